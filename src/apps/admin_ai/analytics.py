@@ -0,0 +1,216 @@
+"""
+Núcleo analítico del asistente financiero (AdminToolExecutor).
+
+Cada herramienta (ingresos, ocupación, proyecciones, clientes, tarifa por
+noche) recorría sus propias reservas en Python, con una consulta por
+propiedad o por mes. Una pregunta que disparaba varias herramientas
+repetía el trabajo y cada una contaba las noches a su manera. Acá:
+
+- `ReservationFrame.load(start, end)` trae una sola vez las reservas
+  aprobadas que tocan la ventana y las guarda en arrays de NumPy por
+  columna (fechas como datetime64[D], montos como float64 con NaN para
+  los nulos). Se cachea (`ADMIN_ANALYTICS_CACHE_TTL`) con las versiones de
+  Reservation, Clients y Property de apps.core.response_cache.
+- Las noches dentro de una ventana y el reparto por meses se calculan por
+  broadcasting: una noche `d` pertenece a la reserva si
+  check_in <= d < check_out (igual que apps.reservation.occupancy). Las
+  noches de fin de semana (vie-sáb) salen de `np.busday_count`.
+- AdminToolExecutor mantiene un frame por instancia (una por turno de la
+  IA) y lo amplía si una herramienta pide una ventana que no cubre, así
+  todas las herramientas de una misma pregunta leen los mismos datos.
+
+Uso:
+    frame = ReservationFrame.load(date(2025, 1, 1), date(2025, 6, 30))
+    mask = frame.checked_in(date(2025, 3, 1), date(2025, 3, 31))
+    frame.price_sol[mask].sum(), frame.nights[mask].sum()
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from apps.core.response_cache import get_versions
+
+WEEKEND_MASK = '0000110'  # weekmask de NumPy (lun..dom): viernes y sábado
+
+FIELDS = (
+    'property_id', 'property__name', 'client_id', 'client__first_name',
+    'client__last_name', 'client__tel_number', 'check_in_date',
+    'check_out_date', 'price_sol', 'price_usd',
+)
+_VERSIONED = ['reservation.Reservation', 'clients.Clients', 'property.Property']
+
+
+def add_months(value, months):
+    """Primer día del mes `months` meses después del mes de `value`."""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(first, last):
+    """Primeros días de mes desde el mes de `first` hasta el de `last`."""
+    months, current = [], date(first.year, first.month, 1)
+    while current <= last:
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+def month_end(value):
+    return date(value.year, value.month, calendar.monthrange(value.year, value.month)[1])
+
+
+def _day(value):
+    return np.datetime64(value, 'D')
+
+
+def _amounts(values):
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=float)
+
+
+def factorize(keys):
+    """(claves únicas en orden de aparición, índice de cada fila). Acepta None y UUID."""
+    index = {}
+    codes = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.int64, count=len(keys))
+    return list(index), codes
+
+
+def group_sum(keys, weights=None):
+    """(claves únicas, suma de `weights` por clave) — cuenta filas si no hay weights."""
+    unique, codes = factorize(keys)
+    if weights is not None:
+        weights = np.nan_to_num(weights)
+    return unique, np.bincount(codes, weights=weights, minlength=len(unique)).astype(float)
+
+
+def mean(values):
+    """Promedio ignorando nulos (NaN), 0 si no hay valores — como Avg()."""
+    valid = values[~np.isnan(values)]
+    return float(valid.mean()) if len(valid) else 0.0
+
+
+@dataclass
+class ReservationFrame:
+    """Reservas aprobadas que tocan [start, end], un array por columna."""
+    start: date
+    end: date
+    property_id: np.ndarray
+    property_name: np.ndarray
+    client_id: np.ndarray
+    client_name: np.ndarray
+    client_phone: np.ndarray
+    check_in: np.ndarray
+    check_out: np.ndarray
+    price_sol: np.ndarray
+    price_usd: np.ndarray
+
+    @classmethod
+    def load(cls, start, end):
+        ttl = getattr(settings, 'ADMIN_ANALYTICS_CACHE_TTL', 300)
+        key = None
+        if ttl:
+            versions = ':'.join(str(version) for version in get_versions(_VERSIONED))
+            key = f'admin_ai:frame:{start}:{end}:{versions}'
+            frame = cache.get(key)
+            if frame is not None:
+                return frame
+        frame = cls._query(start, end)
+        if key:
+            cache.set(key, frame, ttl)
+        return frame
+
+    @classmethod
+    def _query(cls, start, end):
+        from apps.reservation.models import Reservation
+
+        # check_in >= start cubre reservas con fechas invertidas que igual
+        # cuentan por fecha de check-in
+        rows = list(
+            Reservation.objects.filter(
+                Q(check_out_date__gte=start) | Q(check_in_date__gte=start),
+                status='approved',
+                deleted=False,
+                check_in_date__lte=end,
+            ).values_list(*FIELDS)
+        )
+        columns = list(zip(*rows)) if rows else [()] * len(FIELDS)
+        (property_ids, property_names, client_ids, first_names, last_names,
+         phones, check_ins, check_outs, prices_sol, prices_usd) = columns
+        return cls(
+            start=start,
+            end=end,
+            property_id=np.array(property_ids, dtype=object),
+            property_name=np.array(property_names, dtype=object),
+            client_id=np.array(client_ids, dtype=object),
+            client_name=np.array(
+                [f"{first or ''} {last or ''}".strip() for first, last in zip(first_names, last_names)],
+                dtype=object,
+            ),
+            client_phone=np.array(phones, dtype=object),
+            check_in=np.array(check_ins, dtype='datetime64[D]'),
+            check_out=np.array(check_outs, dtype='datetime64[D]'),
+            price_sol=_amounts(prices_sol),
+            price_usd=_amounts(prices_usd),
+        )
+
+    def __len__(self):
+        return len(self.check_in)
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    @property
+    def nights(self):
+        """Noches totales de cada reserva (0 si las fechas están invertidas)."""
+        return np.maximum((self.check_out - self.check_in).astype(np.int64), 0)
+
+    @property
+    def has_client(self):
+        return np.array([client is not None for client in self.client_id], dtype=bool)
+
+    def checked_in(self, start, end, property_name=None):
+        """Máscara: check-in en [start, end] (y nombre de casa que contiene `property_name`)."""
+        mask = (self.check_in >= _day(start)) & (self.check_in <= _day(end))
+        if property_name:
+            mask &= self.property_mask(property_name)
+        return mask
+
+    def property_mask(self, property_name):
+        needle = property_name.lower()
+        return np.array([needle in (name or '').lower() for name in self.property_name], dtype=bool)
+
+    def nights_between(self, start, end):
+        """Noches de cada reserva dentro de [start, end] (ambos días incluidos)."""
+        first = np.maximum(self.check_in, _day(start))
+        last = np.minimum(self.check_out, _day(end + timedelta(days=1)))
+        return np.maximum((last - first).astype(np.int64), 0)
+
+    def split_months(self, months):
+        """
+        Reparto de cada estadía en `months` (primeros días de mes):
+        (noches, noches vie-sáb), matrices reservas x meses.
+        """
+        starts = np.array(months, dtype='datetime64[D]')
+        ends = np.array([add_months(month, 1) for month in months], dtype='datetime64[D]')
+        first = np.maximum(self.check_in[:, None], starts[None, :])
+        last = np.minimum(self.check_out[:, None], ends[None, :])
+        nights = np.maximum((last - first).astype(np.int64), 0)
+        weekend = np.busday_count(first, np.maximum(first, last), weekmask=WEEKEND_MASK)
+        return nights, weekend
+
+    def prorated(self, amounts, nights_in):
+        """Monto proporcional a las noches en el tramo (`nights_in`, una columna por tramo)."""
+        total = self.nights.astype(float)
+        share = np.divide(nights_in, total[:, None], out=np.zeros(nights_in.shape), where=total[:, None] > 0)
+        return np.nan_to_num(amounts)[:, None] * share
+
+
+def weekend_nights(month):
+    """(noches dom-jue, noches vie-sáb) de un mes completo."""
+    start, end = _day(month), _day(add_months(month, 1))
+    weekend = int(np.busday_count(start, end, weekmask=WEEKEND_MASK))
+    return int((end - start).astype(np.int64)) - weekend, weekend
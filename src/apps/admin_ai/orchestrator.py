@@ -5,8 +5,6 @@ Sigue el patrón de apps.chatbot.ai_orchestrator pero simplificado para uso admi
 import json
 import logging
 
-import openai
-from django.conf import settings
 from django.utils import timezone
 
 from .models import AdminChatSession, AdminChatMessage
@@ -94,7 +92,9 @@ class AdminAIOrchestrator:
 
     def _call_ai(self, session, user_message):
         """Realiza la llamada a OpenAI con function calling"""
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        from apps.core import ai_gateway
+
+        client = ai_gateway.client('admin_ai')
 
         messages = self._build_messages(session, user_message)
 
@@ -0,0 +1,75 @@
+from datetime import date
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from .analytics import ReservationFrame, add_months, group_sum, mean, month_range, weekend_nights
+
+
+def make_frame(rows, start=date(2025, 1, 1), end=date(2025, 3, 31)):
+    """rows: (propiedad, cliente, check_in, check_out, precio_sol)."""
+    properties, clients, check_ins, check_outs, prices = zip(*rows)
+    return ReservationFrame(
+        start=start,
+        end=end,
+        property_id=np.array(properties, dtype=object),
+        property_name=np.array([f'Casa {p}' for p in properties], dtype=object),
+        client_id=np.array(clients, dtype=object),
+        client_name=np.array([f'Cliente {c}' for c in clients], dtype=object),
+        client_phone=np.array(['' for _ in clients], dtype=object),
+        check_in=np.array(check_ins, dtype='datetime64[D]'),
+        check_out=np.array(check_outs, dtype='datetime64[D]'),
+        price_sol=np.array([np.nan if p is None else p for p in prices], dtype=float),
+        price_usd=np.full(len(rows), np.nan),
+    )
+
+
+class ReservationFrameTest(SimpleTestCase):
+    def setUp(self):
+        self.frame = make_frame([
+            # 30 ene (jue) -> 2 feb (dom): 2 noches en enero, 1 en febrero
+            (1, 'a', date(2025, 1, 30), date(2025, 2, 2), 300.0),
+            # 31 ene (vie) -> 1 feb: solo la noche del viernes, en enero
+            (2, 'b', date(2025, 1, 31), date(2025, 2, 1), 100.0),
+            (1, 'a', date(2025, 2, 10), date(2025, 2, 14), None),
+            (2, None, date(2025, 3, 1), date(2025, 3, 1), 50.0),
+        ])
+
+    def test_month_helpers(self):
+        self.assertEqual(add_months(date(2025, 11, 20), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 5), -1), date(2024, 12, 1))
+        self.assertEqual(
+            month_range(date(2024, 12, 10), date(2025, 2, 1)),
+            [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+        # Enero 2025: 31 noches, 9 de ellas viernes o sábado
+        self.assertEqual(weekend_nights(date(2025, 1, 1)), (22, 9))
+
+    def test_nights_and_window(self):
+        self.assertEqual(self.frame.nights.tolist(), [3, 1, 4, 0])
+        # La última noche de la ventana (31 ene) cuenta
+        self.assertEqual(
+            self.frame.nights_between(date(2025, 1, 1), date(2025, 1, 31)).tolist(), [2, 1, 0, 0],
+        )
+        mask = self.frame.checked_in(date(2025, 1, 1), date(2025, 1, 31), property_name='casa 1')
+        self.assertEqual(mask.tolist(), [True, False, False, False])
+        self.assertEqual(self.frame.has_client.tolist(), [True, True, True, False])
+
+    def test_split_months_matches_day_by_day(self):
+        months = month_range(date(2025, 1, 1), date(2025, 3, 1))
+        nights, weekend = self.frame.split_months(months)
+        self.assertEqual(nights.tolist(), [[2, 1, 0], [1, 0, 0], [0, 4, 0], [0, 0, 0]])
+        self.assertEqual(weekend.tolist(), [[1, 1, 0], [1, 0, 0], [0, 0, 0], [0, 0, 0]])
+
+        revenue = self.frame.prorated(self.frame.price_sol, nights)
+        np.testing.assert_allclose(revenue[0], [200.0, 100.0, 0.0])
+        self.assertEqual(revenue[2].tolist(), [0.0, 0.0, 0.0])
+
+    def test_group_sum_and_mean(self):
+        keys, totals = group_sum(self.frame.client_id, self.frame.price_sol)
+        self.assertEqual(keys, ['a', 'b', None])
+        self.assertEqual(totals.tolist(), [300.0, 100.0, 50.0])
+        self.assertEqual(group_sum(self.frame.property_id)[1].tolist(), [2.0, 2.0])
+        self.assertEqual(mean(self.frame.price_sol), 150.0)
+        self.assertEqual(mean(np.array([np.nan])), 0.0)
+        self.assertEqual(group_sum(np.array([], dtype=object))[1].tolist(), [])
@@ -5,10 +5,9 @@ Cada método consulta datos reales de la base de datos.
 import json
 import logging
 from datetime import date, timedelta
-from decimal import Decimal
 
 from django.db import models as db_models
-from django.db.models import Sum, Avg, Count, Q, F, Min, Max
+from django.db.models import Sum, Count, Q, F, Min, Max
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -62,52 +61,49 @@ class AdminToolExecutor:
 
         return dt_from, dt_to
 
+    def _frame(self, start, end):
+        """
+        Reservas en columnas (apps.admin_ai.analytics) que cubren [start, end].
+        Se comparte entre las herramientas de un mismo turno; si una pide una
+        ventana que no cubre, se recarga la unión alineada a meses.
+        """
+        from apps.admin_ai.analytics import ReservationFrame, month_end
+
+        frame = getattr(self, '_reservations', None)
+        if frame is None or not frame.covers(start, end):
+            if frame is not None:
+                start, end = min(start, frame.start), max(end, frame.end)
+            self._reservations = ReservationFrame.load(start.replace(day=1), month_end(end))
+        return self._reservations
+
     def _get_revenue_summary(self, date_from=None, date_to=None, property_name=None):
+        from apps.admin_ai.analytics import group_sum, mean
         from apps.reservation.models import Reservation
         from apps.property.models import Property
+        import numpy as np
 
         dt_from, dt_to = self._parse_dates(date_from, date_to)
 
-        qs = Reservation.objects.filter(
-            check_in_date__gte=dt_from,
-            check_in_date__lte=dt_to,
-            status='approved',
-            deleted=False,
-        )
-        if property_name:
-            qs = qs.filter(property__name__icontains=property_name)
-
-        # Totales generales
-        totals = qs.aggregate(
-            total_sol=Sum('price_sol'),
-            total_usd=Sum('price_usd'),
-            avg_sol=Avg('price_sol'),
-            avg_usd=Avg('price_usd'),
-            count=Count('id'),
-        )
+        frame = self._frame(dt_from, dt_to)
+        mask = frame.checked_in(dt_from, dt_to, property_name)
+        price_sol, price_usd = frame.price_sol[mask], frame.price_usd[mask]
 
-        total_sol = float(totals['total_sol'] or 0)
-        total_usd = float(totals['total_usd'] or 0)
-        avg_sol = float(totals['avg_sol'] or 0)
-        avg_usd = float(totals['avg_usd'] or 0)
-        count = totals['count'] or 0
+        # Totales generales (los nulos no cuentan para el promedio, como Avg)
+        count = int(mask.sum())
+        total_sol = float(np.nansum(price_sol))
+        total_usd = float(np.nansum(price_usd))
+        avg_sol = mean(price_sol)
+        avg_usd = mean(price_usd)
 
         # Total de noches
-        total_nights = 0
-        for r in qs.only('check_in_date', 'check_out_date'):
-            nights = (r.check_out_date - r.check_in_date).days
-            if nights > 0:
-                total_nights += nights
+        total_nights = int(frame.nights[mask].sum())
 
         # Desglose por propiedad
-        by_property = (
-            qs.values('property__name')
-            .annotate(
-                revenue_sol=Sum('price_sol'),
-                revenue_usd=Sum('price_usd'),
-                reservations=Count('id'),
-            )
-            .order_by('-revenue_sol')
+        names, revenue_sol = group_sum(frame.property_name[mask], price_sol)
+        _, revenue_usd = group_sum(frame.property_name[mask], price_usd)
+        _, reservations = group_sum(frame.property_name[mask])
+        by_property = sorted(
+            zip(names, revenue_sol, revenue_usd, reservations), key=lambda p: -p[1],
         )
 
         days_in_period = (dt_to - dt_from).days + 1
@@ -127,12 +123,12 @@ class AdminToolExecutor:
             'RevPAR_sol': round(revpar, 2),
             'desglose_por_propiedad': [
                 {
-                    'propiedad': p['property__name'],
-                    'ingresos_sol': float(p['revenue_sol'] or 0),
-                    'ingresos_usd': float(p['revenue_usd'] or 0),
-                    'reservas': p['reservations'],
+                    'propiedad': name,
+                    'ingresos_sol': round(float(sol), 2),
+                    'ingresos_usd': round(float(usd), 2),
+                    'reservas': int(reservations_count),
                 }
-                for p in by_property
+                for name, sol, usd, reservations_count in by_property
             ],
         }
 
@@ -155,31 +151,22 @@ class AdminToolExecutor:
         return json.dumps(result, ensure_ascii=False)
 
     def _get_occupancy_rates(self, date_from=None, date_to=None):
-        from apps.reservation.models import Reservation
+        from apps.admin_ai.analytics import group_sum
         from apps.property.models import Property
 
         dt_from, dt_to = self._parse_dates(date_from, date_to)
         days_in_period = (dt_to - dt_from).days + 1
 
-        properties = Property.objects.filter(deleted=False)
+        # Noches dentro de [dt_from, dt_to], ambos días incluidos
+        frame = self._frame(dt_from, dt_to)
+        ids, nights = group_sum(frame.property_id, frame.nights_between(dt_from, dt_to))
+        occupied_by_property = dict(zip(ids, nights))
+
+        properties = Property.objects.filter(deleted=False).only('id', 'name')
         occupancy = []
 
         for prop in properties:
-            reservations = Reservation.objects.filter(
-                property=prop,
-                status='approved',
-                deleted=False,
-                check_in_date__lte=dt_to,
-                check_out_date__gte=dt_from,
-            )
-            occupied_nights = 0
-            for r in reservations:
-                start = max(r.check_in_date, dt_from)
-                end = min(r.check_out_date, dt_to)
-                nights = (end - start).days
-                if nights > 0:
-                    occupied_nights += nights
-
+            occupied_nights = int(occupied_by_property.get(prop.id, 0))
             rate = (occupied_nights / days_in_period * 100) if days_in_period > 0 else 0
             occupancy.append({
                 'propiedad': prop.name,
@@ -350,31 +337,25 @@ class AdminToolExecutor:
         return json.dumps({'propiedades': details}, ensure_ascii=False)
 
     def _get_financial_projections(self, months_back=3, months_forward=1):
-        from apps.reservation.models import Reservation
+        from apps.admin_ai.analytics import add_months
+        import numpy as np
 
         today = date.today()
+        first_month = add_months(today, -months_back)
+        future_end = today + timedelta(days=30 * months_forward)
+        frame = self._frame(first_month, max(today, future_end))
 
-        # Datos históricos por mes
+        # Datos históricos por mes (por fecha de check-in)
         monthly_data = []
         for i in range(months_back, 0, -1):
-            month_start = (today.replace(day=1) - timedelta(days=30 * i)).replace(day=1)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1, day=1) - timedelta(days=1)
-
-            qs = Reservation.objects.filter(
-                check_in_date__gte=month_start,
-                check_in_date__lte=month_end,
-                status='approved',
-                deleted=False,
-            )
-            total = qs.aggregate(sol=Sum('price_sol'), usd=Sum('price_usd'), count=Count('id'))
+            month_start = add_months(today, -i)
+            month_end = add_months(today, -i + 1) - timedelta(days=1)
+            mask = frame.checked_in(month_start, month_end)
             monthly_data.append({
                 'mes': month_start.strftime('%Y-%m'),
-                'ingresos_sol': float(total['sol'] or 0),
-                'ingresos_usd': float(total['usd'] or 0),
-                'reservas': total['count'] or 0,
+                'ingresos_sol': round(float(np.nansum(frame.price_sol[mask])), 2),
+                'ingresos_usd': round(float(np.nansum(frame.price_usd[mask])), 2),
+                'reservas': int(mask.sum()),
             })
 
         # Crecimiento promedio mensual
@@ -391,13 +372,8 @@ class AdminToolExecutor:
         avg_monthly = sum(revenues) / len(revenues) if revenues else 0
 
         # Reservas futuras confirmadas
-        future_qs = Reservation.objects.filter(
-            check_in_date__gt=today,
-            check_in_date__lte=today + timedelta(days=30 * months_forward),
-            status='approved',
-            deleted=False,
-        )
-        future_totals = future_qs.aggregate(sol=Sum('price_sol'), count=Count('id'))
+        future = frame.checked_in(today + timedelta(days=1), future_end)
+        future_totals = {'sol': round(float(np.nansum(frame.price_sol[future])), 2), 'count': int(future.sum())}
 
         result = {
             'historico_mensual': monthly_data,
@@ -413,38 +389,26 @@ class AdminToolExecutor:
         return json.dumps(result, ensure_ascii=False)
 
     def _get_client_analytics(self, date_from=None, date_to=None, top_n=10):
-        from apps.reservation.models import Reservation
+        from apps.admin_ai.analytics import factorize
         from apps.clients.models import Clients
+        import numpy as np
 
         dt_from, dt_to = self._parse_dates(date_from, date_to, default_days=90)
 
-        approved = Reservation.objects.filter(
-            check_in_date__gte=dt_from,
-            check_in_date__lte=dt_to,
-            status='approved',
-            deleted=False,
-            client__isnull=False,
-        )
+        frame = self._frame(dt_from, dt_to)
+        mask = frame.checked_in(dt_from, dt_to) & frame.has_client
+        client_ids, codes = factorize(frame.client_id[mask])
+        spent = np.bincount(codes, weights=np.nan_to_num(frame.price_sol[mask]), minlength=len(client_ids))
+        reservations = np.bincount(codes, minlength=len(client_ids))
 
-        # Top clientes por gasto
-        top_clients = (
-            approved
-            .values('client__first_name', 'client__last_name', 'client__tel_number')
-            .annotate(
-                total_sol=Sum('price_sol'),
-                total_reservas=Count('id'),
-            )
-            .order_by('-total_sol')[:top_n]
-        )
+        # Top clientes por gasto (primera fila de cada cliente para nombre y teléfono)
+        first_row = np.unique(codes, return_index=True)[1]
+        names, phones = frame.client_name[mask][first_row], frame.client_phone[mask][first_row]
+        top = np.argsort(-spent, kind='stable')[:top_n]
 
         # Nuevos vs recurrentes
-        unique_clients = approved.values('client').distinct().count()
-        clients_with_history = (
-            approved.values('client')
-            .annotate(res_count=Count('id'))
-            .filter(res_count__gt=1)
-            .count()
-        )
+        unique_clients = len(client_ids)
+        clients_with_history = int((reservations > 1).sum())
 
         # Total clientes en sistema
         total_clients = Clients.objects.filter(deleted=False).count()
@@ -456,12 +420,12 @@ class AdminToolExecutor:
             'total_clientes_en_sistema': total_clients,
             'top_clientes': [
                 {
-                    'nombre': f"{c['client__first_name']} {c['client__last_name'] or ''}".strip(),
-                    'telefono': c['client__tel_number'],
-                    'gasto_total_sol': float(c['total_sol'] or 0),
-                    'reservas': c['total_reservas'],
+                    'nombre': names[i],
+                    'telefono': phones[i],
+                    'gasto_total_sol': round(float(spent[i]), 2),
+                    'reservas': int(reservations[i]),
                 }
-                for c in top_clients
+                for i in top
             ],
         }
         return json.dumps(result, ensure_ascii=False)
@@ -508,72 +472,66 @@ class AdminToolExecutor:
         return json.dumps(result, ensure_ascii=False)
 
     def _get_nightly_rate_analysis(self, months_back=6, months_forward=2, property_name=None):
-        from apps.reservation.models import Reservation
+        from apps.admin_ai.analytics import add_months, month_range, month_end, weekend_nights
         from apps.property.models import Property
         from apps.property.pricing_models import PropertyPricing, SeasonPricing, SpecialDatePricing
-        from calendar import monthrange
 
         today = date.today()
 
         properties = Property.objects.filter(deleted=False)
         if property_name:
             properties = properties.filter(name__icontains=property_name)
+        properties = list(properties)
 
         # Generar lista de meses a analizar
-        months = []
-        start_month = today.month - months_back
-        start_year = today.year
-        while start_month <= 0:
-            start_month += 12
-            start_year -= 1
-
-        current = date(start_year, start_month, 1)
-        end_month_offset = months_forward
-        end_date = today.replace(day=1)
-        for _ in range(end_month_offset):
-            if end_date.month == 12:
-                end_date = end_date.replace(year=end_date.year + 1, month=1)
-            else:
-                end_date = end_date.replace(month=end_date.month + 1)
-
-        while current <= end_date:
-            months.append(current)
-            if current.month == 12:
-                current = current.replace(year=current.year + 1, month=1)
-            else:
-                current = current.replace(month=current.month + 1)
+        months = month_range(add_months(today, -months_back), add_months(today, months_forward))
+
+        # Noches (y noches vie-sáb) de cada reserva en cada mes, e ingreso prorrateado
+        frame = self._frame(months[0], month_end(months[-1]))
+        nights, weekend = frame.split_months(months)
+        revenue_sol = frame.prorated(frame.price_sol, nights)
+        revenue_usd = frame.prorated(frame.price_usd, nights)
+
+        # Tarifas, fechas especiales y temporada: una consulta por tipo, no por mes
+        pricing_by_property = {
+            pricing.property_id: pricing
+            for pricing in PropertyPricing.objects.filter(property__in=properties)
+        }
+        specials_by_month = {}
+        for s in SpecialDatePricing.objects.filter(
+            property__in=properties,
+            is_active=True,
+            month__in={month.month for month in months},
+        ):
+            specials_by_month.setdefault((s.property_id, s.month), []).append({
+                'dia': s.day,
+                'descripcion': s.description,
+                'precio_usd': float(s.price_usd),
+                'minimo_noches': s.minimum_consecutive_nights,
+            })
+        high_season = {}
+        if pricing_by_property:
+            high_season = {
+                month: SeasonPricing.is_high_season(date(month.year, month.month, 15)) for month in months
+            }
+        available = {month: weekend_nights(month) for month in months}
 
         result_by_property = []
 
         for prop in properties:
             # Obtener tarifas configuradas
-            try:
-                pricing = PropertyPricing.objects.get(property=prop)
-                has_pricing = True
-            except PropertyPricing.DoesNotExist:
-                has_pricing = False
+            pricing = pricing_by_property.get(prop.id)
+            has_pricing = pricing is not None
+            rows = frame.property_id == prop.id
 
             prop_months = []
-            for month_start in months:
-                days_in_month = monthrange(month_start.year, month_start.month)[1]
-                month_end = date(month_start.year, month_start.month, days_in_month)
-
-                # Contar noches weekday y weekend en el mes
-                weekday_nights = 0
-                weekend_nights = 0
-                d = month_start
-                while d <= month_end:
-                    # Vie=4, Sáb=5 son weekend
-                    if d.weekday() in (4, 5):
-                        weekend_nights += 1
-                    else:
-                        weekday_nights += 1
-                    d += timedelta(days=1)
+            for j, month_start in enumerate(months):
+                # Noches weekday (Dom-Jue) y weekend (Vie-Sáb) en el mes
+                weekday_nights, weekend_nights_count = available[month_start]
 
                 # Determinar temporada predominante del mes
                 if has_pricing:
-                    mid_month = date(month_start.year, month_start.month, 15)
-                    is_high = SeasonPricing.is_high_season(mid_month)
+                    is_high = high_season[month_start]
                     season_name = 'alta' if is_high else 'baja'
                     if is_high:
                         rate_weekday = float(pricing.weekday_high_season_usd)
@@ -583,20 +541,7 @@ class AdminToolExecutor:
                         rate_weekend = float(pricing.weekend_low_season_usd)
 
                     # Revisar si hay fechas especiales en el mes
-                    specials = SpecialDatePricing.objects.filter(
-                        property=prop,
-                        is_active=True,
-                        month=month_start.month,
-                    )
-                    special_dates_info = [
-                        {
-                            'dia': s.day,
-                            'descripcion': s.description,
-                            'precio_usd': float(s.price_usd),
-                            'minimo_noches': s.minimum_consecutive_nights,
-                        }
-                        for s in specials
-                    ]
+                    special_dates_info = specials_by_month.get((prop.id, month_start.month), [])
                 else:
                     season_name = 'sin configurar'
                     rate_weekday = 0
@@ -604,47 +549,15 @@ class AdminToolExecutor:
                     special_dates_info = []
 
                 # Reservas reales de este mes para esta propiedad
-                reservations = Reservation.objects.filter(
-                    property=prop,
-                    status='approved',
-                    deleted=False,
-                    check_in_date__lte=month_end,
-                    check_out_date__gte=month_start,
-                )
-
-                occupied_weekday = 0
-                occupied_weekend = 0
-                month_revenue_sol = Decimal('0')
-                month_revenue_usd = Decimal('0')
-                reservation_count = 0
-
-                for r in reservations:
-                    # Solo contar noches dentro de este mes
-                    r_start = max(r.check_in_date, month_start)
-                    r_end = min(r.check_out_date, month_end)
-                    total_r_nights = (r.check_out_date - r.check_in_date).days
-                    nights_in_month = (r_end - r_start).days
-                    if nights_in_month <= 0:
-                        continue
-
-                    reservation_count += 1
-
-                    d = r_start
-                    while d < r_end:
-                        if d.weekday() in (4, 5):
-                            occupied_weekend += 1
-                        else:
-                            occupied_weekday += 1
-                        d += timedelta(days=1)
-
-                    # Prorratear ingreso si la reserva cruza meses
-                    if total_r_nights > 0:
-                        ratio = Decimal(str(nights_in_month)) / Decimal(str(total_r_nights))
-                        month_revenue_sol += (r.price_sol or Decimal('0')) * ratio
-                        month_revenue_usd += (r.price_usd or Decimal('0')) * ratio
+                month_nights = nights[rows, j]
+                occupied_weekend = int(weekend[rows, j].sum())
+                occupied_weekday = int(month_nights.sum()) - occupied_weekend
+                reservation_count = int((month_nights > 0).sum())
+                month_revenue_sol = float(revenue_sol[rows, j].sum())
+                month_revenue_usd = float(revenue_usd[rows, j].sum())
 
                 total_occupied = occupied_weekday + occupied_weekend
-                total_available = weekday_nights + weekend_nights
+                total_available = weekday_nights + weekend_nights_count
                 occupancy_pct = round(total_occupied / total_available * 100, 1) if total_available > 0 else 0
 
                 month_data = {
@@ -653,26 +566,26 @@ class AdminToolExecutor:
                     'tarifa_weekday_usd': rate_weekday,
                     'tarifa_weekend_usd': rate_weekend,
                     'noches_weekday_disponibles': weekday_nights,
-                    'noches_weekend_disponibles': weekend_nights,
+                    'noches_weekend_disponibles': weekend_nights_count,
                     'noches_weekday_ocupadas': occupied_weekday,
                     'noches_weekend_ocupadas': occupied_weekend,
                     'ocupacion_weekday_pct': round(occupied_weekday / weekday_nights * 100, 1) if weekday_nights > 0 else 0,
-                    'ocupacion_weekend_pct': round(occupied_weekend / weekend_nights * 100, 1) if weekend_nights > 0 else 0,
+                    'ocupacion_weekend_pct': round(occupied_weekend / weekend_nights_count * 100, 1) if weekend_nights_count > 0 else 0,
                     'ocupacion_total_pct': occupancy_pct,
                     'reservas': reservation_count,
-                    'ingreso_real_sol': round(float(month_revenue_sol), 2),
-                    'ingreso_real_usd': round(float(month_revenue_usd), 2),
-                    'precio_promedio_noche_sol': round(float(month_revenue_sol) / total_occupied, 2) if total_occupied > 0 else 0,
-                    'precio_promedio_noche_usd': round(float(month_revenue_usd) / total_occupied, 2) if total_occupied > 0 else 0,
+                    'ingreso_real_sol': round(month_revenue_sol, 2),
+                    'ingreso_real_usd': round(month_revenue_usd, 2),
+                    'precio_promedio_noche_sol': round(month_revenue_sol / total_occupied, 2) if total_occupied > 0 else 0,
+                    'precio_promedio_noche_usd': round(month_revenue_usd / total_occupied, 2) if total_occupied > 0 else 0,
                 }
                 if special_dates_info:
                     month_data['fechas_especiales'] = special_dates_info
 
                 # Ingreso potencial (si estuviera 100% ocupado a tarifas configuradas)
                 if has_pricing:
-                    potential = (rate_weekday * weekday_nights) + (rate_weekend * weekend_nights)
+                    potential = (rate_weekday * weekday_nights) + (rate_weekend * weekend_nights_count)
                     month_data['ingreso_potencial_usd'] = round(potential, 2)
-                    month_data['captacion_pct'] = round(float(month_revenue_usd) / potential * 100, 1) if potential > 0 else 0
+                    month_data['captacion_pct'] = round(month_revenue_usd / potential * 100, 1) if potential > 0 else 0
 
                 prop_months.append(month_data)
 
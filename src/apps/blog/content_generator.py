@@ -560,14 +560,14 @@ de esa ocasión (no genérico a /casas-alquiler-punta-hermosa).""")
                 "Agrega tu API key de OpenAI al .env"
             )
 
-        import openai
+        from apps.core import ai_gateway
 
-        client = openai.OpenAI(api_key=self.openai_key)
+        client = ai_gateway.client('blog')
 
         logger.info("Llamando a OpenAI API para generar contenido...")
 
+        # Modelo, timeout y reintentos: AI_GATEWAY_USE_CASES['blog']
         response = client.chat.completions.create(
-            model="gpt-4o",
             max_tokens=4096,
             temperature=0.7,
             messages=[
@@ -712,10 +712,10 @@ de esa ocasión (no genérico a /casas-alquiler-punta-hermosa).""")
             return None
 
         try:
-            import openai
             import requests
+            from apps.core import ai_gateway
 
-            client = openai.OpenAI(api_key=self.openai_key)
+            client = ai_gateway.client('blog')
             template = topic['template']
 
             # Prompt construido para forzar estilo foto real
@@ -6,6 +6,7 @@ from django.core.files.base import ContentFile
 from django.utils.text import slugify
 
 from apps.core.models import BaseModel
+from apps.core.image_derivatives import enqueue_derivatives, get_manifest
 
 
 def blog_image_upload_path(instance, filename):
@@ -115,10 +116,20 @@ class BlogPost(BaseModel):
         # Save first to have a file path
         super().save(*args, **kwargs)
 
-        # Generate thumbnail if featured_image exists and no thumbnail yet
+        # Thumbnail and responsive sizes are built off-request by the
+        # derivatives pool (see apps.core.image_derivatives)
+        if self.featured_image and (
+            not self.thumbnail or not get_manifest(self.featured_image.name)
+        ):
+            enqueue_derivatives(self, 'featured_image', after='process_uploaded_image')
+
+    def process_uploaded_image(self):
+        """Derivatives worker hook: builds the legacy 400x300 thumbnail."""
         if self.featured_image and not self.thumbnail:
             self.generate_thumbnail()
-            super().save(update_fields=['thumbnail'])
+            if self.thumbnail:
+                return {'thumbnail': self.thumbnail.name}
+        return None
 
     def generate_thumbnail(self):
         """Generate thumbnail from featured image (400x300) in WebP format."""
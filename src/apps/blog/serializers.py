@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from apps.core.image_derivatives import get_srcset
+
 from .models import BlogCategory, BlogPost
 
 
@@ -14,12 +16,13 @@ class BlogPostListSerializer(serializers.ModelSerializer):
     category_slug = serializers.SerializerMethodField()
     featured_image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    featured_image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = BlogPost
         fields = [
             'id', 'title', 'slug', 'excerpt', 'featured_image_url',
-            'thumbnail_url', 'category_name', 'category_slug',
+            'thumbnail_url', 'featured_image_srcset', 'category_name', 'category_slug',
             'author', 'published_date',
         ]
 
@@ -39,17 +42,21 @@ class BlogPostListSerializer(serializers.ModelSerializer):
             return obj.thumbnail.url
         return None
 
+    def get_featured_image_srcset(self, obj):
+        return get_srcset(obj.featured_image)
+
 
 class BlogPostDetailSerializer(serializers.ModelSerializer):
     category = BlogCategorySerializer(read_only=True)
     featured_image_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    featured_image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = BlogPost
         fields = [
             'id', 'title', 'slug', 'content', 'excerpt', 'meta_description',
-            'featured_image_url', 'thumbnail_url', 'category',
+            'featured_image_url', 'thumbnail_url', 'featured_image_srcset', 'category',
             'author', 'status', 'published_date', 'created', 'updated',
         ]
 
@@ -63,6 +70,9 @@ class BlogPostDetailSerializer(serializers.ModelSerializer):
             return obj.thumbnail.url
         return None
 
+    def get_featured_image_srcset(self, obj):
+        return get_srcset(obj.featured_image)
+
 
 class BlogPostAdminSerializer(serializers.ModelSerializer):
     """Serializer para administración de posts (lectura + edición parcial)."""
@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.core.paginator import CustomPagination
+from apps.core.response_cache import cache_response
 from .models import BlogCategory, BlogPost, SearchConsoleData
 from .serializers import (
     BlogCategorySerializer,
@@ -45,6 +46,14 @@ class BlogPostViewSet(viewsets.ReadOnlyModelViewSet):
             return BlogPostDetailSerializer
         return BlogPostListSerializer
 
+    @cache_response('blog.BlogPost', 'blog.BlogCategory')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('blog.BlogPost', 'blog.BlogCategory')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class BlogCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """API pública de categorías del blog."""
@@ -170,8 +179,19 @@ class SearchConsoleStatsView(APIView):
         })
 
 
+SITEMAP_URL_TEMPLATE = (
+    '  <url>\n'
+    '    <loc>https://casaaustin.pe/blog/{slug}</loc>\n'
+    '    <lastmod>{lastmod}</lastmod>\n'
+    '    <changefreq>monthly</changefreq>\n'
+    '    <priority>0.7</priority>\n'
+    '  </url>\n'
+)
+
+
 @api_view(['GET', 'HEAD'])
 @perm_classes([AllowAny])
+@cache_response('blog.BlogPost', ttl=3600)
 def blog_sitemap(request):
     """Genera sitemap XML dinámico con todos los blog posts publicados.
 
@@ -183,24 +203,15 @@ def blog_sitemap(request):
         deleted=False, status='published'
     ).order_by('-published_date').values_list('slug', 'updated')
 
-    urls = []
-    for slug, updated in posts:
-        lastmod = updated.strftime('%Y-%m-%d') if updated else ''
-        urls.append(
-            f'  <url>\n'
-            f'    <loc>https://casaaustin.pe/blog/{slug}</loc>\n'
-            f'    <lastmod>{lastmod}</lastmod>\n'
-            f'    <changefreq>monthly</changefreq>\n'
-            f'    <priority>0.7</priority>\n'
-            f'  </url>'
-        )
-
-    xml = (
+    parts = [
         '<?xml version="1.0" encoding="UTF-8"?>\n'
         '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        + '\n'.join(urls) + '\n'
-        '</urlset>'
-    )
+    ]
+    for slug, updated in posts.iterator():
+        lastmod = updated.strftime('%Y-%m-%d') if updated else ''
+        parts.append(SITEMAP_URL_TEMPLATE.format(slug=slug, lastmod=lastmod))
+    parts.append('</urlset>')
+    xml = ''.join(parts)
     # En HEAD Django/DRF omite el body automáticamente pero usa el
     # mismo Content-Type/Length que tendría el GET — perfecto para GSC.
     return HttpResponse(xml, content_type='application/xml; charset=utf-8')
@@ -659,8 +659,7 @@ class ChatAnalysisView(APIView):
     )
 
     def get(self, request):
-        import openai
-        from django.conf import settings as django_settings
+        from apps.core import ai_gateway
 
         # Obtener el prompt actual del chatbot
         chatbot_config = ChatbotConfiguration.get_config()
@@ -745,7 +744,7 @@ class ChatAnalysisView(APIView):
 
         # Llamar a OpenAI para análisis
         try:
-            client = openai.OpenAI(api_key=django_settings.OPENAI_API_KEY)
+            client = ai_gateway.client('reports')
             response = client.chat.completions.create(
                 model="gpt-4.1",
                 temperature=0.2,
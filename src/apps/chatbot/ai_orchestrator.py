@@ -1,6 +1,8 @@
+import hashlib
 import json
 import logging
 import re
+import time
 from datetime import date
 
 from django.conf import settings
@@ -10,6 +12,9 @@ from .models import ChatSession, ChatMessage
 from .tool_executor import ToolExecutor, TOOL_DEFINITIONS
 from .channel_sender import get_sender
 from .utils import calc_bed_capacity
+from .prompt_cache import get_fragment
+from .conversation import ConversationContext
+from .streaming import StreamingReply
 from . import guards
 
 logger = logging.getLogger(__name__)
@@ -51,6 +56,12 @@ _TOOL_PATTERN = re.compile(
 )
 
 
+# Para streaming: párrafos que no se pueden limpiar sin la respuesta entera
+_INSTRUCTION_OPEN_RE = re.compile(r'^\s*\[INSTRUCCI[ÓO]N', re.IGNORECASE | re.MULTILINE)
+_PRICE_RE = re.compile(r'(?:\$|S/\.?)\s*\d[\d,]*\d(?:\.\d+)?')
+_PRICING_TOOLS = {'check_availability', 'check_late_checkout', 'get_pricing_table'}
+
+
 def sanitize_response(text):
     """Limpia el texto de respuesta antes de enviar al cliente.
     Elimina llamadas a herramientas expuestas, errores internos y
@@ -211,46 +222,101 @@ class AIOrchestrator:
         Returns:
             str: Texto de la respuesta generada
         """
+        started_at = time.monotonic()
+
+        # Historial de la sesión cargado una vez para todo el turno: guards,
+        # prompt, herramientas y guardias post-respuesta lo comparten.
+        conversation = ConversationContext(session)
+
         # ===== GUARDS DETERMINÍSTICOS (pre-OpenAI) =====
         # Cada guard puede interceptar un caso y responder sin llamar al modelo.
         # Si interceptan, ChatMessage queda con tokens_used=0 y tool_calls
         # con metadata "guard:<nombre>" para trazabilidad.
-        guard_response = self._try_guards(session, inbound_message)
+        guard_response = self._try_guards(session, inbound_message, conversation)
         if guard_response is not None:
             return self._send_guard_response(
-                session, guard_response, send_wa
+                session, guard_response, send_wa, started_at
             )
 
+        # Streaming: la respuesta final (post-herramientas) se envía por
+        # párrafos mientras el modelo la genera (ver streaming.py).
+        stream = None
+        if send_wa and getattr(settings, 'CHATBOT_STREAMING', False):
+            stream = self._new_stream(session, inbound_message, conversation, started_at)
+
         try:
             response_text, tool_calls_data, model_used, tokens = self._call_ai(
-                session, inbound_message, self.config.primary_model
+                session, inbound_message, self.config.primary_model, conversation, stream
             )
         except Exception as e:
             logger.error(f"Error con modelo primario: {e}")
-            try:
-                response_text, tool_calls_data, model_used, tokens = self._call_ai(
-                    session, inbound_message, self.config.fallback_model
-                )
-            except Exception as e2:
-                logger.error(f"Error con modelo fallback: {e2}")
-                response_text = "¡Hola! 😊 En este momento no puedo procesar tu consulta. Nuestro equipo te atenderá en breve, o puedes contactarnos directamente: 📲 https://wa.me/51999902992"
-                tool_calls_data = []
-                model_used = 'error'
+            if stream is not None and stream.dispatched:
+                # Parte de la respuesta ya llegó al cliente: reintentar con
+                # el modelo fallback la duplicaría. Se persiste lo enviado
+                # y se descarta la cola incompleta.
+                stream.remaining()
+                response_text = ''
+                tool_calls_data = stream.tool_calls_data
+                model_used = self.config.primary_model
                 tokens = 0
+            else:
+                try:
+                    response_text, tool_calls_data, model_used, tokens = self._call_ai(
+                        session, inbound_message, self.config.fallback_model, conversation, stream
+                    )
+                except Exception as e2:
+                    logger.error(f"Error con modelo fallback: {e2}")
+                    response_text = "¡Hola! 😊 En este momento no puedo procesar tu consulta. Nuestro equipo te atenderá en breve, o puedes contactarnos directamente: 📲 https://wa.me/51999902992"
+                    tool_calls_data = []
+                    model_used = 'error'
+                    tokens = 0
+
+        if stream is not None and stream.began:
+            # Las guardias sin texto ya corrieron en stream.begin (antes del
+            # primer envío); aquí solo se completa y envía lo que falta.
+            content = self._finish_stream(stream, response_text, tool_calls_data)
+            return self._save_ai_response(
+                session, content, stream.message_ids[-1] if stream.message_ids else None,
+                model_used, tokens, tool_calls_data, stream.first_message_ms,
+            )
 
+        pause_ai = self._run_response_guards(
+            session, inbound_message, tool_calls_data, conversation
+        )
+        if pause_ai:
+            send_wa = False
+
+        response_text = self._postprocess_response(response_text, tool_calls_data)
+
+        # Enviar por el canal correspondiente
+        wa_message_id = None
+        first_message_ms = None
+        if send_wa:
+            sender = get_sender(session.channel)
+            wa_message_id = sender.send_text_message(session.wa_id, response_text)
+            first_message_ms = int((time.monotonic() - started_at) * 1000)
+
+        return self._save_ai_response(
+            session, response_text, wa_message_id, model_used, tokens,
+            tool_calls_data, first_message_ms,
+        )
+
+    def _run_response_guards(self, session, inbound_message, tool_calls_data, conversation=None):
+        """Guardias post-modelo que no dependen del texto de la respuesta.
+        Retorna True si la sesión quedó pausada (no se debe enviar)."""
         # Guardia determinística: detectar intención de compra explícita en el mensaje
         # entrante y forzar notify_team(ready_to_book) si el modelo no lo hizo.
-        self._force_ready_to_book_if_intent(session, inbound_message, tool_calls_data)
+        self._force_ready_to_book_if_intent(session, inbound_message, tool_calls_data, conversation)
 
         # Guardia: detectar reclamo de reserva ya hecha ("ya pagué", "ya
         # reservé", etc.) y disparar notify_team con la razón correcta
         # (reservation_claimed_not_found / reservation_claimed_pending) +
         # contexto rico para el equipo.
-        self._force_reservation_claim_if_intent(session, inbound_message, tool_calls_data)
+        self._force_reservation_claim_if_intent(session, inbound_message, tool_calls_data, conversation)
 
         # Guardia determinística: detectar keywords configuradas en admin
         # (escalation_keywords → pausa IA, callback_keywords → solo notifica).
-        # Puede pausar la sesión, lo cual hace que la próxima línea NO envíe.
+        # Puede pausar la sesión, lo cual hace que NO se envíe la respuesta.
         pause_ai = self._force_escalation_if_keyword(
             session, inbound_message, tool_calls_data
         )
@@ -261,8 +327,10 @@ class AIOrchestrator:
                 f"Session {session.id} escalated by keyword guard — "
                 f"AI response suppressed."
             )
-            send_wa = False
+        return pause_ai
 
+    def _postprocess_response(self, response_text, tool_calls_data):
+        """Sanitiza, aplica guardias de precios e inyecta cotización/links."""
         # Sanitizar respuesta antes de enviar
         response_text = sanitize_response(response_text)
 
@@ -286,14 +354,11 @@ class AIOrchestrator:
         # Red de seguridad: pasar de nuevo por sanitize_response después del
         # inject. El _result_full del tool incluye INSTRUCCIÓN IA al final;
         # si por alguna ruta llegara hasta aquí, este pase final lo elimina.
-        response_text = sanitize_response(response_text)
-
-        # Enviar por el canal correspondiente
-        wa_message_id = None
-        if send_wa:
-            sender = get_sender(session.channel)
-            wa_message_id = sender.send_text_message(session.wa_id, response_text)
+        return sanitize_response(response_text)
 
+    def _save_ai_response(self, session, content, wa_message_id, model_used, tokens,
+                          tool_calls_data, first_message_ms=None):
+        """Persiste la respuesta de la IA y actualiza los contadores."""
         # Detectar intención basada en herramientas usadas
         intent = self._detect_intent(tool_calls_data)
 
@@ -307,13 +372,18 @@ class AIOrchestrator:
             session=session,
             direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
             message_type=ChatMessage.MessageTypeChoices.TEXT,
-            content=response_text,
+            content=content,
             wa_message_id=wa_message_id,
             ai_model=model_used,
             tokens_used=tokens,
             tool_calls=tool_calls_for_db,
             intent_detected=intent,
+            first_message_ms=first_message_ms,
         )
+        if first_message_ms is not None:
+            logger.info(
+                f"Primer mensaje en {first_message_ms} ms (sesión {session.id})"
+            )
 
         # Actualizar contadores
         session.total_messages += 1
@@ -323,89 +393,102 @@ class AIOrchestrator:
             'total_messages', 'ai_messages', 'last_message_at'
         ])
 
-        return response_text
-
-    def _try_guards(self, session, inbound_message):
-        """Ejecuta todos los guards determinísticos. Retorna el primer match
-        o None si ninguno aplica."""
-        user_text = self._extract_user_text(inbound_message)
-        if not user_text:
-            return None
-
-        # G1 — Aclaración USD/SOL
-        result = guards.try_currency_clarification(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
-            )
-            return result
+        return content
 
-        # G_REQUOTE — Repetir/resumir cotización anterior (sin recotizar)
-        result = guards.try_requote(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
-            )
-            return result
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
 
-        # G3 — Lista de casas / catálogo
-        result = guards.try_property_list(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
-            )
-            return result
+    def _new_stream(self, session, inbound_message, conversation, started_at):
+        sender = get_sender(session.channel)
 
-        # G_FAQ — Preguntas frecuentes (mascotas, check-in, wifi, etc.)
-        result = guards.try_faq(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
+        def on_begin(tool_calls_data):
+            return not self._run_response_guards(
+                session, inbound_message, tool_calls_data, conversation
             )
-            return result
 
-        # G_MAGIC_LINK — Cliente existente confirma cotización (R4.1).
-        # Solo activa si MAGIC_LINK_ENABLED=True + session.client existe.
-        # Cliente nuevo (sin session.client) cae al guard G_EXPRESS de abajo.
-        result = guards.try_continue_link_with_magic(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
-            )
-            return result
+        stream = StreamingReply(
+            send=lambda text: sender.send_text_message(session.wa_id, text),
+            process_chunk=lambda text: self._process_stream_chunk(text, stream.tool_calls_data),
+            on_begin=on_begin,
+            started_at=started_at,
+        )
+        return stream
 
-        # G_EXPRESS — Cliente NUEVO (sin session.client) que quiere reservar.
-        # Solo activa si EXPRESS_RESERVATION_ENABLED=True. Máquina de
-        # estados: pide DNI → valida RENIEC → confirma nombre → magic link.
-        # Si flag OFF o cliente vinculado, no actúa y cae a R1.0 normal.
-        result = guards.try_express_dni_flow(session, user_text)
-        if result is not None:
-            logger.info(
-                f"Guard activo: {result['intent']} (sesión {session.id})"
-            )
-            return result
+    def _process_stream_chunk(self, text, tool_calls_data):
+        """Limpia párrafos completos antes de enviarlos. Retorna None si el
+        texto necesita la respuesta entera (bloque [INSTRUCCIÓN] abierto, o
+        precios sin herramienta de precios: la guardia reescribe el mensaje)."""
+        if _INSTRUCTION_OPEN_RE.search(text):
+            return None
+        used_pricing = any(tc.get('name') in _PRICING_TOOLS for tc in tool_calls_data)
+        if not used_pricing and _PRICE_RE.search(text):
+            return None
+        text = sanitize_response(text)
+        text = self._guard_fabricated_prices(text, tool_calls_data)
+        text = self._inject_booking_url(text, tool_calls_data)
+        return sanitize_response(text)
+
+    def _finish_stream(self, stream, response_text, tool_calls_data):
+        """Procesa y envía lo que quedó sin enviar. Retorna el texto completo
+        de la respuesta (lo enviado, o lo que se habría enviado si la sesión
+        quedó pausada)."""
+        rest = stream.remaining()
+        if not stream.dispatched:
+            # Nada enviado aún: mismo pipeline que sin streaming, sobre la
+            # respuesta completa (o el mensaje de error si ambos modelos fallaron).
+            final = self._postprocess_response(response_text, tool_calls_data)
+        else:
+            # Las guardias de texto completo ven lo ya enviado + la cola;
+            # lo que agregan solo puede ir en el último mensaje.
+            sent = stream.sent_text
+            final = sanitize_response(rest)
+            final = self._guard_fabricated_prices(final, tool_calls_data)
+            final = self._inject_booking_url(final, tool_calls_data)
+            whole = f"{sent}\n\n{final}".strip()
+            if not self._has_quote_block(whole):
+                final = self._inject_missing_quote(final, tool_calls_data)
+            whole = f"{sent}\n\n{final}".strip()
+            helped = self._inject_post_link_helper(whole)
+            if helped != whole:
+                final = final.rstrip() + helped[len(whole.rstrip()):]
+            final = sanitize_response(final)
+        stream.send_final(final)
+        return stream.sent_text if stream.allowed else final
+
+    def _try_guards(self, session, inbound_message, conversation=None):
+        """Ejecuta todos los guards determinísticos. Retorna el primer match
+        o None si ninguno aplica."""
+        user_text = self._extract_user_text(inbound_message)
+        if not user_text:
+            return None
 
-        # G4 — Identificador (DNI/nombre) tras reclamo de reserva
-        result = guards.try_post_claim_identifier(session, user_text)
+        # Orden de prioridad (ver guards.GUARD_CHAIN):
+        # G1 moneda → G_REQUOTE → G3 lista de casas → G_FAQ → G_MAGIC_LINK
+        # (cliente existente) → G_EXPRESS (cliente nuevo) → G4 identificador.
+        # Un pre-filtro de regex combinada descarta los guards sin trigger,
+        # así que los mensajes que no aplican a ninguno no consultan la BD.
+        result = guards.run_guards(session, user_text, conversation=conversation)
         if result is not None:
             logger.info(
                 f"Guard activo: {result['intent']} (sesión {session.id})"
             )
-            return result
+        return result
 
-        return None
-
-    def _send_guard_response(self, session, guard_result, send_wa):
+    def _send_guard_response(self, session, guard_result, send_wa, started_at=None):
         """Envía la respuesta de un guard determinístico y persiste el
         ChatMessage con tokens_used=0 y metadata del guard."""
         response_text = sanitize_response(guard_result['response'])
 
         wa_message_id = None
+        first_message_ms = None
         if send_wa:
             sender = get_sender(session.channel)
             wa_message_id = sender.send_text_message(
                 session.wa_id, response_text
             )
+            if started_at is not None:
+                first_message_ms = int((time.monotonic() - started_at) * 1000)
 
         ChatMessage.objects.create(
             session=session,
@@ -417,6 +500,7 @@ class AIOrchestrator:
             tokens_used=0,
             tool_calls=[guard_result['tool_call_meta']],
             intent_detected=guard_result['intent'],
+            first_message_ms=first_message_ms,
         )
 
         session.total_messages += 1
@@ -428,13 +512,19 @@ class AIOrchestrator:
 
         return response_text
 
-    def _call_ai(self, session, inbound_message, model):
-        """Realiza la llamada a OpenAI con function calling"""
-        import openai
+    def _call_ai(self, session, inbound_message, model, conversation=None, stream=None):
+        """Realiza la llamada a OpenAI con function calling.
+
+        Con `stream` (StreamingReply), la llamada final posterior a las
+        herramientas se consume en streaming y se envía por párrafos.
+        """
+        from apps.core import ai_gateway
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        client = ai_gateway.client('chatbot')
 
-        messages = self._build_messages(session, inbound_message)
+        if conversation is None:
+            conversation = ConversationContext(session)
+        messages = self._build_messages(session, inbound_message, conversation)
 
         response = client.chat.completions.create(
             model=model,
@@ -453,7 +543,7 @@ class AIOrchestrator:
         if choice.message.tool_calls:
             messages.append(choice.message)
 
-            executor = ToolExecutor(session)
+            executor = ToolExecutor(session, conversation=conversation)
             seen_calls = set()  # Dedup: evitar misma herramienta con mismos args
 
             for tool_call in choice.message.tool_calls:
@@ -549,15 +639,10 @@ class AIOrchestrator:
                 else self.config.max_tokens_per_response
             )
 
-            response2 = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=self.config.temperature,
-                max_tokens=second_max_tokens,
+            response_text, final_tokens = self._final_completion(
+                client, model, messages, second_max_tokens, stream, tool_calls_data
             )
-
-            response_text = response2.choices[0].message.content or ""
-            total_tokens += response2.usage.total_tokens if response2.usage else 0
+            total_tokens += final_tokens
         else:
             response_text = choice.message.content or ""
 
@@ -621,7 +706,7 @@ class AIOrchestrator:
                 if retry_choice.message.tool_calls:
                     # Ejecutar las herramientas del retry
                     messages.append(retry_choice.message)
-                    executor = ToolExecutor(session)
+                    executor = ToolExecutor(session, conversation=conversation)
                     for tool_call in retry_choice.message.tool_calls:
                         func_name = tool_call.function.name
                         try:
@@ -687,27 +772,62 @@ class AIOrchestrator:
                         max(self.config.max_tokens_per_response, 1200) if has_pricing
                         else self.config.max_tokens_per_response
                     )
-                    final_resp = client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=self.config.temperature,
-                        max_tokens=final_max,
+                    response_text, final_tokens = self._final_completion(
+                        client, model, messages, final_max, stream, tool_calls_data
                     )
-                    response_text = final_resp.choices[0].message.content or ""
-                    total_tokens += final_resp.usage.total_tokens if final_resp.usage else 0
+                    total_tokens += final_tokens
                 else:
                     # Retry tampoco llamó herramientas, usar su texto
                     response_text = retry_choice.message.content or response_text
 
         return response_text, tool_calls_data, model, total_tokens
 
-    def _build_messages(self, session, inbound_message):
+    def _final_completion(self, client, model, messages, max_tokens, stream, tool_calls_data):
+        """Llamada final (sin tools) con los resultados de las herramientas.
+        Retorna (texto, tokens). Con `stream`, el texto se consume
+        incrementalmente y los párrafos completos se envían al vuelo."""
+        if stream is None:
+            resp = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=self.config.temperature,
+                max_tokens=max_tokens,
+            )
+            return resp.choices[0].message.content or "", (
+                resp.usage.total_tokens if resp.usage else 0
+            )
+
+        stream.begin(tool_calls_data)
+        parts = []
+        tokens = 0
+        events = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=self.config.temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={'include_usage': True},
+        )
+        for event in events:
+            if event.usage:
+                tokens = event.usage.total_tokens
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                stream.feed(delta)
+        return ''.join(parts), tokens
+
+    def _build_messages(self, session, inbound_message, conversation=None):
         """Construye el array de mensajes para OpenAI.
 
         inbound_message puede ser un ChatMessage object o un string.
         """
+        if conversation is None:
+            conversation = ConversationContext(session)
         messages = [
-            {"role": "system", "content": self._build_system_prompt(session)}
+            {"role": "system", "content": self._build_system_prompt(session, conversation)}
         ]
 
         # Determinar si es objeto ChatMessage o string
@@ -715,15 +835,12 @@ class AIOrchestrator:
         msg_content = inbound_message.content if is_obj else str(inbound_message)
 
         # Últimos 20 mensajes del historial
-        recent_qs = ChatMessage.objects.filter(
-            session=session, deleted=False
+        recent_messages = conversation.recent(
+            20, exclude_id=inbound_message.id if is_obj else None
         )
-        if is_obj:
-            recent_qs = recent_qs.exclude(id=inbound_message.id)
-        recent_messages = recent_qs.order_by('-created')[:20]
 
         # Revertir para orden cronológico
-        for msg in reversed(list(recent_messages)):
+        for msg in reversed(recent_messages):
             if msg.direction == ChatMessage.DirectionChoices.INBOUND:
                 messages.append({"role": "user", "content": msg.content})
             elif msg.direction in [
@@ -844,24 +961,22 @@ class AIOrchestrator:
             'REGLA_CAPACIDADES': regla,
         }
 
-    def _build_system_prompt(self, session):
-        """Construye el system prompt dinámico con contexto de ventas"""
+    def _build_base_prompt(self):
+        """Prompt configurado con los datos de propiedades inyectados."""
         base_prompt = self.config.system_prompt
-
-        # Inyectar datos de propiedades desde la BD
         property_ctx = self._build_property_context()
         for key, value in property_ctx.items():
             base_prompt = base_prompt.replace('{' + key + '}', value)
+        return base_prompt
 
-        context_parts = [base_prompt]
-
-        # Fecha actual con calendario de próximos 14 días
+    def _build_calendar_context(self, today):
+        """Calendario de los próximos 14 días + feriados próximos."""
         from datetime import timedelta
         days_es = {
             0: 'lunes', 1: 'martes', 2: 'miércoles',
             3: 'jueves', 4: 'viernes', 5: 'sábado', 6: 'domingo',
         }
-        today = date.today()
+        context_parts = []
         day_name = days_es[today.weekday()]
         calendar_lines = []
         for i in range(14):
@@ -896,6 +1011,31 @@ class AIOrchestrator:
                 "\nFeriados y fechas especiales próximos:\n"
                 + '\n'.join(holiday_lines)
             )
+        return '\n'.join(context_parts)
+
+    def _build_system_prompt(self, session, conversation=None):
+        """Construye el system prompt dinámico con contexto de ventas.
+
+        Las secciones que no dependen de la sesión salen del cache de
+        fragmentos (ver prompt_cache.py); aquí solo se arma el contexto
+        del cliente y de la conversación (historial vía `conversation`).
+        """
+        if conversation is None:
+            conversation = ConversationContext(session)
+        # Datos de propiedades inyectados desde la BD. La clave incluye un
+        # hash del prompt configurado: editarlo en el admin no necesita señal.
+        base_prompt = get_fragment(
+            'base', ('property.Property',), self._build_base_prompt,
+            extra=hashlib.sha1(self.config.system_prompt.encode('utf-8')).hexdigest(),
+        )
+        context_parts = [base_prompt]
+
+        # Fecha actual con calendario de próximos 14 días y feriados
+        today = date.today()
+        context_parts.append(get_fragment(
+            'calendar', (), lambda: self._build_calendar_context(today),
+            extra=today.isoformat(),
+        ))
 
         # Disambiguation de meses
         context_parts.append(
@@ -1012,7 +1152,9 @@ class AIOrchestrator:
 
         # Tipo de cambio actual
         from apps.property.pricing_models import ExchangeRate
-        exchange_rate = ExchangeRate.get_current_rate()
+        exchange_rate = get_fragment(
+            'exchange_rate', ('property.ExchangeRate',), ExchangeRate.get_current_rate,
+        )
 
         # Instrucciones técnicas (SIEMPRE presentes)
         context_parts.append(
@@ -1214,12 +1356,7 @@ class AIOrchestrator:
         # === BLOQUE VENTA 2: RECOTIZACIÓN = BUYING SIGNAL FUERTE ===
         # Analisis: 33% de clientes recotizan (cambian fechas/personas/casas).
         # Es señal fuerte de compra que el bot hoy ignora.
-        recent_quotes = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-            intent_detected='availability_check',
-        ).count()
+        recent_quotes = conversation.counts()['quotes']
         if recent_quotes >= 2:
             context_parts.append(
                 "\n\n🔥 BUYING SIGNAL DETECTADO — CLIENTE EVALUANDO OPCIONES:"
@@ -1291,12 +1428,7 @@ class AIOrchestrator:
         # === Detección de duda de moneda (USD vs SOL) post-cotización ===
         # Si el cliente pregunta sobre la equivalencia o el formato del precio
         # cuando ya recibió cotización, NO debe re-pedir fechas/personas.
-        last_user_msg = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.INBOUND,
-        ).order_by('-created').first()
-        last_user_text = ((last_user_msg.content if last_user_msg else '') or '').lower()
+        last_user_text = conversation.last_inbound_text()
 
         currency_patterns = [
             r'\bc[oó]mo\s+es\s+(?:eso\s+de\s+)?(?:los\s+)?d[oó]lares?\b',
@@ -1334,11 +1466,7 @@ class AIOrchestrator:
         # === Anti-presentación repetida ===
         # Si el bot ya respondió antes en esta sesión, NO debe presentarse otra vez
         # como Valeria. Solo en el primer turno (cuando no hay outbound_ai previo).
-        prior_ai_count = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-        ).count()
+        prior_ai_count = conversation.counts()['ai']
 
         if prior_ai_count > 0:
             context_parts.append(
@@ -1368,11 +1496,7 @@ class AIOrchestrator:
         client_insists_no_date = any(re.search(p, last_user_text) for p in no_date_patterns)
 
         # Contar cuántas veces el bot pidió "fecha" en mensajes recientes
-        recent_ai_msgs = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-        ).order_by('-created')[:6]
+        recent_ai_msgs = conversation.outbound_ai(6)
         date_asks = sum(
             1 for m in recent_ai_msgs
             if re.search(r'\b(?:fecha|d[ií]a|cu[aá]ndo|qu[eé] d[ií]a)', (m.content or '').lower())
@@ -1380,10 +1504,7 @@ class AIOrchestrator:
 
         if client_insists_no_date and date_asks >= 2:
             # Buscar precio_desde de las propiedades para dar rango
-            from apps.property.models import Property
-            min_desde = Property.objects.filter(
-                deleted=False, precio_desde__isnull=False, precio_desde__gt=0,
-            ).order_by('precio_desde').values_list('precio_desde', flat=True).first()
+            min_desde = get_fragment('min_precio_desde', ('property.Property',), self._get_min_precio_desde)
             range_hint = ""
             if min_desde:
                 range_hint = (
@@ -1405,7 +1526,7 @@ class AIOrchestrator:
             )
 
         # === INSTRUCCIONES DINÁMICAS según estado de la conversación ===
-        context_parts.append(self._build_sales_context(session, today))
+        context_parts.append(self._build_sales_context(session, today, conversation))
 
         return '\n'.join(context_parts)
 
@@ -1416,14 +1537,22 @@ class AIOrchestrator:
         en revisión) para que el bot tenga contexto incluso cuando el cliente todavía
         no completó el pago.
         """
+        from apps.reservation.active_stay import stay_resolver
         from apps.reservation.models import Reservation
 
+        statuses = ('approved', 'pending', 'under_review')
+        stay = stay_resolver.next_for_client(client.id, today, statuses=statuses)
+        if stay:
+            return stay.load('property')
+
+        # El índice solo cubre el horizonte cercano; reservas más lejanas
+        # se buscan en la BD.
         return Reservation.objects.filter(
             client=client,
             check_out_date__gte=today,
-            status__in=['approved', 'pending', 'under_review'],
+            status__in=statuses,
             deleted=False,
-        ).order_by('check_in_date').first()
+        ).select_related('property').order_by('check_in_date').first()
 
     def _build_in_stay_context(self, res):
         """Contexto para huésped EN CURSO (check_in <= hoy <= check_out)"""
@@ -1541,19 +1670,16 @@ class AIOrchestrator:
             "¿En qué te ayudo?'"
         )
 
-    def _build_sales_context(self, session, today):
+    def _build_sales_context(self, session, today, conversation=None):
         """Genera instrucciones de venta dinámicas según el estado de la conversación"""
         from datetime import timedelta
 
+        if conversation is None:
+            conversation = ConversationContext(session)
         parts = []
 
         # Último mensaje del cliente (lo necesitamos para varios detectores)
-        last_user = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.INBOUND,
-        ).order_by('-created').first()
-        last_user_text = ((last_user.content if last_user else '') or '').lower()
+        last_user_text = conversation.last_inbound_text()
 
         # === DETECTAR RESERVA ACTIVA (post-venta) ===
         if session.client:
@@ -1614,12 +1740,7 @@ class AIOrchestrator:
             # Primer contacto — modo asesora. Se bifurca entre cliente CLARO
             # (ya dio fechas o personas) y cliente VAGO (solo saludó / pidió info).
             # Detección de vaguedad: buscar en el último mensaje del usuario.
-            last_user = ChatMessage.objects.filter(
-                session=session,
-                deleted=False,
-                direction=ChatMessage.DirectionChoices.INBOUND,
-            ).order_by('-created').first()
-            last_text = ((last_user.content if last_user else '') or '').lower()
+            last_text = last_user_text
 
             # "CLARO" si el mensaje contiene números/fechas/nombres de casa/personas
             claro_patterns = [
@@ -1670,11 +1791,7 @@ class AIOrchestrator:
                 )
         elif not has_quote:
             # Verificar si ya hubo intentos de check_availability (fechas dadas pero sin disponibilidad)
-            had_availability_check = ChatMessage.objects.filter(
-                session=session,
-                deleted=False,
-                intent_detected='availability_check',
-            ).exists()
+            had_availability_check = conversation.counts()['availability_checks'] > 0
 
             if had_availability_check:
                 # Cliente YA dio fechas pero no había disponibilidad
@@ -1731,12 +1848,7 @@ class AIOrchestrator:
 
         # Detectar urgencia por fechas cercanas (si hay contexto de fechas)
         # Revisamos últimas herramientas ejecutadas para extraer fechas cotizadas
-        last_check = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-            intent_detected='availability_check',
-        ).order_by('-created').first()
+        last_check = conversation.last_availability_check()
 
         if last_check and last_check.tool_calls:
             for tc in last_check.tool_calls:
@@ -1784,8 +1896,23 @@ class AIOrchestrator:
 
         return ''.join(parts)
 
+    @staticmethod
+    def _get_min_precio_desde():
+        """Menor precio_desde publicado (0 si ninguna casa lo tiene)."""
+        from apps.property.models import Property
+        return Property.objects.filter(
+            deleted=False, precio_desde__isnull=False, precio_desde__gt=0,
+        ).order_by('precio_desde').values_list('precio_desde', flat=True).first() or 0
+
     @staticmethod
     def _get_min_price_usd():
+        """Menor tarifa base en USD (cacheada hasta que cambie PropertyPricing)."""
+        return get_fragment(
+            'min_price_usd', ('property.PropertyPricing',), AIOrchestrator._query_min_price_usd,
+        )
+
+    @staticmethod
+    def _query_min_price_usd():
         """Obtiene la menor tarifa base en USD de PropertyPricing."""
         from apps.property.pricing_models import PropertyPricing
         try:
@@ -1849,7 +1976,8 @@ class AIOrchestrator:
         r'\btermin[eé]\s+(?:el\s+)?(?:pago|la\s+reserva)\b',
     ]
 
-    def _force_ready_to_book_if_intent(self, session, inbound_message, tool_calls_data):
+    def _force_ready_to_book_if_intent(self, session, inbound_message, tool_calls_data,
+                                       conversation=None):
         """Si el mensaje entrante contiene intención de compra explícita y el
         modelo NO llamó notify_team(ready_to_book) ni escalate_to_human,
         disparamos notify_team directamente para alertar al equipo."""
@@ -1881,7 +2009,7 @@ class AIOrchestrator:
             f"Forcing notify_team for session {session.id}. Text: {user_text[:100]}"
         )
         try:
-            executor = ToolExecutor(session)
+            executor = ToolExecutor(session, conversation=conversation)
             result = executor.execute('notify_team', {
                 'reason': 'ready_to_book',
                 'details': f"Intención de compra detectada automáticamente: \"{user_text[:200]}\"",
@@ -1895,23 +2023,11 @@ class AIOrchestrator:
             logger.error(f"Error forcing notify_team: {e}", exc_info=True)
 
     @staticmethod
-    def _get_last_booking_url(session):
+    def _get_last_booking_url(session, conversation=None):
         """Devuelve el último link de reserva (/reservar?... o
         /disponibilidad?...) enviado en mensajes OUTBOUND_AI recientes.
         None si no hay."""
-        recent = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-        ).order_by('-created')[:15]
-        for msg in recent:
-            m = re.search(
-                r'https://casaaustin\.pe/(?:reservar|disponibilidad)\?[^\s\n]+',
-                msg.content or '',
-            )
-            if m:
-                return m.group(0)
-        return None
+        return (conversation or ConversationContext(session)).last_booking_url()
 
     # R3.1 — mapeo SCENARIO → (needs_notify, notify_reason).
     # Si needs_notify=False, NO disparamos al equipo (cliente recibió info
@@ -1928,7 +2044,8 @@ class AIOrchestrator:
         'no_reservations':          (True, 'reservation_claimed_not_found'),
     }
 
-    def _force_reservation_claim_if_intent(self, session, inbound_message, tool_calls_data):
+    def _force_reservation_claim_if_intent(self, session, inbound_message, tool_calls_data,
+                                           conversation=None):
         """Si el cliente afirma haber reservado/pagado, asegura que
         notify_team se dispare con la razón correcta SOLO cuando hace falta.
         Si la reserva está approved/cancelled, NO molesta al equipo."""
@@ -1961,7 +2078,7 @@ class AIOrchestrator:
         # Si el modelo no llamó check_reservations, llamarla nosotros.
         if scenario_str is None:
             try:
-                exec_check = ToolExecutor(session)
+                exec_check = ToolExecutor(session, conversation=conversation)
                 check_result = exec_check.execute('check_reservations', {})
                 sm = re.search(r'SCENARIO:\s*(\w+)', check_result)
                 if sm:
@@ -2003,12 +2120,12 @@ class AIOrchestrator:
         else:
             details_lines.append("Cliente NO vinculado a este wa_id.")
 
-        last_url = self._get_last_booking_url(session)
+        last_url = self._get_last_booking_url(session, conversation)
         if last_url:
             details_lines.append(f"Último link enviado: {last_url}")
 
         try:
-            last_quote = guards._get_last_quote(session)
+            last_quote = guards._get_last_quote(session, conversation)
             if last_quote:
                 details_lines.append(
                     f"Última cotización: ${last_quote.get('usd')} USD / "
@@ -2023,7 +2140,7 @@ class AIOrchestrator:
             f"Text: {user_text[:100]}"
         )
         try:
-            executor = ToolExecutor(session)
+            executor = ToolExecutor(session, conversation=conversation)
             result = executor.execute('notify_team', {
                 'reason': reason,
                 'details': "\n".join(details_lines),
@@ -2134,18 +2251,8 @@ class AIOrchestrator:
         return False
 
     @staticmethod
-    def _inject_missing_quote(text, tool_calls_data):
-        """Si el turno ejecutó check_availability y la respuesta del modelo no
-        contiene el bloque formateado de cotización, lo inyecta directamente
-        desde el result_preview.
-
-        Visto en producción: Rosamia — el bot llamó check_availability y
-        respondió solo "¿Te animas a reservar? 😊" sin pegar la cotización.
-        """
-        if not text:
-            text = ''
-
-        # Detectar si el texto del modelo YA contiene el bloque de cotización.
+    def _has_quote_block(text):
+        """¿El texto YA contiene el bloque formateado de cotización?"""
         # Reconocemos AMBOS formatos: el viejo (PRECIO PARA / 🏠) y el nuevo
         # (📅 con · y casas con ↳ o "Más económica:"). Si no detectamos ningún
         # marcador, asumimos que falta y lo inyectamos.
@@ -2168,7 +2275,21 @@ class AIOrchestrator:
             or 'Tu link para reservar y pagar' in text  # copy nuevo (multi-casa)
             or 'casaaustin.pe/r/' in text  # cualquier magic link presente
         )
-        if has_quote_old_format or has_quote_new_format:
+        return has_quote_old_format or has_quote_new_format
+
+    @staticmethod
+    def _inject_missing_quote(text, tool_calls_data):
+        """Si el turno ejecutó check_availability y la respuesta del modelo no
+        contiene el bloque formateado de cotización, lo inyecta directamente
+        desde el result_preview.
+
+        Visto en producción: Rosamia — el bot llamó check_availability y
+        respondió solo "¿Te animas a reservar? 😊" sin pegar la cotización.
+        """
+        if not text:
+            text = ''
+
+        if AIOrchestrator._has_quote_block(text):
             return text
 
         # Buscar el último result completo de check_availability / check_late_checkout
@@ -0,0 +1,214 @@
+"""
+Envío de campañas por WhatsApp (promos por fechas, cumpleaños, follow-ups).
+
+Los comandos arman primero la audiencia con consultas por conjunto y
+renderizan todos los mensajes en el hilo principal (todo lo que toca la
+BD). Recién después `Campaign.send` los despacha:
+
+- Un pool de `CAMPAIGN_WORKERS` hilos comparte una `requests.Session` con
+  keep-alive: sin handshake TCP/TLS por mensaje.
+- Un token bucket limita el ritmo a `CAMPAIGN_RATE_PER_SEC` envíos por
+  segundo (ráfagas de hasta `CAMPAIGN_BURST`) para no chocar con el rate
+  limit de la Cloud API.
+- Cada envío se anota apenas termina en un journal
+  (`CAMPAIGN_PROGRESS_DIR/<nombre>.jsonl`) junto con los datos de su log.
+  Si el comando se corta a la mitad, la siguiente corrida salta a quien
+  ya está en el journal (`is_done`) y escribe su log igual: cada
+  destinatario recibe el mensaje una sola vez.
+- `send` toma un `flock` exclusivo sobre `<nombre>.lock` mientras envía y
+  relee el journal al tomarlo: si otra corrida de la misma campaña está
+  enviando aborta con `CampaignBusy` en vez de duplicar mensajes.
+- Los logs se escriben al final con bulk_create a partir de `results()`;
+  `finish()` borra el journal.
+
+Los workers solo hacen HTTP: nada de ORM dentro de `prepare`/`send`.
+
+Uso:
+    campaign = Campaign(f'promo_birthday:{year}')
+    pending = [m for m in messages if not campaign.is_done(m.key)]
+    campaign.send(pending, send=lambda message, http: ...)
+    PromoBirthdaySent.objects.bulk_create(... campaign.results() ...)
+    campaign.finish()
+"""
+import fcntl
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE_PER_SEC = 10
+DEFAULT_BURST = 10
+
+
+class CampaignBusy(CommandError):
+    """Otra corrida de la misma campaña está enviando (el comando sale con error)."""
+
+
+class TokenBucket:
+    """Limitador de ritmo compartido entre hilos (`rate` tokens/segundo)."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+
+@dataclass
+class CampaignMessage:
+    """
+    Un envío de la campaña.
+
+    `key`: id estable del destinatario (idempotencia y resume).
+    `to`: número/ID del canal. `payload`: lo que necesita `send`.
+    `record`: datos (serializables) para escribir el log al final.
+    """
+    key: str
+    to: str
+    payload: dict = field(default_factory=dict)
+    record: dict = field(default_factory=dict)
+
+
+def pooled_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class Campaign:
+    """Envío concurrente, con ritmo limitado y reanudable de una campaña."""
+
+    def __init__(self, name, workers=None, rate=None, burst=None, directory=None):
+        self.name = name
+        self.workers = max(1, int(
+            workers or getattr(settings, 'CAMPAIGN_WORKERS', DEFAULT_WORKERS)
+        ))
+        rate = rate or getattr(settings, 'CAMPAIGN_RATE_PER_SEC', DEFAULT_RATE_PER_SEC)
+        burst = burst or getattr(settings, 'CAMPAIGN_BURST', DEFAULT_BURST)
+        self.bucket = TokenBucket(rate, burst)
+        self.http = pooled_session(self.workers)
+        directory = directory or settings.CAMPAIGN_PROGRESS_DIR
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        self.path = Path(directory) / f'{safe_name}.jsonl'
+        self._lock = threading.Lock()
+        self._results = self._load()
+
+    def _load(self):
+        results = {}
+        if not self.path.exists():
+            return results
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Línea cortada por una caída a mitad de escritura
+                    continue
+                results[entry['key']] = entry
+        if results:
+            logger.info(f"Campaña {self.name}: reanudando, {len(results)} envíos ya hechos")
+        return results
+
+    def is_done(self, key):
+        return str(key) in self._results
+
+    def results(self):
+        """Envíos terminados (de esta corrida y de corridas cortadas):
+        {key: {'key', 'result', 'record'}}."""
+        return dict(self._results)
+
+    @contextmanager
+    def _exclusive(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CampaignBusy(f'Campaña {self.name}: otra corrida ya está enviando') from None
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _record(self, message, result):
+        entry = {'key': str(message.key), 'result': result, 'record': message.record}
+        line = json.dumps(entry, cls=DjangoJSONEncoder)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+            self._results[entry['key']] = entry
+
+    def send(self, messages, send, prepare=None):
+        """
+        Despacha `messages` en el pool. Por cada uno: `prepare(message, http)`
+        (sin límite de ritmo, p.ej. generar el texto con IA), luego espera
+        un token y `send(message, http)`. Lo que retorne `send` queda en el
+        journal como `result`. Si `prepare`/`send` lanzan una excepción el
+        destinatario no se anota (se reintenta en la próxima corrida).
+        Retorna {key: result} de esta corrida; `CampaignBusy` si otra
+        corrida tiene el lock.
+        """
+        with self._exclusive():
+            # Otra corrida pudo enviar desde que se leyó el journal
+            self._results = self._load()
+            pending = [m for m in messages if not self.is_done(m.key)]
+            return self._send(pending, send, prepare)
+
+    def _send(self, pending, send, prepare):
+        def _run(message):
+            try:
+                if prepare is not None:
+                    prepare(message, self.http)
+                self.bucket.acquire()
+                result = send(message, self.http)
+            except Exception as e:
+                logger.error(f"Campaña {self.name}: envío a {message.to} falló: {e}", exc_info=True)
+                return None
+            self._record(message, result)
+            return message.key
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='campaign') as pool:
+            done = [key for key in pool.map(_run, pending) if key is not None]
+        return {str(key): self._results[str(key)]['result'] for key in done}
+
+    def finish(self):
+        """Borra el journal (llamar después de escribir los logs)."""
+        self.path.unlink(missing_ok=True)
+        self._results = {}
+        self.http.close()
@@ -6,18 +6,19 @@ from .instagram_sender import InstagramSender
 from .messenger_sender import MessengerSender
 
 
-def get_sender(channel):
+def get_sender(channel, http=None):
     """
     Retorna la instancia del sender apropiado para el canal.
 
     Args:
         channel: 'whatsapp', 'instagram', o 'messenger'
+        http: requests.Session compartida (opcional, p.ej. en campañas)
 
     Returns:
         Sender con métodos send_text_message() y mark_as_read()
     """
     if channel == 'instagram':
-        return InstagramSender()
+        return InstagramSender(http=http)
     elif channel == 'messenger':
-        return MessengerSender()
-    return WhatsAppSender()
+        return MessengerSender(http=http)
+    return WhatsAppSender(http=http)
@@ -0,0 +1,202 @@
+"""
+Contexto de conversación por turno.
+
+Al procesar un mensaje entrante, guards, orquestador, ToolExecutor y
+scoring preguntaban por el historial de la sesión con consultas casi
+iguales: los últimos 20 mensajes, las últimas cotizaciones, el último
+link de reserva, el último inbound, etc. ConversationContext carga una
+sola vez la ventana reciente de la sesión (`WINDOW_SIZE` mensajes, del más
+nuevo al más viejo) y responde todo eso en memoria. Los tool_calls ya
+vienen parseados (JSONField) y las cotizaciones y links de reserva se
+indexan la primera vez que se piden.
+
+Si una pregunta necesita más mensajes de los que trae la ventana y la
+sesión tiene más historial, se consulta la BD con el mismo filtro de
+siempre: el resultado es idéntico al de las consultas sueltas.
+
+Uso:
+    conversation = ConversationContext(session)
+    guards.run_guards(session, text, conversation=conversation)
+    history = conversation.recent(20, exclude_id=inbound.id)
+    executor = ToolExecutor(session, conversation=conversation)
+"""
+import re
+
+from django.db.models import Count, Q
+
+from .models import ChatMessage
+
+WINDOW_SIZE = 40
+QUOTE_TOOLS = ('check_availability', 'check_late_checkout')
+BOOKING_URL_RE = re.compile(
+    r'https://casaaustin\.pe/(?:reservar|disponibilidad)\?[^\s\n]+'
+)
+
+INBOUND = ChatMessage.DirectionChoices.INBOUND
+OUTBOUND_AI = ChatMessage.DirectionChoices.OUTBOUND_AI
+
+
+class ConversationContext:
+    """Historial reciente de una sesión, cargado una vez por turno."""
+
+    def __init__(self, session, window=WINDOW_SIZE, messages=None):
+        """
+        `messages`: ventana ya cargada (más nuevo primero), p.ej. desde un
+        prefetch por lote; se asume completa si trae menos de `window`.
+        """
+        self.session = session
+        self.window = window
+        self._messages = list(messages) if messages is not None else None
+        self._memo = {}
+
+    def _queryset(self):
+        return ChatMessage.objects.filter(session=self.session, deleted=False)
+
+    @property
+    def messages(self):
+        """Ventana reciente (más nuevo primero), cargada en la primera lectura."""
+        if self._messages is None:
+            self._messages = list(self._queryset().order_by('-created')[:self.window])
+        return self._messages
+
+    @property
+    def complete(self):
+        """True si la ventana contiene todo el historial de la sesión."""
+        return len(self.messages) < self.window
+
+    def memo(self, key, loader):
+        if key not in self._memo:
+            self._memo[key] = loader()
+        return self._memo[key]
+
+    def _select(self, key, limit, predicate, fallback):
+        """
+        Primeros `limit` mensajes de la ventana que cumplen `predicate`. Si
+        no alcanzan y la ventana está truncada, `fallback()` (queryset con el
+        mismo filtro, ordenado por -created) resuelve la consulta en la BD.
+        """
+        def load():
+            found = [m for m in self.messages if predicate(m)][:limit]
+            if len(found) < limit and not self.complete:
+                return list(fallback()[:limit])
+            return found
+        return self.memo((key, limit), load)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def recent(self, limit, exclude_id=None):
+        """Últimos `limit` mensajes (sin `exclude_id`), más nuevo primero."""
+        return self._select(
+            ('recent', exclude_id), limit,
+            lambda m: m.id != exclude_id,
+            lambda: self._queryset().exclude(id=exclude_id).order_by('-created'),
+        )
+
+    def inbound(self, limit):
+        return self._select(
+            'inbound', limit,
+            lambda m: m.direction == INBOUND,
+            lambda: self._queryset().filter(direction=INBOUND).order_by('-created'),
+        )
+
+    def outbound_ai(self, limit):
+        return self._select(
+            'outbound_ai', limit,
+            lambda m: m.direction == OUTBOUND_AI,
+            lambda: self._queryset().filter(direction=OUTBOUND_AI).order_by('-created'),
+        )
+
+    def last_inbound(self):
+        return next(iter(self.inbound(1)), None)
+
+    def last_inbound_text(self):
+        """Contenido del último inbound en minúsculas ('' si no hay)."""
+        msg = self.last_inbound()
+        return ((msg.content if msg else '') or '').lower()
+
+    def quote_messages(self, limit=10):
+        """Últimos outbound_ai con tool_calls (donde viven las cotizaciones)."""
+        return self._select(
+            'quote_messages', limit,
+            lambda m: m.direction == OUTBOUND_AI and m.tool_calls != [],
+            lambda: self._queryset().filter(direction=OUTBOUND_AI)
+            .exclude(tool_calls=[]).order_by('-created'),
+        )
+
+    def quote_tool_calls(self):
+        """Tool calls de cotización (check_availability / late checkout) de
+        los últimos mensajes con tool_calls, del más nuevo al más viejo."""
+        def load():
+            return [
+                tc
+                for msg in self.quote_messages()
+                for tc in (msg.tool_calls or [])
+                if tc.get('name') in QUOTE_TOOLS
+            ]
+        return self.memo('quote_tool_calls', load)
+
+    def last_booking_url(self):
+        """Último link de reserva enviado en los 15 outbound_ai recientes."""
+        def load():
+            for msg in self.outbound_ai(15):
+                m = BOOKING_URL_RE.search(msg.content or '')
+                if m:
+                    return m.group(0)
+            return None
+        return self.memo('last_booking_url', load)
+
+    def last_availability_check(self):
+        """Último outbound_ai con intent availability_check (o None)."""
+        found = self._select(
+            'last_availability_check', 1,
+            lambda m: m.direction == OUTBOUND_AI and m.intent_detected == 'availability_check',
+            lambda: self._queryset().filter(
+                direction=OUTBOUND_AI, intent_detected='availability_check',
+            ).order_by('-created'),
+        )
+        return next(iter(found), None)
+
+    def recent_availability_checks(self, since, limit=3):
+        """Outbound_ai desde `since` cuyo intent incluye availability_check."""
+        return self._select(
+            ('recent_availability_checks', since), limit,
+            lambda m: (
+                m.direction == OUTBOUND_AI
+                and m.created >= since
+                and 'availability_check' in (m.intent_detected or '')
+            ),
+            lambda: self._queryset().filter(
+                direction=OUTBOUND_AI, created__gte=since,
+                intent_detected__icontains='availability_check',
+            ).order_by('-created'),
+        )
+
+    def counts(self):
+        """
+        Conteos de toda la sesión: {'ai', 'quotes', 'availability_checks'}.
+        `quotes` son outbound_ai con availability_check; `availability_checks`
+        cualquier mensaje con ese intent. Una sola consulta si la ventana
+        está truncada.
+        """
+        def load():
+            if self.complete:
+                return {
+                    'ai': sum(1 for m in self.messages if m.direction == OUTBOUND_AI),
+                    'quotes': sum(
+                        1 for m in self.messages
+                        if m.direction == OUTBOUND_AI and m.intent_detected == 'availability_check'
+                    ),
+                    'availability_checks': sum(
+                        1 for m in self.messages if m.intent_detected == 'availability_check'
+                    ),
+                }
+            return self._queryset().aggregate(
+                ai=Count('id', filter=Q(direction=OUTBOUND_AI)),
+                quotes=Count('id', filter=Q(
+                    direction=OUTBOUND_AI, intent_detected='availability_check',
+                )),
+                availability_checks=Count('id', filter=Q(intent_detected='availability_check')),
+            )
+        return self.memo('counts', load)
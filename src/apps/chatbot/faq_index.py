@@ -0,0 +1,175 @@
+"""
+Índice vectorial local de preguntas frecuentes.
+
+Cada FrequentQuestion tiene uno o más vectores "canónicos" (embedding
+normalizado) guardados en disco como matriz NumPy (`vectors.npy`, se abre
+memory-mapped) + la lista de claves (`keys.json`). Los mensajes nuevos se
+asignan por vecino más cercano (producto punto = coseno) y solo lo que no
+supera `FAQ_MATCH_THRESHOLD` se agrupa y se manda al modelo.
+
+La clave `NOISE` marca grupos que el modelo descartó (saludos, datos
+sueltos): mensajes parecidos en corridas futuras se ignoran sin volver a
+llamar al modelo.
+
+Uso:
+    index = QuestionIndex.load()
+    keys, scores = index.nearest(vectors)
+    index.add(fq.id.hex, centroid(vectors[members]))
+    index.save()
+"""
+import json
+import logging
+import os
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+NOISE = 'noise'
+VECTORS_FILE = 'vectors.npy'
+KEYS_FILE = 'keys.json'
+EMBEDDING_BATCH_SIZE = 256
+
+# Respuestas cortas que nunca son consultas (comparadas sin tildes ni signos)
+TRIVIAL_REPLIES = {
+    'ok', 'oka', 'okay', 'si', 'no', 'ya', 'listo', 'claro', 'gracias',
+    'muchas gracias', 'hola', 'buenas', 'buenos dias', 'buenas tardes',
+    'buenas noches', 'perfecto', 'genial', 'dale', 'de acuerdo', 'entendido',
+}
+
+
+def _plain(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9ñ ]+', ' ', text).split()
+
+
+def is_candidate(text):
+    """Descarta mensajes que no pueden ser una consulta (sin llamar a la IA)."""
+    words = _plain(text or '')
+    if not words:
+        return False
+    return ' '.join(words) not in TRIVIAL_REPLIES
+
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def centroid(vectors):
+    """Vector canónico de un grupo: promedio normalizado."""
+    return normalize(np.asarray(vectors, dtype=np.float32).mean(axis=0, keepdims=True))[0]
+
+
+def embed_texts(client, texts, model=None):
+    """Embeddings normalizados (float32) de `texts`, en lotes."""
+    model = model or getattr(settings, 'FAQ_EMBEDDING_MODEL', 'text-embedding-3-small')
+    rows = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        batch = texts[start:start + EMBEDDING_BATCH_SIZE]
+        resp = client.embeddings.create(model=model, input=batch)
+        rows.extend(item.embedding for item in sorted(resp.data, key=lambda d: d.index))
+    if not rows:
+        return np.zeros((0, 0), dtype=np.float32)
+    return normalize(rows)
+
+
+def greedy_clusters(vectors, threshold):
+    """
+    Agrupa vectores normalizados: cada uno se une al primer líder con
+    similitud >= threshold o abre un grupo nuevo. Retorna listas de índices.
+    """
+    leaders = []
+    clusters = []
+    for i, vector in enumerate(vectors):
+        if leaders:
+            scores = np.asarray(leaders) @ vector
+            best = int(scores.argmax())
+            if scores[best] >= threshold:
+                clusters[best].append(i)
+                continue
+        leaders.append(vector)
+        clusters.append([i])
+    return clusters
+
+
+class QuestionIndex:
+    """Matriz de vectores canónicos + clave (FrequentQuestion.id.hex o NOISE)."""
+
+    def __init__(self, directory=None, keys=None, vectors=None):
+        self.directory = Path(directory or settings.FAQ_INDEX_DIR)
+        self.keys = list(keys or [])
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def load(cls, directory=None):
+        index = cls(directory)
+        vectors_path = index.directory / VECTORS_FILE
+        keys_path = index.directory / KEYS_FILE
+        if not (vectors_path.exists() and keys_path.exists()):
+            return index
+        try:
+            vectors = np.load(vectors_path, mmap_mode='r')
+            keys = json.loads(keys_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice FAQ ilegible, se reconstruye: {e}")
+            return index
+        if len(keys) != len(vectors):
+            logger.warning("Índice FAQ inconsistente (claves vs vectores), se reconstruye")
+            return index
+        index.keys, index.vectors = keys, vectors
+        return index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nearest(self, vectors):
+        """(claves, similitudes) del vecino más cercano de cada vector."""
+        if not len(self) or not len(vectors):
+            return [None] * len(vectors), np.zeros(len(vectors), dtype=np.float32)
+        scores = np.asarray(vectors, dtype=np.float32) @ np.asarray(self.vectors).T
+        best = scores.argmax(axis=1)
+        return [self.keys[i] for i in best], scores[np.arange(len(best)), best]
+
+    def add(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        if len(self):
+            self.vectors = np.vstack([np.asarray(self.vectors), vector])
+        else:
+            self.vectors = vector
+        self.keys.append(key)
+
+    def retain(self, valid_keys):
+        """Quita vectores de preguntas que ya no existen (NOISE se conserva)."""
+        mask = [key == NOISE or key in valid_keys for key in self.keys]
+        if all(mask):
+            return
+        self.vectors = np.asarray(self.vectors)[np.array(mask, dtype=bool)]
+        self.keys = [key for key, keep in zip(self.keys, mask) if keep]
+
+    def save(self):
+        """Escritura atómica: archivos temporales + os.replace."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors_tmp = self.directory / f'{VECTORS_FILE}.tmp'
+        keys_tmp = self.directory / f'{KEYS_FILE}.tmp'
+        with open(vectors_tmp, 'wb') as f:
+            np.save(f, np.asarray(self.vectors, dtype=np.float32))
+        keys_tmp.write_text(json.dumps(self.keys))
+        os.replace(vectors_tmp, self.directory / VECTORS_FILE)
+        os.replace(keys_tmp, self.directory / KEYS_FILE)
+
+    def clear(self):
+        for name in (VECTORS_FILE, KEYS_FILE):
+            try:
+                (self.directory / name).unlink()
+            except FileNotFoundError:
+                pass
+        self.keys = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
@@ -14,6 +14,7 @@ Convenciones:
 
 import re
 
+from .conversation import ConversationContext
 from .models import ChatMessage
 
 
@@ -64,7 +65,30 @@ _QUOTE_PRICE_RE = re.compile(
 _PROPERTY_NAME_RE = re.compile(r'Casa\s+Austin\s+\d', re.IGNORECASE)
 
 
-def _get_last_quote(session):
+def _quote_messages(session, conversation=None):
+    """Últimos 10 mensajes outbound_ai con tool_calls (donde viven las
+    cotizaciones). Con `conversation` salen de la ventana ya cargada."""
+    if conversation is not None:
+        return conversation.quote_messages()
+    return ChatMessage.objects.filter(
+        session=session,
+        deleted=False,
+        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
+    ).exclude(tool_calls=[]).order_by('-created')[:10]
+
+
+def _recent_ai_messages(session, conversation=None):
+    """Últimos 15 mensajes outbound_ai (de la ventana de `conversation`)."""
+    if conversation is not None:
+        return conversation.outbound_ai(15)
+    return ChatMessage.objects.filter(
+        session=session,
+        deleted=False,
+        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
+    ).order_by('-created')[:15]
+
+
+def _get_last_quote(session, conversation=None):
     """Recupera la última cotización (property, usd, sol) del historial.
 
     Busca en los últimos 10 mensajes outbound_ai con tool_calls. Si encuentra
@@ -74,13 +98,7 @@ def _get_last_quote(session):
     Returns:
         dict {property, usd, sol} | None
     """
-    recent = ChatMessage.objects.filter(
-        session=session,
-        deleted=False,
-        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-    ).exclude(tool_calls=[]).order_by('-created')[:10]
-
-    for msg in recent:
+    for msg in _quote_messages(session, conversation):
         for tc in (msg.tool_calls or []):
             if tc.get('name') not in ('check_availability', 'check_late_checkout'):
                 continue
@@ -100,7 +118,7 @@ def _infer_property_from_text(text):
     return m.group(0) if m else 'la casa cotizada'
 
 
-def try_currency_clarification(session, last_user_text):
+def try_currency_clarification(session, last_user_text, conversation=None):
     """Detecta preguntas de moneda/equivalencia y responde sin llamar al modelo.
 
     Args:
@@ -116,7 +134,7 @@ def try_currency_clarification(session, last_user_text):
     if not CURRENCY_CLARIFICATION_RE.search(last_user_text):
         return None
 
-    quote = _get_last_quote(session)
+    quote = _get_last_quote(session, conversation)
 
     if quote:
         response = (
@@ -256,7 +274,7 @@ def _format_property_list():
     return "\n".join(lines)
 
 
-def try_property_list(session, last_user_text):
+def try_property_list(session, last_user_text, conversation=None):
     """Detecta preguntas genéricas tipo "qué casas tienen" y responde con
     la lista canned. NO dispara si el mensaje ya contiene fecha o personas.
 
@@ -358,34 +376,27 @@ def _extract_identifier(user_text):
     return None
 
 
-def _last_ai_asked_for_identifier(session):
+def _last_ai_asked_for_identifier(session, conversation=None):
     """¿La última respuesta del bot pidió DNI/nombre para verificar reserva?"""
-    last_ai = ChatMessage.objects.filter(
-        session=session,
-        deleted=False,
-        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-    ).order_by('-created').first()
+    last_ai = next(iter(_recent_ai_messages(session, conversation)), None)
     if not last_ai:
         return False
     content = (last_ai.content or '').lower()
     return any(marker in content for marker in _ASK_IDENTIFIER_MARKERS)
 
 
-def _find_last_booking_url(session):
+def _find_last_booking_url(session, conversation=None):
     """Devuelve el último link parametrizado enviado en mensajes outbound."""
-    recent = ChatMessage.objects.filter(
-        session=session,
-        deleted=False,
-        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-    ).order_by('-created')[:15]
-    for msg in recent:
+    if conversation is not None:
+        return conversation.last_booking_url()
+    for msg in _recent_ai_messages(session, conversation):
         m = _BOOKING_URL_RE.search(msg.content or '')
         if m:
             return m.group(0)
     return None
 
 
-def try_post_claim_identifier(session, last_user_text):
+def try_post_claim_identifier(session, last_user_text, conversation=None):
     """G4 — Cliente entregó DNI/nombre tras el prompt 'nombre o documento'.
 
     Activación:
@@ -401,7 +412,7 @@ def try_post_claim_identifier(session, last_user_text):
     if not last_user_text:
         return None
 
-    if not _last_ai_asked_for_identifier(session):
+    if not _last_ai_asked_for_identifier(session, conversation):
         return None
 
     ident = _extract_identifier(last_user_text)
@@ -410,7 +421,7 @@ def try_post_claim_identifier(session, last_user_text):
 
     from .tool_executor import ToolExecutor
     from .reservation_lookup import client_phone_matches_wa_id
-    executor = ToolExecutor(session)
+    executor = ToolExecutor(session, conversation=conversation)
 
     scenario = 'unknown'
     mismatch_detected = False
@@ -576,11 +587,11 @@ def try_post_claim_identifier(session, last_user_text):
             f"(DNI: {c.number_doc or 'N/A'})"
         )
 
-    last_url = _find_last_booking_url(session)
+    last_url = _find_last_booking_url(session, conversation)
     if last_url:
         details.append(f"Último link enviado: {last_url}")
 
-    last_quote = _get_last_quote(session)
+    last_quote = _get_last_quote(session, conversation)
     if last_quote:
         details.append(
             f"Última cotización: ${last_quote.get('usd')} USD / "
@@ -672,7 +683,7 @@ _REQUOTE_URL_RE = re.compile(
 _REQUOTE_DISCOUNT_RE = re.compile(r'🎁[^\n]+')
 
 
-def _get_full_last_quote(session):
+def _get_full_last_quote(session, conversation=None):
     """Recupera la última cotización COMPLETA del historial (vs `_get_last_quote`
     que solo trae precios de una casa).
 
@@ -686,13 +697,7 @@ def _get_full_last_quote(session):
     """
     from django.utils import timezone as _tz
 
-    recent = ChatMessage.objects.filter(
-        session=session,
-        deleted=False,
-        direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-    ).exclude(tool_calls=[]).order_by('-created')[:10]
-
-    for msg in recent:
+    for msg in _quote_messages(session, conversation):
         has_avail = any(
             (tc.get('name') == 'check_availability')
             for tc in (msg.tool_calls or [])
@@ -822,7 +827,7 @@ def _render_per_person(quote):
     return "\n".join(lines)
 
 
-def try_requote(session, last_user_text):
+def try_requote(session, last_user_text, conversation=None):
     """G_REQUOTE — Si hay cotización previa Y el cliente pregunta el precio
     SIN dar nueva fecha/personas, responder determinísticamente.
 
@@ -846,7 +851,7 @@ def try_requote(session, last_user_text):
     if not (is_total or is_per_person or is_generic):
         return None
 
-    quote = _get_full_last_quote(session)
+    quote = _get_full_last_quote(session, conversation)
     if not quote:
         return None
 
@@ -1196,7 +1201,7 @@ def _render_photos_videos(text=None):
 _FAQ_NUMBERS_OK_TOPICS = {'parking', 'grill', 'photos_videos'}
 
 
-def try_faq(session, last_user_text):
+def try_faq(session, last_user_text, conversation=None):
     """G_FAQ — Detecta una FAQ entre los 12 topics y responde determinístico.
 
     Conservador:
@@ -1362,7 +1367,7 @@ def _resolve_property_by_num(num):
     ).first()
 
 
-def try_continue_link_with_magic(session, last_user_text):
+def try_continue_link_with_magic(session, last_user_text, conversation=None):
     """G_MAGIC_LINK — Dos fases para entregar magic link al cliente vinculado:
 
     Fase 1 (ask_house):
@@ -1387,7 +1392,7 @@ def try_continue_link_with_magic(session, last_user_text):
     if not session or not session.client_id:
         return None
 
-    quote = _get_full_last_quote(session)
+    quote = _get_full_last_quote(session, conversation)
     if not quote:
         return None
 
@@ -1847,7 +1852,7 @@ def _build_full_name_from_reniec(data):
     return ' '.join(parts) if parts else ''
 
 
-def try_express_dni_flow(session, last_user_text):
+def try_express_dni_flow(session, last_user_text, conversation=None):
     """G_EXPRESS — refina magic link cuando el cliente elige una casa específica.
 
     Contexto: la tool check_availability ya envía un magic link junto con la
@@ -1876,7 +1881,7 @@ def try_express_dni_flow(session, last_user_text):
     if not m:
         return None
 
-    quote = _get_full_last_quote(session)
+    quote = _get_full_last_quote(session, conversation)
     if not quote:
         return None
 
@@ -1921,3 +1926,82 @@ def try_express_dni_flow(session, last_user_text):
         },
         dni=None, full_name=None, prop=prop,
     )
+
+
+# ============================================================================
+# Dispatch — pre-filtro de guards
+# ============================================================================
+# La mayoría de mensajes no activa ningún guard. En vez de correr cada
+# try_* (cada uno con sus regex y sus consultas al historial), una sola
+# regex combinada con los triggers de todos los guards decide si vale la
+# pena seguir; solo los guards cuyo trigger matchea se ejecutan, en el
+# mismo orden de prioridad de siempre. El historial de la sesión se carga
+# a lo sumo una vez por turno en un ConversationContext compartido
+# (ver conversation.py).
+
+def _magic_awaiting_house(session, last_user_text):
+    return bool((session.conversation_context or {}).get('magic_awaiting_house'))
+
+
+def _has_identifier(session, last_user_text):
+    return _extract_identifier(last_user_text) is not None
+
+
+# (nombre, guard, patrones trigger, predicado extra). Un guard es candidato
+# si alguno de sus patrones matchea o si el predicado retorna True. Cada
+# trigger es condición necesaria del guard: saltarlo no cambia el resultado.
+GUARD_CHAIN = [
+    ('currency_clarification', try_currency_clarification,
+     CURRENCY_CLARIFICATION_PATTERNS, None),
+    ('requote', try_requote,
+     IS_TOTAL_PATTERNS + PER_PERSON_PATTERNS + REQUOTE_GENERIC_PATTERNS, None),
+    ('property_list', try_property_list, PROPERTY_LIST_PATTERNS, None),
+    ('faq', try_faq,
+     [pattern for topic in FAQ_TOPICS for pattern in topic['patterns']], None),
+    ('magic_link', try_continue_link_with_magic,
+     _AFFIRMATIVE_SHORT_PATTERNS + _AFFIRMATIVE_INTENT_PATTERNS + [_CASA_REF_RE.pattern],
+     _magic_awaiting_house),
+    ('express', try_express_dni_flow, [_CASA_REF_RE.pattern], None),
+    ('post_claim_identifier', try_post_claim_identifier, [], _has_identifier),
+]
+
+
+def _union(patterns):
+    return re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+
+
+_GUARD_TRIGGERS = [
+    (name, guard, _union(patterns) if patterns else None, extra)
+    for name, guard, patterns, extra in GUARD_CHAIN
+]
+GUARD_TRIGGER_RE = _union(
+    [pattern for _, _, patterns, _ in GUARD_CHAIN for pattern in patterns]
+)
+
+
+def candidate_guards(session, last_user_text):
+    """Guards cuyo trigger aplica a este mensaje, en orden de prioridad."""
+    if not last_user_text:
+        return []
+    any_trigger = GUARD_TRIGGER_RE.search(last_user_text) is not None
+    candidates = []
+    for name, guard, trigger_re, extra in _GUARD_TRIGGERS:
+        if any_trigger and trigger_re is not None and trigger_re.search(last_user_text):
+            candidates.append((name, guard))
+        elif extra is not None and extra(session, last_user_text):
+            candidates.append((name, guard))
+    return candidates
+
+
+def run_guards(session, last_user_text, conversation=None):
+    """Ejecuta los guards candidatos y retorna el primer match o None."""
+    candidates = candidate_guards(session, last_user_text)
+    if not candidates:
+        return None
+    if conversation is None:
+        conversation = ConversationContext(session)
+    for name, guard in candidates:
+        result = guard(session, last_user_text, conversation=conversation)
+        if result is not None:
+            return result
+    return None
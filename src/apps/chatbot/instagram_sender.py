@@ -8,7 +8,9 @@ logger = logging.getLogger(__name__)
 class InstagramSender:
     """Envía mensajes por Instagram DM (Meta Send API)"""
 
-    def __init__(self):
+    def __init__(self, http=None):
+        """`http`: requests.Session compartida (pool keep-alive); por defecto `requests`."""
+        self.http = http or requests
         self.access_token = os.getenv('INSTAGRAM_ACCESS_TOKEN')
         self.api_url = "https://graph.instagram.com/v22.0/me/messages"
         self.headers = {
@@ -33,7 +35,7 @@ class InstagramSender:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers, timeout=15
             )
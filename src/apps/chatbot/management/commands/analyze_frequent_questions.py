@@ -1,52 +1,55 @@
 """
-Analiza CONVERSACIONES COMPLETAS del chatbot para extraer preguntas
-frecuentes. Para cada conversación madura (sin actividad reciente), pasa
-el transcript completo al modelo y le pide identificar las preguntas
-genuinas que hizo el cliente, con categoría y frase descriptiva.
-
-Ventajas vs analizar mensaje por mensaje:
-- El modelo ve el contexto completo (respuestas del cliente tipo "20 personas"
-  no se confunden con preguntas).
-- Múltiples formas de preguntar lo mismo dentro de la misma conversación
-  se consolidan automáticamente en una sola pregunta.
-- No requiere filtros determinísticos (cliente VS bot, ruido, saludos).
+Analiza incrementalmente los mensajes inbound del chatbot para extraer
+preguntas frecuentes.
+
+Cada corrida procesa solo los mensajes nuevos desde el watermark de
+FrequentQuestionCheckpoint, así que el costo diario es proporcional al
+volumen nuevo y no al historial completo.
 
 Flujo:
-1. Selecciona sesiones con:
-   - last_message_at antes de (now - MIN_INACTIVITY_HOURS), o status=closed.
-   - No analizadas previamente (conversation_context['fq_analyzed_at'] vacío).
-   - Con al menos N mensajes (total_messages >= 2).
-2. Por cada sesión:
-   - Arma transcript (user + assistant, últimos 40 msgs).
-   - Llama al modelo (gpt-4.1-nano) con prompt que pide JSON con lista
-     de preguntas [{category, match_id|null, new_label|null}, ...].
-   - Aplica cada pregunta: match vs existentes o crea nueva en
-     FrequentQuestion.
-   - Marca la sesión: conversation_context['fq_analyzed_at'] = now.
-3. Actualiza checkpoint.
+1. Toma los mensajes inbound con created > watermark (y más antiguos que
+   --min-inactivity-hours). Descarta sin IA las respuestas triviales
+   ("ok", "gracias", "hola").
+2. Calcula embeddings en lotes y asigna cada mensaje al vecino más cercano
+   del índice vectorial local (ver apps/chatbot/faq_index.py). Si la
+   similitud supera FAQ_MATCH_THRESHOLD, suma a esa FrequentQuestion sin
+   llamar al modelo de chat.
+3. Los mensajes sin match se agrupan entre sí por similitud y solo esos
+   grupos se envían al modelo, varios grupos por llamada, para que los
+   clasifique (match con existente, pregunta nueva o ruido).
+4. Aplica los conteos (1 por sesión y pregunta), agrega los centroides
+   al índice y avanza el watermark. Si una llamada al modelo falla no se
+   escribe nada y la siguiente corrida reintenta desde el mismo punto.
 
 Uso: python manage.py analyze_frequent_questions
+     python manage.py analyze_frequent_questions --dry-run --limit 500
 Cron recomendado: diario 2am Lima.
 """
 import json
 import logging
 from datetime import timedelta
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
 
+from apps.chatbot.faq_index import (
+    NOISE, QuestionIndex, centroid, embed_texts, greedy_clusters, is_candidate,
+)
 from apps.chatbot.models import (
-    ChatSession, ChatMessage, ChatbotConfiguration,
+    ChatMessage, ChatbotConfiguration,
     FrequentQuestion, FrequentQuestionCheckpoint,
 )
 
 logger = logging.getLogger(__name__)
 
 
-MIN_INACTIVITY_HOURS = 48   # antigüedad mínima del último mensaje
-MIN_TOTAL_MESSAGES = 2      # evita sesiones con solo 1 mensaje de bienvenida
-MAX_TRANSCRIPT_MESSAGES = 40  # trunca transcripts muy largos
-MAX_MESSAGE_CHARS = 400       # trunca mensajes individuales
+MIN_INACTIVITY_HOURS = 48   # antigüedad mínima del mensaje (conversación madura)
+MAX_MESSAGE_CHARS = 400     # trunca mensajes individuales
+MAX_SAMPLES = 5             # ejemplos guardados por pregunta
+GROUPS_PER_CALL = 25        # grupos sin match por llamada al modelo
+SAMPLES_PER_GROUP = 4       # mensajes de ejemplo por grupo en el prompt
 
 
 # Categorías predefinidas — legibles para el modelo.
@@ -95,85 +98,49 @@ CATEGORY_LABELS = {
 }
 
 
-CLASSIFIER_SYSTEM_PROMPT = """Eres un analizador de conversaciones del chatbot de Casa Austin (alquiler de casas de playa en Perú).
+CLASSIFIER_SYSTEM_PROMPT = """Eres un analizador de mensajes del chatbot de Casa Austin (alquiler de casas de playa en Perú).
 
-Tu tarea: leer una conversación WhatsApp entre un cliente y Valeria (asesora) e identificar SOLO las preguntas o consultas genuinas que hizo el cliente.
+Te doy GRUPOS numerados de mensajes de clientes. Los mensajes de cada grupo
+ya fueron agrupados por similitud: representan el mismo tema. Para CADA
+grupo decide si es una consulta genuina del cliente.
 
-IGNORA solo lo siguiente:
+IGNORA (ignore=true) los grupos que sean:
 - Saludos aislados sin contenido ("Hola" solo, "Buenas tardes" solo)
 - Confirmaciones o respuestas a Valeria ("sí", "ok", "listo", "gracias", "claro")
 - Datos que el cliente da como respuesta a preguntas del bot ("20 personas", "el 25 de abril", "casa 3")
 - Mensajes muy cortos sin contexto claro (emojis solos, "?")
 
-EXTRAE (enfoque AGRESIVO — capturamos intención del cliente, no solo preguntas):
+CUENTAN como consulta (enfoque AGRESIVO — capturamos intención del cliente):
 1. Preguntas explícitas: "¿Aceptan mascotas?", "¿Cuál es el precio?"
-2. Consultas implícitas: "Quisiera información sobre la piscina", "Necesito saber el horario"
-3. EXPRESIONES DE INTENCIÓN (importantes — se consideran consulta):
-   - "Quisiera reservar" / "Quiero reservar una casa" → tema: cómo reservar
-   - "Me interesa conocer más sobre las casas" → tema: información general
-   - "Quiero información" / "Información por favor" → tema: información general
-   - "Necesito ayuda con casaaustin.pe" → tema: ayuda con sitio/reserva
-   - "Estoy interesada en alquilar" → tema: alquiler general
-   - "Busco una casa para..." → tema: búsqueda con contexto
-   Estas cuentan como "consulta" porque revelan duda del cliente.
+2. Consultas implícitas: "Quisiera información sobre la piscina"
+3. Expresiones de intención: "Quisiera reservar", "Me interesa conocer más
+   sobre las casas", "Busco una casa para...".
 4. Dudas sobre políticas, servicios o proceso.
 
-La regla práctica: ¿el cliente está BUSCANDO una respuesta/información?
-Si sí → captúralo. Si solo está confirmando o respondiendo al bot → ignóralo.
-
 CATEGORÍAS DISPONIBLES:
 """ + "\n".join(f"- {k}: {v}" for k, v in CATEGORIES.items()) + """
 
 ⚠️ GUÍA PARA CASOS AMBIGUOS DE CATEGORIZACIÓN:
-- Pregunta por PRECIO + FECHA específica → usa `availability` (pide cotización).
-  Ej: "¿precio para el 25 de abril?" → availability.
-- Pregunta por PRECIO sin fecha o genérica → usa `pricing_general`.
-  Ej: "¿desde qué precios?", "¿cuánto cuesta la casa?" → pricing_general.
-- Pregunta por CAPACIDAD → siempre `capacity`, NO `availability`.
-  Ej: "¿cuántas personas entran?", "¿para cuántos es la casa?" → capacity.
-- Pregunta por CÓMO RESERVAR, voucher, adelanto, web → `how_to_book`.
-- Pregunta por MÉTODOS de pago (tarjeta, Yape, etc) → `payment_methods`.
-  Pero "¿ya procesaron mi pago?" → `during_stay_support` o `how_to_book`.
-- Pregunta por MAPA, dirección, cómo llegar → `location`.
-- Pregunta por FOTOS, video, ver la casa → `photos`.
-- Pregunta por MASCOTAS → siempre `pets`.
-- Pregunta por FIESTAS/MÚSICA/ORQUESTA/BULLA → siempre `parties_music`.
-- Pregunta por EVENTOS corporativos, bodas, grupos >30 → `group_events`.
-- Pregunta por FULL DAY/INGRESO ANTICIPADO → `full_day` o `check_in_out`.
-  "¿Puedo entrar antes?" → check_in_out. "¿Solo de día?" → full_day.
-
-⚠️ REGLA DE CONSOLIDACIÓN INTERNA (IMPORTANTE):
-Dentro de UNA MISMA CONVERSACIÓN, el cliente a menudo reformula la misma
-pregunta. Tú DEBES consolidarlas como UNA SOLA entrada en tu output.
-Ejemplos de lo que es la MISMA pregunta:
-- "cuánto cuesta" = "precio" = "desde qué monto" = "qué tarifas" → 1 entrada
-- "¿hay disponibilidad?" = "¿está libre?" = "¿tienen fechas?" → 1 entrada
-- "¿cuántas personas caben?" = "¿capacidad de la casa?" = "¿para cuántos es?" → 1 entrada
-NUNCA devuelvas 2 entradas que signifiquen lo mismo aunque el cliente las
-haya formulado con palabras distintas.
+- PRECIO + FECHA específica → `availability`. PRECIO sin fecha → `pricing_general`.
+- CAPACIDAD → siempre `capacity`, NO `availability`.
+- CÓMO RESERVAR, voucher, adelanto, web → `how_to_book`.
+- MÉTODOS de pago (tarjeta, Yape, etc) → `payment_methods`.
+- MAPA, dirección, cómo llegar → `location`. FOTOS, video → `photos`.
+- MASCOTAS → siempre `pets`. FIESTAS/MÚSICA/ORQUESTA/BULLA → siempre `parties_music`.
+- EVENTOS corporativos, bodas, grupos >30 → `group_events`.
+- "¿Puedo entrar antes?" → check_in_out. "¿Solo de día?" → full_day.
 
 ⚠️ MATCH CONTRA EXISTENTES (AGRESIVO):
-Te daré una lista de preguntas frecuentes YA registradas (por categoría).
-Para cada pregunta que identifiques, SIEMPRE revisa primero si es
-"esencialmente la misma" que alguna de la lista. El criterio es SEMÁNTICO,
-no literal. Casos que DEBEN hacer match:
-- Tu pregunta: "cliente quiere saber cuándo hay fechas libres"
-  Existente: "Los usuarios preguntan si hay disponibilidad"
-  → MATCH (ambos sobre disponibilidad)
-- Tu pregunta: "preguntaron el precio de las casas"
-  Existente: "Los clientes piden el precio general"
-  → MATCH (ambos precio general)
-- Tu pregunta: "cuántas personas entran"
-  Existente: "Los usuarios preguntan la capacidad"
-  → MATCH (ambos capacidad)
-
-Solo genera new_label si REALMENTE no hay nada parecido. Prefiere match
-con algo existente 80% del tiempo cuando hay lista no vacía.
-
-FORMATO DE SALIDA (JSON estricto, sin texto adicional):
+Te daré las preguntas frecuentes YA registradas (por categoría). Para cada
+grupo revisa primero si es "esencialmente la misma" que alguna de la
+lista (criterio SEMÁNTICO, no literal) y usa su match_id. Solo genera
+new_label si REALMENTE no hay nada parecido.
+
+FORMATO DE SALIDA (JSON estricto, sin texto adicional), una entrada por grupo:
 {
-  "questions": [
-    {"category": "<key>", "match_id": "<id_hex8>"|null, "new_label": "<frase>"|null},
+  "groups": [
+    {"group": <n>, "ignore": false, "category": "<key>", "match_id": "<id_hex8>"|null, "new_label": "<frase>"|null},
+    {"group": <n>, "ignore": true},
     ...
   ]
 }
@@ -181,38 +148,33 @@ FORMATO DE SALIDA (JSON estricto, sin texto adicional):
 new_label debe empezar con "Los usuarios preguntaron...", "Los clientes
 quieren saber si...", "Consultan por...", etc. Debe ser genérico (no
 mencionar datos del cliente específico).
-
-Si la conversación NO contiene ninguna pregunta genuina del cliente,
-devuelve {"questions": []}.
 """
 
 
 class Command(BaseCommand):
-    help = 'Analiza conversaciones maduras y extrae preguntas frecuentes'
+    help = 'Analiza mensajes inbound nuevos y extrae preguntas frecuentes'
 
     def add_arguments(self, parser):
         parser.add_argument('--dry-run', action='store_true')
         parser.add_argument(
-            '--limit', type=int, default=100,
-            help='Máx sesiones a analizar por corrida (default 100)',
+            '--limit', type=int, default=5000,
+            help='Máx mensajes inbound a analizar por corrida (default 5000)',
         )
         parser.add_argument(
             '--min-inactivity-hours', type=int, default=MIN_INACTIVITY_HOURS,
-            help=f'Antigüedad mínima del último msg (default {MIN_INACTIVITY_HOURS}h)',
+            help=f'Antigüedad mínima del mensaje (default {MIN_INACTIVITY_HOURS}h)',
         )
         parser.add_argument(
             '--force-session',
-            help='Analiza una sesión específica por UUID (ignora filtros)',
+            help='Analiza los mensajes de una sesión por UUID (ignora watermark, no lo avanza)',
         )
         parser.add_argument(
             '--reset-all', action='store_true',
-            help='Borra todos los FrequentQuestion y marcas de sesión analizada',
+            help='Borra todos los FrequentQuestion, el índice vectorial y el watermark',
         )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        limit = options['limit']
-        min_hours = options['min_inactivity_hours']
         force_session = options.get('force_session')
 
         config = ChatbotConfiguration.get_config()
@@ -220,223 +182,268 @@ class Command(BaseCommand):
             self.stdout.write('Chatbot inactivo, saltando análisis.')
             return
 
+        checkpoint = FrequentQuestionCheckpoint.get_singleton()
+
         if options['reset_all']:
             if not dry_run:
                 FrequentQuestion.objects.all().delete()
-                for s in ChatSession.objects.exclude(conversation_context={}):
-                    ctx = s.conversation_context or {}
-                    if 'fq_analyzed_at' in ctx:
-                        ctx.pop('fq_analyzed_at', None)
-                        s.conversation_context = ctx
-                        s.save(update_fields=['conversation_context'])
+                QuestionIndex().clear()
+                checkpoint.last_analyzed_message_created = None
+                checkpoint.total_messages_analyzed = 0
+                checkpoint.notes = ''
+                checkpoint.save()
                 self.stdout.write('Reset completo.')
             else:
-                self.stdout.write('[DRY] --reset-all descartaría FQs y marcas')
+                self.stdout.write('[DRY] --reset-all descartaría FQs, índice y watermark')
             return
 
-        import openai
-        from django.conf import settings
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-
-        # Query de sesiones candidatas
-        if force_session:
-            sessions = ChatSession.objects.filter(pk=force_session)
-        else:
-            cutoff = timezone.now() - timedelta(hours=min_hours)
-            sessions = ChatSession.objects.filter(
-                deleted=False,
-                total_messages__gte=MIN_TOTAL_MESSAGES,
-                last_message_at__lt=cutoff,
-            ).exclude(
-                conversation_context__fq_analyzed_at__isnull=False,
-            ).order_by('last_message_at')[:limit]
-
-        total = sessions.count()
+        messages = self._new_messages(checkpoint, options)
+        candidates = [m for m in messages if is_candidate(m['content'])]
         self.stdout.write(
-            f'Sesiones candidatas (inactivas >{min_hours}h, no analizadas): {total}'
+            f'Mensajes inbound nuevos: {len(messages)} '
+            f'({len(candidates)} candidatos tras descartar respuestas triviales)'
         )
 
-        if total == 0:
+        if dry_run:
+            for m in candidates[:10]:
+                self.stdout.write(f'  [DRY] {str(m["session_id"])[:8]}: {m["content"][:80]!r}')
             return
 
-        processed = 0
-        extracted_questions = 0
-        errors = 0
-        # Modelo específico para este command — mini es mucho mejor que nano
-        # para clasificación con matching semántico. Corre 1 vez al día con
-        # volumen bajo, costo sigue siendo ~$0.12/día (~$3.60/mes).
-        classifier_model = 'gpt-4.1-mini'
-
-        for session in sessions:
-            transcript = self._build_transcript(session)
-            if not transcript:
-                self._mark_analyzed(session, skipped=True)
-                processed += 1
-                continue
-
-            if dry_run:
-                self.stdout.write(
-                    f'\n[DRY] Sesión {str(session.id)[:8]} '
-                    f'({session.wa_profile_name or session.wa_id}) — '
-                    f'{session.total_messages} msgs'
-                )
-                self.stdout.write(f'  transcript preview: {transcript[:200]!r}')
-                processed += 1
-                continue
-
+        stats = {'matched': 0, 'new': 0, 'noise': 0, 'groups': 0}
+        if candidates:
+            from apps.core import ai_gateway
+            client = ai_gateway.client('faq_analysis')
             try:
-                existing_block = self._build_existing_block()
-                user_prompt = (
-                    f"TRANSCRIPT DE LA CONVERSACIÓN:\n{transcript}\n\n"
-                    f"PREGUNTAS FRECUENTES EXISTENTES (para posible match):\n"
-                    f"{existing_block}\n\n"
-                    f"Identifica las preguntas del cliente y responde SOLO con el JSON."
-                )
-                resp = client.chat.completions.create(
-                    model=classifier_model,
-                    messages=[
-                        {"role": "system", "content": CLASSIFIER_SYSTEM_PROMPT},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    temperature=0,
-                    max_tokens=600,
-                    response_format={"type": "json_object"},
-                )
-                raw = resp.choices[0].message.content or '{}'
-                data = json.loads(raw)
+                stats = self._analyze(client, candidates)
             except Exception as e:
-                logger.error(f'Error analizando sesión {session.id}: {e}')
-                errors += 1
-                processed += 1
-                continue
-
-            questions = data.get('questions') or []
-            for q in questions:
-                if not isinstance(q, dict):
-                    continue
-                category = q.get('category') or 'other'
-                if category not in CATEGORIES:
-                    category = 'other'
-                match_id = q.get('match_id')
-                new_label = (q.get('new_label') or '').strip()
-                self._apply_question(session, category, match_id, new_label)
-                extracted_questions += 1
-
-            self._mark_analyzed(session, skipped=False)
-            processed += 1
-
-            if processed % 10 == 0:
-                self.stdout.write(
-                    f'  progreso: {processed}/{total} — preguntas extraídas: {extracted_questions}'
-                )
-
-        # Actualizar checkpoint (solo informativo)
-        if not dry_run:
-            checkpoint = FrequentQuestionCheckpoint.get_singleton()
-            checkpoint.total_messages_analyzed = (
-                checkpoint.total_messages_analyzed + processed
+                logger.error(f'Error analizando preguntas frecuentes: {e}', exc_info=True)
+                self.stderr.write(f'Error: {e} — no se avanzó el watermark')
+                return
+
+        if messages and not force_session:
+            checkpoint.last_analyzed_message_created = messages[-1]['created']
+            checkpoint.total_messages_analyzed += len(messages)
+            checkpoint.notes = (
+                f"{timezone.now():%Y-%m-%d %H:%M}: {len(messages)} msgs, "
+                f"{stats['matched']} por índice, {stats['groups']} grupos al modelo, "
+                f"{stats['new']} preguntas nuevas"
             )
             checkpoint.save()
 
         self.stdout.write(self.style.SUCCESS(
-            f'✓ Sesiones procesadas: {processed} | '
-            f'Preguntas extraídas: {extracted_questions} | '
-            f'Errores: {errors}'
+            f'✓ Mensajes: {len(messages)} | '
+            f'Asignados por índice: {stats["matched"]} | '
+            f'Grupos enviados al modelo: {stats["groups"]} | '
+            f'Preguntas nuevas: {stats["new"]} | '
+            f'Ruido: {stats["noise"]}'
         ))
 
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
 
-    def _build_transcript(self, session):
-        """Arma un transcript legible de la sesión en orden cronológico."""
-        msgs = ChatMessage.objects.filter(
-            session=session, deleted=False,
-        ).exclude(
-            direction=ChatMessage.DirectionChoices.SYSTEM,
-        ).order_by('created')[:MAX_TRANSCRIPT_MESSAGES]
-        lines = []
-        for m in msgs:
-            role = {
-                'inbound': 'Cliente',
-                'outbound_ai': 'Valeria',
-                'outbound_human': 'Admin',
-            }.get(m.direction, 'Sistema')
-            content = (m.content or '').strip()
-            if not content:
-                continue
-            content = content[:MAX_MESSAGE_CHARS]
-            lines.append(f'[{role}]: {content}')
-        return '\n'.join(lines)
+    def _new_messages(self, checkpoint, options):
+        """Mensajes inbound nuevos, en orden cronológico."""
+        qs = ChatMessage.objects.filter(
+            deleted=False,
+            direction=ChatMessage.DirectionChoices.INBOUND,
+        ).exclude(content='')
+        if options.get('force_session'):
+            qs = qs.filter(session_id=options['force_session'])
+        else:
+            cutoff = timezone.now() - timedelta(hours=options['min_inactivity_hours'])
+            qs = qs.filter(created__lt=cutoff, session__deleted=False)
+            if checkpoint.last_analyzed_message_created:
+                qs = qs.filter(created__gt=checkpoint.last_analyzed_message_created)
+        return list(
+            qs.order_by('created')
+            .values('id', 'session_id', 'session__wa_id', 'content', 'created')[:options['limit']]
+        )
 
-    def _build_existing_block(self):
+    def _load_index(self, client, live, dimensions):
+        """Índice local sin vectores huérfanos; se reconstruye desde los labels si hace falta."""
+        index = QuestionIndex.load()
+        if len(index) and index.vectors.shape[1] != dimensions:
+            # Cambió el modelo de embeddings
+            index = QuestionIndex()
+        index.retain(set(live))
+        if not len(index) and live:
+            fqs = list(live.values())
+            for fq, vector in zip(fqs, embed_texts(client, [fq.label for fq in fqs])):
+                index.add(fq.id.hex, vector)
+        return index
+
+    def _analyze(self, client, candidates):
+        texts = [m['content'].strip()[:MAX_MESSAGE_CHARS] for m in candidates]
+        vectors = embed_texts(client, texts)
+        live = {fq.id.hex: fq for fq in FrequentQuestion.objects.filter(deleted=False)}
+        index = self._load_index(client, live, vectors.shape[1])
+        threshold = getattr(settings, 'FAQ_MATCH_THRESHOLD', 0.82)
+
+        # 1) Vecino más cercano contra las preguntas canónicas
+        hits = {}
+        unmatched = []
+        noise = 0
+        keys, scores = index.nearest(vectors)
+        for i, (key, score) in enumerate(zip(keys, scores)):
+            if key is None or score < threshold:
+                unmatched.append(i)
+            elif key == NOISE:
+                noise += 1
+            else:
+                hits.setdefault(key, []).append(i)
+        matched = sum(len(members) for members in hits.values())
+
+        # 2) Solo los grupos sin match van al modelo, en lotes
+        groups = [
+            [unmatched[j] for j in cluster]
+            for cluster in greedy_clusters(vectors[unmatched], threshold)
+        ] if unmatched else []
+        new_questions = {}
+        for start in range(0, len(groups), GROUPS_PER_CALL):
+            batch = groups[start:start + GROUPS_PER_CALL]
+            decisions = self._classify_groups(client, batch, texts, live)
+            for n, members in enumerate(batch, 1):
+                vector = centroid(vectors[members])
+                decision = decisions.get(n)
+                if decision is None:
+                    continue
+                if decision == NOISE:
+                    index.add(NOISE, vector)
+                    noise += len(members)
+                    continue
+                category, match_key, label = decision
+                if match_key:
+                    hits.setdefault(match_key, []).extend(members)
+                    index.add(match_key, vector)
+                    continue
+                entry = new_questions.setdefault(
+                    (category, label.lower()), {'category': category, 'label': label, 'members': [], 'vectors': []},
+                )
+                entry['members'].extend(members)
+                entry['vectors'].append(vector)
+
+        # 3) Aplicar conteos y guardar el índice
+        with transaction.atomic():
+            self._apply_hits(hits, live, candidates, texts)
+            created = self._create_questions(new_questions.values(), candidates, texts)
+        for fq, vectors_ in created:
+            for vector in vectors_:
+                index.add(fq.id.hex, vector)
+        index.save()
+
+        return {'matched': matched, 'new': len(created), 'noise': noise, 'groups': len(groups)}
+
+    def _build_existing_block(self, live):
         """Bloque con top 6 preguntas por categoría para match."""
+        by_category = {}
+        for fq in sorted(live.values(), key=lambda fq: -fq.count):
+            items = by_category.setdefault(fq.category, [])
+            if len(items) < 6:
+                items.append(fq)
         lines = []
         for cat_key in CATEGORIES.keys():
-            if cat_key == 'other':
-                continue
-            top = FrequentQuestion.objects.filter(
-                category=cat_key
-            ).order_by('-count')[:6]
-            items = list(top)
-            if not items:
+            if cat_key == 'other' or not by_category.get(cat_key):
                 continue
             lines.append(f'\n[{cat_key}]:')
-            for fq in items:
-                lines.append(
-                    f'  id={fq.id.hex[:8]} (×{fq.count}): {fq.label}'
-                )
+            for fq in by_category[cat_key]:
+                lines.append(f'  id={fq.id.hex[:8]} (×{fq.count}): {fq.label}')
         return '\n'.join(lines) if lines else '(sin preguntas previas)'
 
-    def _apply_question(self, session, category, match_id, new_label):
-        """Incrementa contador de pregunta existente o crea una nueva."""
-        now = timezone.now()
-
-        if match_id:
-            prefix = str(match_id).replace('-', '').lower()[:8]
-            if prefix:
-                fq = FrequentQuestion.objects.filter(
-                    category=category,
-                ).extra(
-                    where=["REPLACE(CAST(id AS CHAR), '-', '') LIKE %s"],
-                    params=[f'{prefix}%'],
-                ).first()
-                if fq:
-                    fq.count += 1
-                    fq.last_seen_at = now
-                    samples = list(fq.sample_messages or [])
-                    if len(samples) < 5:
-                        samples.append({
-                            'session_id': str(session.id),
-                            'wa_id': session.wa_id,
-                            'created': now.isoformat(),
-                        })
-                        fq.sample_messages = samples
-                    fq.save(update_fields=[
-                        'count', 'last_seen_at', 'sample_messages', 'updated',
-                    ])
-                    return
-
-        if not new_label:
-            return
+    def _classify_groups(self, client, groups, texts, live):
+        """
+        Una llamada al modelo para varios grupos. Retorna
+        {n: NOISE | (category, match_key, label)}; los grupos omitidos por
+        el modelo no aparecen.
+        """
+        blocks = []
+        for n, members in enumerate(groups, 1):
+            samples = '\n'.join(f'  - {texts[i]}' for i in members[:SAMPLES_PER_GROUP])
+            blocks.append(f'GRUPO {n} ({len(members)} mensajes):\n{samples}')
+        user_prompt = (
+            'GRUPOS DE MENSAJES:\n' + '\n\n'.join(blocks) + '\n\n'
+            'PREGUNTAS FRECUENTES EXISTENTES (para posible match):\n'
+            f'{self._build_existing_block(live)}\n\n'
+            'Clasifica cada grupo y responde SOLO con el JSON.'
+        )
+        resp = client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": CLASSIFIER_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            temperature=0,
+            max_tokens=120 * len(groups),
+            response_format={"type": "json_object"},
+        )
+        data = json.loads(resp.choices[0].message.content or '{}')
 
-        FrequentQuestion.objects.create(
-            category=category,
-            category_label=CATEGORY_LABELS.get(category, category),
-            label=new_label,
-            count=1,
-            last_seen_at=now,
-            sample_messages=[{
-                'session_id': str(session.id),
-                'wa_id': session.wa_id,
-                'created': now.isoformat(),
-            }],
+        decisions = {}
+        for item in data.get('groups') or []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                n = int(item.get('group'))
+            except (TypeError, ValueError):
+                continue
+            if not 1 <= n <= len(groups):
+                continue
+            if item.get('ignore'):
+                decisions[n] = NOISE
+                continue
+            category = item.get('category') or 'other'
+            if category not in CATEGORIES:
+                category = 'other'
+            prefix = str(item.get('match_id') or '').replace('-', '').lower()[:8]
+            match_key = next((key for key in live if key.startswith(prefix)), None) if prefix else None
+            label = (item.get('new_label') or '').strip()
+            if match_key or label:
+                decisions[n] = (category, match_key, label)
+        return decisions
+
+    def _samples(self, members, candidates, texts, existing=()):
+        samples = list(existing or [])
+        for i in members:
+            if len(samples) >= MAX_SAMPLES:
+                break
+            m = candidates[i]
+            samples.append({
+                'session_id': str(m['session_id']),
+                'wa_id': m['session__wa_id'],
+                'created': m['created'].isoformat(),
+                'message': texts[i],
+            })
+        return samples
+
+    def _apply_hits(self, hits, live, candidates, texts):
+        """Suma 1 por sesión distinta a cada pregunta existente."""
+        now = timezone.now()
+        updates = []
+        for key, members in hits.items():
+            fq = live.get(key)
+            if fq is None:
+                continue
+            fq.count += len({candidates[i]['session_id'] for i in members})
+            fq.last_seen_at = max(candidates[i]['created'] for i in members)
+            fq.sample_messages = self._samples(members, candidates, texts, fq.sample_messages)
+            fq.updated = now
+            updates.append(fq)
+        FrequentQuestion.objects.bulk_update(
+            updates, ['count', 'last_seen_at', 'sample_messages', 'updated'],
         )
 
-    def _mark_analyzed(self, session, skipped=False):
-        ctx = session.conversation_context or {}
-        ctx['fq_analyzed_at'] = timezone.now().isoformat()
-        if skipped:
-            ctx['fq_skipped'] = True
-        session.conversation_context = ctx
-        session.save(update_fields=['conversation_context'])
+    def _create_questions(self, entries, candidates, texts):
+        """Crea las preguntas nuevas; retorna [(fq, centroides)]."""
+        created = []
+        for entry in entries:
+            members = entry['members']
+            fq = FrequentQuestion(
+                category=entry['category'],
+                category_label=CATEGORY_LABELS.get(entry['category'], entry['category']),
+                label=entry['label'],
+                count=len({candidates[i]['session_id'] for i in members}),
+                last_seen_at=max(candidates[i]['created'] for i in members),
+                sample_messages=self._samples(members, candidates, texts),
+            )
+            created.append((fq, entry['vectors']))
+        FrequentQuestion.objects.bulk_create([fq for fq, _ in created])
+        return created
@@ -10,6 +10,10 @@ Dos tipos de follow-up:
 La ventana de WhatsApp es 24h desde el último mensaje del cliente.
 Se respeta un máximo de 1 follow-up por sesión.
 
+Las exclusiones y el historial se cargan en lote para todas las sesiones;
+los textos se generan con IA y se envían en el pool de
+apps.chatbot.campaigns (ritmo limitado, reanudable).
+
 Uso: python manage.py send_followups
 Cron recomendado: cada 2 horas (8am-10pm)
 """
@@ -17,9 +21,12 @@ import logging
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Prefetch
 from django.utils import timezone
 
 from apps.chatbot.models import ChatSession, ChatMessage, ChatbotConfiguration
+from apps.chatbot.campaigns import Campaign, CampaignMessage
 from apps.chatbot.channel_sender import get_sender
 from apps.chatbot.ai_orchestrator import AIOrchestrator
 
@@ -119,10 +126,15 @@ class Command(BaseCommand):
         max_age_no_quote = now - timedelta(hours=2)
         max_age_quoted = now - timedelta(hours=4)
 
-        sent_no_quote = 0
-        sent_quoted = 0
+        sent = {'no_quote': 0, 'quoted': 0}
         skipped = 0
 
+        recent_messages = Prefetch(
+            'messages',
+            queryset=ChatMessage.objects.filter(deleted=False).order_by('-created')[:10],
+            to_attr='followup_history',
+        )
+
         # === 1. Sesiones SIN cotización ===
         no_quote_sessions = ChatSession.objects.filter(
             deleted=False,
@@ -134,31 +146,7 @@ class Command(BaseCommand):
             last_customer_message_at__gte=min_age,
             last_customer_message_at__lte=max_age_no_quote,
             total_messages__gte=2,  # Al menos 1 ida y vuelta
-        )
-
-        for session in no_quote_sessions:
-            name = session.wa_profile_name or session.wa_id
-
-            # Saltar si un admin ya intervino o si el cliente tiene reserva activa
-            skip_reason = self._should_skip(session)
-            if skip_reason:
-                skipped += 1
-                if dry_run:
-                    self.stdout.write(f'[SKIP] {name}: {skip_reason}')
-                continue
-
-            if dry_run:
-                self.stdout.write(f'[DRY] Sin cotización: {name} — último msg cliente: {session.last_customer_message_at}')
-                sent_no_quote += 1
-                continue
-
-            try:
-                self._send_followup(session, config, 'no_quote')
-                sent_no_quote += 1
-                self.stdout.write(f'  Enviado a {name}')
-            except Exception as e:
-                logger.error(f"Error enviando follow-up sin cotización a {session.wa_id}: {e}")
-                self.stdout.write(self.style.ERROR(f'  Error con {name}: {e}'))
+        ).select_related('client').prefetch_related(recent_messages)
 
         # === 2. Sesiones CON cotización pero sin conversión ===
         quoted_sessions = ChatSession.objects.filter(
@@ -170,13 +158,25 @@ class Command(BaseCommand):
             last_customer_message_at__isnull=False,
             last_customer_message_at__gte=min_age,
             quoted_at__lte=max_age_quoted,
+        ).select_related('client').prefetch_related(recent_messages)
+
+        candidates = (
+            [(session, 'no_quote') for session in no_quote_sessions]
+            + [(session, 'quoted') for session in quoted_sessions]
         )
+        skip_reasons = self._skip_reasons([session for session, _ in candidates])
 
-        for session in quoted_sessions:
+        campaign = None if dry_run else Campaign('followups')
+        messages = []
+        for session, followup_type in candidates:
             name = session.wa_profile_name or session.wa_id
 
+            # Enviado en una corrida cortada: _send_followups escribe su log
+            if campaign and campaign.is_done(session.id):
+                continue
+
             # Saltar si un admin ya intervino o si el cliente tiene reserva activa
-            skip_reason = self._should_skip(session)
+            skip_reason = skip_reasons.get(session.id)
             if skip_reason:
                 skipped += 1
                 if dry_run:
@@ -184,63 +184,74 @@ class Command(BaseCommand):
                 continue
 
             if dry_run:
-                self.stdout.write(f'[DRY] Cotizada sin conversión: {name} — cotizada: {session.quoted_at}')
-                sent_quoted += 1
+                if followup_type == 'no_quote':
+                    self.stdout.write(f'[DRY] Sin cotización: {name} — último msg cliente: {session.last_customer_message_at}')
+                else:
+                    self.stdout.write(f'[DRY] Cotizada sin conversión: {name} — cotizada: {session.quoted_at}')
+                sent[followup_type] += 1
                 continue
 
             try:
-                self._send_followup(session, config, 'quoted')
-                sent_quoted += 1
-                self.stdout.write(f'  Enviado a {name}')
+                messages.append(self._build_followup(session, followup_type))
             except Exception as e:
-                logger.error(f"Error enviando follow-up cotizado a {session.wa_id}: {e}")
+                logger.error(f"Error preparando follow-up a {session.wa_id}: {e}")
                 self.stdout.write(self.style.ERROR(f'  Error con {name}: {e}'))
 
+        if not dry_run:
+            self._send_followups(campaign, messages, config, sent)
+
         action = 'Enviaría' if dry_run else 'Enviados'
         self.stdout.write(self.style.SUCCESS(
-            f'{action}: {sent_no_quote} follow-ups sin cotización, '
-            f'{sent_quoted} follow-ups post-cotización. '
+            f'{action}: {sent["no_quote"]} follow-ups sin cotización, '
+            f'{sent["quoted"]} follow-ups post-cotización. '
             f'Saltados: {skipped}.'
         ))
 
-    def _should_skip(self, session):
-        """Verifica si la sesión debe ser excluida del follow-up.
+    def _skip_reasons(self, sessions):
+        """Razones para excluir sesiones del follow-up, con dos consultas
+        para todas las candidatas.
 
         Returns:
-            str con la razón si debe saltarse, None si está ok.
+            dict session_id → razón (solo las que deben saltarse).
         """
         from apps.reservation.models import Reservation
         from datetime import date as date_type
 
+        if not sessions:
+            return {}
+
         # 1. Saltar si un admin ya respondió en esta sesión
-        has_admin_msg = ChatMessage.objects.filter(
-            session=session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_HUMAN,
-        ).exists()
-        if has_admin_msg:
-            return 'admin ya intervino en la conversación'
+        admin_sessions = set(
+            ChatMessage.objects.filter(
+                session_id__in=[s.id for s in sessions],
+                deleted=False,
+                direction=ChatMessage.DirectionChoices.OUTBOUND_HUMAN,
+            ).values_list('session_id', flat=True).distinct()
+        )
 
         # 2. Saltar si el cliente tiene reserva activa (aprobada/pendiente)
-        if session.client:
-            has_active_reservation = Reservation.objects.filter(
-                client=session.client,
+        clients_with_reservation = set(
+            Reservation.objects.filter(
+                client_id__in={s.client_id for s in sessions if s.client_id},
                 deleted=False,
                 status__in=['approved', 'pending', 'incomplete'],
                 check_out_date__gte=date_type.today(),
-            ).exists()
-            if has_active_reservation:
-                return 'cliente tiene reserva activa'
-
-        return None
+            ).values_list('client_id', flat=True)
+        )
 
-    def _send_followup(self, session, config, followup_type):
-        """Genera y envía un mensaje de follow-up usando IA"""
-        import openai
+        reasons = {}
+        for session in sessions:
+            if session.id in admin_sessions:
+                reasons[session.id] = 'admin ya intervino en la conversación'
+            elif session.client_id and session.client_id in clients_with_reservation:
+                reasons[session.id] = 'cliente tiene reserva activa'
+        return reasons
+
+    def _build_followup(self, session, followup_type):
+        """Arma el prompt del follow-up (magic link fresco incluido). El
+        texto lo genera la IA en el pool de la campaña."""
         from django.conf import settings
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-
         # ─── Magic link FRESCO para clientes que ya cotizaron ───
         # El magic link original (válido 1h) ya expiró cuando hacemos
         # follow-up horas después. Generamos uno nuevo basándonos en
@@ -289,11 +300,6 @@ class Command(BaseCommand):
             except Exception as e:
                 logger.warning(f"Followup magic link error ({session.id}): {e}", exc_info=True)
 
-        # Obtener últimos mensajes para contexto
-        recent_msgs = ChatMessage.objects.filter(
-            session=session, deleted=False
-        ).order_by('-created')[:10]
-
         messages = []
         if followup_type == 'no_quote':
             messages.append({"role": "system", "content": FOLLOWUP_NO_QUOTE_PROMPT})
@@ -312,9 +318,9 @@ class Command(BaseCommand):
                 )
             messages.append({"role": "system", "content": sys_prompt})
 
-        # Agregar historial como contexto
+        # Agregar historial (últimos 10 mensajes, prefetch) como contexto
         history = ""
-        for msg in reversed(list(recent_msgs)):
+        for msg in reversed(session.followup_history):
             direction = {
                 'inbound': 'Cliente',
                 'outbound_ai': 'IA',
@@ -328,45 +334,81 @@ class Command(BaseCommand):
             "content": f"Contacto: {name}\nHistorial:\n{history}\n\nGenera el mensaje de follow-up."
         })
 
-        response = client.chat.completions.create(
-            model=config.primary_model,
-            messages=messages,
-            temperature=0.8,
-            max_tokens=200,
+        return CampaignMessage(
+            key=str(session.id),
+            to=session.wa_id,
+            payload={'messages': messages, 'channel': session.channel},
+            record={'followup_type': followup_type, 'name': name},
         )
 
-        followup_text = response.choices[0].message.content or ""
-        if not followup_text.strip():
-            return
-
-        # Enviar por el canal correspondiente
-        sender = get_sender(session.channel)
-        wa_message_id = sender.send_text_message(session.wa_id, followup_text)
-
-        # Guardar mensaje
-        ChatMessage.objects.create(
-            session=session,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-            message_type=ChatMessage.MessageTypeChoices.TEXT,
-            content=followup_text,
-            wa_message_id=wa_message_id,
-            ai_model=config.primary_model,
-            intent_detected=f'followup_{followup_type}',
+    def _send_followups(self, campaign, messages, config, sent):
+        """Genera los textos con IA y los envía en el pool de la campaña;
+        luego guarda los mensajes y actualiza las sesiones en lote."""
+        from apps.core import ai_gateway
+
+        client = ai_gateway.client('chatbot')
+        senders = {}
+
+        def generate(message, http):
+            response = client.chat.completions.create(
+                model=config.primary_model,
+                messages=message.payload['messages'],
+                temperature=0.8,
+                max_tokens=200,
+            )
+            message.record['text'] = response.choices[0].message.content or ""
+
+        def send(message, http):
+            if not message.record['text'].strip():
+                return None
+            # Enviar por el canal correspondiente
+            channel = message.payload['channel']
+            if channel not in senders:
+                senders[channel] = get_sender(channel, http=http)
+            return senders[channel].send_text_message(message.to, message.record['text'])
+
+        campaign.send(messages, send=send, prepare=generate)
+
+        # Registrar todos los envíos (incluye los de una corrida cortada);
+        # las sesiones que ya tienen su follow-up guardado se omiten.
+        results = campaign.results()
+        pending_sessions = set(
+            str(session_id) for session_id in ChatSession.objects.filter(
+                id__in=list(results), followup_count=0,
+            ).values_list('id', flat=True)
         )
-
-        # Actualizar sesión
+        chat_messages = []
+        for key, entry in results.items():
+            record = entry['record']
+            text = record.get('text') or ''
+            if key not in pending_sessions or not text.strip():
+                continue
+            followup_type = record['followup_type']
+            chat_messages.append(ChatMessage(
+                session_id=key,
+                direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
+                message_type=ChatMessage.MessageTypeChoices.TEXT,
+                content=text,
+                wa_message_id=entry['result'],
+                ai_model=config.primary_model,
+                intent_detected=f'followup_{followup_type}',
+            ))
+            sent[followup_type] += 1
+            self.stdout.write(f"  Enviado a {record['name']}")
+            logger.info(
+                f"Follow-up ({followup_type}) enviado a {record['name']}: "
+                f"{text[:80]}..."
+            )
+
+        # Actualizar sesiones
         now = timezone.now()
-        session.followup_sent_at = now
-        session.followup_count += 1
-        session.total_messages += 1
-        session.ai_messages += 1
-        session.last_message_at = now
-        session.save(update_fields=[
-            'followup_sent_at', 'followup_count',
-            'total_messages', 'ai_messages', 'last_message_at',
-        ])
-
-        logger.info(
-            f"Follow-up ({followup_type}) enviado a {session.wa_id}: "
-            f"{followup_text[:80]}..."
-        )
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(chat_messages)
+            ChatSession.objects.filter(id__in=[m.session_id for m in chat_messages]).update(
+                followup_sent_at=now,
+                followup_count=F('followup_count') + 1,
+                total_messages=F('total_messages') + 1,
+                ai_messages=F('ai_messages') + 1,
+                last_message_at=now,
+            )
+        campaign.finish()
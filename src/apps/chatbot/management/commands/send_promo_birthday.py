@@ -6,7 +6,10 @@ Lógica:
 2. Calcula fecha objetivo: hoy + days_before_birthday
 3. Busca clientes con cumpleaños en esa fecha (date__month, date__day)
 4. Filtra: tiene teléfono, no existe PromoBirthdaySent para ese año
-5. Para cada cliente: construye 8 params de plantilla y envía via WhatsApp
+5. Calcula el nivel de todos los clientes con consultas agregadas y
+   construye los 8 params de plantilla de cada uno
+6. Envía con apps.chatbot.campaigns (pool con ritmo limitado, reanudable)
+   y registra los envíos con bulk_create
 
 Uso: python manage.py send_promo_birthday [--dry-run]
 Cron recomendado: diario 9am
@@ -15,16 +18,102 @@ import logging
 from datetime import date, timedelta
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
 
 from apps.chatbot.models import (
     ChatSession, PromoBirthdayConfig, PromoBirthdaySent,
 )
+from apps.chatbot.campaigns import Campaign, CampaignMessage
 from apps.chatbot.whatsapp_sender import WhatsAppSender
 from apps.clients.models import Clients, Achievement, ClientAchievement
 
 logger = logging.getLogger(__name__)
 
 
+def get_level_info_bulk(clients):
+    """
+    Info de nivel de varios clientes con consultas agregadas (una por tipo
+    de dato, no por cliente).
+
+    Returns:
+        dict: client_id → (nivel_actual, discount_perm, siguiente_nivel, que_falta)
+    """
+    from apps.reservation.models import Reservation
+
+    client_ids = [c.id for c in clients]
+    if not client_ids:
+        return {}
+
+    # Último logro obtenido por cada cliente
+    last_achievement = {}
+    for ca in ClientAchievement.objects.filter(
+        client_id__in=client_ids, deleted=False,
+    ).select_related('achievement').order_by('client_id', '-earned_at'):
+        last_achievement.setdefault(ca.client_id, ca.achievement)
+
+    achievements = list(Achievement.objects.filter(
+        is_active=True, deleted=False,
+    ).order_by('order'))
+
+    reservations = dict(
+        Reservation.objects.filter(
+            client_id__in=client_ids, deleted=False, status='approved',
+        ).values('client_id').annotate(n=Count('id')).values_list('client_id', 'n')
+    )
+    referrals = dict(
+        Clients.objects.filter(
+            referred_by_id__in=client_ids, deleted=False,
+        ).values('referred_by_id').annotate(n=Count('id')).values_list('referred_by_id', 'n')
+    )
+    referral_reservations = dict(
+        Reservation.objects.filter(
+            client__referred_by_id__in=client_ids, deleted=False, status='approved',
+        ).values('client__referred_by_id').annotate(n=Count('id'))
+        .values_list('client__referred_by_id', 'n')
+    )
+
+    info = {}
+    for client_id in client_ids:
+        current_achievement = last_achievement.get(client_id)
+        if current_achievement:
+            nivel_actual = current_achievement.name
+            discount_perm = current_achievement.discount_percentage
+            # Siguiente nivel en orden
+            next_achievement = next(
+                (a for a in achievements if a.order > current_achievement.order), None,
+            )
+        else:
+            nivel_actual = "Sin nivel"
+            discount_perm = 0
+            next_achievement = achievements[0] if achievements else None
+
+        if not next_achievement:
+            info[client_id] = (nivel_actual, discount_perm, "Máximo alcanzado", "¡Ya eres del nivel más alto!")
+            continue
+
+        # Calcular qué falta
+        client_reservations = reservations.get(client_id, 0)
+        client_referrals = referrals.get(client_id, 0)
+        client_referral_reservations = referral_reservations.get(client_id, 0)
+
+        faltas = []
+        if next_achievement.required_reservations > client_reservations:
+            diff = next_achievement.required_reservations - client_reservations
+            faltas.append(f"{diff} reserva{'s' if diff > 1 else ''}")
+        if next_achievement.required_referrals > client_referrals:
+            diff = next_achievement.required_referrals - client_referrals
+            faltas.append(f"{diff} referido{'s' if diff > 1 else ''}")
+        if next_achievement.required_referral_reservations > client_referral_reservations:
+            diff = next_achievement.required_referral_reservations - client_referral_reservations
+            faltas.append(f"{diff} reserva{'s' if diff > 1 else ''} de referidos")
+
+        que_falta = " y ".join(faltas) if faltas else "¡Ya cumples los requisitos!"
+        info[client_id] = (nivel_actual, discount_perm, next_achievement.name, que_falta)
+
+    return info
+
+
 def get_client_level_info(client):
     """
     Obtiene info del nivel actual del cliente y qué le falta para el siguiente.
@@ -32,61 +121,7 @@ def get_client_level_info(client):
     Returns:
         tuple: (nivel_actual, discount_perm, siguiente_nivel, que_falta)
     """
-    from apps.reservation.models import Reservation
-
-    # Último logro obtenido por el cliente
-    last_ca = ClientAchievement.objects.filter(
-        client=client, deleted=False,
-    ).select_related('achievement').order_by('-earned_at').first()
-
-    if last_ca:
-        current_achievement = last_ca.achievement
-        nivel_actual = current_achievement.name
-        discount_perm = current_achievement.discount_percentage
-    else:
-        current_achievement = None
-        nivel_actual = "Sin nivel"
-        discount_perm = 0
-
-    # Buscar siguiente nivel en orden
-    if current_achievement:
-        next_achievement = Achievement.objects.filter(
-            is_active=True, deleted=False,
-            order__gt=current_achievement.order,
-        ).order_by('order').first()
-    else:
-        next_achievement = Achievement.objects.filter(
-            is_active=True, deleted=False,
-        ).order_by('order').first()
-
-    if not next_achievement:
-        return nivel_actual, discount_perm, "Máximo alcanzado", "¡Ya eres del nivel más alto!"
-
-    # Calcular qué falta
-    client_reservations = Reservation.objects.filter(
-        client=client, deleted=False, status='approved',
-    ).count()
-    client_referrals = Clients.objects.filter(
-        referred_by=client, deleted=False,
-    ).count()
-    referral_reservations = Reservation.objects.filter(
-        client__referred_by=client, deleted=False, status='approved',
-    ).count()
-
-    faltas = []
-    if next_achievement.required_reservations > client_reservations:
-        diff = next_achievement.required_reservations - client_reservations
-        faltas.append(f"{diff} reserva{'s' if diff > 1 else ''}")
-    if next_achievement.required_referrals > client_referrals:
-        diff = next_achievement.required_referrals - client_referrals
-        faltas.append(f"{diff} referido{'s' if diff > 1 else ''}")
-    if next_achievement.required_referral_reservations > referral_reservations:
-        diff = next_achievement.required_referral_reservations - referral_reservations
-        faltas.append(f"{diff} reserva{'s' if diff > 1 else ''} de referidos")
-
-    que_falta = " y ".join(faltas) if faltas else "¡Ya cumples los requisitos!"
-
-    return nivel_actual, discount_perm, next_achievement.name, que_falta
+    return get_level_info_bulk([client])[client.id]
 
 
 class Command(BaseCommand):
@@ -115,17 +150,17 @@ class Command(BaseCommand):
         )
 
         # Buscar clientes con cumpleaños en la fecha objetivo
-        clients = Clients.objects.filter(
+        clients = list(Clients.objects.filter(
             date__month=target_date.month,
             date__day=target_date.day,
             deleted=False,
-        )
+        ))
 
-        if not clients.exists():
+        if not clients:
             self.stdout.write('No hay clientes con cumpleaños en esa fecha.')
             return
 
-        self.stdout.write(f'Clientes con cumpleaños el {target_date.day}/{target_date.month}: {clients.count()}')
+        self.stdout.write(f'Clientes con cumpleaños el {target_date.day}/{target_date.month}: {len(clients)}')
 
         # Clientes que ya recibieron promo este año
         already_sent = set(
@@ -138,9 +173,18 @@ class Command(BaseCommand):
         sent_count = 0
         skipped_count = 0
 
+        campaign = None if dry_run else Campaign(f'promo_birthday:{target_date.isoformat()}')
+        clients_by_key = {str(client.id): client for client in clients}
+
+        eligible = []
         for client in clients:
             client_name = f"{client.first_name} {client.last_name or ''}".strip()
 
+            # Enviado en una corrida anterior que se cortó: solo falta el log
+            # (se escribe abajo aunque ahora caiga en una exclusión)
+            if campaign and campaign.is_done(client.id):
+                continue
+
             # Verificar que no se haya enviado ya
             if client.id in already_sent:
                 self.stdout.write(f'  SKIP {client_name}: ya recibió promo este año')
@@ -148,14 +192,24 @@ class Command(BaseCommand):
                 continue
 
             # Verificar que tiene teléfono
-            phone = client.tel_number
-            if not phone:
+            if not client.tel_number:
                 self.stdout.write(f'  SKIP {client_name}: sin teléfono')
                 skipped_count += 1
                 continue
 
-            # Obtener info de nivel
-            nivel_actual, discount_perm, siguiente_nivel, que_falta = get_client_level_info(client)
+            eligible.append(client)
+
+        # Info de nivel de todos los elegibles en consultas agregadas
+        level_info = get_level_info_bulk(eligible)
+
+        sender = WhatsAppSender(http=campaign.http if campaign else None)
+        messages = []
+
+        for client in eligible:
+            client_name = f"{client.first_name} {client.last_name or ''}".strip()
+            phone = client.tel_number
+
+            nivel_actual, discount_perm, siguiente_nivel, que_falta = level_info[client.id]
 
             # Puntos disponibles (= S/)
             puntos = client.get_available_points()
@@ -195,16 +249,7 @@ class Command(BaseCommand):
                 }
             ]
 
-            # Enviar template WA
-            sender = WhatsAppSender()
-            wa_message_id = sender.send_template_message(
-                to=phone,
-                template_name=config.wa_template_name,
-                language_code=config.wa_template_language,
-                components=components,
-            )
-
-            # Obtener contenido real de la plantilla renderizada
+            # Contenido real de la plantilla renderizada (el body se pide a Meta una vez)
             rendered = sender.render_template(
                 config.wa_template_name, config.wa_template_language, components
             )
@@ -214,47 +259,78 @@ class Command(BaseCommand):
                 f"Desc cumple: {config.birthday_discount_percentage}% | Desc perm: {int(discount_perm)}%"
             )
 
-            if not wa_message_id:
-                self.stdout.write(self.style.ERROR(
-                    f'  ERROR {client_name}: envío WA falló'
-                ))
-                PromoBirthdaySent.objects.create(
-                    client=client,
-                    year=target_date.year,
-                    wa_message_id=None,
-                    status='failed',
-                )
-                ChatSession.register_outbound_template(
-                    phone_number=phone,
-                    content=f"[Promo cumpleaños - ERROR]\n\n{template_content}",
-                    intent='promo_birthday',
-                    client=client,
-                )
-                skipped_count += 1
-                continue
+            messages.append(CampaignMessage(
+                key=str(client.id),
+                to=phone,
+                payload={'components': components},
+                record={
+                    'template_content': template_content,
+                    'summary': (
+                        f'nivel={nivel_actual}, puntos={int(puntos)}, '
+                        f'desc={config.birthday_discount_percentage}%'
+                    ),
+                },
+            ))
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'\nEnviaría: {sent_count} promos de cumpleaños. Omitidos: {skipped_count}.'
+            ))
+            return
+
+        # Enviar templates WA (pool con ritmo limitado)
+        campaign.send(messages, send=lambda message, http: sender.send_template_message(
+            to=message.to,
+            template_name=config.wa_template_name,
+            language_code=config.wa_template_language,
+            components=message.payload['components'],
+        ))
 
-            # Registrar envío exitoso
-            PromoBirthdaySent.objects.create(
+        # Registrar todos los envíos (incluye los de una corrida cortada,
+        # aunque el cliente ya no esté en la audiencia de hoy)
+        results = campaign.results()
+        missing = [key for key in results if key not in clients_by_key]
+        if missing:
+            clients_by_key.update(
+                (str(client.id), client) for client in Clients.objects.filter(id__in=missing)
+            )
+        logs = []
+        history = []
+        for key, entry in results.items():
+            client = clients_by_key.get(key)
+            if client is None:
+                continue
+            client_name = f"{client.first_name} {client.last_name or ''}".strip()
+            wa_message_id = entry['result']
+            record = entry['record']
+            logs.append(PromoBirthdaySent(
                 client=client,
                 year=target_date.year,
                 wa_message_id=wa_message_id,
-                status='sent',
-            )
-
-            ChatSession.register_outbound_template(
-                phone_number=phone,
-                content=f"[Promo cumpleaños - Enviado OK]\n\n{template_content}",
-                intent='promo_birthday',
-                client=client,
-            )
-
-            sent_count += 1
-            self.stdout.write(
-                f'  ENVIADO {client_name}: nivel={nivel_actual}, '
-                f'puntos={int(puntos)}, desc={config.birthday_discount_percentage}%'
-            )
+                status='sent' if wa_message_id else 'failed',
+            ))
+            if wa_message_id:
+                content = f"[Promo cumpleaños - Enviado OK]\n\n{record['template_content']}"
+                sent_count += 1
+                self.stdout.write(f"  ENVIADO {client_name}: {record['summary']}")
+            else:
+                content = f"[Promo cumpleaños - ERROR]\n\n{record['template_content']}"
+                skipped_count += 1
+                self.stdout.write(self.style.ERROR(
+                    f'  ERROR {client_name}: envío WA falló'
+                ))
+            history.append({
+                'phone_number': client.tel_number,
+                'content': content,
+                'intent': 'promo_birthday',
+                'client': client,
+            })
+
+        with transaction.atomic():
+            PromoBirthdaySent.objects.bulk_create(logs, ignore_conflicts=True)
+            ChatSession.register_outbound_templates(history)
+        campaign.finish()
 
-        action = 'Enviaría' if dry_run else 'Enviados'
         self.stdout.write(self.style.SUCCESS(
-            f'\n{action}: {sent_count} promos de cumpleaños. Omitidos: {skipped_count}.'
+            f'\nEnviados: {sent_count} promos de cumpleaños. Omitidos: {skipped_count}.'
         ))
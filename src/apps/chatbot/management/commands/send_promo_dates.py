@@ -6,7 +6,9 @@ Lógica:
 2. Calcula fecha objetivo: hoy + days_before_checkin
 3. Busca en SearchTracking clientes que buscaron esa check_in_date
 4. Excluye clientes con reserva activa/futura y clientes que ya recibieron promo
-5. Para cada cliente elegible: verifica disponibilidad, genera código, envía template WA
+5. Para cada cliente elegible: verifica disponibilidad, genera código y arma el template
+6. Envía con apps.chatbot.campaigns (pool con ritmo limitado, reanudable)
+   y registra PromoDateSent + historial de chat con bulk_create
 
 Uso: python manage.py send_promo_dates [--dry-run]
 Cron recomendado: diario 9am
@@ -16,12 +18,13 @@ import re
 from datetime import date, timedelta
 
 from django.core.management.base import BaseCommand
-from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
 
 from apps.chatbot.models import (
     ChatSession, ChatMessage, PromoDateConfig, PromoDateSent,
 )
+from apps.chatbot.campaigns import Campaign, CampaignMessage
 from apps.chatbot.whatsapp_sender import WhatsAppSender
 from apps.clients.models import SearchTracking
 
@@ -46,6 +49,36 @@ def select_best_search(searches):
     return best.check_out_date, selected_guests
 
 
+def _casas_text(properties):
+    """Detalle de casas con precio (tachado si hay descuento) para el template."""
+    casas_detalle = []
+    for p in properties:
+        original = float(p.get('subtotal_sol', p.get('final_price_sol', 0)))
+        final = float(p.get('final_price_sol', 0))
+        if original > final:
+            casas_detalle.append(
+                f"{p['property_name']}: ~S/{original:.0f}~ *S/{final:.0f}*"
+            )
+        else:
+            casas_detalle.append(
+                f"{p['property_name']}: *S/{final:.0f}*"
+            )
+    return ' | '.join(casas_detalle)
+
+
+def _fechas_str(pricing_service, check_in_date, check_out_date):
+    try:
+        mes_in = pricing_service._get_month_name_spanish(check_in_date.month)
+        mes_out = pricing_service._get_month_name_spanish(check_out_date.month)
+    except Exception:
+        mes_in = str(check_in_date.month)
+        mes_out = str(check_out_date.month)
+
+    if check_in_date.month == check_out_date.month:
+        return f"{check_in_date.day}-{check_out_date.day} de {mes_in}"
+    return f"{check_in_date.day} de {mes_in} al {check_out_date.day} de {mes_out}"
+
+
 class Command(BaseCommand):
     help = 'Envía promos automáticas por fechas buscadas que siguen disponibles'
 
@@ -87,25 +120,20 @@ class Command(BaseCommand):
             session_key__startswith='chatbot_',
         )
 
-        if not client_searches_qs.exists() and not chatbot_anon_searches.exists():
-            self.stdout.write('No hay búsquedas de clientes para esa fecha.')
-            return
-
         # Agrupar por cliente (registrados)
         client_searches = {}
         for s in client_searches_qs:
-            client_id = s.client_id
-            if client_id not in client_searches:
-                client_searches[client_id] = []
-            client_searches[client_id].append(s)
+            client_searches.setdefault(s.client_id, []).append(s)
 
         # Agrupar búsquedas anónimas del chatbot por wa_id
         anon_searches = {}
         for s in chatbot_anon_searches:
             wa_id = s.session_key.replace('chatbot_', '')
-            if wa_id not in anon_searches:
-                anon_searches[wa_id] = []
-            anon_searches[wa_id].append(s)
+            anon_searches.setdefault(wa_id, []).append(s)
+
+        if not client_searches and not anon_searches:
+            self.stdout.write('No hay búsquedas de clientes para esa fecha.')
+            return
 
         self.stdout.write(
             f'Clientes registrados que buscaron {target_date}: {len(client_searches)}, '
@@ -120,6 +148,7 @@ class Command(BaseCommand):
                 status__in=['approved', 'pending', 'incomplete', 'under_review'],
                 check_in_date__lte=target_date,
                 check_out_date__gt=target_date,
+                client_id__in=list(client_searches),
             ).values_list('client_id', flat=True)
         )
 
@@ -141,21 +170,17 @@ class Command(BaseCommand):
             recent_promos = PromoDateSent.objects.filter(
                 created__gte=cooldown_cutoff,
                 deleted=False,
-            )
-            clients_in_cooldown = set(
-                recent_promos.filter(client__isnull=False)
-                .values_list('client_id', flat=True)
-            )
-            # También trackear teléfonos para anónimos del chatbot
-            anon_phones_in_cooldown = set()
-            for p in recent_promos.filter(client__isnull=False).select_related('client'):
-                if p.client and p.client.tel_number:
-                    digits = re.sub(r'\D', '', p.client.tel_number)
-                    if digits:
-                        anon_phones_in_cooldown.add(digits)
-                        # Añadir variante sin el "51" inicial por si el wa_id no lo trae
-                        if digits.startswith('51') and len(digits) > 9:
-                            anon_phones_in_cooldown.add(digits[2:])
+                client__isnull=False,
+            ).values_list('client_id', 'client__tel_number')
+            for client_id, tel_number in recent_promos:
+                clients_in_cooldown.add(client_id)
+                # También trackear teléfonos para anónimos del chatbot
+                digits = re.sub(r'\D', '', tel_number or '')
+                if digits:
+                    anon_phones_in_cooldown.add(digits)
+                    # Añadir variante sin el "51" inicial por si el wa_id no lo trae
+                    if digits.startswith('51') and len(digits) > 9:
+                        anon_phones_in_cooldown.add(digits[2:])
 
         # Opcionalmente excluir clientes con chat activo < 24h
         clients_recent_chat = set()
@@ -169,192 +194,96 @@ class Command(BaseCommand):
                 ).values_list('client_id', flat=True)
             )
 
-        sent_count = 0
-        skipped_count = 0
+        from apps.property.pricing_service import PricingCalculationService
+        pricing_service = PricingCalculationService()
 
+        campaign = None if dry_run else Campaign(f'promo_dates:{target_date.isoformat()}')
+        sender = WhatsAppSender(http=campaign.http if campaign else None)
+        discount_pct = int(config.discount_config.discount_percentage)
+
+        self.sent_count = 0
+        self.skipped_count = 0
+        # key de campaña → nombre para el log de consola
+        audience = {}
+        messages = []
+        new_sessions = []
+
+        eligible_clients = []
         for client_id, client_search_list in client_searches.items():
             client = client_search_list[0].client
             client_name = f"{client.first_name} {client.last_name or ''}".strip()
+            key = f'client:{client.id}'
+
+            # Enviado en una corrida anterior que se cortó: solo falta el log,
+            # aunque ahora caiga en una exclusión (p.ej. ya respondió)
+            if campaign and campaign.is_done(key):
+                audience[key] = client_name
+                continue
 
             # Exclusiones
             if client_id in clients_with_reservation:
-                self.stdout.write(f'  SKIP {client_name}: tiene reserva activa')
-                skipped_count += 1
+                self._skip(f'{client_name}: tiene reserva activa')
                 continue
 
             if client_id in clients_already_promo:
-                self.stdout.write(f'  SKIP {client_name}: ya recibió promo')
-                skipped_count += 1
+                self._skip(f'{client_name}: ya recibió promo')
                 continue
 
             if client_id in clients_in_cooldown:
-                self.stdout.write(
-                    f'  SKIP {client_name}: cooldown ({cooldown_days}d) — '
+                self._skip(
+                    f'{client_name}: cooldown ({cooldown_days}d) — '
                     f'recibió promo recientemente para otra fecha'
                 )
-                skipped_count += 1
                 continue
 
             if client_id in clients_recent_chat:
-                self.stdout.write(f'  SKIP {client_name}: chat activo < 24h')
-                skipped_count += 1
+                self._skip(f'{client_name}: chat activo < 24h')
                 continue
 
             # Verificar min_search_count
             if len(client_search_list) < config.min_search_count:
-                self.stdout.write(f'  SKIP {client_name}: solo {len(client_search_list)} búsqueda(s)')
-                skipped_count += 1
+                self._skip(f'{client_name}: solo {len(client_search_list)} búsqueda(s)')
                 continue
 
             # Verificar que el cliente tiene teléfono
-            phone = client.tel_number
-            if not phone:
-                self.stdout.write(f'  SKIP {client_name}: sin teléfono')
-                skipped_count += 1
+            if not client.tel_number:
+                self._skip(f'{client_name}: sin teléfono')
                 continue
 
-            # Seleccionar mejor búsqueda (personas y check_out)
-            check_out_date, guests = select_best_search(client_search_list)
-
-            # Verificar disponibilidad y calcular pricing
-            try:
-                from apps.property.pricing_service import PricingCalculationService
-                pricing_service = PricingCalculationService()
-                pricing_result = pricing_service.calculate_pricing(
-                    check_in_date=target_date,
-                    check_out_date=check_out_date,
-                    guests=guests,
-                    client_id=str(client.id),
-                )
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'  ERROR {client_name}: pricing falló: {e}'
-                ))
-                continue
+            eligible_clients.append((client, client_name, client_search_list))
 
-            # Verificar que hay propiedades disponibles
-            available_properties = [
-                p for p in pricing_result.get('properties', [])
-                if p.get('available')
-            ]
+        # Sesión más reciente de cada cliente elegible, en una consulta
+        client_sessions = {}
+        for session in ChatSession.objects.filter(
+            client_id__in=[c.id for c, _, _ in eligible_clients], deleted=False,
+        ).order_by('-last_message_at'):
+            client_sessions.setdefault(session.client_id, session)
 
-            if not available_properties:
-                self.stdout.write(f'  SKIP {client_name}: sin disponibilidad')
-                skipped_count += 1
-                continue
+        for client, client_name, client_search_list in eligible_clients:
+            phone = client.tel_number
+            key = f'client:{client.id}'
+            audience[key] = client_name
 
-            if dry_run:
-                casas = ', '.join(p['property_name'] for p in available_properties)
-                self.stdout.write(
-                    f'  [DRY] {client_name} ({phone}): '
-                    f'{target_date} → {check_out_date}, {guests}p, '
-                    f'casas: {casas}'
-                )
-                sent_count += 1
-                continue
+            # Seleccionar mejor búsqueda (personas y check_out)
+            check_out_date, guests = select_best_search(client_search_list)
 
-            # Generar código de descuento
-            try:
-                discount_code = config.discount_config.generate_code()
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'  ERROR {client_name}: no se pudo generar código: {e}'
-                ))
+            rendered = self._render(
+                config, pricing_service, sender, client_name, target_date,
+                check_out_date, guests, client_id=str(client.id), dry_run=dry_run,
+                label=f'{client_name} ({phone})', dry_tag='DRY',
+            )
+            if rendered is None:
                 continue
 
-            # Recalcular pricing con descuento
-            try:
-                pricing_with_discount = pricing_service.calculate_pricing(
-                    check_in_date=target_date,
-                    check_out_date=check_out_date,
-                    guests=guests,
-                    client_id=str(client.id),
-                    discount_code=discount_code.code,
-                )
-                available_with_discount = [
-                    p for p in pricing_with_discount.get('properties', [])
-                    if p.get('available')
-                ]
-            except Exception:
-                available_with_discount = available_properties
-
-            # Construir detalle de casas para el template
-            casas_detalle = []
-            for p in available_with_discount:
-                original = float(p.get('subtotal_sol', p.get('final_price_sol', 0)))
-                final = float(p.get('final_price_sol', 0))
-                if original > final:
-                    casas_detalle.append(
-                        f"{p['property_name']}: ~S/{original:.0f}~ *S/{final:.0f}*"
-                    )
-                else:
-                    casas_detalle.append(
-                        f"{p['property_name']}: *S/{final:.0f}*"
-                    )
-            casas_text = ' | '.join(casas_detalle)
-
-            # Formatear fechas
-            from apps.property.pricing_service import PricingCalculationService as PCS
-            try:
-                svc = PCS()
-                mes_in = svc._get_month_name_spanish(target_date.month)
-                mes_out = svc._get_month_name_spanish(check_out_date.month)
-            except Exception:
-                mes_in = str(target_date.month)
-                mes_out = str(check_out_date.month)
-
-            if target_date.month == check_out_date.month:
-                fechas_str = f"{target_date.day}-{check_out_date.day} de {mes_in}"
-            else:
-                fechas_str = f"{target_date.day} de {mes_in} al {check_out_date.day} de {mes_out}"
-
-            discount_pct = int(config.discount_config.discount_percentage)
-
             # Primer nombre con fallback para evitar saludo vacío
             client_fn = (client.first_name or '').split()[0] if client.first_name else ''
             if not client_fn or client_fn.lower() in ('hola', 'hello', 'hi'):
                 client_fn = 'amig@'
 
-            # Construir componentes del template
-            components = [
-                {
-                    'type': 'body',
-                    'parameters': [
-                        {'type': 'text', 'text': client_fn},
-                        {'type': 'text', 'text': fechas_str},
-                        {'type': 'text', 'text': str(guests)},
-                        {'type': 'text', 'text': casas_text},
-                        {'type': 'text', 'text': discount_code.code},
-                        {'type': 'text', 'text': str(discount_pct)},
-                    ]
-                }
-            ]
-
-            # Enviar template WA
-            sender = WhatsAppSender()
-            wa_message_id = sender.send_template_message(
-                to=phone,
-                template_name=config.wa_template_name,
-                language_code=config.wa_template_language,
-                components=components,
-            )
-
-            # Obtener contenido real de la plantilla renderizada
-            rendered = sender.render_template(
-                config.wa_template_name, config.wa_template_language, components
-            )
-            template_content = rendered or (
-                f"Fechas: {fechas_str} ({guests} personas) | "
-                f"Casas: {casas_text} | Código: {discount_code.code} ({discount_pct}% desc)"
-            )
-
             # Obtener/crear sesión de chat
-            session = ChatSession.objects.filter(
-                client=client, deleted=False
-            ).order_by('-last_message_at').first()
-
+            session = client_sessions.get(client.id)
             if not session:
-                session = ChatSession.objects.create(
+                session = ChatSession(
                     channel='whatsapp',
                     wa_id=phone,
                     wa_profile_name=client_name,
@@ -362,86 +291,13 @@ class Command(BaseCommand):
                     status='active',
                     ai_enabled=True,
                 )
+                client_sessions[client.id] = session
+                new_sessions.append(session)
 
-            if not wa_message_id:
-                self.stdout.write(self.style.ERROR(
-                    f'  ERROR {client_name}: envío WA falló'
-                ))
-                PromoDateSent.objects.create(
-                    client=client,
-                    check_in_date=target_date,
-                    check_out_date=check_out_date,
-                    guests=guests,
-                    discount_code=discount_code,
-                    wa_message_id=None,
-                    session=session,
-                    message_content=casas_text,
-                    pricing_snapshot={
-                        'properties': [
-                            {
-                                'name': p['property_name'],
-                                'final_price_sol': float(p.get('final_price_sol', 0)),
-                            }
-                            for p in available_with_discount
-                        ],
-                        'discount_percentage': discount_pct,
-                    },
-                    status='failed',
-                )
-                ChatMessage.objects.create(
-                    session=session,
-                    direction='system',
-                    message_type='text',
-                    content=f"[Promo fechas - ERROR] No se pudo enviar:\n\n{template_content}",
-                    intent_detected='promo_date',
-                )
-                session.total_messages += 1
-                session.last_message_at = timezone.now()
-                session.save(update_fields=['total_messages', 'last_message_at'])
-                continue
-
-            # Registrar en PromoDateSent
-            PromoDateSent.objects.create(
-                client=client,
-                check_in_date=target_date,
-                check_out_date=check_out_date,
-                guests=guests,
-                discount_code=discount_code,
-                wa_message_id=wa_message_id,
-                session=session,
-                message_content=casas_text,
-                pricing_snapshot={
-                    'properties': [
-                        {
-                            'name': p['property_name'],
-                            'final_price_sol': float(p.get('final_price_sol', 0)),
-                        }
-                        for p in available_with_discount
-                    ],
-                    'discount_percentage': discount_pct,
-                    'discount_code': discount_code.code,
-                },
-                status='sent',
-            )
-
-            ChatMessage.objects.create(
-                session=session,
-                direction='system',
-                message_type='text',
-                content=f"[Promo fechas - Enviado OK]\n\n{template_content}",
-                wa_message_id=wa_message_id,
-                intent_detected='promo_date',
-            )
-
-            session.total_messages += 1
-            session.last_message_at = timezone.now()
-            session.save(update_fields=['total_messages', 'last_message_at'])
-
-            sent_count += 1
-            self.stdout.write(
-                f'  ENVIADO {client_name}: {discount_code.code} '
-                f'({discount_pct}%) - {casas_text[:60]}'
-            )
+            messages.append(self._message(
+                key, phone, client_fn, rendered, config, sender,
+                record={'client_id': client.id, 'session_id': session.id},
+            ))
 
         # === BÚSQUEDAS ANÓNIMAS DEL CHATBOT (personas que cotizaron sin registrarse) ===
         if anon_searches:
@@ -478,20 +334,32 @@ class Command(BaseCommand):
                     ).values_list('wa_id', flat=True)
                 )
 
+            # Sesión más reciente de cada wa_id, en una consulta
+            anon_sessions = {}
+            for session in ChatSession.objects.filter(
+                wa_id__in=list(anon_searches), deleted=False,
+            ).select_related('client').order_by('-last_message_at'):
+                anon_sessions.setdefault(session.wa_id, session)
+
             self.stdout.write(f'\n--- Procesando {len(anon_searches)} búsquedas anónimas del chatbot ---')
 
             for wa_id, search_list in anon_searches.items():
                 wa_digits = re.sub(r'\D', '', wa_id)
+                session = anon_sessions.get(wa_id)
+                contact_name = session.wa_profile_name if session else wa_id
+                key = f'wa:{wa_id}'
+
+                if campaign and campaign.is_done(key):
+                    audience[key] = f'[ANON] {contact_name} ({wa_id})'
+                    continue
 
                 # Dedup: si ya procesamos este teléfono como cliente registrado
                 if wa_digits in processed_phones or wa_digits[2:] in processed_phones:
-                    self.stdout.write(f'  SKIP {wa_id}: ya procesado como cliente registrado')
-                    skipped_count += 1
+                    self._skip(f'{wa_id}: ya procesado como cliente registrado')
                     continue
 
                 if wa_digits in already_promo_phones:
-                    self.stdout.write(f'  SKIP {wa_id}: ya recibió promo')
-                    skipped_count += 1
+                    self._skip(f'{wa_id}: ya recibió promo')
                     continue
 
                 # COOLDOWN para anónimos: si el teléfono coincide con uno que
@@ -501,112 +369,33 @@ class Command(BaseCommand):
                     wa_digits in anon_phones_in_cooldown
                     or wa_digits_short in anon_phones_in_cooldown
                 ):
-                    self.stdout.write(
-                        f'  SKIP {wa_id}: cooldown ({cooldown_days}d) — '
+                    self._skip(
+                        f'{wa_id}: cooldown ({cooldown_days}d) — '
                         f'cliente recibió promo recientemente'
                     )
-                    skipped_count += 1
                     continue
 
                 if wa_id in anon_recent_chat:
-                    self.stdout.write(f'  SKIP {wa_id}: chat activo < 24h')
-                    skipped_count += 1
+                    self._skip(f'{wa_id}: chat activo < 24h')
                     continue
 
                 if len(search_list) < config.min_search_count:
-                    self.stdout.write(f'  SKIP {wa_id}: solo {len(search_list)} búsqueda(s)')
-                    skipped_count += 1
+                    self._skip(f'{wa_id}: solo {len(search_list)} búsqueda(s)')
                     continue
 
+                audience[key] = f'[ANON] {contact_name} ({wa_id})'
+
                 # Seleccionar mejor búsqueda
                 check_out_date, guests = select_best_search(search_list)
 
-                # Obtener nombre del perfil WA
-                session = ChatSession.objects.filter(
-                    wa_id=wa_id, deleted=False
-                ).order_by('-last_message_at').first()
-                contact_name = session.wa_profile_name if session else wa_id
-
-                # Verificar disponibilidad
-                try:
-                    from apps.property.pricing_service import PricingCalculationService
-                    pricing_service = PricingCalculationService()
-                    pricing_result = pricing_service.calculate_pricing(
-                        check_in_date=target_date,
-                        check_out_date=check_out_date,
-                        guests=guests,
-                    )
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ERROR {wa_id}: pricing falló: {e}'))
-                    continue
-
-                available_properties = [
-                    p for p in pricing_result.get('properties', [])
-                    if p.get('available')
-                ]
-                if not available_properties:
-                    self.stdout.write(f'  SKIP {wa_id}: sin disponibilidad')
-                    skipped_count += 1
-                    continue
-
-                if dry_run:
-                    casas = ', '.join(p['property_name'] for p in available_properties)
-                    self.stdout.write(
-                        f'  [DRY/ANON] {contact_name} ({wa_id}): '
-                        f'{target_date} → {check_out_date}, {guests}p, '
-                        f'casas: {casas}'
-                    )
-                    sent_count += 1
-                    continue
-
-                # Generar código de descuento
-                try:
-                    discount_code = config.discount_config.generate_code()
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'  ERROR {wa_id}: no se pudo generar código: {e}'))
+                rendered = self._render(
+                    config, pricing_service, sender, wa_id, target_date,
+                    check_out_date, guests, dry_run=dry_run,
+                    label=f'{contact_name} ({wa_id})', dry_tag='DRY/ANON',
+                )
+                if rendered is None:
                     continue
 
-                # Recalcular pricing con descuento
-                try:
-                    pricing_with_discount = pricing_service.calculate_pricing(
-                        check_in_date=target_date,
-                        check_out_date=check_out_date,
-                        guests=guests,
-                        discount_code=discount_code.code,
-                    )
-                    available_with_discount = [
-                        p for p in pricing_with_discount.get('properties', [])
-                        if p.get('available')
-                    ]
-                except Exception:
-                    available_with_discount = available_properties
-
-                casas_detalle = []
-                for p in available_with_discount:
-                    original = float(p.get('subtotal_sol', p.get('final_price_sol', 0)))
-                    final = float(p.get('final_price_sol', 0))
-                    if original > final:
-                        casas_detalle.append(f"{p['property_name']}: ~S/{original:.0f}~ *S/{final:.0f}*")
-                    else:
-                        casas_detalle.append(f"{p['property_name']}: *S/{final:.0f}*")
-                casas_text = ' | '.join(casas_detalle)
-
-                # Formatear fechas
-                try:
-                    svc = PricingCalculationService()
-                    mes_in = svc._get_month_name_spanish(target_date.month)
-                    mes_out = svc._get_month_name_spanish(check_out_date.month)
-                except Exception:
-                    mes_in = str(target_date.month)
-                    mes_out = str(check_out_date.month)
-
-                if target_date.month == check_out_date.month:
-                    fechas_str = f"{target_date.day}-{check_out_date.day} de {mes_in}"
-                else:
-                    fechas_str = f"{target_date.day} de {mes_in} al {check_out_date.day} de {mes_out}"
-
-                discount_pct = int(config.discount_config.discount_percentage)
-
                 # Usar primer nombre del perfil WA. Si no hay nombre real o el
                 # perfil contiene literalmente "Hola" (evita "Hola Hola 👋"),
                 # intentar el first_name del cliente; sino usar placeholder neutro.
@@ -619,114 +408,228 @@ class Command(BaseCommand):
                     else:
                         first_name = 'amig@'
 
-                components = [
-                    {
-                        'type': 'body',
-                        'parameters': [
-                            {'type': 'text', 'text': first_name},
-                            {'type': 'text', 'text': fechas_str},
-                            {'type': 'text', 'text': str(guests)},
-                            {'type': 'text', 'text': casas_text},
-                            {'type': 'text', 'text': discount_code.code},
-                            {'type': 'text', 'text': str(discount_pct)},
-                        ]
-                    }
-                ]
+                messages.append(self._message(
+                    key, wa_id, first_name, rendered, config, sender,
+                    record={
+                        'client_id': None,
+                        'session_id': session.id if session else None,
+                        'wa_id': wa_id,
+                    },
+                ))
 
-                sender = WhatsAppSender()
-                wa_message_id = sender.send_template_message(
-                    to=wa_id,
-                    template_name=config.wa_template_name,
-                    language_code=config.wa_template_language,
-                    components=components,
-                )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'\nEnviaría: {self.sent_count} promos. Omitidos: {self.skipped_count}.'
+            ))
+            return
 
-                # Obtener contenido real de la plantilla renderizada
-                rendered = sender.render_template(
-                    config.wa_template_name, config.wa_template_language, components
-                )
-                template_content = rendered or (
-                    f"Fechas: {fechas_str} ({guests} personas) | "
-                    f"Casas: {casas_text} | Código: {discount_code.code} ({discount_pct}% desc)"
-                )
+        # Sesiones nuevas antes de enviar: el journal guarda su id
+        ChatSession.objects.bulk_create(new_sessions)
 
-                if not wa_message_id:
-                    self.stdout.write(self.style.ERROR(f'  ERROR {wa_id}: envío WA falló'))
-                    PromoDateSent.objects.create(
-                        client=None,
-                        check_in_date=target_date,
-                        check_out_date=check_out_date,
-                        guests=guests,
-                        discount_code=discount_code,
-                        wa_message_id=None,
-                        session=session,
-                        message_content=casas_text,
-                        pricing_snapshot={
-                            'properties': [
-                                {'name': p['property_name'], 'final_price_sol': float(p.get('final_price_sol', 0))}
-                                for p in available_with_discount
-                            ],
-                            'discount_percentage': discount_pct,
-                            'wa_id': wa_id,
-                        },
-                        status='failed',
-                    )
-                    if session:
-                        ChatMessage.objects.create(
-                            session=session,
-                            direction='system',
-                            message_type='text',
-                            content=f"[Promo fechas - ERROR] No se pudo enviar:\n\n{template_content}",
-                            intent_detected='promo_date',
-                        )
-                        session.total_messages += 1
-                        session.last_message_at = timezone.now()
-                        session.save(update_fields=['total_messages', 'last_message_at'])
-                    skipped_count += 1
-                    continue
+        # Enviar templates WA (pool con ritmo limitado)
+        campaign.send(messages, send=lambda message, http: sender.send_template_message(
+            to=message.to,
+            template_name=config.wa_template_name,
+            language_code=config.wa_template_language,
+            components=message.payload['components'],
+        ))
 
-                # Registrar en PromoDateSent (sin client, con session)
-                PromoDateSent.objects.create(
-                    client=None,
-                    check_in_date=target_date,
-                    check_out_date=check_out_date,
-                    guests=guests,
-                    discount_code=discount_code,
-                    wa_message_id=wa_message_id,
-                    session=session,
-                    message_content=casas_text,
-                    pricing_snapshot={
-                        'properties': [
-                            {'name': p['property_name'], 'final_price_sol': float(p.get('final_price_sol', 0))}
-                            for p in available_with_discount
-                        ],
-                        'discount_percentage': discount_pct,
-                        'discount_code': discount_code.code,
-                        'wa_id': wa_id,
-                    },
-                    status='sent',
-                )
+        self._write_logs(campaign, audience, target_date, discount_pct)
+        campaign.finish()
 
-                if session:
-                    ChatMessage.objects.create(
-                        session=session,
-                        direction='system',
-                        message_type='text',
-                        content=f"[Promo fechas - Enviado OK]\n\n{template_content}",
-                        wa_message_id=wa_message_id,
-                        intent_detected='promo_date',
-                    )
-                    session.total_messages += 1
-                    session.last_message_at = timezone.now()
-                    session.save(update_fields=['total_messages', 'last_message_at'])
+        self.stdout.write(self.style.SUCCESS(
+            f'\nEnviados: {self.sent_count} promos. Omitidos: {self.skipped_count}.'
+        ))
 
-                sent_count += 1
+    def _skip(self, reason):
+        self.stdout.write(f'  SKIP {reason}')
+        self.skipped_count += 1
+
+    def _render(self, config, pricing_service, sender, name, target_date,
+                check_out_date, guests, dry_run, label, dry_tag, client_id=None):
+        """
+        Verifica disponibilidad, genera el código y arma el detalle de
+        casas con el descuento aplicado. None si no corresponde enviar.
+        """
+        client_kwargs = {'client_id': client_id} if client_id else {}
+
+        # Verificar disponibilidad y calcular pricing
+        try:
+            pricing_result = pricing_service.calculate_pricing(
+                check_in_date=target_date,
+                check_out_date=check_out_date,
+                guests=guests,
+                **client_kwargs,
+            )
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(
+                f'  ERROR {name}: pricing falló: {e}'
+            ))
+            return None
+
+        # Verificar que hay propiedades disponibles
+        available_properties = [
+            p for p in pricing_result.get('properties', [])
+            if p.get('available')
+        ]
+
+        if not available_properties:
+            self._skip(f'{name}: sin disponibilidad')
+            return None
+
+        if dry_run:
+            casas = ', '.join(p['property_name'] for p in available_properties)
+            self.stdout.write(
+                f'  [{dry_tag}] {label}: '
+                f'{target_date} → {check_out_date}, {guests}p, '
+                f'casas: {casas}'
+            )
+            self.sent_count += 1
+            return None
+
+        # Generar código de descuento
+        try:
+            discount_code = config.discount_config.generate_code()
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(
+                f'  ERROR {name}: no se pudo generar código: {e}'
+            ))
+            return None
+
+        # Recalcular pricing con descuento
+        try:
+            pricing_with_discount = pricing_service.calculate_pricing(
+                check_in_date=target_date,
+                check_out_date=check_out_date,
+                guests=guests,
+                discount_code=discount_code.code,
+                **client_kwargs,
+            )
+            available_with_discount = [
+                p for p in pricing_with_discount.get('properties', [])
+                if p.get('available')
+            ]
+        except Exception:
+            available_with_discount = available_properties
+
+        return {
+            'check_out_date': check_out_date,
+            'guests': guests,
+            'discount_code': discount_code,
+            'properties': available_with_discount,
+            'casas_text': _casas_text(available_with_discount),
+            'fechas_str': _fechas_str(pricing_service, target_date, check_out_date),
+        }
+
+    def _message(self, key, to, first_name, rendered, config, sender, record):
+        """Componentes del template + datos del log (serializables) del envío."""
+        discount_code = rendered['discount_code']
+        discount_pct = int(config.discount_config.discount_percentage)
+        fechas_str = rendered['fechas_str']
+        guests = rendered['guests']
+        casas_text = rendered['casas_text']
+
+        components = [
+            {
+                'type': 'body',
+                'parameters': [
+                    {'type': 'text', 'text': first_name},
+                    {'type': 'text', 'text': fechas_str},
+                    {'type': 'text', 'text': str(guests)},
+                    {'type': 'text', 'text': casas_text},
+                    {'type': 'text', 'text': discount_code.code},
+                    {'type': 'text', 'text': str(discount_pct)},
+                ]
+            }
+        ]
+
+        # Contenido real de la plantilla renderizada (el body se pide a Meta una vez)
+        rendered_template = sender.render_template(
+            config.wa_template_name, config.wa_template_language, components
+        )
+        template_content = rendered_template or (
+            f"Fechas: {fechas_str} ({guests} personas) | "
+            f"Casas: {casas_text} | Código: {discount_code.code} ({discount_pct}% desc)"
+        )
+
+        return CampaignMessage(
+            key=key,
+            to=to,
+            payload={'components': components},
+            record={
+                **record,
+                'check_out_date': rendered['check_out_date'],
+                'guests': guests,
+                'discount_code_id': discount_code.id,
+                'discount_code': discount_code.code,
+                'message_content': casas_text,
+                'properties': [
+                    {
+                        'name': p['property_name'],
+                        'final_price_sol': float(p.get('final_price_sol', 0)),
+                    }
+                    for p in rendered['properties']
+                ],
+                'template_content': template_content,
+            },
+        )
+
+    def _write_logs(self, campaign, audience, target_date, discount_pct):
+        """PromoDateSent + mensaje de sistema en el chat, en lote, para todos
+        los envíos de la campaña (incluidos los de una corrida cortada, estén
+        o no en la audiencia de esta corrida: finish() borra el journal)."""
+        promos = []
+        chat_messages = []
+        for key, entry in campaign.results().items():
+            name = audience.get(key, key)
+            record = entry['record']
+            wa_message_id = entry['result']
+
+            pricing_snapshot = {
+                'properties': record['properties'],
+                'discount_percentage': discount_pct,
+            }
+            if wa_message_id:
+                pricing_snapshot['discount_code'] = record['discount_code']
+            if record.get('wa_id'):
+                pricing_snapshot['wa_id'] = record['wa_id']
+
+            promos.append(PromoDateSent(
+                client_id=record['client_id'],
+                check_in_date=target_date,
+                check_out_date=record['check_out_date'],
+                guests=record['guests'],
+                discount_code_id=record['discount_code_id'],
+                wa_message_id=wa_message_id,
+                session_id=record['session_id'],
+                message_content=record['message_content'],
+                pricing_snapshot=pricing_snapshot,
+                status='sent' if wa_message_id else 'failed',
+            ))
+
+            if wa_message_id:
+                content = f"[Promo fechas - Enviado OK]\n\n{record['template_content']}"
+                self.sent_count += 1
                 self.stdout.write(
-                    f'  ENVIADO [ANON] {contact_name} ({wa_id}): {discount_code.code} '
-                    f'({discount_pct}%) - {casas_text[:60]}'
+                    f"  ENVIADO {name}: {record['discount_code']} "
+                    f"({discount_pct}%) - {record['message_content'][:60]}"
                 )
+            else:
+                content = f"[Promo fechas - ERROR] No se pudo enviar:\n\n{record['template_content']}"
+                if record.get('wa_id'):
+                    self.skipped_count += 1
+                self.stdout.write(self.style.ERROR(f'  ERROR {name}: envío WA falló'))
+
+            if record['session_id']:
+                chat_messages.append(ChatMessage(
+                    session_id=record['session_id'],
+                    direction='system',
+                    message_type='text',
+                    content=content,
+                    wa_message_id=wa_message_id,
+                    intent_detected='promo_date',
+                ))
 
-        action = 'Enviaría' if dry_run else 'Enviados'
-        self.stdout.write(self.style.SUCCESS(
-            f'\n{action}: {sent_count} promos. Omitidos: {skipped_count}.'
-        ))
+        with transaction.atomic():
+            PromoDateSent.objects.bulk_create(promos)
+            ChatSession.bulk_log_messages(chat_messages)
@@ -226,10 +226,9 @@ class Command(BaseCommand):
 
     def _send_rescue(self, session, config):
         """Genera y envía el mensaje de rescate rápido usando IA."""
-        import openai
-        from django.conf import settings
+        from apps.core import ai_gateway
 
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        client = ai_gateway.client('chatbot')
 
         # Últimos 10 mensajes para contexto
         recent_msgs = ChatMessage.objects.filter(
@@ -8,7 +8,9 @@ logger = logging.getLogger(__name__)
 class MessengerSender:
     """Envía mensajes por Facebook Messenger (Page Messaging API)"""
 
-    def __init__(self):
+    def __init__(self, http=None):
+        """`http`: requests.Session compartida (pool keep-alive); por defecto `requests`."""
+        self.http = http or requests
         self.access_token = os.getenv('MESSENGER_PAGE_ACCESS_TOKEN')
         self.api_url = "https://graph.facebook.com/v22.0/me/messages"
         self.headers = {
@@ -32,7 +34,7 @@ class MessengerSender:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers,
                 params={'access_token': self.access_token},
@@ -58,7 +60,7 @@ class MessengerSender:
         }
 
         try:
-            requests.post(
+            self.http.post(
                 self.api_url, json=payload,
                 params={'access_token': self.access_token},
                 headers=self.headers, timeout=10
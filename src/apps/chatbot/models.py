@@ -1,7 +1,9 @@
 import re
 import logging
+from collections import Counter, defaultdict
 
 from django.db import models
+from django.db.models import F
 from django.conf import settings
 from django.utils import timezone
 
@@ -160,6 +162,93 @@ class ChatSession(BaseModel):
             logger.error(f"register_outbound_template error: {e}")
             return None
 
+    @staticmethod
+    def _phone_variants(phone_number):
+        digits = re.sub(r'\D', '', phone_number)
+        variants = [digits]
+        if digits.startswith('51') and len(digits) > 9:
+            variants.append(digits[2:])
+        elif len(digits) == 9:
+            variants.append(f'51{digits}')
+        return digits, variants
+
+    @staticmethod
+    def register_outbound_templates(entries):
+        """
+        Versión en lote de register_outbound_template para campañas.
+        `entries`: dicts con phone_number, content, intent y client
+        (opcional). Resuelve todas las sesiones con una consulta, crea las
+        que faltan y guarda los mensajes con bulk_log_messages.
+        """
+        if not entries:
+            return []
+        resolved = [ChatSession._phone_variants(e['phone_number']) for e in entries]
+        all_variants = {v for _, variants in resolved for v in variants}
+
+        by_wa_id = {}
+        for session in ChatSession.objects.filter(
+            wa_id__in=all_variants, channel='whatsapp', deleted=False,
+        ).select_related('client').order_by('-last_message_at'):
+            by_wa_id.setdefault(session.wa_id, session)
+
+        new_sessions = {}
+        relink = {}
+        messages = []
+        for entry, (digits, variants) in zip(entries, resolved):
+            client = entry.get('client')
+            session = next((by_wa_id[v] for v in variants if v in by_wa_id), None)
+            if session is None and client:
+                session = new_sessions.get(digits)
+                if session is None:
+                    session = new_sessions[digits] = ChatSession(
+                        channel='whatsapp',
+                        wa_id=digits,
+                        wa_profile_name=client.first_name or '',
+                        client=client,
+                        status='active',
+                        ai_enabled=True,
+                    )
+            if session is None:
+                logger.warning(
+                    f"register_outbound_templates: no se encontró sesión para {digits} y no hay client para crearla"
+                )
+                continue
+            if client and not session.client_id:
+                session.client = client
+                relink[session.id] = session
+            messages.append(ChatMessage(
+                session=session,
+                direction='system',
+                message_type='text',
+                content=entry['content'],
+                intent_detected=entry['intent'],
+            ))
+
+        ChatSession.objects.bulk_create(new_sessions.values())
+        ChatSession.objects.bulk_update(relink.values(), ['client'])
+        return ChatSession.bulk_log_messages(messages)
+
+    @staticmethod
+    def bulk_log_messages(messages):
+        """
+        Guarda en lote mensajes (ChatMessage sin guardar) y suma
+        total_messages / last_message_at en sus sesiones, igual que los
+        envíos uno a uno. Una UPDATE por cantidad distinta de mensajes.
+        """
+        if not messages:
+            return []
+        created = ChatMessage.objects.bulk_create(messages)
+        by_count = defaultdict(list)
+        for session_id, count in Counter(m.session_id for m in created).items():
+            by_count[count].append(session_id)
+        now = timezone.now()
+        for count, session_ids in by_count.items():
+            ChatSession.objects.filter(id__in=session_ids).update(
+                total_messages=F('total_messages') + count,
+                last_message_at=now,
+            )
+        return created
+
 
 class ChatMessage(BaseModel):
     """Mensaje individual de una sesión de chat"""
@@ -203,6 +292,11 @@ class ChatMessage(BaseModel):
     confidence_score = models.FloatField(null=True, blank=True)
     ai_model = models.CharField(max_length=50, null=True, blank=True)
     tokens_used = models.PositiveIntegerField(default=0)
+    first_message_ms = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="ms desde que se empezó a procesar el turno hasta que se "
+                  "envió el primer mensaje de esta respuesta"
+    )
     tool_calls = models.JSONField(
         default=list, blank=True,
         help_text="Herramientas usadas por la IA"
@@ -217,6 +311,14 @@ class ChatMessage(BaseModel):
         verbose_name = '📝 Mensaje de Chat'
         verbose_name_plural = '📝 Mensajes de Chat'
         ordering = ['created']
+        indexes = [
+            # Ventana de historial por turno (ConversationContext). Sin
+            # `deleted`: `NOT deleted` cortaría el índice antes de `created`
+            # y el ORDER BY necesitaría un sort
+            models.Index(fields=['session', 'created']),
+            # Último inbound / últimas respuestas IA de la sesión
+            models.Index(fields=['session', 'direction', 'created']),
+        ]
 
     def __str__(self):
         preview = self.content[:50] + '...' if len(self.content) > 50 else self.content
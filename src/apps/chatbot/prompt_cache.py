@@ -0,0 +1,59 @@
+"""
+Cache de fragmentos del system prompt del chatbot.
+
+`AIOrchestrator._build_system_prompt` corre en cada mensaje entrante. Las
+secciones que no dependen de la sesión (catálogo de casas con capacidades,
+calendario + feriados, tipo de cambio, tarifa mínima) se arman una vez y
+se guardan en el cache bajo una clave que incluye la versión de los
+modelos de los que dependen. Esas versiones las cambian las señales
+post_save/post_delete de apps.core.response_cache, así que editar una casa
+o una tarifa en el admin invalida solo los fragmentos afectados.
+
+Las versiones viven en el cache default: con uno compartido (`REDIS_URL`)
+la invalidación llega a todos los workers. Con el LocMemCache por defecto
+solo la ve el proceso que guardó el cambio; en los demás el fragmento viejo
+dura hasta `LOCAL_FRAGMENT_TTL` (minutos, no la hora de `FRAGMENT_TTL`).
+
+Lo que no viene de un modelo entra a la clave vía `extra`: el día para el
+calendario, un hash del prompt configurado para el prompt base.
+
+Uso:
+    text = get_fragment('base', ('property.Property',), build)
+    text = get_fragment('calendar', (), build, extra=today.isoformat())
+"""
+from django.core.cache import cache
+
+from apps.core.response_cache import get_versions, is_shared
+
+FRAGMENT_PREFIX = 'chatbot:prompt:'
+# Acota lo que tarda en verse un cambio hecho con update()/bulk (sin señales)
+FRAGMENT_TTL = 60 * 60
+# Cache por proceso: acota lo que tarda en verse un cambio hecho en otro worker
+LOCAL_FRAGMENT_TTL = 5 * 60
+
+
+def fragment_key(name, models=(), extra=None):
+    versions = get_versions(sorted(models)) if models else []
+    parts = [name, *(str(v) for v in versions)]
+    if extra is not None:
+        parts.append(str(extra))
+    return FRAGMENT_PREFIX + ':'.join(parts)
+
+
+def get_fragment(name, models, build, extra=None, ttl=None):
+    """
+    Valor cacheado del fragmento `name`, o `build()` si su versión cambió.
+
+    `models`: labels ('app.Model') de los que depende el fragmento.
+    `extra`: parte adicional de la clave (p.ej. la fecha de hoy).
+    `ttl`: por defecto FRAGMENT_TTL con cache compartido, si no
+    LOCAL_FRAGMENT_TTL.
+    """
+    if ttl is None:
+        ttl = FRAGMENT_TTL if is_shared() else LOCAL_FRAGMENT_TTL
+    key = fragment_key(name, models, extra)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, ttl)
+    return value
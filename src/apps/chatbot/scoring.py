@@ -26,6 +26,7 @@ from typing import List, Optional
 
 from django.utils import timezone
 
+from .conversation import ConversationContext
 from .models import ChatSession, ChatMessage
 
 
@@ -126,12 +127,14 @@ def _suggested_actions_for_stage(stage, has_objection):
     return actions
 
 
-def calculate_intervention_score(session, *, recent_messages=None):
+def calculate_intervention_score(session, *, recent_messages=None, conversation=None):
     """Calcula score + razón + acciones sugeridas para una ChatSession.
 
     Args:
         session: ChatSession (debe venir con prefetch_related para perf)
         recent_messages: list opcional de últimos N ChatMessages, evita re-query.
+        conversation: ConversationContext opcional (historial ya cargado
+            en el turno); se usa si no se pasa recent_messages.
 
     Returns:
         Opportunity dataclass listo para serializar, o None si la sesión
@@ -146,10 +149,9 @@ def calculate_intervention_score(session, *, recent_messages=None):
 
     # Mensajes recientes para detectar objeciones / patrones
     if recent_messages is None:
-        recent_messages = list(
-            ChatMessage.objects.filter(session=session, deleted=False)
-            .order_by('-created')[:10]
-        )
+        if conversation is None:
+            conversation = ConversationContext(session, window=10)
+        recent_messages = conversation.recent(10)
     last_5_inbound = [
         m.content for m in recent_messages
         if m.direction == ChatMessage.DirectionChoices.INBOUND
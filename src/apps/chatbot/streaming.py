@@ -0,0 +1,136 @@
+"""
+Entrega en streaming de la respuesta del chatbot.
+
+La respuesta final del modelo (la que sigue a la ejecución de
+herramientas: cotizaciones, disponibilidad, etc.) se consume como stream
+de OpenAI. Cada vez que se completa un párrafo (línea en blanco) y el
+acumulado supera `CHATBOT_STREAM_MIN_CHARS`, se limpia con
+`process_chunk` (sanitize, guardia de precios, link de reserva) y se envía
+por el canal; el cliente empieza a leer mientras el modelo sigue
+escribiendo.
+
+Si un párrafo necesita ver la respuesta completa para limpiarse (p.ej.
+abre un bloque [INSTRUCCIÓN] o trae precios sin herramienta de precios),
+`process_chunk` retorna None: desde ahí el resto se retiene y se procesa
+entero al final, igual que sin streaming.
+
+`first_message_ms` mide desde que se empezó a procesar el turno hasta el
+primer envío; se guarda en ChatMessage.first_message_ms.
+
+Uso:
+    stream = StreamingReply(send=..., process_chunk=..., on_begin=...)
+    stream.begin(tool_calls_data)   # antes de la llamada final
+    for delta in ...: stream.feed(delta)
+    stream.send_final(clean(stream.remaining()))
+"""
+import re
+import time
+
+from django.conf import settings
+
+DEFAULT_MIN_CHARS = 160
+
+_PARAGRAPH_BREAK_RE = re.compile(r'\n[ \t]*\n')
+
+
+class ParagraphSplitter:
+    """Acumula deltas de texto y entrega los párrafos ya completos."""
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, delta):
+        self._buffer += delta
+        parts = _PARAGRAPH_BREAK_RE.split(self._buffer)
+        self._buffer = parts.pop()
+        return [p for p in parts if p.strip()]
+
+    def flush(self):
+        rest, self._buffer = self._buffer, ''
+        return rest
+
+
+class StreamingReply:
+    """Envía por párrafos la respuesta final mientras el modelo la genera."""
+
+    def __init__(self, send, process_chunk, on_begin=None, min_chars=None, started_at=None):
+        """
+        `send(text)`: envía un mensaje y retorna su id de canal (o None).
+        `process_chunk(text)`: texto limpio a enviar, o None para retener
+        el resto hasta el final.
+        `on_begin(tool_calls_data)`: se llama una vez, antes del primer
+        envío; si retorna False no se envía nada (p.ej. sesión escalada).
+        """
+        self.send = send
+        self.process_chunk = process_chunk
+        self.on_begin = on_begin
+        if min_chars is None:
+            min_chars = getattr(settings, 'CHATBOT_STREAM_MIN_CHARS', DEFAULT_MIN_CHARS)
+        self.min_chars = min_chars
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.first_message_ms = None
+        self.tool_calls_data = []
+        self.began = False
+        self.allowed = True
+        self.held = False
+        self.sent = []
+        self.message_ids = []
+        self._pending = []
+        self._splitter = ParagraphSplitter()
+
+    @property
+    def dispatched(self):
+        return bool(self.sent)
+
+    @property
+    def sent_text(self):
+        return '\n\n'.join(self.sent)
+
+    def begin(self, tool_calls_data):
+        """Marca el inicio de la respuesta final (herramientas ya ejecutadas).
+        Si se llama de nuevo (reintento con otro modelo sin nada enviado),
+        descarta el texto del intento anterior."""
+        self.tool_calls_data = tool_calls_data
+        if self.began:
+            if not self.dispatched:
+                self.held = False
+                self.remaining()
+            return
+        self.began = True
+        if self.on_begin is not None:
+            self.allowed = self.on_begin(tool_calls_data) is not False
+
+    def feed(self, delta):
+        for paragraph in self._splitter.feed(delta):
+            self._pending.append(paragraph)
+            if sum(len(p) for p in self._pending) >= self.min_chars:
+                self._dispatch()
+
+    def _dispatch(self):
+        if not self.allowed or self.held:
+            return
+        text = self.process_chunk('\n\n'.join(self._pending))
+        if text is None:
+            self.held = True
+            return
+        self._pending = []
+        if text.strip():
+            self._send(text)
+
+    def remaining(self):
+        """Texto aún no enviado: párrafos retenidos + cola del stream."""
+        tail = self._splitter.flush()
+        parts = self._pending + ([tail] if tail.strip() else [])
+        self._pending = []
+        return '\n\n'.join(parts)
+
+    def send_final(self, text):
+        if self.allowed and text and text.strip():
+            self._send(text)
+
+    def _send(self, text):
+        message_id = self.send(text)
+        if self.first_message_ms is None:
+            self.first_message_ms = int((time.monotonic() - self.started_at) * 1000)
+        self.sent.append(text)
+        self.message_ids.append(message_id)
@@ -0,0 +1,161 @@
+"""
+Reanudación de las campañas (send_promo_dates, send_promo_birthday,
+send_followups): quien quedó en el journal de una corrida cortada recibe su
+log aunque en la corrida siguiente caiga en una exclusión.
+
+Necesita BD (TestCase). Clientes con bulk_create para no disparar las
+señales de Clients (audiencias de Meta); sin red: el sender es un mock.
+"""
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import pytz
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.chatbot.campaigns import Campaign, CampaignMessage
+from apps.chatbot.models import (
+    ChatbotConfiguration, ChatMessage, ChatSession, PromoBirthdayConfig,
+    PromoBirthdaySent, PromoDateConfig, PromoDateSent,
+)
+from apps.clients.models import Clients, SearchTracking
+from apps.property.pricing_models import DynamicDiscountConfig
+
+
+def make_clients(*names):
+    return Clients.objects.bulk_create([
+        Clients(
+            first_name=name, last_name='Prueba', document_type='dni',
+            number_doc=f'{i:08d}', tel_number=f'5199900000{i}', email=f'{name.lower()}@mail.pe',
+        )
+        for i, name in enumerate(names)
+    ])
+
+
+class CampaignResumeTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        settings_patch = override_settings(CAMPAIGN_PROGRESS_DIR=directory)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def journal(self, name, key, record, result='wamid.previo'):
+        """Simula una corrida anterior cortada después de enviar a `key`."""
+        Campaign(name).send(
+            [CampaignMessage(key=key, to='51999000000', record=record)],
+            send=lambda message, http: result,
+        )
+
+    def run_command(self, name, sender_path):
+        self.output = StringIO()
+        with mock.patch(sender_path) as sender:
+            call_command(name, stdout=self.output)
+        return sender
+
+
+class SendPromoDatesResumeTest(CampaignResumeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        discount = DynamicDiscountConfig.objects.create(
+            name='promo', prefix='PROMO', discount_percentage=Decimal('10'), validity_days=3,
+        )
+        PromoDateConfig.objects.create(
+            is_active=True, discount_config=discount, days_before_checkin=3,
+            cooldown_days=0, min_search_count=1, exclude_recent_chatters=True,
+        )
+        self.target = date.today() + timedelta(days=3)
+        self.sent_before, self.chatting = make_clients('Ana', 'Beto')
+        for client in (self.sent_before, self.chatting):
+            SearchTracking.objects.create(
+                client=client, check_in_date=self.target,
+                check_out_date=self.target + timedelta(days=2), guests=4,
+            )
+            # Los dos escribieron en las últimas 24h (Ana respondió a la promo)
+            ChatSession.objects.create(
+                wa_id=client.tel_number, client=client, last_customer_message_at=timezone.now(),
+            )
+
+    def test_journaled_recipient_is_logged_despite_exclusion(self):
+        self.journal(f'promo_dates:{self.target.isoformat()}', f'client:{self.sent_before.id}', {
+            'client_id': str(self.sent_before.id), 'session_id': None,
+            'check_out_date': self.target + timedelta(days=2), 'guests': 4,
+            'discount_code_id': None, 'discount_code': 'PROMO1', 'message_content': 'Casa 1',
+            'properties': [], 'template_content': 'Promo',
+        })
+
+        sender = self.run_command('send_promo_dates', 'apps.chatbot.management.commands.send_promo_dates.WhatsAppSender')
+
+        sender.return_value.send_template_message.assert_not_called()
+        promos = PromoDateSent.objects.all()
+        self.assertEqual([promo.client_id for promo in promos], [self.sent_before.id])
+        self.assertEqual(promos[0].wa_message_id, 'wamid.previo')
+        self.assertEqual(Campaign(f'promo_dates:{self.target.isoformat()}').results(), {})
+
+
+class SendPromoBirthdayResumeTest(CampaignResumeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        PromoBirthdayConfig.objects.create(is_active=True, days_before_birthday=0)
+        today = date.today()
+        self.sent_before, self.no_phone = make_clients('Ana', 'Beto')
+        # Ana perdió el teléfono después del envío; Beto nunca lo tuvo
+        Clients.objects.filter(id__in=[self.sent_before.id, self.no_phone.id]).update(
+            date=today.replace(year=1990) if (today.month, today.day) != (2, 29) else date(1992, 2, 29),
+            tel_number='',
+        )
+        self.year = today.year
+        self.name = f'promo_birthday:{today.isoformat()}'
+
+    def test_journaled_recipient_is_logged_despite_exclusion(self):
+        self.journal(self.name, str(self.sent_before.id), {'template_content': 'Feliz cumple', 'summary': 'nivel'})
+
+        sender = self.run_command('send_promo_birthday', 'apps.chatbot.management.commands.send_promo_birthday.WhatsAppSender')
+
+        sender.return_value.send_template_message.assert_not_called()
+        logs = PromoBirthdaySent.objects.all()
+        self.assertEqual([log.client_id for log in logs], [self.sent_before.id])
+        self.assertEqual((logs[0].year, logs[0].status), (self.year, 'sent'))
+
+
+class SendFollowupsResumeTest(CampaignResumeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ChatbotConfiguration.objects.create(is_active=True)
+        self.now = pytz.timezone('America/Lima').localize(datetime(2026, 5, 8, 15, 0))
+        last_message = self.now - timedelta(hours=3)
+        self.sent_before, self.admin_replied = [
+            ChatSession.objects.create(
+                wa_id=f'5199900000{i}', status='active', ai_enabled=True,
+                total_messages=4, last_customer_message_at=last_message,
+            )
+            for i in range(2)
+        ]
+        # En las dos intervino un admin después del follow-up cortado
+        for session in (self.sent_before, self.admin_replied):
+            ChatMessage.objects.create(session=session, direction='outbound_human', content='Hola')
+
+    def test_journaled_session_is_logged_despite_exclusion(self):
+        self.journal('followups', str(self.sent_before.id), {
+            'followup_type': 'no_quote', 'name': 'Ana', 'text': '¿Pudiste revisar la opción?',
+        })
+
+        with mock.patch('apps.chatbot.management.commands.send_followups.timezone.now', return_value=self.now):
+            sender = self.run_command('send_followups', 'apps.chatbot.management.commands.send_followups.get_sender')
+
+        sender.assert_not_called()
+        followups = ChatMessage.objects.filter(intent_detected='followup_no_quote')
+        self.assertEqual([message.session_id for message in followups], [self.sent_before.id])
+        self.sent_before.refresh_from_db()
+        self.admin_replied.refresh_from_db()
+        self.assertEqual((self.sent_before.followup_count, self.admin_replied.followup_count), (1, 0))
+        # La ya enviada no cuenta como saltada
+        self.assertIn('Saltados: 1.', self.output.getvalue())
@@ -0,0 +1,92 @@
+import fcntl
+import tempfile
+from datetime import date
+
+from django.test import SimpleTestCase
+
+from apps.chatbot.campaigns import Campaign, CampaignBusy, CampaignMessage, TokenBucket
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_paces_after_burst(self):
+        """Con ráfaga de 2 y 4 envíos/s, los 6 primeros tardan 1 segundo"""
+        clock = _FakeClock()
+        bucket = TokenBucket(rate=4, capacity=2, clock=clock, sleep=clock.sleep)
+        for _ in range(6):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.slept, 1.0)
+
+
+class CampaignTest(SimpleTestCase):
+    """Envío reanudable (sin red ni BD: `send` es un fake)"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.calls = []
+
+    def _campaign(self):
+        return Campaign('promo_test:2026-05-08', workers=3, rate=1000, directory=self.directory)
+
+    def _messages(self, count):
+        return [
+            CampaignMessage(key=f'client:{i}', to=f'5199900000{i}', record={'check_out_date': date(2026, 5, 10)})
+            for i in range(count)
+        ]
+
+    def _send(self, message, http):
+        self.calls.append(message.key)
+        if message.to.endswith('3'):
+            raise ConnectionError('timeout')
+        return f'wamid.{message.key}'
+
+    def test_sends_once_per_recipient_across_runs(self):
+        """Una corrida cortada se reanuda sin reenviar a nadie"""
+        first = self._campaign()
+        sent = first.send(self._messages(3), send=self._send)
+        self.assertEqual(set(sent), {'client:0', 'client:1', 'client:2'})
+
+        # Siguiente corrida (mismo journal): solo salen los nuevos
+        self.calls = []
+        resumed = self._campaign()
+        self.assertTrue(resumed.is_done('client:1'))
+        resumed.send(self._messages(5), send=self._send)
+        self.assertEqual(sorted(self.calls), ['client:3', 'client:4'])
+
+        results = resumed.results()
+        self.assertEqual(results['client:0']['result'], 'wamid.client:0')
+        self.assertEqual(results['client:0']['record']['check_out_date'], '2026-05-10')
+        # El envío que falló no queda anotado: se reintenta la próxima vez
+        self.assertNotIn('client:3', results)
+
+    def test_finish_clears_journal(self):
+        campaign = self._campaign()
+        campaign.send(self._messages(2), send=self._send)
+        campaign.finish()
+        self.assertEqual(self._campaign().results(), {})
+
+    def test_overlapping_runs_send_once(self):
+        """Una corrida que arrancó antes relee el journal; si la otra sigue enviando, aborta"""
+        early, other = self._campaign(), self._campaign()
+        other.send(self._messages(2), send=self._send)
+        early.send(self._messages(3), send=self._send)
+        self.assertEqual(self.calls, ['client:0', 'client:1', 'client:2'])
+
+        with open(early.path.with_suffix('.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self.assertRaises(CampaignBusy):
+                self._campaign().send(self._messages(5), send=self._send)
+        self.assertEqual(len(self.calls), 3)
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.chatbot import guards
+from apps.chatbot.ai_orchestrator import AIOrchestrator
+from apps.chatbot.conversation import INBOUND, OUTBOUND_AI, ConversationContext
+from apps.chatbot.tool_executor import ToolExecutor
+
+NOW = datetime(2026, 5, 1, 12, 0)
+QUOTE_TEXT = (
+    "Casa Austin 2 para 6 personas: $340 · S/1224\n"
+    "Reserva directa: https://casaaustin.pe/reservar?casa=2&personas=6"
+)
+
+
+def _msg(pk, direction, content, minutes_ago, tool_calls=None, intent=None):
+    return SimpleNamespace(
+        id=pk, direction=direction, content=content,
+        created=NOW - timedelta(minutes=minutes_ago),
+        tool_calls=tool_calls or [], intent_detected=intent,
+    )
+
+
+class _CountingQuerySet:
+    """Sustituto del queryset de la ventana: cuenta cuántas veces se carga."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.loads = 0
+
+    def order_by(self, *fields):
+        return self
+
+    def __getitem__(self, item):
+        self.loads += 1
+        return self.messages[item]
+
+
+class ConversationContextTest(SimpleTestCase):
+    """Tests del historial por turno (SimpleTestCase: cualquier consulta a la BD falla)"""
+
+    def setUp(self):
+        self.session = SimpleNamespace(id='test', conversation_context={}, client_id=None)
+        # Más nuevo primero, como lo carga la ventana
+        self.messages = [
+            _msg(5, INBOUND, 'son dólares o soles?', 0),
+            _msg(4, OUTBOUND_AI, QUOTE_TEXT, 5, intent='availability_check', tool_calls=[{
+                'name': 'check_availability',
+                'arguments': {'property_name': 'Casa Austin 2', 'guests': 6, 'check_out': '2026-05-10'},
+            }]),
+            _msg(3, INBOUND, 'somos 6 para el 8 de mayo', 6),
+            _msg(2, OUTBOUND_AI, 'Hola! Soy Valeria 😊 ¿Qué fechas tienes en mente?', 10),
+            _msg(1, INBOUND, 'Hola', 11),
+        ]
+
+    def test_queries_answered_from_window(self):
+        """Con la ventana completa no hay consultas adicionales"""
+        conversation = ConversationContext(self.session, messages=self.messages)
+        self.assertEqual([m.id for m in conversation.recent(20, exclude_id=5)], [4, 3, 2, 1])
+        self.assertEqual(conversation.last_inbound_text(), 'son dólares o soles?')
+        self.assertEqual([m.id for m in conversation.quote_messages()], [4])
+        self.assertEqual(conversation.last_availability_check().id, 4)
+        self.assertEqual(
+            conversation.last_booking_url(),
+            'https://casaaustin.pe/reservar?casa=2&personas=6',
+        )
+        self.assertEqual(
+            conversation.counts(), {'ai': 2, 'quotes': 1, 'availability_checks': 1},
+        )
+        self.assertEqual(
+            [m.id for m in conversation.recent_availability_checks(NOW - timedelta(minutes=30))],
+            [4],
+        )
+
+    def test_turn_loads_history_once(self):
+        """Guards, herramientas y guardias post-respuesta comparten una sola carga"""
+        queryset = _CountingQuerySet(self.messages)
+        conversation = ConversationContext(self.session)
+        with mock.patch.object(ConversationContext, '_queryset', return_value=queryset):
+            result = guards.run_guards(
+                self.session, 'son dólares o soles?', conversation=conversation,
+            )
+            self.assertIn('$340 · S/1224', result['response'])
+
+            executor = ToolExecutor(self.session, conversation=conversation)
+            self.assertEqual(
+                executor._recover_last_availability_context(),
+                {'property_name': 'Casa Austin 2', 'guests': 6, 'check_out': '2026-05-10'},
+            )
+            self.assertTrue(AIOrchestrator._get_last_booking_url(self.session, conversation))
+            guards._get_full_last_quote(self.session, conversation)
+            conversation.recent(20, exclude_id=5)
+            conversation.counts()
+            conversation.outbound_ai(6)
+        self.assertEqual(queryset.loads, 1)
+
+    def test_truncated_window_falls_back_to_query(self):
+        """Si la ventana no alcanza y la sesión tiene más historial, se consulta la BD"""
+        conversation = ConversationContext(self.session, window=2, messages=self.messages[:2])
+        fallback = _CountingQuerySet([m for m in self.messages if m.direction == INBOUND])
+        queryset = mock.Mock()
+        queryset.filter.return_value.order_by.return_value = fallback
+        with mock.patch.object(ConversationContext, '_queryset', return_value=queryset):
+            self.assertEqual([m.id for m in conversation.inbound(2)], [5, 3])
+        self.assertEqual(fallback.loads, 1)
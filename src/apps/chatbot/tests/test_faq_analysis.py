@@ -0,0 +1,97 @@
+"""
+analyze_frequent_questions de punta a punta contra el gateway de IA real
+(apps.core.ai_gateway) con un transporte HTTP falso: embeddings y chat
+pasan por la fachada, no por el SDK directo.
+
+Necesita BD (TestCase).
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+
+import httpx
+import openai
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.chatbot.management.commands.analyze_frequent_questions import Command
+from apps.chatbot.models import FrequentQuestion
+from apps.core import ai_gateway
+
+# Un eje por tema: lo que dice el transporte falso para cada texto
+TOPICS = {'mascota': [1, 0, 0], 'piscina': [0, 1, 0]}
+
+
+def embedding_for(text):
+    return next((vector for word, vector in TOPICS.items() if word in text.lower()), [0, 0, 1])
+
+
+class FaqAnalysisGatewayTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        settings_patch = override_settings(FAQ_INDEX_DIR=directory)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+        self.requests = []
+        sdk = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(self.respond)))
+        gateway = mock.patch.multiple(
+            ai_gateway, _client=sdk, _client_pid=os.getpid(), _semaphore=threading.BoundedSemaphore(2),
+        )
+        gateway.start()
+        self.addCleanup(gateway.stop)
+        ai_gateway.clear_stats()
+        self.addCleanup(ai_gateway.clear_stats)
+
+    def respond(self, request):
+        body = json.loads(request.content)
+        self.requests.append((request.url.path, body))
+        if request.url.path.endswith('/embeddings'):
+            return httpx.Response(200, json={
+                'object': 'list', 'model': body['model'],
+                'data': [
+                    {'object': 'embedding', 'index': i, 'embedding': embedding_for(text)}
+                    for i, text in enumerate(body['input'])
+                ],
+                'usage': {'prompt_tokens': len(body['input']), 'total_tokens': len(body['input'])},
+            })
+        decision = {'groups': [{'group': 1, 'ignore': False, 'category': 'amenities', 'new_label': '¿La piscina es temperada?'}]}
+        return httpx.Response(200, json={
+            'id': 'c1', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(decision)}}],
+            'usage': {'prompt_tokens': 50, 'completion_tokens': 20, 'total_tokens': 70},
+        })
+
+    def test_analyze_through_gateway(self):
+        pets = FrequentQuestion.objects.create(category='pets', category_label='Mascotas', label='¿Aceptan mascota?', count=3)
+        created = timezone.now() - timedelta(days=3)
+        candidates = [
+            {'id': i, 'session_id': session, 'session__wa_id': f'5199900000{i}', 'content': text, 'created': created}
+            for i, (session, text) in enumerate([
+                ('s1', '¿Puedo llevar a mi mascota?'),
+                ('s2', 'Tengo una mascota pequeña'),
+                ('s3', '¿La piscina tiene agua caliente?'),
+            ])
+        ]
+
+        stats = Command()._analyze(ai_gateway.client('faq_analysis'), candidates)
+
+        self.assertEqual(stats, {'matched': 2, 'new': 1, 'noise': 0, 'groups': 1})
+        pets.refresh_from_db()
+        self.assertEqual(pets.count, 5)
+        self.assertTrue(FrequentQuestion.objects.filter(category='amenities', label='¿La piscina es temperada?').exists())
+
+        paths = [path for path, _ in self.requests]
+        # Candidatos, labels del índice vacío y una clasificación
+        self.assertEqual(paths, ['/v1/embeddings', '/v1/embeddings', '/v1/chat/completions'])
+        self.assertEqual(self.requests[0][1]['model'], 'text-embedding-3-small')
+        self.assertEqual(self.requests[2][1]['model'], 'gpt-4.1-mini')
+        usage = ai_gateway.stats()['faq_analysis']
+        self.assertEqual((usage['calls'], usage['errors'], usage['prompt_tokens']), (3, 0, 3 + 1 + 50))
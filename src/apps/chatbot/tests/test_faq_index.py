@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.chatbot.faq_index import (
+    NOISE, QuestionIndex, centroid, greedy_clusters, is_candidate, normalize,
+)
+
+
+class FaqIndexTest(SimpleTestCase):
+    """Tests del índice vectorial de preguntas frecuentes"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_trivial_replies_are_not_candidates(self):
+        """Saludos y confirmaciones se descartan sin IA"""
+        self.assertFalse(is_candidate('Ok!'))
+        self.assertFalse(is_candidate('  Buenas tardes  '))
+        self.assertFalse(is_candidate('👍'))
+        self.assertTrue(is_candidate('¿Aceptan mascotas?'))
+
+    def test_nearest_neighbour(self):
+        """Cada vector se asigna a la clave canónica más parecida"""
+        index = QuestionIndex(self.directory)
+        index.add('pets', normalize([[1, 0, 0]])[0])
+        index.add(NOISE, normalize([[0, 1, 0]])[0])
+        keys, scores = index.nearest(normalize([[0.9, 0.1, 0], [0.1, 1, 0]]))
+        self.assertEqual(keys, ['pets', NOISE])
+        self.assertGreater(scores[0], 0.9)
+
+    def test_empty_index_has_no_match(self):
+        """Sin vectores no hay vecino"""
+        keys, scores = QuestionIndex(self.directory).nearest(normalize([[1, 0]]))
+        self.assertEqual(keys, [None])
+        self.assertEqual(scores[0], 0)
+
+    def test_save_and_load_roundtrip(self):
+        """El índice se recupera de disco memory-mapped"""
+        index = QuestionIndex(self.directory)
+        index.add('a', normalize([[1, 2, 3]])[0])
+        index.add('b', normalize([[3, 2, 1]])[0])
+        index.save()
+        loaded = QuestionIndex.load(self.directory)
+        self.assertEqual(loaded.keys, ['a', 'b'])
+        self.assertIsInstance(loaded.vectors, np.memmap)
+        np.testing.assert_allclose(loaded.vectors, index.vectors)
+
+    def test_retain_drops_deleted_questions(self):
+        """Los vectores de preguntas borradas se descartan; el ruido se conserva"""
+        index = QuestionIndex(self.directory)
+        for key in ('a', 'b', NOISE):
+            index.add(key, normalize([[1, 1]])[0])
+        index.retain({'b'})
+        self.assertEqual(index.keys, ['b', NOISE])
+        self.assertEqual(len(index.vectors), 2)
+
+    def test_greedy_clusters(self):
+        """Mensajes parecidos quedan en el mismo grupo"""
+        vectors = normalize([[1, 0], [0.95, 0.05], [0, 1], [0.05, 0.95]])
+        self.assertEqual(greedy_clusters(vectors, 0.9), [[0, 1], [2, 3]])
+        np.testing.assert_allclose(np.linalg.norm(centroid(vectors[[0, 1]])), 1.0, rtol=1e-6)
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from apps.chatbot import guards
+
+
+class GuardDispatchTest(SimpleTestCase):
+    """Tests del pre-filtro de guards (SimpleTestCase: cualquier consulta a la BD falla)"""
+
+    def setUp(self):
+        self.session = SimpleNamespace(id='test', conversation_context={}, client_id=None)
+
+    def _names(self, text):
+        return [name for name, _ in guards.candidate_guards(self.session, text)]
+
+    def test_plain_message_has_no_candidates(self):
+        """Un mensaje sin triggers no ejecuta guards ni consulta el historial"""
+        self.assertEqual(self._names('hola, buenas'), [])
+        self.assertIsNone(guards.run_guards(self.session, 'hola, buenas'))
+
+    def test_candidates_follow_priority(self):
+        """Los candidatos respetan el orden de GUARD_CHAIN"""
+        self.assertEqual(self._names('son dólares o soles?')[0], 'currency_clarification')
+        self.assertIn('faq', self._names('¿aceptan mascotas?'))
+        self.assertIn('express', self._names('la casa 3 porfa'))
+
+    def test_magic_awaiting_state_is_candidate(self):
+        """Con la pregunta de casa pendiente, G_MAGIC_LINK corre aunque no haya trigger"""
+        self.session.conversation_context = {'magic_awaiting_house': '2026-05-01'}
+        self.assertIn('magic_link', self._names('la 3'))
+
+    def test_combined_trigger_matches_components(self):
+        """La regex combinada matchea si y solo si matchea algún guard"""
+        texts = [
+            'hola', 'cuánto cuesta?', 'qué casas tienen', 'check in?',
+            'sí', 'casa 2', '$340 · S/1224', 'gracias', 'somos 10 para el 5 de mayo',
+        ]
+        for text in texts:
+            expected = any(
+                trigger is not None and trigger.search(text)
+                for _, _, trigger, _ in guards._GUARD_TRIGGERS
+            )
+            self.assertEqual(bool(guards.GUARD_TRIGGER_RE.search(text)), expected, text)
+
+    def test_guard_without_history_runs_without_queries(self):
+        """El FAQ responde sin tocar la BD"""
+        result = guards.run_guards(self.session, '¿aceptan mascotas?')
+        self.assertEqual(result['intent'], 'guard:faq:pet_friendly')
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from apps.chatbot.prompt_cache import FRAGMENT_TTL, LOCAL_FRAGMENT_TTL, get_fragment
+from apps.core.response_cache import bump_version
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PromptFragmentCacheTest(SimpleTestCase):
+    """Tests del cache de fragmentos del system prompt"""
+
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def _build(self):
+        self.builds += 1
+        return f'fragmento {self.builds}'
+
+    def test_fragment_is_built_once(self):
+        """Mientras el modelo no cambie se reutiliza el fragmento"""
+        first = get_fragment('base', ('property.Property',), self._build)
+        second = get_fragment('base', ('property.Property',), self._build)
+        self.assertEqual(first, second)
+        self.assertEqual(self.builds, 1)
+
+    def test_model_change_rebuilds(self):
+        """Un cambio en el modelo invalida solo los fragmentos que dependen de él"""
+        get_fragment('base', ('property.Property',), self._build)
+        get_fragment('rate', ('property.ExchangeRate',), self._build)
+        bump_version('property.Property')
+        self.assertEqual(get_fragment('base', ('property.Property',), self._build), 'fragmento 3')
+        self.assertEqual(get_fragment('rate', ('property.ExchangeRate',), self._build), 'fragmento 2')
+
+    def test_extra_is_part_of_key(self):
+        """Fragmentos por fecha se recalculan al cambiar el día"""
+        get_fragment('calendar', (), self._build, extra='2026-01-01')
+        get_fragment('calendar', (), self._build, extra='2026-01-02')
+        self.assertEqual(self.builds, 2)
+
+    def test_local_cache_uses_short_ttl(self):
+        """Sin cache compartido el fragmento vence en minutos"""
+        with mock.patch('apps.chatbot.prompt_cache.cache') as fake_cache:
+            fake_cache.get.return_value = None
+            get_fragment('base', (), self._build)
+            self.assertEqual(fake_cache.set.call_args[0][2], LOCAL_FRAGMENT_TTL)
+            with mock.patch('apps.chatbot.prompt_cache.is_shared', return_value=True):
+                get_fragment('base', (), self._build)
+            self.assertEqual(fake_cache.set.call_args[0][2], FRAGMENT_TTL)
@@ -0,0 +1,110 @@
+from django.test import SimpleTestCase
+
+from apps.chatbot.ai_orchestrator import AIOrchestrator
+from apps.chatbot.streaming import ParagraphSplitter, StreamingReply
+
+BOOKING_URL = 'https://casaaustin.pe/reservar?casa=2&checkin=2026-05-08&personas=6'
+QUOTE_RESULT = (
+    "📅 Vie 8 may → Sáb 9 may · 1 noche · 6 personas\n"
+    "Casa Austin 2 · $340 · S/1224\n"
+    f"Reserva directa: {BOOKING_URL}"
+)
+
+
+def _deltas(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StreamingReplyTest(SimpleTestCase):
+    """Tests de la entrega por párrafos (sin red ni BD)"""
+
+    def _stream(self, min_chars=10, on_begin=None, process_chunk=None):
+        self.sent = []
+
+        def send(text):
+            self.sent.append(text)
+            return f'wamid.{len(self.sent)}'
+
+        return StreamingReply(
+            send=send,
+            process_chunk=process_chunk or (lambda text: text.upper()),
+            on_begin=on_begin,
+            min_chars=min_chars,
+        )
+
+    def test_splitter_waits_for_blank_line(self):
+        """Un párrafo se entrega recién cuando llega la línea en blanco"""
+        splitter = ParagraphSplitter()
+        self.assertEqual(splitter.feed('Hola, soy Valeria.\n'), [])
+        self.assertEqual(splitter.feed('\nTe cuento'), ['Hola, soy Valeria.'])
+        self.assertEqual(splitter.flush(), 'Te cuento')
+
+    def test_paragraphs_sent_while_streaming(self):
+        """Los párrafos completos salen antes de que termine el stream"""
+        stream = self._stream()
+        stream.begin([])
+        for delta in _deltas('Claro, te cuento 😊\n\nTenemos 4 casas en Punta Hermosa'):
+            stream.feed(delta)
+        self.assertEqual(self.sent, ['CLARO, TE CUENTO 😊'])
+        self.assertIsNotNone(stream.first_message_ms)
+        self.assertEqual(stream.remaining(), 'Tenemos 4 casas en Punta Hermosa')
+
+    def test_short_paragraphs_are_joined(self):
+        """Párrafos más cortos que min_chars se juntan en un mensaje"""
+        stream = self._stream(min_chars=20)
+        stream.begin([])
+        stream.feed('Hola!\n\nClaro.\n\nTe paso los precios ahora\n\n')
+        self.assertEqual(self.sent, ['HOLA!\n\nCLARO.\n\nTE PASO LOS PRECIOS AHORA'])
+
+    def test_held_chunk_keeps_rest_for_the_end(self):
+        """Si un párrafo necesita la respuesta completa, no se envía nada más"""
+        stream = self._stream(process_chunk=lambda text: None if 'HOLD' in text else text)
+        stream.begin([])
+        stream.feed('Primer párrafo listo\n\nHOLD aquí\n\nÚltimo párrafo\n\n')
+        self.assertEqual(self.sent, ['Primer párrafo listo'])
+        self.assertEqual(stream.remaining(), 'HOLD aquí\n\nÚltimo párrafo')
+
+    def test_on_begin_can_suppress_sending(self):
+        """Con la sesión escalada (on_begin → False) no se envía nada"""
+        stream = self._stream(on_begin=lambda tool_calls: False)
+        stream.begin([])
+        stream.feed('Un párrafo largo de respuesta\n\n')
+        stream.send_final('cola')
+        self.assertEqual(self.sent, [])
+
+
+class StreamPostprocessTest(SimpleTestCase):
+    """Guardias de texto aplicadas sobre la respuesta en streaming"""
+
+    def setUp(self):
+        self.orchestrator = AIOrchestrator(config=None)
+        self.tool_calls = [{
+            'name': 'check_availability',
+            'arguments': {'guests': 6},
+            '_result_full': QUOTE_RESULT,
+        }]
+
+    def test_chunk_with_instruction_block_is_held(self):
+        self.assertIsNone(self.orchestrator._process_stream_chunk(
+            'Listo!\n[INSTRUCCIÓN IA] no mostrar', self.tool_calls,
+        ))
+
+    def test_unverified_price_without_pricing_tool_is_held(self):
+        self.assertIsNone(self.orchestrator._process_stream_chunk('Sale $300 la noche', []))
+
+    def test_chunk_gets_parametrized_link(self):
+        text = self.orchestrator._process_stream_chunk(
+            'Puedes reservar en https://casaaustin.pe', self.tool_calls,
+        )
+        self.assertIn(BOOKING_URL, text)
+
+    def test_missing_quote_goes_in_last_message(self):
+        """Si la cotización no se pegó, se envía al final con el cierre"""
+        stream = StreamingReply(send=lambda text: None, process_chunk=lambda text: text, min_chars=5)
+        stream.begin(self.tool_calls)
+        stream.feed('Perfecto, ya revisé la disponibilidad para ustedes.\n\n¿Te animas?')
+        content = self.orchestrator._finish_stream(stream, '', self.tool_calls)
+        self.assertEqual(len(stream.sent), 2)
+        self.assertTrue(stream.sent[1].startswith('📅'))
+        self.assertTrue(stream.sent[1].endswith('¿Te animas?'))
+        self.assertEqual(content, stream.sent_text)
@@ -3,6 +3,7 @@ from datetime import date, datetime, timedelta
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from .booking_urls import build_availability_url, build_booking_url
+from .conversation import ConversationContext
 
 logger = logging.getLogger(__name__)
 
@@ -418,8 +419,10 @@ TOOL_DEFINITIONS = [
 class ToolExecutor:
     """Ejecuta las herramientas (function calls) invocadas por la IA"""
 
-    def __init__(self, session):
+    def __init__(self, session, conversation=None):
         self.session = session
+        # Historial del turno compartido con el orquestador (ver conversation.py)
+        self.conversation = conversation or ConversationContext(session)
 
     def execute(self, tool_name, arguments):
         """Ejecuta una herramienta y retorna el resultado como string"""
@@ -452,7 +455,7 @@ class ToolExecutor:
     def _check_calendar(self, from_date=None, to_date=None, property_name=None):
         """Consulta disponibilidad de casas en un rango de fechas (sin precios)."""
         from apps.property.models import Property
-        from apps.reservation.models import Reservation
+        from apps.reservation.occupancy import occupancy
         from datetime import timedelta
 
         today = date.today()
@@ -504,27 +507,22 @@ class ToolExecutor:
         if not properties.exists():
             return "No hay propiedades registradas."
 
-        # Obtener reservas activas en el rango (ampliar +1 día para late checkout)
-        active_statuses = ['approved', 'pending', 'under_review']
-        reservations = Reservation.objects.filter(
-            deleted=False,
-            status__in=active_statuses,
-            check_out_date__gt=start - timedelta(days=1),
-            check_in_date__lt=end,
-        ).select_related('property')
-
-        # Construir mapa de ocupación considerando late checkout
-        occupation = {}
-        for r in reservations:
-            effective_checkout = r.check_out_date
-            if r.late_checkout and r.late_check_out_date:
-                if r.late_check_out_date > r.check_out_date:
-                    effective_checkout = r.late_check_out_date
-                elif r.check_out_date == r.late_check_out_date:
-                    effective_checkout = r.late_check_out_date + timedelta(days=1)
-            occupation.setdefault(r.property_id, []).append(
-                (r.check_in_date, effective_checkout)
-            )
+        # Ocupación por noche de cada casa en [start, end) considerando late
+        # checkout (una consulta para todas las casas; sin cache local: de
+        # esto depende ofrecer fechas)
+        active_statuses = ('approved', 'pending', 'under_review')
+        grids = occupancy(
+            [prop.id for prop in properties],
+            start, max(start, end - timedelta(days=1)),
+            statuses=active_statuses, availability=True,
+        )
+        occupation = {
+            prop_id: [
+                (r['check_in_date'], r['effective_checkout'])
+                for r in grid.reservations.values()
+            ]
+            for prop_id, grid in grids.items()
+        }
 
         # Para la fecha específica consultada o rango corto, mostrar por fecha
         days_range = (end - start).days
@@ -549,12 +547,7 @@ class ToolExecutor:
                 occupied = []
 
                 for prop in properties:
-                    is_occupied = False
-                    for (ci, co) in occupation.get(prop.id, []):
-                        if ci <= d < co:
-                            is_occupied = True
-                            break
-                    if is_occupied:
+                    if not grids[prop.id].is_free(d):
                         occupied.append(prop.name)
                     else:
                         available.append(prop.name)
@@ -580,19 +573,13 @@ class ToolExecutor:
             # Calcular fines de semana (viernes y sábado como check-in) en el rango
             all_free_weekends = {}  # prop_id -> list of "sáb DD/mmm"
             for prop in properties:
-                prop_reservations = occupation.get(prop.id, [])
                 free_weekends = []
                 for i in range(days_range):
                     d = start + timedelta(days=i)
                     # viernes (4) y sábado (5) como días de check-in de fin de semana
                     if d.weekday() not in (4, 5):
                         continue
-                    is_free = True
-                    for (ci, co) in prop_reservations:
-                        if ci <= d < co:
-                            is_free = False
-                            break
-                    if is_free:
+                    if grids[prop.id].is_free(d):
                         free_weekends.append(
                             f"{days_es[d.weekday()]} {d.day} {months_es[d.month]}"
                         )
@@ -614,16 +601,9 @@ class ToolExecutor:
                         )
 
                     # Contar noches libres
-                    free_nights = 0
-                    for i in range(days_range):
-                        d = start + timedelta(days=i)
-                        is_free = True
-                        for (ci, co) in prop_reservations:
-                            if ci <= d < co:
-                                is_free = False
-                                break
-                        if is_free:
-                            free_nights += 1
+                    free_nights = grids[prop.id].free_nights(
+                        start, start + timedelta(days=days_range - 1),
+                    ) if days_range else 0
 
                     occ_str = ", ".join(occupied_ranges)
                     lines.append(
@@ -673,16 +653,9 @@ class ToolExecutor:
         # fechas + personas + propiedad. Si sí → instruir al AI que reuse
         # la cotización anterior en vez de duplicarla.
         try:
-            from .models import ChatMessage
             from django.utils import timezone
             cutoff = timezone.now() - timedelta(minutes=30)
-            recent = ChatMessage.objects.filter(
-                session=self.session,
-                direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-                created__gte=cutoff,
-                intent_detected__icontains='availability_check',
-                deleted=False,
-            ).order_by('-created')[:3]
+            recent = self.conversation.recent_availability_checks(cutoff)
             # Buscar coincidencia exacta de fechas + guests + propiedad
             ci_token = check_in_date.strftime('%d')
             co_token = check_out_date.strftime('%d')
@@ -1688,25 +1661,17 @@ class ToolExecutor:
         """Recupera property + guests + check_out del último check_availability
         o check_late_checkout de la sesión. Se usa para mantener coherencia
         entre cotización y late checkout (misma reserva = mismas personas)."""
-        from .models import ChatMessage
         if not self.session:
             return None
-        recent_ai = ChatMessage.objects.filter(
-            session=self.session,
-            deleted=False,
-            direction=ChatMessage.DirectionChoices.OUTBOUND_AI,
-        ).exclude(tool_calls=[]).order_by('-created')[:10]
-        for msg in recent_ai:
-            for tc in (msg.tool_calls or []):
-                if tc.get('name') in ('check_availability', 'check_late_checkout'):
-                    args = tc.get('arguments') or {}
-                    guests = args.get('guests')
-                    if guests and int(guests) >= 1:
-                        return {
-                            'property_name': args.get('property_name'),
-                            'guests': int(guests),
-                            'check_out': args.get('check_out') or args.get('checkout_date'),
-                        }
+        for tc in self.conversation.quote_tool_calls():
+            args = tc.get('arguments') or {}
+            guests = args.get('guests')
+            if guests and int(guests) >= 1:
+                return {
+                    'property_name': args.get('property_name'),
+                    'guests': int(guests),
+                    'check_out': args.get('check_out') or args.get('checkout_date'),
+                }
         return None
 
     def _escalate_to_human(self, reason):
@@ -1873,14 +1838,10 @@ class ToolExecutor:
 
     def _log_unanswered_question(self, question, category='other'):
         """Registra una pregunta que el bot no pudo responder."""
-        from apps.chatbot.models import UnresolvedQuestion, ChatMessage
+        from apps.chatbot.models import UnresolvedQuestion
 
         # Obtener contexto: últimos 3 mensajes del cliente
-        recent_msgs = ChatMessage.objects.filter(
-            session=self.session,
-            deleted=False,
-            direction='inbound',
-        ).order_by('-created')[:3]
+        recent_msgs = self.conversation.inbound(3)
 
         context = '\n'.join(
             f"[{m.created.strftime('%d/%m %H:%M')}] {m.content[:200]}"
@@ -13,7 +13,9 @@ _template_cache = {}
 class WhatsAppSender:
     """Envía mensajes por WhatsApp Business API (Meta Cloud API v22.0)"""
 
-    def __init__(self):
+    def __init__(self, http=None):
+        """`http`: requests.Session compartida (pool keep-alive); por defecto `requests`."""
+        self.http = http or requests
         self.access_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
         self.phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
         self.waba_id = os.getenv('WHATSAPP_BUSINESS_ACCOUNT_ID', '')
@@ -60,7 +62,7 @@ class WhatsAppSender:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers, timeout=15
             )
@@ -157,7 +159,7 @@ class WhatsAppSender:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers, timeout=15
             )
@@ -198,7 +200,7 @@ class WhatsAppSender:
         }
 
         try:
-            response = requests.post(
+            response = self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers, timeout=15
             )
@@ -231,7 +233,7 @@ class WhatsAppSender:
                 return None
             try:
                 url = f"https://graph.facebook.com/v22.0/{self.waba_id}/message_templates"
-                resp = requests.get(url, params={'name': template_name}, headers=self.headers, timeout=10)
+                resp = self.http.get(url, params={'name': template_name}, headers=self.headers, timeout=10)
                 resp.raise_for_status()
                 templates = resp.json().get('data', [])
                 body_text = None
@@ -274,7 +276,7 @@ class WhatsAppSender:
         }
 
         try:
-            requests.post(
+            self.http.post(
                 self.api_url, json=payload,
                 headers=self.headers, timeout=10
             )
@@ -23,6 +23,7 @@ from .whatsapp_service import WhatsAppOTPService
 import os
 import logging
 from django.core.cache import cache
+from django.db import transaction
 
 logger = logging.getLogger('apps')
 
@@ -676,7 +677,7 @@ class ClientCompleteRegistrationView(APIView):
 
 
 # Import ClientJWTAuthentication from dedicated module
-from .authentication import ClientJWTAuthentication
+from .authentication import ClientJWTAuthentication, lock_client
 
 
 class ClientVerifyDocumentView(APIView):
@@ -1476,6 +1477,7 @@ class ClientLinkFacebookView(APIView):
                                 'message': 'Esta cuenta de Facebook ya está vinculada a otro usuario'
                             }, status=409)
                         
+                        client = lock_client(client)
                         client.link_facebook_account(facebook_id, profile_data)
                         
                         logger.info(f'Cliente {client.first_name} (ID: {client.id}) vinculó su cuenta de Facebook (FB ID: {facebook_id})')
@@ -1537,8 +1539,9 @@ class ClientUnlinkFacebookView(APIView):
                     'message': 'No tienes una cuenta de Facebook vinculada'
                 }, status=400)
             
-            # Desvincular la cuenta
-            client.unlink_facebook_account()
+            # Desvincular la cuenta (fila actual y bloqueada: el principal es de solo lectura)
+            with transaction.atomic():
+                lock_client(client).unlink_facebook_account()
             
             logger.info(f'Cliente {client.first_name} desvinculó su cuenta de Facebook')
             
@@ -1620,14 +1623,17 @@ class ClientWelcomeDiscountView(APIView):
             # Cliente ya autenticado por DRF
             client = request.user
             
-            # Verificar si ya recibió código de bienvenida
-            if client.welcome_discount_issued:
+            def already_issued(client):
                 return Response({
                     'success': False,
                     'message': 'Ya has recibido tu código de descuento de bienvenida anteriormente',
                     'discount_issued_at': client.welcome_discount_issued_at
                 }, status=400)
             
+            # Verificar si ya recibió código de bienvenida
+            if client.welcome_discount_issued:
+                return already_issued(client)
+            
             # Verificar si ya tiene reservas aprobadas
             has_approved_reservations = Reservation.objects.filter(
                 client=client,
@@ -1650,13 +1656,20 @@ class ClientWelcomeDiscountView(APIView):
                     'message': 'No hay promoción de bienvenida activa en este momento'
                 }, status=404)
             
-            # Generar el código de descuento
-            discount_code = config.generate_welcome_code(client)
-            
-            # Marcar que ya recibió el código
-            client.welcome_discount_issued = True
-            client.welcome_discount_issued_at = timezone.now()
-            client.save()
+            # Sobre la fila actual y bloqueada: el principal es de solo lectura
+            # y dos requests simultáneos no pueden emitir dos códigos
+            with transaction.atomic():
+                client = lock_client(client)
+                if client.welcome_discount_issued:
+                    return already_issued(client)
+                
+                # Generar el código de descuento
+                discount_code = config.generate_welcome_code(client)
+                
+                # Marcar que ya recibió el código
+                client.welcome_discount_issued = True
+                client.welcome_discount_issued_at = timezone.now()
+                client.save()
             
             logger.info(f'Código de bienvenida {discount_code.code} generado para cliente {client.first_name} {client.last_name}')
             
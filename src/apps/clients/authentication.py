@@ -1,6 +1,86 @@
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.core.response_cache import is_shared
+
 from .models import Clients
 
+PRINCIPAL_PREFIX = 'clients:principal:'
+DEFAULT_PRINCIPAL_TTL = 60
+
+# Columnas pesadas (JSON), sensibles o de saldo: no se cachean; Django las
+# carga recién cuando una vista las lee (campos diferidos).
+PRINCIPAL_DEFERRED_FIELDS = (
+    'facebook_profile_data', 'acquisition_data', 'comentarios_clientes',
+    'password', 'otp_code', 'otp_expires_at',
+    'points_balance', 'points_expires_at',
+)
+
+
+class ReadOnlyPrincipalError(RuntimeError):
+    """Se intentó guardar o borrar el principal en vez de una fila bloqueada."""
+
+
+def _principal_fields():
+    return [
+        f.attname for f in Clients._meta.concrete_fields
+        if f.name not in PRINCIPAL_DEFERRED_FIELDS
+    ]
+
+
+def principal_key(client_id):
+    return f'{PRINCIPAL_PREFIX}{client_id}'
+
+
+def _read_only(*args, **kwargs):
+    raise ReadOnlyPrincipalError(
+        'El cliente autenticado es de solo lectura: usar lock_client() para escribirlo'
+    )
+
+
+def get_client_principal(client_id):
+    """
+    Cliente autenticado con solo las columnas livianas. Es una instancia de
+    Clients de solo lectura (save()/delete() lanzan ReadOnlyPrincipalError):
+    puede ser una foto de hasta `CLIENT_PRINCIPAL_TTL` segundos y guardarla
+    pisaría cambios posteriores. Para escribir, `lock_client()`. Los campos
+    diferidos se cargan de la BD al leerlos. None si no existe o está
+    eliminado.
+
+    Solo se cachea si el cache es compartido (REDIS_URL): la invalidación de
+    las señales de Clients tiene que llegar a todos los workers. Con
+    LocMem cada request consulta la fila.
+    """
+    fields = _principal_fields()
+    ttl = getattr(settings, 'CLIENT_PRINCIPAL_TTL', DEFAULT_PRINCIPAL_TTL) if is_shared() else 0
+    key = principal_key(client_id)
+    values = cache.get(key) if ttl else None
+    if values is None:
+        values = Clients.objects.filter(
+            id=client_id, deleted=False,
+        ).values_list(*fields).first()
+        if values is None:
+            return None
+        if ttl:
+            cache.set(key, values, ttl)
+    principal = Clients.from_db('default', fields, values)
+    principal.save = principal.delete = _read_only
+    return principal
+
+
+def lock_client(client):
+    """
+    Fila actual de `client` bloqueada con select_for_update, para
+    modificarla y guardarla. Llamar dentro de transaction.atomic().
+    """
+    return Clients.objects.select_for_update().get(pk=client.pk)
+
+
+def invalidate_client_principal(client_id):
+    """Llamado desde las señales post_save/post_delete de Clients."""
+    cache.delete(principal_key(client_id))
+
 
 class ClientJWTAuthentication(JWTAuthentication):
     """
@@ -24,12 +104,33 @@ class ClientJWTAuthentication(JWTAuthentication):
     # ahora aceptamos magic tokens en endpoints normales del cliente.
     _allow_magic_token = True
 
+    def authenticate(self, request):
+        """
+        Memoiza el resultado en el request: las vistas que re-autentican a
+        mano con ClientJWTAuthentication().authenticate(request) reciben
+        el mismo cliente sin validar el token ni consultar otra vez.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        django_request = getattr(request, '_request', request)
+        memo = django_request.__dict__.setdefault('_client_jwt_auth', {})
+        key = (type(self), self._allow_magic_token, raw_token)
+        if key not in memo:
+            memo[key] = super().authenticate(request)
+        return memo[key]
+
     def get_user(self, validated_token):
         """
         Override to get client instead of user.
 
         Looks for client_id or user_id claim in the token and returns
-        the corresponding Client object.
+        the corresponding Client object (principal cacheado, ver
+        get_client_principal).
 
         Si _allow_magic_token=False, bloquea tokens con is_magic=True.
         Por defecto _allow_magic_token=True para que el flujo del link
@@ -38,13 +139,10 @@ class ClientJWTAuthentication(JWTAuthentication):
         """
         if validated_token.get('is_magic') and not self._allow_magic_token:
             return None
-        try:
-            client_id = validated_token.get('client_id')
-            if not client_id:
-                client_id = validated_token.get('user_id')
-
-            if client_id:
-                return Clients.objects.get(id=client_id, deleted=False)
-        except Clients.DoesNotExist:
-            pass
+        client_id = validated_token.get('client_id')
+        if not client_id:
+            client_id = validated_token.get('user_id')
+
+        if client_id:
+            return get_client_principal(client_id)
         return None
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 from apps.core.models import BaseModel
 
@@ -327,9 +327,16 @@ class Clients(BaseModel):
                 code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
                 break
         
-        self.referral_code = code
-        self.save()
-        return code
+        # Solo esta columna y sobre la fila bloqueada: no pisa cambios de
+        # otra instancia (el principal autenticado es de solo lectura) ni
+        # genera dos códigos si dos requests llegan juntos
+        with transaction.atomic():
+            row = Clients.objects.select_for_update().get(pk=self.pk)
+            if not row.referral_code:
+                row.referral_code = code
+                row.save(update_fields=['referral_code'])
+        self.referral_code = row.referral_code
+        return self.referral_code
     
     def get_referral_code(self):
         """Obtiene el código de referido, generándolo si no existe"""
@@ -519,10 +526,10 @@ class SearchTracking(BaseModel):
         import logging
         logger = logging.getLogger(__name__)
         
-        logger.info(f"SearchTracking.save: About to save with:")
-        logger.info(f"  check_in_date={self.check_in_date} (type: {type(self.check_in_date)}, repr: {repr(self.check_in_date)})")
-        logger.info(f"  check_out_date={self.check_out_date} (type: {type(self.check_out_date)}, repr: {repr(self.check_out_date)})")
-        logger.info(f"  guests={self.guests} (type: {type(self.guests)}, repr: {repr(self.guests)})")
+        logger.debug("SearchTracking.save: About to save with:")
+        logger.debug("  check_in_date=%s (type: %s, repr: %s)", self.check_in_date, type(self.check_in_date), repr(self.check_in_date))
+        logger.debug("  check_out_date=%s (type: %s, repr: %s)", self.check_out_date, type(self.check_out_date), repr(self.check_out_date))
+        logger.debug("  guests=%s (type: %s, repr: %s)", self.guests, type(self.guests), repr(self.guests))
         
         if self.check_in_date is None:
             logger.error("SearchTracking.save: check_in_date is None!")
@@ -534,9 +541,9 @@ class SearchTracking(BaseModel):
             logger.error("SearchTracking.save: guests is None!")
             raise ValueError("guests cannot be null")
             
-        logger.info("SearchTracking.save: All validations passed, calling super().save()")
+        logger.debug("SearchTracking.save: All validations passed, calling super().save()")
         super().save(*args, **kwargs)
-        logger.info("SearchTracking.save: Successfully saved!")
+        logger.debug("SearchTracking.save: Successfully saved!")
 
 
 class Achievement(BaseModel):
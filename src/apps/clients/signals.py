@@ -1,11 +1,12 @@
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from .models import Clients, Achievement, ClientAchievement
 from django.conf import settings
 import requests
 import hashlib
 from ..core.telegram_notifier import send_telegram_message
+from .authentication import invalidate_client_principal
 
 logger = logging.getLogger('apps')
 
@@ -321,6 +322,14 @@ def link_chat_session_to_new_client(client):
         logger.error(f"Error vinculando sesión de chat a nuevo cliente {client.id}: {e}")
 
 
+@receiver(post_save, sender=Clients)
+@receiver(post_delete, sender=Clients)
+def invalidate_principal_on_client_change(sender, instance, **kwargs):
+    """El principal cacheado de ClientJWTAuthentication se recarga en el
+    próximo request (datos editados o cliente eliminado)."""
+    invalidate_client_principal(instance.id)
+
+
 @receiver(post_save, sender=Clients)
 def update_audience_on_client_creation(sender, instance, created, **kwargs):
     if created:
@@ -1,3 +1,73 @@
-from django.test import TestCase
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.clients import authentication
+from apps.clients.authentication import (
+    ClientJWTAuthentication, ReadOnlyPrincipalError, get_client_principal,
+    invalidate_client_principal,
+)
+from apps.clients.models import Clients
+
+
+class ClientPrincipalTest(SimpleTestCase):
+    """Principal cacheado de ClientJWTAuthentication (sin BD: la consulta es un mock)"""
+
+    def setUp(self):
+        cache.clear()
+        self.client_id = uuid.uuid4()
+        fields = authentication._principal_fields()
+        row = tuple(
+            self.client_id if name == 'id' else
+            'Ana' if name == 'first_name' else
+            False if name == 'deleted' else None
+            for name in fields
+        )
+        queryset = mock.Mock()
+        queryset.values_list.return_value.first.return_value = row
+        patcher = mock.patch.object(Clients.objects, 'filter', return_value=queryset)
+        self.filter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(authentication, 'is_shared', return_value=True)
+    def test_principal_cached_until_invalidated(self, _shared):
+        principal = get_client_principal(self.client_id)
+        self.assertIsInstance(principal, Clients)
+        self.assertEqual(principal.first_name, 'Ana')
+        self.assertIn('facebook_profile_data', principal.get_deferred_fields())
+
+        get_client_principal(self.client_id)
+        self.assertEqual(self.filter.call_count, 1)
+
+        invalidate_client_principal(self.client_id)
+        get_client_principal(self.client_id)
+        self.assertEqual(self.filter.call_count, 2)
+
+    def test_local_cache_is_not_used(self):
+        """Con LocMem la invalidación no llega a otros workers: no se cachea"""
+        get_client_principal(self.client_id)
+        get_client_principal(self.client_id)
+        self.assertEqual(self.filter.call_count, 2)
+
+    def test_principal_is_read_only(self):
+        principal = get_client_principal(self.client_id)
+        principal.first_name = 'Otra'
+        with self.assertRaises(ReadOnlyPrincipalError):
+            principal.save()
+        with self.assertRaises(ReadOnlyPrincipalError):
+            principal.delete()
+
+    def test_repeated_authentication_in_request_is_memoized(self):
+        token = AccessToken()
+        token['client_id'] = str(self.client_id)
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        first, _ = ClientJWTAuthentication().authenticate(request)
+        with mock.patch.object(ClientJWTAuthentication, 'get_validated_token') as validate:
+            second, _ = ClientJWTAuthentication().authenticate(request)
+        validate.assert_not_called()
+        self.assertIs(first, second)
+        self.assertEqual(self.filter.call_count, 1)
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.db import transaction
 from django.db.models import Q, Sum, Count, Max, F, Value
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
@@ -10,6 +11,9 @@ from datetime import datetime, timedelta
 from apps.reservation.models import Reservation
 from apps.reservation.serializers import ClientReservationSerializer, ReservationListSerializer, ReservationRetrieveSerializer
 from .auth_views import ClientJWTAuthentication
+from .authentication import lock_client
+from apps.core.response_cache import cache_response
+from apps.core.exports import EXPORT_CHUNK_SIZE, parse_export, stream_export
 
 import logging
 
@@ -1017,6 +1021,7 @@ class PublicAchievementsListView(APIView):
     """Vista pública para obtener todos los logros disponibles"""
     permission_classes = [AllowAny]
 
+    @cache_response('clients.Achievement')
     def get(self, request):
         """Obtener lista de todos los logros disponibles"""
         logger.info("PublicAchievementsListView: Request for public achievements")
@@ -1840,11 +1845,16 @@ class ClientProfileView(APIView):
 
             logger.info(f"ClientProfileView: Client authenticated - ID: {client.id}")
 
-            # Usar serializer para validar y actualizar datos
-            serializer = ClientProfileSerializer(client, data=request.data, partial=True, context={'request': request})
+            # Usar serializer para validar y actualizar datos. El principal
+            # autenticado es de solo lectura: se edita la fila actual, bloqueada
+            with transaction.atomic():
+                client = lock_client(client)
+                serializer = ClientProfileSerializer(client, data=request.data, partial=True, context={'request': request})
+                is_valid = serializer.is_valid()
+                if is_valid:
+                    serializer.save()
 
-            if serializer.is_valid():
-                serializer.save()
+            if is_valid:
                 logger.info(f"ClientProfileView: Profile updated successfully for client {client.id}")
 
                 # Generar auditoría de la actualización
@@ -2297,6 +2307,54 @@ class SearchTrackingTestView(APIView):
         }, status=200)
 
 
+SEARCH_TRACKING_EXPORT_COLUMNS = (
+    'id', 'search_timestamp', 'check_in_date', 'check_out_date', 'guests',
+    'client_info.id', 'client_info.first_name', 'client_info.last_name',
+    'client_info.email', 'client_info.tel_number',
+    'property_info.id', 'property_info.name',
+    'technical_data.ip_address', 'technical_data.session_key',
+    'technical_data.user_agent', 'technical_data.referrer', 'created',
+)
+
+
+def _search_tracking_export_row(tracking):
+    """Fila de SearchTrackingExportView (JSON anidado; aplanado en archivos)."""
+    return {
+        'id': str(tracking.id),
+        'search_timestamp': tracking.search_timestamp.isoformat() if tracking.search_timestamp else None,
+        'check_in_date': tracking.check_in_date.strftime('%Y-%m-%d') if tracking.check_in_date else None,
+        'check_out_date': tracking.check_out_date.strftime('%Y-%m-%d') if tracking.check_out_date else None,
+        'guests': tracking.guests,
+        'client_info': {
+            'id': str(tracking.client.id) if tracking.client else 'ANONIMO',
+            'first_name': tracking.client.first_name if tracking.client else 'Usuario',
+            'last_name': tracking.client.last_name if tracking.client else 'Anónimo',
+            'email': tracking.client.email if tracking.client else 'anonimo@casaaustin.pe',
+            'tel_number': tracking.client.tel_number if tracking.client else 'Sin teléfono',
+        } if tracking.client else {
+            'id': 'ANONIMO',
+            'first_name': 'Usuario',
+            'last_name': 'Anónimo',
+            'email': 'anonimo@casaaustin.pe',
+            'tel_number': 'Sin teléfono',
+        },
+        'property_info': {
+            'id': str(tracking.property.id) if tracking.property else 'SIN_PROPIEDAD',
+            'name': tracking.property.name if tracking.property else 'Búsqueda general',
+        } if tracking.property else {
+            'id': 'SIN_PROPIEDAD',
+            'name': 'Búsqueda general',
+        },
+        'technical_data': {
+            'ip_address': str(tracking.ip_address) if tracking.ip_address else None,
+            'session_key': str(tracking.session_key) if tracking.session_key else None,
+            'user_agent': str(tracking.user_agent) if tracking.user_agent else None,
+            'referrer': str(tracking.referrer) if tracking.referrer else None,
+        },
+        'created': tracking.created.strftime('%Y-%m-%d') if hasattr(tracking, 'created') and tracking.created else None,
+    }
+
+
 class SearchTrackingExportView(APIView):
     """Vista para exportar datos de tracking de búsquedas en formato JSON y enviar a Google Sheets"""
     permission_classes = [AllowAny]
@@ -2410,45 +2468,21 @@ class SearchTrackingExportView(APIView):
             if property_id:
                 search_tracking_queryset = search_tracking_queryset.filter(property_id=property_id)
 
-            # Preparar datos para exportación
-            export_data = []
-            for tracking in search_tracking_queryset:
-                data = {
-                    'id': str(tracking.id),
-                    'search_timestamp': tracking.search_timestamp.isoformat() if tracking.search_timestamp else None,
-                    'check_in_date': tracking.check_in_date.strftime('%Y-%m-%d') if tracking.check_in_date else None,
-                    'check_out_date': tracking.check_out_date.strftime('%Y-%m-%d') if tracking.check_out_date else None,
-                    'guests': tracking.guests,
-                    'client_info': {
-                        'id': str(tracking.client.id) if tracking.client else 'ANONIMO',
-                        'first_name': tracking.client.first_name if tracking.client else 'Usuario',
-                        'last_name': tracking.client.last_name if tracking.client else 'Anónimo',
-                        'email': tracking.client.email if tracking.client else 'anonimo@casaaustin.pe',
-                        'tel_number': tracking.client.tel_number if tracking.client else 'Sin teléfono',
-                    } if tracking.client else {
-                        'id': 'ANONIMO',
-                        'first_name': 'Usuario',
-                        'last_name': 'Anónimo',
-                        'email': 'anonimo@casaaustin.pe',
-                        'tel_number': 'Sin teléfono',
-                    },
-                    'property_info': {
-                        'id': str(tracking.property.id) if tracking.property else 'SIN_PROPIEDAD',
-                        'name': tracking.property.name if tracking.property else 'Búsqueda general',
-                    } if tracking.property else {
-                        'id': 'SIN_PROPIEDAD',
-                        'name': 'Búsqueda general',
-                    },
-                    'technical_data': {
-                        'ip_address': str(tracking.ip_address) if tracking.ip_address else None,
-                        'session_key': str(tracking.session_key) if tracking.session_key else None,
-                        'user_agent': str(tracking.user_agent) if tracking.user_agent else None,
-                        'referrer': str(tracking.referrer) if tracking.referrer else None,
-                    },
-                    'created': tracking.created.strftime('%Y-%m-%d') if hasattr(tracking, 'created') and tracking.created else None,
-                }
+            try:
+                export = parse_export(request, SEARCH_TRACKING_EXPORT_COLUMNS)
+            except ValueError as e:
+                return Response({'success': False, 'message': str(e)}, status=400)
+
+            # Preparar datos para exportación (por bloques, sin cargar todo el historial)
+            rows = (
+                _search_tracking_export_row(tracking)
+                for tracking in search_tracking_queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            if export:
+                filename = f"search-tracking-{timezone.now():%Y%m%d}"
+                return stream_export(rows, *export, filename=filename)
 
-                export_data.append(data)
+            export_data = list(rows)
 
             # Preparar respuesta con metadatos
             response_data = {
@@ -2505,7 +2539,7 @@ class SearchTrackingView(APIView):
 
     def post(self, request):
         """Registrar o actualizar búsqueda del cliente"""
-        logger.info("SearchTrackingView: === INICIO === ")
+        logger.debug("SearchTrackingView: === INICIO === ")
 
         try:
             # Autenticar cliente
@@ -2515,26 +2549,26 @@ class SearchTrackingView(APIView):
             client = None
             if auth_result:
                 client, validated_token = auth_result
-                logger.info(f"SearchTrackingView: Cliente autenticado: {client.id if client else 'Anónimo'}")
+                logger.debug("SearchTrackingView: Cliente autenticado: %s", client.id if client else 'Anónimo')
             else:
                 # Permitir búsquedas anónimas si el cliente no está autenticado
-                logger.info("SearchTrackingView: Cliente no autenticado. Procesando como anónimo.")
+                logger.debug("SearchTrackingView: Cliente no autenticado. Procesando como anónimo.")
                 # Aquí se podría usar la IP para identificar al usuario anónimo si fuera necesario
                 client_ip = self.get_client_ip(request)
-                logger.info(f"SearchTrackingView: IP del cliente anónimo: {client_ip}")
+                logger.debug("SearchTrackingView: IP del cliente anónimo: %s", client_ip)
 
 
             # Log de lo que recibe Django
-            logger.info(f"SearchTrackingView: === DATOS RECIBIDOS ===")
-            logger.info(f"SearchTrackingView: request.method = {request.method}")
-            logger.info(f"SearchTrackingView: request.content_type = {request.content_type}")
-            logger.info(f"SearchTrackingView: request.data = {request.data}")
-            logger.info(f"SearchTrackingView: type(request.data) = {type(request.data)}")
+            logger.debug("SearchTrackingView: === DATOS RECIBIDOS ===")
+            logger.debug("SearchTrackingView: request.method = %s", request.method)
+            logger.debug("SearchTrackingView: request.content_type = %s", request.content_type)
+            logger.debug("SearchTrackingView: request.data = %s", request.data)
+            logger.debug("SearchTrackingView: type(request.data) = %s", type(request.data))
 
             # Extraer y procesar datos
             raw_data = request.data
-            logger.info(f"SearchTrackingView: === PROCESANDO DATOS ===")
-            logger.info(f"SearchTrackingView: raw_data = {raw_data}")
+            logger.debug("SearchTrackingView: === PROCESANDO DATOS ===")
+            logger.debug("SearchTrackingView: raw_data = %s", raw_data)
 
             # Procesar fechas y número de huéspedes
             check_in_date = None
@@ -2548,30 +2582,30 @@ class SearchTrackingView(APIView):
 
                 if 'check_in_date' in raw_data and raw_data['check_in_date']:
                     check_in_str = raw_data['check_in_date']
-                    logger.info(f"SearchTrackingView: Procesando check_in_date: {check_in_str}")
+                    logger.debug("SearchTrackingView: Procesando check_in_date: %s", check_in_str)
                     # Intentar varios formatos de fecha si es necesario, o definir uno estricto
                     check_in_date = datetime.strptime(check_in_str, '%Y-%m-%d').date()
-                    logger.info(f"SearchTrackingView: check_in_date procesado: {check_in_date}")
+                    logger.debug("SearchTrackingView: check_in_date procesado: %s", check_in_date)
 
                 if 'check_out_date' in raw_data and raw_data['check_out_date']:
                     check_out_str = raw_data['check_out_date']
-                    logger.info(f"SearchTrackingView: Procesando check_out_date: {check_out_str}")
+                    logger.debug("SearchTrackingView: Procesando check_out_date: %s", check_out_str)
                     check_out_date = datetime.strptime(check_out_str, '%Y-%m-%d').date()
-                    logger.info(f"SearchTrackingView: check_out_date procesado: {check_out_date}")
+                    logger.debug("SearchTrackingView: check_out_date procesado: %s", check_out_date)
 
                 if 'guests' in raw_data and raw_data['guests'] is not None:
                     guests = int(raw_data['guests'])
-                    logger.info(f"SearchTrackingView: guests procesado: {guests}")
+                    logger.debug("SearchTrackingView: guests procesado: %s", guests)
 
                 if 'property' in raw_data and raw_data['property']:
                     from apps.property.models import Property
                     try:
                         property_obj = Property.objects.get(id=raw_data['property'])
-                        logger.info(f"SearchTrackingView: property procesado: {property_obj.id if property_obj else 'None'}")
+                        logger.debug("SearchTrackingView: property procesado: %s", property_obj.id if property_obj else 'None')
                     except Property.DoesNotExist:
-                        logger.warning(f"SearchTrackingView: Property con ID {raw_data['property']} no encontrada")
+                        logger.warning("SearchTrackingView: Property con ID %s no encontrada", raw_data['property'])
                     except ValueError:
-                         logger.warning(f"SearchTrackingView: Formato de ID de propiedad inválido: {raw_data['property']}")
+                         logger.warning("SearchTrackingView: Formato de ID de propiedad inválido: %s", raw_data['property'])
 
 
                 # Validaciones básicas requeridas para guardar el tracking
@@ -2583,14 +2617,14 @@ class SearchTrackingView(APIView):
                     raise ValueError("guests es requerido.")
 
             except ValueError as ve:
-                logger.error(f"SearchTrackingView: Error en formato de datos: {str(ve)}")
+                logger.error("SearchTrackingView: Error en formato de datos: %s", str(ve))
                 return Response({
                     'success': False,
                     'message': 'Error en formato de datos',
                     'errors': str(ve)
                 }, status=400)
             except Exception as e:
-                 logger.error(f"SearchTrackingView: Error procesando datos: {str(e)}")
+                 logger.error("SearchTrackingView: Error procesando datos: %s", str(e))
                  return Response({
                     'success': False,
                     'message': 'Error al procesar datos de búsqueda',
@@ -2604,7 +2638,7 @@ class SearchTrackingView(APIView):
             user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]  # Limitar longitud
             referrer = request.META.get('HTTP_REFERER', '')
 
-            logger.info(f"SearchTrackingView: Datos adicionales capturados - IP: {ip_address}, Session: {session_key}")
+            logger.debug("SearchTrackingView: Datos adicionales capturados - IP: %s, Session: %s", ip_address, session_key)
 
             # Guardar registro de SearchTracking (siempre crear nuevo)
             search_tracking = SearchTracking.objects.create(
@@ -2622,9 +2656,9 @@ class SearchTrackingView(APIView):
             )
 
             if client:
-                logger.info(f"SearchTrackingView: Nuevo registro creado para cliente {client.id}: {search_tracking.id}")
+                logger.debug("SearchTrackingView: Nuevo registro creado para cliente %s: %s", client.id, search_tracking.id)
             else:
-                logger.info(f"SearchTrackingView: Nuevo registro anónimo creado: {search_tracking.id} para IP {ip_address}")
+                logger.debug("SearchTrackingView: Nuevo registro anónimo creado: %s para IP %s", search_tracking.id, ip_address)
 
             # Serializar la respuesta
             serializer = SearchTrackingSerializer(search_tracking)
@@ -2636,7 +2670,7 @@ class SearchTrackingView(APIView):
             }, status=200)
 
         except Exception as e:
-            logger.error(f"SearchTrackingView: Error al guardar/actualizar SearchTracking: {str(e)}")
+            logger.error("SearchTrackingView: Error al guardar/actualizar SearchTracking: %s", str(e))
             return Response({
                 'success': False,
                 'message': 'Error al guardar la búsqueda',
@@ -2702,6 +2736,7 @@ class PublicAchievementsListView(APIView):
     """Vista pública para obtener todos los logros disponibles"""
     permission_classes = [AllowAny]
 
+    @cache_response('clients.Achievement')
     def get(self, request):
         """Obtener lista de todos los logros disponibles"""
         logger.info("PublicAchievementsListView: Request for public achievements")
@@ -0,0 +1,233 @@
+"""
+Gateway compartido para las llamadas a OpenAI.
+
+Cada punto de uso (chatbot, asistente financiero, blog, vouchers, análisis
+de preguntas frecuentes, reportes) creaba `openai.OpenAI(...)` en cada
+llamada: un pool HTTP nuevo (TLS incluido) por mensaje, timeout de 10
+minutos y los reintentos por defecto del SDK. Acá:
+
+- Un solo cliente por proceso (se recrea tras un fork) con un pool httpx
+  de `AI_GATEWAY_POOL_SIZE` conexiones keep-alive.
+- `client(use_case)` devuelve una fachada con la misma forma que el SDK
+  (`.chat.completions.create`, `.embeddings.create`, `.images.generate`;
+  nada más del SDK pasa por acá) que aplica el timeout,
+  los reintentos (backoff del SDK, respeta Retry-After en 429) y el modelo
+  de chat por defecto de `AI_GATEWAY_USE_CASES[use_case]`.
+- Un semáforo por proceso (`AI_GATEWAY_MAX_CONCURRENCY`) limita las
+  llamadas en vuelo: una ráfaga de mensajes de WhatsApp espera su turno
+  (hasta `AI_GATEWAY_QUEUE_TIMEOUT` segundos, luego `AIGatewayBusy`) en vez
+  de disparar 429 en cadena. En streaming el cupo se libera al terminar de
+  consumir la respuesta.
+- Contabilidad por caso de uso: llamadas, errores, rechazos por cupo,
+  tokens y latencia (`stats()`), visible en /api/v1/perf/requests/.
+
+Como el ring buffer de apps.core.perf, el semáforo y los contadores son
+por proceso: cada worker de gunicorn tiene los suyos.
+
+Uso:
+    from apps.core import ai_gateway
+
+    response = ai_gateway.client('chatbot').chat.completions.create(
+        model=config.primary_model, messages=messages,
+    )
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USE_CASE = {'timeout': 60.0, 'max_retries': 2}
+
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_client = None
+_client_pid = None
+_semaphore = None
+_stats = defaultdict(lambda: {
+    'calls': 0, 'errors': 0, 'busy': 0,
+    'prompt_tokens': 0, 'completion_tokens': 0,
+    'latency_ms': 0.0, 'max_latency_ms': 0.0,
+})
+
+
+class AIGatewayBusy(Exception):
+    """No se liberó un cupo de concurrencia dentro de AI_GATEWAY_QUEUE_TIMEOUT."""
+
+
+def use_case_options(use_case):
+    options = dict(DEFAULT_USE_CASE)
+    options.update(getattr(settings, 'AI_GATEWAY_USE_CASES', {}).get(use_case, {}))
+    return options
+
+
+def _shared_client():
+    """Cliente OpenAI del proceso; uno nuevo si el proceso hizo fork."""
+    global _client, _client_pid, _semaphore
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            import httpx
+            import openai  # ~0.9s de import: solo al primer uso
+
+            pool = getattr(settings, 'AI_GATEWAY_POOL_SIZE', 20)
+            _client = openai.OpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=openai.DefaultHttpxClient(
+                    limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool),
+                ),
+            )
+            _semaphore = threading.BoundedSemaphore(getattr(settings, 'AI_GATEWAY_MAX_CONCURRENCY', 8))
+            _client_pid = pid
+    return _client
+
+
+def _record(use_case, started, usage=None, error=False):
+    elapsed = (time.monotonic() - started) * 1000
+    with _stats_lock:
+        stats = _stats[use_case]
+        stats['calls'] += 1
+        stats['errors'] += int(error)
+        stats['latency_ms'] += elapsed
+        stats['max_latency_ms'] = max(stats['max_latency_ms'], elapsed)
+        if usage is not None:
+            stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+            stats['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+    logger.debug('AI gateway: %s %.0f ms%s', use_case, elapsed, ' (error)' if error else '')
+
+
+def stats():
+    """Contadores por caso de uso con la latencia promedio."""
+    with _stats_lock:
+        snapshot = {use_case: dict(values) for use_case, values in _stats.items()}
+    for values in snapshot.values():
+        values['avg_latency_ms'] = round(values['latency_ms'] / values['calls'], 1) if values['calls'] else 0
+        values['latency_ms'] = round(values['latency_ms'], 1)
+        values['max_latency_ms'] = round(values['max_latency_ms'], 1)
+    return snapshot
+
+
+def clear_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _acquire(use_case):
+    """Toma un cupo de concurrencia; retorna la función que lo libera."""
+    semaphore = _semaphore
+    timeout = getattr(settings, 'AI_GATEWAY_QUEUE_TIMEOUT', 20.0)
+    if not semaphore.acquire(timeout=timeout):
+        with _stats_lock:
+            _stats[use_case]['busy'] += 1
+        logger.warning('AI gateway: sin cupo tras %.0fs para %s', timeout, use_case)
+        raise AIGatewayBusy(f'Demasiadas llamadas a OpenAI en curso ({use_case})')
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            semaphore.release()
+    return release
+
+
+class _Stream:
+    """Respuesta en streaming: libera el cupo y registra el uso al terminar."""
+
+    def __init__(self, events, use_case, started, release):
+        self._events = events
+        self._use_case = use_case
+        self._started = started
+        self._release = release
+        self._usage = None
+
+    def __iter__(self):
+        error = True
+        try:
+            for event in self._events:
+                if getattr(event, 'usage', None):
+                    self._usage = event.usage
+                yield event
+            error = False
+        finally:
+            self._release()
+            _record(self._use_case, self._started, self._usage, error=error)
+
+    def __del__(self):
+        # Si nunca se consumió, el cupo no puede quedar tomado
+        self._release()
+
+
+class GatewayClient:
+    """Fachada con la forma del SDK que pasa cada llamada por el gateway."""
+
+    def __init__(self, use_case):
+        self.use_case = use_case
+        self.options = use_case_options(use_case)
+        self.chat = _Chat(self)
+        self.embeddings = _Embeddings(self)
+        self.images = _Images(self)
+
+    def request(self, path, kwargs):
+        target = _shared_client().with_options(
+            timeout=self.options['timeout'], max_retries=self.options['max_retries'],
+        )
+        for name in path:
+            target = getattr(target, name)
+
+        release = _acquire(self.use_case)
+        started = time.monotonic()
+        try:
+            response = target(**kwargs)
+        except BaseException:
+            release()
+            _record(self.use_case, started, error=True)
+            raise
+        if kwargs.get('stream'):
+            return _Stream(response, self.use_case, started, release)
+        release()
+        _record(self.use_case, started, getattr(response, 'usage', None))
+        return response
+
+
+class _Completions:
+    def __init__(self, gateway):
+        self._gateway = gateway
+
+    def create(self, **kwargs):
+        if self._gateway.options.get('model'):
+            kwargs.setdefault('model', self._gateway.options['model'])
+        return self._gateway.request(('chat', 'completions', 'create'), kwargs)
+
+
+class _Chat:
+    def __init__(self, gateway):
+        self.completions = _Completions(gateway)
+
+
+class _Embeddings:
+    def __init__(self, gateway):
+        self._gateway = gateway
+
+    def create(self, **kwargs):
+        # El `model` del caso de uso es de chat: acá lo pasa el llamador
+        return self._gateway.request(('embeddings', 'create'), kwargs)
+
+
+class _Images:
+    def __init__(self, gateway):
+        self._gateway = gateway
+
+    def generate(self, **kwargs):
+        return self._gateway.request(('images', 'generate'), kwargs)
+
+
+def client(use_case='default'):
+    """Cliente para `use_case` (clave de AI_GATEWAY_USE_CASES)."""
+    return GatewayClient(use_case)
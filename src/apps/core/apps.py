@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'apps.core'
+
+    def ready(self):
+        from django.apps import apps
+        from django.db.models.signals import post_delete, post_save
+
+        from .response_cache import VERSIONED_MODELS, on_model_change
+
+        for label in VERSIONED_MODELS:
+            model = apps.get_model(label)
+            post_save.connect(on_model_change, sender=model, dispatch_uid=f'response_cache_post_save:{label}')
+            post_delete.connect(on_model_change, sender=model, dispatch_uid=f'response_cache_post_delete:{label}')
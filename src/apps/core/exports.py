@@ -0,0 +1,123 @@
+"""
+Exportaciones tabulares en streaming (CSV / XLSX).
+
+Los endpoints de exportación devolvían todo el período como un JSON que el
+frontend convertía a Excel: la lista completa de dicts vivía en memoria y
+los rangos largos (un año) terminaban en timeout. Con `?export=csv|xlsx`
+el mismo endpoint arma el archivo en el servidor:
+
+- Las filas salen de un generador (consultas con `.iterator()`), nunca de
+  una lista completa.
+- CSV: cada fila se escribe y se envía apenas se genera.
+- XLSX: workbook `write_only` de openpyxl; las filas se vuelcan a disco a
+  medida que se agregan y el archivo final se envía por chunks.
+- `?columns=a,b,c` elige y ordena las columnas. Los dicts anidados se
+  aplanan con punto (`client_info.email`).
+
+Uso:
+    try:
+        export = parse_export(request, COLUMNS)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    if export:
+        return stream_export(rows, *export, filename='reservas-2025-04')
+"""
+import csv
+import json
+import tempfile
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Filas por consulta de `.iterator()` en las exportaciones
+EXPORT_CHUNK_SIZE = 2000
+_FILE_CHUNK = 64 * 1024
+
+
+def parse_export(request, available):
+    """
+    (formato, columnas) pedidos en `?export=` / `?columns=`, o None si el
+    request no pide archivo. Lanza ValueError con un formato o columnas
+    desconocidas.
+    """
+    fmt = (request.query_params.get('export') or '').strip().lower()
+    if not fmt:
+        return None
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"export debe ser uno de: {', '.join(EXPORT_FORMATS)}")
+    requested = [c.strip() for c in (request.query_params.get('columns') or '').split(',') if c.strip()]
+    unknown = [c for c in requested if c not in available]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+    return fmt, list(requested or available)
+
+
+def flatten(row, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}"""
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def _cell(value):
+    if isinstance(value, (list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # openpyxl no acepta datetimes con zona horaria
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class _Echo:
+    """Pseudo-buffer: csv.writer devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(rows, columns):
+    writer = csv.writer(_Echo())
+    # BOM para que Excel abra el CSV como UTF-8
+    yield '\ufeff' + writer.writerow(columns)
+    for row in rows:
+        row = flatten(row)
+        yield writer.writerow([_cell(row.get(column)) for column in columns])
+
+
+def _xlsx_chunks(rows, columns, title):
+    # openpyxl (y numpy) se importan solo al exportar XLSX: este módulo lo
+    # cargan las vistas, que se importan en cada arranque con system checks
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31] or 'Export')
+    sheet.append(columns)
+    for row in rows:
+        row = flatten(row)
+        sheet.append([_cell(row.get(column)) for column in columns])
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(_FILE_CHUNK):
+            yield chunk
+
+
+def stream_export(rows, fmt, columns, filename):
+    """StreamingHttpResponse con `rows` (iterable de dicts) como CSV o XLSX."""
+    if fmt == 'csv':
+        content = _csv_chunks(rows, columns)
+    else:
+        content = _xlsx_chunks(rows, columns, filename)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,266 @@
+"""
+Pipeline asíncrono de derivados de imagen (tamaños responsivos + srcset).
+
+Las subidas desde el admin (fotos de propiedades, eventos, blog) ya no
+redimensionan dentro del request: al confirmar la transacción se encola el
+archivo en un pool de hilos que genera varios anchos en WebP (y AVIF si el
+Pillow instalado lo soporta). Los derivados se guardan por hash de
+contenido, así que una misma imagen subida varias veces se procesa una
+sola vez.
+
+Layout en storage:
+    derivatives/<hash[:2]>/<hash>/<ancho>.<ext>
+    derivatives/<hash[:2]>/<hash>/manifest.json
+    derivatives/index/<sha1(nombre_origen)>.json   (manifest por archivo origen)
+
+Uso:
+    enqueue_derivatives(photo, 'image_file', after='generate_thumbnail')
+    get_srcset(photo.image_file)  # "https://.../320.webp 320w, ..."
+"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .response_cache import bump_version
+
+logger = logging.getLogger('apps')
+
+DERIVATIVES_ROOT = 'derivatives'
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+DEFAULT_WORKERS = 2
+
+# Calidad por formato (AVIF comprime más a igual calidad visual)
+_QUALITY = {'webp': 82, 'avif': 60}
+
+_MANIFEST_CACHE_PREFIX = 'imgderiv:'
+_MANIFEST_CACHE_TTL = 60 * 60 * 6
+# Los orígenes aún sin procesar se cachean poco tiempo para no golpear
+# el storage en cada serialización mientras el worker termina.
+_MISSING_CACHE_TTL = 60
+_MISSING = '__missing__'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', DEFAULT_WORKERS)
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(workers)),
+                    thread_name_prefix='img-derivatives',
+                )
+    return _executor
+
+
+def available_formats():
+    """Formatos de salida soportados por el Pillow instalado (WebP siempre primero)."""
+    from PIL import Image
+
+    Image.init()
+    formats = ['webp']
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    return formats
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hash_dir(digest):
+    return f"{DERIVATIVES_ROOT}/{digest[:2]}/{digest}"
+
+
+def _index_path(source_name):
+    key = hashlib.sha1(source_name.encode('utf-8')).hexdigest()
+    return f"{DERIVATIVES_ROOT}/index/{key}.json"
+
+
+def _cache_key(source_name):
+    return _MANIFEST_CACHE_PREFIX + hashlib.sha1(source_name.encode('utf-8')).hexdigest()
+
+
+def _read_json(path):
+    if not default_storage.exists(path):
+        return None
+    with default_storage.open(path, 'rb') as fh:
+        return json.loads(fh.read().decode('utf-8'))
+
+
+def _write_json(path, payload):
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(json.dumps(payload).encode('utf-8')))
+
+
+def _render(image, width, fmt):
+    """Redimensiona manteniendo proporción y serializa en el formato pedido."""
+    from PIL import Image
+
+    height = max(1, round(image.height * width / image.width))
+    resized = image if width == image.width else image.resize(
+        (width, height), Image.Resampling.LANCZOS
+    )
+    output = BytesIO()
+    resized.save(output, format=fmt.upper(), quality=_QUALITY.get(fmt, 80))
+    return output.getvalue(), height
+
+
+def build_derivatives(source_name):
+    """
+    Genera (o reutiliza) los derivados de un archivo del storage.
+
+    Es síncrona: la usan el worker y el comando de backfill. Retorna el
+    manifest o None si el origen no existe o no es una imagen válida.
+    """
+    from PIL import Image, ImageOps
+
+    if not source_name or not default_storage.exists(source_name):
+        return None
+
+    with default_storage.open(source_name, 'rb') as fh:
+        data = fh.read()
+    digest = content_hash(data)
+    base_dir = _hash_dir(digest)
+    manifest_path = f"{base_dir}/manifest.json"
+
+    manifest = _read_json(manifest_path)
+    if manifest is None:
+        try:
+            with Image.open(BytesIO(data)) as img:
+                img = ImageOps.exif_transpose(img)
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+
+                widths = [w for w in _widths() if w < img.width] or [img.width]
+                variants = {}
+                for fmt in available_formats():
+                    for width in widths:
+                        payload, height = _render(img, width, fmt)
+                        path = f"{base_dir}/{width}.{fmt}"
+                        if not default_storage.exists(path):
+                            default_storage.save(path, ContentFile(payload))
+                        variants.setdefault(fmt, []).append({
+                            'width': width, 'height': height, 'path': path,
+                        })
+                manifest = {
+                    'hash': digest,
+                    'width': img.width,
+                    'height': img.height,
+                    'variants': variants,
+                }
+        except Exception as e:
+            logger.warning(f"No se pudieron generar derivados de {source_name}: {e}")
+            return None
+        _write_json(manifest_path, manifest)
+
+    _write_json(_index_path(source_name), manifest)
+    cache.set(_cache_key(source_name), manifest, _MANIFEST_CACHE_TTL)
+    return manifest
+
+
+def get_manifest(source_name):
+    """Manifest de derivados del archivo, o None si aún no se procesó."""
+    if not source_name:
+        return None
+    key = _cache_key(source_name)
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached == _MISSING else cached
+    try:
+        manifest = _read_json(_index_path(source_name))
+    except Exception as e:
+        logger.warning(f"Error leyendo manifest de derivados de {source_name}: {e}")
+        manifest = None
+    if manifest is None:
+        cache.set(key, _MISSING, _MISSING_CACHE_TTL)
+        return None
+    cache.set(key, manifest, _MANIFEST_CACHE_TTL)
+    return manifest
+
+
+def get_srcset(file_field, fmt='webp', absolute=None):
+    """
+    Construye el atributo srcset para un FileField/ImageField.
+
+    `absolute` es un callable opcional (p.ej. request.build_absolute_uri)
+    para convertir las URLs relativas de MEDIA_URL.
+    """
+    if not file_field:
+        return None
+    manifest = get_manifest(file_field.name)
+    if not manifest:
+        return None
+    variants = manifest.get('variants', {}).get(fmt)
+    if not variants:
+        return None
+    parts = []
+    for variant in variants:
+        url = default_storage.url(variant['path'])
+        if absolute:
+            url = absolute(url)
+        parts.append(f"{url} {variant['width']}w")
+    return ', '.join(parts)
+
+
+def _process(model, pk, field_name, after):
+    close_old_connections()
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            return
+        if after:
+            updates = getattr(instance, after)() or {}
+            if updates:
+                model.objects.filter(pk=pk).update(**updates)
+                for attr, value in updates.items():
+                    setattr(instance, attr, value)
+        source = getattr(instance, field_name)
+        if source:
+            build_derivatives(source.name)
+        # update() no dispara señales: las respuestas cacheadas deben
+        # incluir el srcset recién generado
+        bump_version(model)
+    except Exception as e:
+        logger.error(f"Error procesando derivados de {model.__name__} {pk}: {e}")
+    finally:
+        close_old_connections()
+
+
+def enqueue_derivatives(instance, field_name, after=None):
+    """
+    Encola la generación de derivados para `instance.<field_name>`.
+
+    `after` es el nombre de un método del modelo que corre en el worker
+    antes de generar los derivados (thumbnail legacy, conversión a WebP…).
+    Debe retornar un dict de campos a persistir con `update()` (sin
+    disparar `save()` de nuevo) o None.
+    """
+    if not getattr(instance, field_name, None):
+        return
+    model, pk = type(instance), instance.pk
+
+    def _submit():
+        if getattr(settings, 'IMAGE_DERIVATIVES_SYNC', False):
+            _process(model, pk, field_name, after)
+        else:
+            _get_executor().submit(_process, model, pk, field_name, after)
+
+    transaction.on_commit(_submit)
@@ -0,0 +1,258 @@
+"""
+Pipeline de logs en cola para el logger `apps`.
+
+El handler `file` era un logging.FileHandler síncrono a DEBUG: cada línea
+se formateaba y se escribía (con flush) dentro del request, y las señales
+de Reservation o el tracking de búsquedas emiten decenas por request. Acá:
+
+- `QueuedFileHandler` (QueueHandler) solo encola el registro; un
+  QueueListener en un hilo aparte aplica el formatter y escribe en
+  `BufferedWatchedFileHandler`: junta las líneas y las escribe con un solo
+  write() cuando la cola queda vacía en vez de flush por línea. Si la cola
+  se llena (`LOG_QUEUE_SIZE`) el registro se descarta y se cuenta en
+  `dropped`, nunca bloquea el request.
+- ERROR y superiores no esperan: el hilo que loguea espera a que el
+  listener los escriba (con todo lo encolado antes), así el traceback de
+  un worker que muere por SIGKILL o por el timeout de gunicorn queda en
+  el archivo.
+- Todos los workers de gunicorn escriben el mismo `LOG_FILE` en modo
+  append; cada write() lleva líneas completas, así que no se mezclan a
+  mitad de línea. La rotación no la hace el proceso (cada worker rotaría
+  por su cuenta y pisaría a los demás) sino logrotate, sin copytruncate:
+  el handler detecta que el archivo se movió (stat como WatchedFileHandler,
+  a lo sumo una vez por segundo) y abre uno nuevo. Por ejemplo en
+  /etc/logrotate.d/casaaustin:
+
+      /srv/casaaustin/src/casaaustin_debug.log {
+          daily
+          rotate 7
+          compress
+          delaycompress
+          missingok
+          notifempty
+      }
+
+- `SamplingFilter` deja pasar 1 de cada N registros DEBUG por módulo
+  (`LOG_SAMPLING`, por prefijo de logger). INFO y superiores no se tocan.
+  Crear el LogRecord (findCaller recorre el stack) es lo más caro de una
+  línea descartada, así que con `early=True` el filtro instala
+  `SampledLogger` como clase de logger: los loggers de módulo creados
+  después (todos los de `apps.*`, que se importan tras configurar el
+  logging) deciden el muestreo antes de crear el registro. Los creados
+  antes se muestrean en el handler.
+- Formato perezoso: el mensaje (`msg % args`) se arma en el hilo que
+  loguea, porque los args pueden ser modelos cuyo __str__ consulta la BD;
+  asctime, el formatter y los tracebacks se resuelven en el listener. Las
+  llamadas calientes usan `logger.debug('... %s', x)` en vez de f-strings
+  para que lo descartado por nivel o muestreo no se formatee nunca.
+
+`python manage.py bench_logging` mide el costo por request de ambos
+caminos.
+
+Uso (LOGGING en settings):
+    'file': {
+        '()': 'apps.core.logging_pipeline.queued_file_handler',
+        'filename': LOG_FILE, 'queue_size': LOG_QUEUE_SIZE, ...
+        'filters': ['sampling'],
+    }
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+
+class BufferedWatchedFileHandler(WatchedFileHandler):
+    """
+    WatchedFileHandler para el hilo del listener: acumula las líneas y las
+    escribe juntas en `flush()` (al vaciar la cola, al pasar `buffer_size`
+    caracteres o con un registro de nivel >= `flush_level`). Revisa si
+    logrotate movió el archivo cada `check_interval` segundos, no en cada
+    registro.
+    """
+
+    def __init__(self, filename, encoding='utf-8', flush_level=logging.ERROR, buffer_size=64 * 1024, check_interval=1.0):
+        super().__init__(filename, encoding=encoding, delay=True)
+        self.flush_level = flush_level
+        self.buffer_size = buffer_size
+        self.check_interval = check_interval
+        self._pending = []
+        self._pending_size = 0
+        self._checked = None
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            self._pending.append(msg)
+            self._pending_size += len(msg)
+            if record.levelno >= self.flush_level or self._pending_size >= self.buffer_size:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if not self._pending:
+                return
+            now = time.monotonic()
+            if self.stream is None:
+                self.stream = self._open()
+                self._statstream()
+                self._checked = now
+            elif now - self._checked >= self.check_interval:
+                self.reopenIfNeeded()
+                self._checked = now
+            data = ''.join(self._pending)
+            self._pending.clear()
+            self._pending_size = 0
+            self.stream.write(data)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class _IdleFlushListener(QueueListener):
+    """QueueListener que hace flush de los handlers al vaciar la cola."""
+
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return self.queue.get(block)
+
+
+class QueuedFileHandler(QueueHandler):
+    """Encola registros; un QueueListener los escribe en `sink`."""
+
+    def __init__(self, sink, queue_size=10000, flush_level=logging.ERROR):
+        self.queue_size = queue_size
+        super().__init__(queue.Queue(queue_size))
+        self.sink = sink
+        self.flush_level = flush_level
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # El formatter corre en el hilo del listener
+        super().setFormatter(fmt)
+        self.sink.setFormatter(fmt)
+
+    def _ensure_listener(self):
+        # Arranque perezoso y por proceso: tras un fork (gunicorn) el hilo
+        # del padre no existe y la cola puede haber quedado con el lock tomado.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.queue_size)
+            self._listener = _IdleFlushListener(self.queue, self.sink, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Mismo proceso: no hace falta copiar ni serializar como hace
+        # QueueHandler. Solo se fija el mensaje (el resto de handlers ven el
+        # mismo texto); el formatter se aplica en el listener.
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if record.levelno >= self.flush_level:
+            # El sink hace flush al escribirlo; esperar a que llegue al disco
+            self.queue.join()
+
+    def flush(self):
+        """Espera a que el listener escriba lo encolado."""
+        if self._pid == os.getpid():
+            self.queue.join()
+            self.sink.flush()
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+        self.sink.close()
+        super().close()
+
+
+def queued_file_handler(filename, encoding='utf-8', queue_size=10000, flush_level=logging.ERROR):
+    """Factory para dictConfig ('()'): cola + BufferedWatchedFileHandler."""
+    sink = BufferedWatchedFileHandler(filename, encoding=encoding, flush_level=flush_level)
+    return QueuedFileHandler(sink, queue_size, flush_level)
+
+
+class SampledLogger(logging.Logger):
+    """Logger que aplica `sampler` antes de crear el LogRecord."""
+    sampler = None
+
+    def _log(self, level, msg, args, **kwargs):
+        sampler = SampledLogger.sampler
+        if sampler is not None and level <= sampler.level and not sampler.keep(self.name):
+            return
+        # Un frame más (este) para que findCaller reporte al que loguea
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 1
+        super()._log(level, msg, args, **kwargs)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar 1 de cada N registros hasta `level` (DEBUG) por logger.
+    `rates` es {prefijo_de_logger: N}; gana el prefijo más largo. Con
+    `early=True` además muestrea en los SampledLogger (ver arriba).
+    """
+
+    def __init__(self, rates=None, level=logging.DEBUG, early=False):
+        super().__init__()
+        self.rates = sorted(
+            ((prefix, int(rate)) for prefix, rate in (rates or {}).items()),
+            key=lambda item: -len(item[0]),
+        )
+        self.level = level if isinstance(level, int) else logging.getLevelName(level.upper())
+        self._counters = {}
+        if early:
+            SampledLogger.sampler = self
+            logging.setLoggerClass(SampledLogger)
+
+    def rate_for(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(f'{prefix}.'):
+                return rate
+        return 1
+
+    def keep(self, name):
+        counter = self._counters.get(name)
+        if counter is None:
+            counter = self._counters.setdefault(name, (self.rate_for(name), itertools.count()))
+        rate, count = counter
+        return rate <= 1 or next(count) % rate == 0
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        if SampledLogger.sampler is self and isinstance(
+            logging.Logger.manager.loggerDict.get(record.name), SampledLogger,
+        ):
+            # Ya se muestreó antes de crear el registro
+            return True
+        return self.keep(record.name)
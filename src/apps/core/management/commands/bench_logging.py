@@ -0,0 +1,101 @@
+"""
+Mide el costo de loguear por request: FileHandler síncrono con f-strings
+(configuración anterior) vs QueuedFileHandler + SamplingFilter con
+argumentos perezosos (apps.core.logging_pipeline).
+
+Cada "request" emite las líneas de un POST de SearchTrackingView: mayoría
+DEBUG con el payload y algunas INFO. Se reporta el tiempo dentro del
+request (lo que paga el cliente) y, aparte, lo que tarda el listener en
+vaciar la cola.
+
+Uso: python manage.py bench_logging [--requests 2000] [--lines 25] [--rate 10]
+"""
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.logging_pipeline import SampledLogger, SamplingFilter, queued_file_handler
+
+LOGGER_NAME = 'apps.bench.logging'
+INFO_EVERY = 5  # una línea INFO cada 5
+
+
+class Command(BaseCommand):
+    help = 'Compara el costo por request del logging síncrono vs el pipeline en cola'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests simulados (default 2000)')
+        parser.add_argument('--lines', type=int, default=25, help='Líneas de log por request (default 25)')
+        parser.add_argument('--rate', type=int, default=10, help='Muestreo DEBUG 1 de N (default 10)')
+
+    def handle(self, *args, **options):
+        requests, lines = max(1, options['requests']), max(1, options['lines'])
+        formatter = logging.Formatter(settings.LOGGING['formatters']['verbose']['format'], style='{')
+        payload = {
+            'check_in_date': '2025-07-18', 'check_out_date': '2025-07-20', 'guests': 4,
+            'property': '3f6c1f4e-8a3b-4c55-9d3e-2b7f1f0c9a11', 'session_key': 'x' * 32,
+        }
+        previous_sampler = SampledLogger.sampler
+        sampler = SamplingFilter({LOGGER_NAME: options['rate']}, early=True)
+        SampledLogger.sampler = None
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+
+        def eager_request():
+            for i in range(lines):
+                if i % INFO_EVERY == 0:
+                    logger.info(f'SearchTrackingView: Datos adicionales capturados - IP: 10.0.0.{i}, Session: {payload["session_key"]}')
+                else:
+                    logger.debug(f'SearchTrackingView: request.data = {payload}')
+
+        def lazy_request():
+            for i in range(lines):
+                if i % INFO_EVERY == 0:
+                    logger.info('SearchTrackingView: Datos adicionales capturados - IP: 10.0.0.%s, Session: %s', i, payload['session_key'])
+                else:
+                    logger.debug('SearchTrackingView: request.data = %s', payload)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sync = logging.FileHandler(os.path.join(tmp, 'sync.log'), encoding='utf-8')
+            sync.setFormatter(formatter)
+            before, _ = self._run(logger, sync, eager_request, requests)
+
+            queued = queued_file_handler(os.path.join(tmp, 'queued.log'), queue_size=settings.LOG_QUEUE_SIZE)
+            queued.setFormatter(formatter)
+            queued.addFilter(sampler)
+            SampledLogger.sampler = sampler
+            try:
+                after, drain = self._run(logger, queued, lazy_request, requests)
+            finally:
+                SampledLogger.sampler = previous_sampler
+            dropped = queued.dropped
+
+        self.stdout.write(f'{requests} requests x {lines} líneas ({sum(1 for i in range(lines) if i % INFO_EVERY)} DEBUG)')
+        self.stdout.write(f'síncrono   : {before * 1e6 / requests:8.1f} µs/request')
+        self.stdout.write(
+            f'en cola    : {after * 1e6 / requests:8.1f} µs/request '
+            f'(listener {drain * 1e3:.1f} ms para vaciar la cola, {dropped} descartados)'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Overhead removido: {(before - after) * 1e6 / requests:.1f} µs/request (x{before / after:.1f})'
+        ))
+
+    def _run(self, logger, handler, request, requests):
+        logger.handlers = [handler]
+        try:
+            started = time.perf_counter()
+            for _ in range(requests):
+                request()
+            elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            handler.flush()
+            drain = time.perf_counter() - started
+        finally:
+            logger.handlers = []
+            handler.close()
+        return elapsed, drain
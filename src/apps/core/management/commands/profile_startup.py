@@ -0,0 +1,117 @@
+"""
+Perfil de arranque de los management commands.
+
+Cada comando se mide en un intérprete nuevo (como lo lanza cron), con
+`python -X importtime`, separando las fases:
+
+- setup:   django.setup() (settings, modelos, AppConfig.ready / señales)
+- import:  el módulo del comando
+- checks:  system checks (importan el URLconf y todas las vistas); los
+           paga cada `manage.py <comando>` salvo con --skip-checks, no
+           call_command ni run_scheduler
+- total:   wall time del proceso, intérprete incluido
+
+y los paquetes que más tiempo de import propio suman.
+
+Uso:
+    python manage.py profile_startup                     # comandos de apps.*
+    python manage.py profile_startup resume_ai_sessions send_quick_rescue --top 5
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.management import load_command_class
+command = load_command_class(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+if command.requires_system_checks:
+    from django.core import checks
+    checks.run_checks()
+checked = time.perf_counter()
+print(json.dumps({
+    'setup': setup - started, 'import': loaded - setup, 'checks': checked - loaded,
+}))
+'''
+
+
+def import_self_times(stderr):
+    """Tiempo de import propio (ms) por paquete de primer nivel."""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1000
+    return totals
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de arranque (setup, import, checks) de cada management command'
+
+    def add_arguments(self, parser):
+        parser.add_argument('commands', nargs='*', help='Comandos a medir (default: todos los de apps.*)')
+        parser.add_argument('--top', type=int, default=3, help='Paquetes más caros por comando (default 3)')
+        parser.add_argument('--json', action='store_true', help='Salida JSON')
+
+    def handle(self, *args, **options):
+        available = get_commands()
+        names = options['commands'] or sorted(
+            name for name, app in available.items() if app.startswith('apps.')
+        )
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise CommandError(f"Comandos desconocidos: {', '.join(unknown)}")
+
+        results, overall = [], Counter()
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        for name in names:
+            started = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', PROBE, available[name], name],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+            )
+            wall = time.perf_counter() - started
+            if proc.returncode != 0:
+                self.stderr.write(f'{name}: falló\n{proc.stderr.splitlines()[-1] if proc.stderr else ""}')
+                continue
+            phases = json.loads(proc.stdout.strip().splitlines()[-1])
+            packages = import_self_times(proc.stderr)
+            overall.update(packages)
+            results.append({
+                'command': name,
+                **{phase: round(value * 1000) for phase, value in phases.items()},
+                'total': round(wall * 1000),
+                'top_imports': [
+                    {'package': package, 'ms': round(ms)} for package, ms in packages.most_common(options['top'])
+                ],
+            })
+
+        results.sort(key=lambda row: -row['total'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f'{"comando":<38}{"setup":>7}{"import":>8}{"checks":>8}{"total":>8}  imports más caros (ms)')
+        for row in results:
+            top = ', '.join(f'{item["package"]} {item["ms"]}' for item in row['top_imports'])
+            self.stdout.write(
+                f'{row["command"]:<38}{row["setup"]:>7}{row["import"]:>8}{row["checks"]:>8}{row["total"]:>8}  {top}'
+            )
+        if results:
+            self.stdout.write('')
+            self.stdout.write('Paquetes con más import propio (promedio por comando):')
+            for package, ms in overall.most_common(10):
+                self.stdout.write(f'  {package:<24}{ms / len(results):8.0f} ms/comando')
@@ -0,0 +1,53 @@
+"""
+Proceso único que ejecuta los comandos periódicos en su horario cron
+(apps.core.scheduler), sin arrancar un manage.py por ejecución.
+
+Uso:
+    python manage.py run_scheduler            # loop (SIGTERM/SIGINT para salir)
+    python manage.py run_scheduler --list     # jobs y próxima ejecución
+    python manage.py run_scheduler --run send_quick_rescue
+Cron (mantiene vivo el proceso; tras un deploy el loop sale solo y cron
+lo relanza con el código nuevo):
+    * * * * * flock -n /tmp/casaaustin-scheduler.lock python manage.py run_scheduler
+"""
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.scheduler import Scheduler, load_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta en un solo proceso los comandos periódicos según su horario cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', action='store_true', help='Listar jobs y su próxima ejecución')
+        parser.add_argument('--run', metavar='COMANDO', help='Ejecutar ahora un job y salir')
+        parser.add_argument('--workers', type=int, help='Hilos para jobs (default SCHEDULER_WORKERS)')
+
+    def handle(self, *args, **options):
+        jobs = load_jobs()
+        scheduler = Scheduler(jobs, workers=options['workers'])
+
+        if options['list']:
+            now = scheduler.now()
+            for job in sorted(jobs, key=lambda job: job.schedule.next_after(now)):
+                self.stdout.write(
+                    f'{job.schedule.expression:<32} {job.name:<30} '
+                    f'próxima: {job.schedule.next_after(now):%Y-%m-%d %H:%M %Z}'
+                )
+            return
+
+        if options['run']:
+            job = next((job for job in jobs if job.command == options['run']), None)
+            if job is None:
+                raise CommandError(f"'{options['run']}' no está en SCHEDULER_JOBS (o está excluido)")
+            if not run_job(job):
+                raise CommandError(f'{job.name} falló (ver log)')
+            return
+
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+        self.stdout.write(f'Scheduler iniciado: {len(jobs)} jobs ({scheduler.tz.key})')
+        scheduler.run()
+        self.stdout.write('Scheduler detenido.')
@@ -58,7 +58,14 @@ def CustomHistoryRequestMiddleware(get_response):
 
     def middleware_with_history(request):
         set_history_context(request)
-        response = get_response(request)
-        return response
+        try:
+            return get_response(request)
+        finally:
+            # Sin esto el request queda en el thread: lo siguiente que se
+            # guarde fuera de una vista (tareas, tests) hereda ese usuario
+            try:
+                del HistoricalRecords.context.request
+            except AttributeError:
+                pass
 
     return middleware_with_history
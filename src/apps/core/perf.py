@@ -0,0 +1,292 @@
+"""
+Instrumentación de rendimiento por request.
+
+`PerformanceMiddleware` perfila una muestra de los requests
+(`PERF_SAMPLE_RATE`) y para cada uno registra:
+
+- Consultas a la BD: cantidad y tiempo (execute_wrapper en cada conexión).
+- Consultas repetidas: el SQL se normaliza a una huella (placeholders y
+  listas `IN (...)` colapsadas); las huellas que se repiten
+  `PERF_DUPLICATE_THRESHOLD` veces o más se reportan como sospecha de N+1.
+- Llamadas HTTP salientes por host (OpenAI, Meta Graph, Expo, Home
+  Assistant, RENIEC...), envolviendo `requests.Session.send` y
+  `httpx.Client.send` / `AsyncClient.send`. Para respuestas en streaming se
+  mide hasta recibir los headers.
+- Tiempo total y vista resuelta.
+
+El resultado va a un ring buffer en memoria del proceso
+(`PERF_BUFFER_SIZE`; cada worker de gunicorn tiene el suyo), expuesto en
+`/api/v1/perf/requests/` para administradores, y al header
+`Server-Timing` de la respuesta (`PERF_SERVER_TIMING`) sólo para usuarios
+staff o requests forzados: expone conteos de consultas y hosts externos.
+Un request fuera de la muestra no paga nada más que el sorteo. Con
+`PERF_FORCE_TOKEN` configurado, el header `X-Perf-Profile: <token>` fuerza
+el perfilado.
+
+En respuestas en streaming (exportaciones) el total no incluye el envío
+del cuerpo.
+"""
+import functools
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+_current = ContextVar('perf_profile', default=None)
+_buffer = deque(maxlen=getattr(settings, 'PERF_BUFFER_SIZE', 500))
+_buffer_lock = threading.Lock()
+_hooks_installed = False
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_METRIC = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def fingerprint(sql):
+    """SQL normalizado para agrupar consultas que solo cambian en valores."""
+    sql = _QUOTED.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _NUMBER.sub('?', sql)
+
+
+class RequestProfile:
+    """Mediciones de un request perfilado."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.query_time = defaultdict(float)
+        self.samples = {}
+        self.http = defaultdict(lambda: [0, 0.0])
+
+    def add_query(self, sql, elapsed):
+        self.db_count += 1
+        self.db_time += elapsed
+        key = fingerprint(sql)
+        self.queries[key] += 1
+        self.query_time[key] += elapsed
+        self.samples.setdefault(key, sql)
+
+    def add_http(self, host, elapsed):
+        stats = self.http[host or 'desconocido']
+        stats[0] += 1
+        stats[1] += elapsed
+
+    def duplicates(self, threshold):
+        return [
+            {
+                'sql': self.samples[key][:500],
+                'count': count,
+                'ms': round(self.query_time[key] * 1000, 2),
+            }
+            for key, count in self.queries.most_common()
+            if count >= threshold
+        ]
+
+    def as_dict(self, view, status, total, threshold):
+        return {
+            'at': timezone.now().isoformat(),
+            'method': self.method,
+            'path': self.path,
+            'view': view,
+            'status': status,
+            'total_ms': round(total * 1000, 2),
+            'db': {'count': self.db_count, 'ms': round(self.db_time * 1000, 2)},
+            'duplicates': self.duplicates(threshold),
+            'http': {
+                host: {'count': count, 'ms': round(elapsed * 1000, 2)}
+                for host, (count, elapsed) in self.http.items()
+            },
+        }
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def _host(request):
+    return urlsplit(str(getattr(request, 'url', ''))).hostname
+
+
+def _wrap_send(original):
+    @functools.wraps(original)
+    def send(self, request, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return original(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original(self, request, *args, **kwargs)
+        finally:
+            profile.add_http(_host(request), time.perf_counter() - started)
+    return send
+
+
+def _wrap_async_send(original):
+    @functools.wraps(original)
+    async def send(self, request, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return await original(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await original(self, request, *args, **kwargs)
+        finally:
+            profile.add_http(_host(request), time.perf_counter() - started)
+    return send
+
+
+def install_http_hooks():
+    """Envuelve los clientes HTTP una sola vez por proceso."""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    import requests
+    requests.Session.send = _wrap_send(requests.Session.send)
+    try:
+        import httpx
+    except ImportError:
+        pass
+    else:
+        httpx.Client.send = _wrap_send(httpx.Client.send)
+        httpx.AsyncClient.send = _wrap_async_send(httpx.AsyncClient.send)
+    _hooks_installed = True
+
+
+def server_timing(record):
+    """Valor del header Server-Timing para un registro del buffer."""
+    parts = [
+        f'total;dur={record["total_ms"]}',
+        f'db;dur={record["db"]["ms"]};desc="{record["db"]["count"]} queries"',
+    ]
+    if record['duplicates']:
+        repeated = sum(item['count'] for item in record['duplicates'])
+        parts.append(f'db-dup;desc="{len(record["duplicates"])} huellas, {repeated} consultas"')
+    for host, stats in record['http'].items():
+        parts.append(f'http-{_METRIC.sub("_", host)};dur={stats["ms"]};desc="{stats["count"]} calls"')
+    return ', '.join(parts)
+
+
+def recent(limit=None, view=None):
+    """Registros del buffer, del más reciente al más antiguo."""
+    with _buffer_lock:
+        records = list(_buffer)
+    records.reverse()
+    if view:
+        records = [record for record in records if record['view'] == view]
+    return records[:limit] if limit else records
+
+
+def clear():
+    with _buffer_lock:
+        _buffer.clear()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summary(records):
+    """Agregado por vista: cantidad, p50/p95/máx, consultas y HTTP promedio."""
+    by_view = defaultdict(list)
+    for record in records:
+        by_view[record['view']].append(record)
+    result = []
+    for view, items in by_view.items():
+        totals = [item['total_ms'] for item in items]
+        result.append({
+            'view': view,
+            'count': len(items),
+            'p50_ms': _percentile(totals, 0.5),
+            'p95_ms': _percentile(totals, 0.95),
+            'max_ms': max(totals),
+            'avg_queries': round(sum(item['db']['count'] for item in items) / len(items), 1),
+            'avg_db_ms': round(sum(item['db']['ms'] for item in items) / len(items), 2),
+            'avg_http_ms': round(
+                sum(stats['ms'] for item in items for stats in item['http'].values()) / len(items), 2,
+            ),
+            'with_duplicates': sum(1 for item in items if item['duplicates']),
+        })
+    return sorted(result, key=lambda row: -row['p95_ms'])
+
+
+def _forced(request):
+    token = getattr(settings, 'PERF_FORCE_TOKEN', '')
+    return bool(token) and request.headers.get('X-Perf-Profile') == token
+
+
+def _sampled(request):
+    if _forced(request):
+        return True
+    rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return match.view_name or match._func_path
+
+
+def _may_see_timing(request):
+    """Server-Timing solo para staff (ya autenticado por la vista) o con el token."""
+    user = getattr(request, 'user', None)
+    return bool(getattr(user, 'is_staff', False)) or _forced(request)
+
+
+def PerformanceMiddleware(get_response):
+    """
+    Perfila una muestra de requests (ver docstring del módulo). Va primero
+    en MIDDLEWARE para que el total incluya al resto de middlewares.
+    """
+    install_http_hooks()
+
+    def middleware(request):
+        if not getattr(settings, 'PERF_ENABLED', True) or not _sampled(request):
+            return get_response(request)
+
+        profile = RequestProfile(request.method, request.path)
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(_db_wrapper))
+                response = get_response(request)
+        finally:
+            _current.reset(token)
+
+        record = profile.as_dict(
+            _view_name(request),
+            response.status_code,
+            time.perf_counter() - profile.started,
+            getattr(settings, 'PERF_DUPLICATE_THRESHOLD', 3),
+        )
+        with _buffer_lock:
+            _buffer.append(record)
+        if getattr(settings, 'PERF_SERVER_TIMING', True) and _may_see_timing(request):
+            response['Server-Timing'] = server_timing(record)
+        return response
+
+    return middleware
@@ -0,0 +1,88 @@
+"""
+Presupuesto de consultas para los endpoints calientes.
+
+Los tests de apps.core.tests ejecutan precios, disponibilidad, turno del
+chatbot, listado de reservas, dashboard y estadísticas contra un dataset
+sembrado. Cada bloque medido tiene un máximo de consultas: si un cambio
+mete un N+1 o una consulta de más, el test falla y muestra el SQL
+capturado con su EXPLAIN.
+
+Con `QUERY_BUDGET_REPORT=<ruta>.json` el suite además guarda, por bloque,
+la cantidad de consultas, el SQL y el plan de cada SELECT, para comparar
+planes entre ramas o después de agregar índices.
+
+Uso (en un TestCase):
+    class HotPathsTest(QueryBudgetMixin, TestCase):
+        def test_pricing(self):
+            with self.assertQueryBudget('pricing', 40):
+                service.calculate_pricing(...)
+"""
+import json
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def explain(sql):
+    """Plan de un SELECT ya capturado (texto, una línea por fila)."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return '\n'.join(' | '.join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'(sin plan: {e})'
+
+
+class QueryBudgetMixin:
+    """assertQueryBudget / assertUsesIndex para TestCase."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.query_report = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        path = getattr(settings, 'QUERY_BUDGET_REPORT', '')
+        if path and cls.query_report:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                report = {}
+            report.update(cls.query_report)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        super().tearDownClass()
+
+    @contextmanager
+    def assertQueryBudget(self, name, budget):
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+        queries = [query['sql'] for query in captured.captured_queries]
+        over = len(queries) > budget
+        plans = None
+        if over or getattr(settings, 'QUERY_BUDGET_REPORT', ''):
+            plans = [explain(sql) for sql in queries]
+        self.query_report[name] = {
+            'budget': budget,
+            'queries': len(queries),
+            'sql': queries,
+            'plans': plans,
+        }
+        if over:
+            detail = '\n\n'.join(
+                f'{i}. {sql}\n   EXPLAIN: {plan}'
+                for i, (sql, plan) in enumerate(zip(queries, plans), 1)
+            )
+            self.fail(f'{name}: {len(queries)} consultas (presupuesto {budget})\n\n{detail}')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """El plan de `queryset` usa alguno de los índices indicados."""
+        plan = queryset.explain()
+        if not any(name in plan for name in index_names):
+            self.fail(f'El plan no usa {", ".join(index_names)}:\n{plan}')
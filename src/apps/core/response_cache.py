@@ -0,0 +1,231 @@
+"""
+Cache de respuestas para endpoints públicos de catálogo.
+
+La clave de cada respuesta combina endpoint + query params + host + la
+versión de cada modelo del que depende. Solo los modelos de
+`VERSIONED_MODELS` tienen versión: sus señales post_save/post_delete
+(conectadas en CoreConfig.ready) la cambian, así que editar una propiedad,
+un post o un logro deja obsoletas solo las respuestas que dependen de ese
+modelo. Las escrituras de otros modelos (mensajes, búsquedas, TV) no pagan
+nada.
+
+Las versiones viven en el cache default. Con un cache compartido
+(`REDIS_URL`, ver `is_shared`) el cambio lo ven todos los workers al
+instante; con el LocMemCache por defecto solo el proceso que escribió, y en
+los demás la respuesta vieja dura hasta que vence su TTL.
+
+- ETag derivado de la clave: si el cliente ya tiene esa versión se
+  responde 304 sin cuerpo.
+- Stale-while-revalidate: vencido el TTL, un solo request regenera la
+  respuesta (lock en el cache) y el resto sigue recibiendo la copia
+  anterior hasta `stale_ttl`. También se anuncia en Cache-Control para
+  que CDN y navegadores hagan lo mismo.
+- Requests autenticados (header Authorization) y métodos que no son
+  GET/HEAD no se cachean.
+
+Las escrituras con `queryset.update()`/`bulk_create` no disparan señales;
+ahí el TTL acota cuánto tarda en verse el cambio (o llamar a
+`bump_version`).
+
+Uso:
+    @cache_response('property.Property', 'property.PropertyPhoto')
+    def list(self, request, *args, **kwargs):
+        ...
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = 'respcache:v:'
+ENTRY_PREFIX = 'respcache:e:'
+REGENERATE_LOCK_TTL = 30
+
+# Modelos con versión: los que usan cache_response, los fragmentos del
+# prompt del chatbot (apps.chatbot.prompt_cache), la grilla de ocupación y
+# el frame del asistente financiero
+VERSIONED_MODELS = (
+    'blog.BlogCategory',
+    'blog.BlogPost',
+    'clients.Achievement',
+    'clients.Clients',
+    'events.Event',
+    'events.EventCategory',
+    'property.ExchangeRate',
+    'property.Property',
+    'property.PropertyPhoto',
+    'property.PropertyPricing',
+    'reservation.Reservation',
+)
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def is_shared():
+    """True si el cache default lo ven todos los procesos (no LocMem ni Dummy)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _check_versioned(labels):
+    missing = set(labels) - set(VERSIONED_MODELS)
+    if missing:
+        raise ValueError(f"Modelos sin versión (agregar a VERSIONED_MODELS): {', '.join(sorted(missing))}")
+
+
+def bump_version(*models):
+    """Invalida las respuestas cacheadas que dependen de estos modelos."""
+    now = time.time_ns()
+    cache.set_many({f'{VERSION_PREFIX}{_label(m)}': now for m in models}, None)
+
+
+def get_versions(labels):
+    _check_versioned(labels)
+    keys = [f'{VERSION_PREFIX}{label}' for label in labels]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            # Nunca en 0: si la clave se desaloja, la nueva versión no
+            # coincide con ninguna respuesta vieja.
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def on_model_change(sender, **kwargs):
+    """Receiver post_save/post_delete de cada modelo de VERSIONED_MODELS."""
+    try:
+        bump_version(sender)
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar cache de respuestas de {sender._meta.label}: {e}")
+
+
+def _find_request(args):
+    for arg in args:
+        if hasattr(arg, 'META') and hasattr(arg, 'method'):
+            return arg
+    raise TypeError('cache_response: la vista no recibió un request')
+
+
+def _cache_key(view_name, request, labels, kwargs):
+    params = sorted((k, v) for k in request.GET for v in request.GET.getlist(k))
+    raw = repr((
+        view_name,
+        request.get_host(),
+        request.is_secure(),
+        request.path,
+        params,
+        sorted(kwargs.items()),
+        get_versions(labels),
+    ))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _serialize(response):
+    if isinstance(response, Response):
+        return {'kind': 'drf', 'data': response.data, 'status': response.status_code}
+    return {
+        'kind': 'raw',
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'status': response.status_code,
+    }
+
+
+def _deserialize(entry):
+    if entry['kind'] == 'drf':
+        return Response(entry['data'], status=entry['status'])
+    return HttpResponse(entry['content'], content_type=entry['content_type'], status=entry['status'])
+
+
+def _not_modified(request, etag, entry):
+    if entry['kind'] == 'drf':
+        return Response(status=304, headers={'ETag': etag})
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def cache_response(*models, ttl=None, stale_ttl=None, bypass=None):
+    """
+    Decorador para vistas (funciones o métodos de APIView/ViewSet).
+
+    `models`: labels ('app.Model') o clases de las que depende la respuesta.
+    `bypass(request)`: si retorna True no se usa el cache (p.ej. efectos
+    secundarios pedidos por query param).
+    """
+    labels = sorted({_label(m) for m in models})
+    _check_versioned(labels)
+
+    def decorator(func):
+        view_name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            if (
+                request.method not in ('GET', 'HEAD')
+                or request.META.get('HTTP_AUTHORIZATION')
+                or not getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+                or (bypass and bypass(request))
+            ):
+                return func(*args, **kwargs)
+
+            fresh_for = ttl if ttl is not None else getattr(settings, 'RESPONSE_CACHE_TTL', 300)
+            stale_for = stale_ttl if stale_ttl is not None else getattr(settings, 'RESPONSE_CACHE_STALE_TTL', 600)
+            key = _cache_key(view_name, request, labels, kwargs)
+            entry_key = f'{ENTRY_PREFIX}{key}'
+            etag = f'"{key[:32]}"'
+
+            entry = cache.get(entry_key)
+            state = 'MISS'
+            if entry is not None:
+                age = time.time() - entry['at']
+                if age < fresh_for:
+                    state = 'HIT'
+                elif not cache.add(f'{entry_key}:lock', 1, REGENERATE_LOCK_TTL):
+                    state = 'STALE'  # otro request ya está regenerando
+
+            if state in ('HIT', 'STALE'):
+                if state == 'HIT' and etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+                    response = _not_modified(request, etag, entry)
+                else:
+                    response = _deserialize(entry)
+            else:
+                try:
+                    response = func(*args, **kwargs)
+                    if response.status_code == 200:
+                        cache.set(
+                            entry_key,
+                            {**_serialize(response), 'at': time.time()},
+                            fresh_for + stale_for,
+                        )
+                finally:
+                    if entry is not None:
+                        cache.delete(f'{entry_key}:lock')
+
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                response['Cache-Control'] = (
+                    f'public, max-age={fresh_for}, stale-while-revalidate={stale_for}'
+                )
+            response['X-Cache'] = state
+            return response
+
+        return wrapper
+
+    return decorator
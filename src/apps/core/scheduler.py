@@ -0,0 +1,237 @@
+"""
+Scheduler en proceso para los comandos periódicos.
+
+Antes cada línea de crontab.txt lanzaba un `manage.py` nuevo (cada 5-15
+minutos para el chatbot): intérprete + django.setup() + system checks en
+cada ejecución. `python manage.py run_scheduler` arranca Django una vez y
+ejecuta los comandos de `SCHEDULER_JOBS` con `call_command` según su
+expresión cron, cada uno en un hilo del pool (`SCHEDULER_WORKERS`). Si un
+job sigue corriendo cuando vuelve a tocarle, esa ejecución se salta.
+
+Las expresiones son cron de 5 campos (minuto hora día-mes mes día-semana)
+con `*`, listas, rangos y pasos, evaluadas en `SCHEDULER_TIMEZONE`. Por
+defecto UTC, igual que el crontab del servidor: las horas de
+`SCHEDULER_JOBS` son UTC (Lima = UTC-5). `SCHEDULER_EXCLUDE` desactiva jobs
+por nombre sin tocar el código.
+
+crontab.txt solo mantiene vivo el proceso (flock cada minuto). Como el
+proceso no se reinicia con el deploy, cada minuto compara
+`deployed_version()` (git HEAD y el mtime de `SCHEDULER_RELOAD_FILE`) con
+la del arranque; si cambió espera a que terminen los jobs en curso y sale,
+y cron lo relanza con el código nuevo al minuto siguiente.
+"""
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# (cron, comando, args) — mismo calendario que tenía crontab.txt, en UTC
+SCHEDULER_JOBS = [
+    # Chatbot
+    ('*/5 * * * *', 'resume_ai_sessions', ()),
+    ('*/15 * * * *', 'send_quick_rescue', ()),
+    ('0 8,10,12,14,16,18,20,22 * * *', 'send_followups', ()),
+    ('0 1 * * *', 'compute_chat_analytics', ()),
+    ('0 2 * * *', 'analyze_frequent_questions', ()),
+    ('0 9 * * *', 'send_promo_dates', ()),
+    ('5 9 * * *', 'send_promo_birthday', ()),
+    ('0 19 * * *', 'send_review_requests', ()),
+    ('0 3 1,15 * *', 'refresh_ig_token', ()),
+    # Clientes / fidelización
+    ('0 2 * * *', 'auto_assign_points', ()),
+    ('0 3 * * *', 'expire_points', ()),
+    ('0 4 1 * *', 'calculate_referral_ranking', ()),
+    ('0 8 * * *', 'send_reservation_reminders', ()),
+    ('0 5 * * *', 'sync_google_sheets', ()),
+    # Reservas / staff / eventos
+    ('0 6 * * *', 'delete_expired_reservations', ()),
+    ('0 7 * * *', 'create_missing_cleaning_tasks', ()),
+    ('0 10 * * *', 'notify_event_winners', ()),
+    # TV
+    ('30 4 * * *', 'rollup_tv_sessions', ()),
+]
+
+_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f'Paso inválido: {text}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f'Fuera de rango ({low}-{high}): {text}')
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """Expresión cron de 5 campos."""
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f'Se esperan 5 campos: {expression!r}')
+        self.expression = expression
+        for (name, low, high), text in zip(_FIELDS, parts):
+            setattr(self, name, _parse_field(text, low, high))
+        # 0 y 7 son domingo
+        self.weekday = frozenset(0 if day == 7 else day for day in self.weekday)
+        self._day_any = parts[2] == '*'
+        self._weekday_any = parts[4] == '*'
+
+    def matches(self, moment):
+        if moment.minute not in self.minute or moment.hour not in self.hour or moment.month not in self.month:
+            return False
+        day_ok = moment.day in self.day
+        weekday_ok = (moment.isoweekday() % 7) in self.weekday
+        # Como cron: con día-mes y día-semana restringidos basta uno
+        if self._day_any or self._weekday_any:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """Primer minuto posterior a `moment` que cumple la expresión."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f'Sin próxima ejecución: {self.expression}')
+
+
+@dataclass
+class Job:
+    schedule: CronSchedule
+    command: str
+    args: tuple = ()
+    running: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def name(self):
+        return ' '.join((self.command, *self.args))
+
+
+def load_jobs(jobs=None):
+    exclude = set(getattr(settings, 'SCHEDULER_EXCLUDE', []))
+    return [
+        Job(CronSchedule(cron), command, tuple(args))
+        for cron, command, args in (jobs if jobs is not None else SCHEDULER_JOBS)
+        if command not in exclude
+    ]
+
+
+def run_job(job):
+    """Ejecuta un job con call_command y loguea duración y salida."""
+    if not job.running.acquire(blocking=False):
+        logger.warning('Scheduler: %s sigue corriendo, se salta esta ejecución', job.name)
+        return False
+    output = StringIO()
+    started = time.monotonic()
+    try:
+        close_old_connections()
+        call_command(job.command, *job.args, stdout=output, stderr=output)
+        logger.info('Scheduler: %s OK en %.1fs', job.name, time.monotonic() - started)
+        return True
+    except BaseException:
+        # SystemExit incluido: algunos comandos terminan con sys.exit()
+        logger.exception('Scheduler: %s falló tras %.1fs', job.name, time.monotonic() - started)
+        return False
+    finally:
+        if output.getvalue().strip():
+            logger.debug('Scheduler: salida de %s:\n%s', job.name, output.getvalue().rstrip())
+        close_old_connections()
+        job.running.release()
+
+
+def deployed_version():
+    """(commit de git HEAD, mtime de SCHEDULER_RELOAD_FILE); None si no se pudo leer."""
+    try:
+        head = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        head = None
+    marker = getattr(settings, 'SCHEDULER_RELOAD_FILE', '')
+    try:
+        mtime = os.stat(marker).st_mtime_ns if marker else None
+    except OSError:
+        mtime = None
+    return head, mtime
+
+
+class Scheduler:
+    """Evalúa los jobs una vez por minuto y los lanza en un pool de hilos."""
+
+    # Minutos hacia atrás que se recuperan si el loop se atrasó
+    MAX_CATCH_UP = 5
+
+    def __init__(self, jobs, workers=None, tz=None, version=deployed_version):
+        self.jobs = jobs
+        self.version = version
+        self.tz = ZoneInfo(tz or getattr(settings, 'SCHEDULER_TIMEZONE', 'UTC'))
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or getattr(settings, 'SCHEDULER_WORKERS', 4),
+            thread_name_prefix='scheduler',
+        )
+        self.stopping = threading.Event()
+
+    def now(self):
+        return datetime.now(self.tz).replace(second=0, microsecond=0)
+
+    def due(self, moment):
+        return [job for job in self.jobs if job.schedule.matches(moment)]
+
+    def tick(self, moment):
+        for job in self.due(moment):
+            self.executor.submit(run_job, job)
+
+    def run(self):
+        started_version = self.version()
+        last = self.now() - timedelta(minutes=1)
+        while not self.stopping.is_set():
+            if self.version() != started_version:
+                logger.info('Scheduler: hay un deploy nuevo, saliendo para que cron lo relance')
+                break
+            current = self.now()
+            moment = max(last + timedelta(minutes=1), current - timedelta(minutes=self.MAX_CATCH_UP))
+            while moment <= current:
+                self.tick(moment)
+                moment += timedelta(minutes=1)
+            last = current
+            wait = 60 - datetime.now(self.tz).second + 0.5
+            self.stopping.wait(wait)
+        self.executor.shutdown(wait=True)
+
+    def stop(self, *args):
+        self.stopping.set()
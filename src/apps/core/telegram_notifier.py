@@ -1,8 +1,7 @@
 import os
 import asyncio
+import functools
 import logging
-from telegram import Bot
-from telegram.error import TelegramError
 
 logger = logging.getLogger('apps')
 
@@ -11,9 +10,22 @@ CHAT_ID = os.getenv('CHAT_ID')
 SECOND_CHAT_ID = os.getenv('SECOND_CHAT_ID')
 
 
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+@functools.lru_cache(maxsize=None)
+def get_bot():
+    """
+    Bot de Telegram, creado en el primer envío. python-telegram-bot (y
+    httpx) pesan ~200ms de import: este módulo lo importan las señales de
+    clientes y reservas, así que cada arranque de Django (y cada cron) los
+    pagaba aunque no enviara nada.
+    """
+    from telegram import Bot
+    return Bot(token=TELEGRAM_BOT_TOKEN)
+
 
 async def async_send_telegram_message(message, chat_id, image_url=None):
+    from telegram.error import TelegramError
+
+    bot = get_bot()
     try:
         logger.debug("Enviando mensaje asincrónicamente a Telegram.")
         if image_url:
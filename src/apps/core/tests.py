@@ -0,0 +1,606 @@
+"""
+Presupuesto de consultas de los endpoints calientes (apps.core.query_budget),
+pipeline de logs (apps.core.logging_pipeline), perfilado por request
+(apps.core.perf), scheduler en proceso (apps.core.scheduler) y gateway de
+OpenAI (apps.core.ai_gateway).
+
+Necesita BD (TestCase). El dataset se siembra con bulk_create para no
+disparar las señales de Reservation (notificaciones, Meta, etc.). Los
+presupuestos son los conteos medidos con este dataset (SQLite, con
+QUERY_BUDGET_REPORT): si un cambio los supera el test muestra el SQL y el
+EXPLAIN de cada consulta. Bajarlos cuando una optimización lo permita.
+"""
+import calendar
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import Group
+import requests
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.accounts.models import CustomUser
+from apps.chatbot.conversation import ConversationContext
+from apps.chatbot.models import ChatbotConfiguration, ChatMessage, ChatSession
+from apps.chatbot.webhook_processor import WebhookProcessor
+from apps.clients.models import Clients
+from apps.dashboard.utils import get_stadistics_period
+from apps.property.models import Property
+from apps.property.pricing_service import PricingCalculationService
+from apps.reservation.models import RentalReceipt, Reservation
+
+from . import ai_gateway, perf, scheduler
+from .logging_pipeline import SampledLogger, SamplingFilter, queued_file_handler
+from .query_budget import QueryBudgetMixin
+
+PROPERTIES = 4
+RESERVATIONS_PER_PROPERTY = 60
+MESSAGES = 80
+
+
+def _index_name(model, fields):
+    return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False, OCCUPANCY_CACHE_TTL=0)
+class HotPathQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Consultas por endpoint caliente contra un dataset sembrado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.seller = CustomUser.objects.create_user(
+            username='vendedor', email='vendedor@casaaustin.pe', password='x',
+            first_name='Luis', last_name='Ramos',
+        )
+        cls.seller.groups.add(Group.objects.get_or_create(name='vendedor')[0])
+        cls.properties = [
+            Property.objects.create(name=f'Casa Austin {i}', slug=f'casa-austin-{i}')
+            for i in range(1, PROPERTIES + 1)
+        ]
+        cls.clients = Clients.objects.bulk_create([
+            Clients(
+                first_name=f'Cliente {i}', last_name='Prueba', tel_number=f'51999{i:06d}',
+                document_type='dni', number_doc=f'{i:08d}', email=f'cliente{i}@mail.pe',
+            )
+            for i in range(40)
+        ])
+
+        reservations = []
+        start = cls.today - timedelta(days=120)
+        for p_idx, prop in enumerate(cls.properties):
+            for r_idx in range(RESERVATIONS_PER_PROPERTY):
+                check_in = start + timedelta(days=r_idx * 4 + p_idx)
+                reservations.append(Reservation(
+                    property=prop,
+                    client=cls.clients[(p_idx * RESERVATIONS_PER_PROPERTY + r_idx) % len(cls.clients)],
+                    seller=cls.seller,
+                    check_in_date=check_in,
+                    check_out_date=check_in + timedelta(days=2),
+                    price_usd=300, price_sol=1100, advance_payment=500,
+                    status=('approved', 'pending', 'cancelled')[r_idx % 3],
+                    origin='man' if r_idx % 10 == 0 else 'aus',
+                    late_checkout=r_idx % 7 == 0,
+                    late_check_out_date=check_in + timedelta(days=2) if r_idx % 7 == 0 else None,
+                ))
+        Reservation.objects.bulk_create(reservations)
+        RentalReceipt.objects.bulk_create([
+            RentalReceipt(reservation=reservation, file=f'recibos/{reservation.id}.jpg')
+            for reservation in reservations[::2]
+        ])
+
+        cls.session = ChatSession.objects.create(wa_id='51999888777', wa_profile_name='Budget')
+        ChatMessage.objects.bulk_create([
+            ChatMessage(
+                session=cls.session,
+                direction='inbound' if i % 2 == 0 else 'outbound_ai',
+                content=f'mensaje {i}',
+            )
+            for i in range(MESSAGES)
+        ])
+        ChatbotConfiguration.objects.create(is_active=False)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.seller)
+
+    def test_pricing(self):
+        check_in = self.today + timedelta(days=30)
+        with self.assertQueryBudget('pricing', 52):
+            PricingCalculationService().calculate_pricing(
+                check_in, check_in + timedelta(days=3), 4,
+                property_id=str(self.properties[0].id),
+            )
+
+    def test_availability_calendar(self):
+        prop = self.properties[0]
+        with self.assertQueryBudget('availability_calendar', 2):
+            response = self.api.get(
+                f'/api/v1/property/{prop.slug}/calendar-occupancy/',
+                {'year': self.today.year, 'days': 'true'},
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_chatbot_turn(self):
+        payload = {'object': 'whatsapp_business_account', 'entry': [{'changes': [{'value': {
+            'contacts': [{'wa_id': self.session.wa_id, 'profile': {'name': 'Budget'}}],
+            'messages': [{
+                'from': self.session.wa_id, 'id': 'wamid.budget', 'type': 'text',
+                'text': {'body': 'Hola, ¿tienen disponibilidad?'}, 'timestamp': '1234567890',
+            }],
+        }}]}]}
+        # Sin red: el acuse de lectura va por un sender simulado
+        with mock.patch('apps.chatbot.webhook_processor.get_sender'), \
+                self.assertQueryBudget('chatbot_turn', 11):
+            WebhookProcessor().process(payload)
+        with self.assertQueryBudget('chatbot_history', 2):
+            conversation = ConversationContext(self.session)
+            conversation.recent(20)
+            conversation.last_inbound()
+            conversation.quote_messages()
+
+    def test_reservation_list_is_flat(self):
+        """El listado no crece en consultas con el tamaño de página"""
+        with self.assertQueryBudget('reservation_list_10', 4) as small:
+            self.assertEqual(self.api.get('/api/v1/reservations/', {'page_size': 10}).status_code, 200)
+        with self.assertQueryBudget('reservation_list_100', 4) as large:
+            self.assertEqual(self.api.get('/api/v1/reservations/', {'page_size': 100}).status_code, 200)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_dashboard(self):
+        with self.assertQueryBudget('dashboard', 17):
+            response = self.api.get('/api/v1/dashboard/', {
+                'month': self.today.month, 'year': self.today.year,
+            })
+        self.assertEqual(response.status_code, 200)
+
+    def test_stats_period(self):
+        # Mes completo del dataset (hace 60 días), sin depender del día de hoy
+        month = self.today - timedelta(days=60)
+        last_day = calendar.monthrange(month.year, month.month)[1]
+        with self.assertQueryBudget('stats_period', 2 + 3 * PROPERTIES):
+            get_stadistics_period(month.replace(day=1), last_day)
+
+    def test_hot_filters_use_composite_indexes(self):
+        prop, client = self.properties[0], self.clients[0]
+        self.assertUsesIndex(
+            Reservation.objects.filter(
+                property=prop, deleted=False, status__in=['approved', 'pending'],
+                check_in_date__lt=self.today, check_out_date__gt=self.today - timedelta(days=30),
+            ),
+            _index_name(Reservation, ['property', 'check_in_date', 'check_out_date']),
+        )
+        self.assertUsesIndex(
+            Reservation.objects.filter(client=client, deleted=False, status='approved'),
+            _index_name(Reservation, ['client', 'status']),
+        )
+        self.assertUsesIndex(
+            ChatMessage.objects.filter(session=self.session, deleted=False).order_by('-created')[:40],
+            _index_name(ChatMessage, ['session', 'created']),
+        )
+        self.assertUsesIndex(
+            ChatMessage.objects.filter(
+                session=self.session, direction='inbound', deleted=False,
+            ).order_by('-created')[:1],
+            _index_name(ChatMessage, ['session', 'direction', 'created']),
+        )
+
+    def test_history_context_cleared_after_request(self):
+        from simple_history.models import HistoricalRecords
+
+        self.assertEqual(self.api.get('/api/v1/reservations/', {'page_size': 10}).status_code, 200)
+        # Si quedara, lo que se guarde después en este thread hereda al usuario
+        self.assertFalse(hasattr(HistoricalRecords.context, 'request'))
+
+
+class LoggingPipelineTest(SimpleTestCase):
+    """QueuedFileHandler + SamplingFilter"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'app.log')
+        self.logger = logging.Logger('apps.test.pipeline')
+        self.logger.setLevel(logging.DEBUG)
+
+    def _handler(self, **kwargs):
+        handler = queued_file_handler(self.path, **kwargs)
+        handler.setFormatter(logging.Formatter('{levelname} {message}', style='{'))
+        self.logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        return handler
+
+    def _lines(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_writes_through_queue_in_order(self):
+        handler = self._handler()
+        for i in range(50):
+            self.logger.info('línea %s', i)
+        handler.flush()
+        self.assertEqual(self._lines(), [f'INFO línea {i}' for i in range(50)])
+
+    def test_message_is_fixed_when_enqueued(self):
+        handler = self._handler()
+        data = {'guests': 2}
+        self.logger.info('data=%s', data)
+        data['guests'] = 5
+        handler.flush()
+        self.assertEqual(self._lines(), ["INFO data={'guests': 2}"])
+
+    def test_reopens_after_logrotate_move(self):
+        handler = self._handler()
+        handler.sink.check_interval = 0
+        self.logger.info('antes')
+        handler.flush()
+        os.rename(self.path, f'{self.path}.1')
+        self.logger.info('después')
+        handler.flush()
+        self.assertEqual(self._lines(), ['INFO después'])
+        with open(f'{self.path}.1', encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'INFO antes\n')
+
+    def test_error_is_written_before_returning(self):
+        handler = self._handler()
+        self.logger.debug('contexto')
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('falló')
+        # Sin flush(): ya está en el disco, traceback incluido
+        lines = self._lines()
+        self.assertEqual(lines[:2], ['DEBUG contexto', 'ERROR falló'])
+        self.assertEqual(lines[-1], 'ZeroDivisionError: division by zero')
+        self.assertEqual(handler.sink._pending, [])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = self._handler(queue_size=1)
+        handler._ensure_listener()
+        handler._listener.stop()
+        handler.queue.put_nowait(object())
+        self.logger.info('descartado')
+        self.assertEqual(handler.dropped, 1)
+        handler._listener = None
+        handler._pid = None
+
+    def test_sampling_per_module(self):
+        sampling = SamplingFilter({'apps.test': 5, 'apps.test.loud': 10})
+        handler = self._handler()
+        handler.addFilter(sampling)
+        loud = logging.Logger('apps.test.loud.view')
+        loud.setLevel(logging.DEBUG)
+        loud.addHandler(handler)
+        for i in range(20):
+            self.logger.debug('pipeline %s', i)
+            loud.debug('loud %s', i)
+            self.logger.info('info %s', i)
+        handler.flush()
+        lines = self._lines()
+        self.assertEqual([l for l in lines if 'pipeline' in l], [f'DEBUG pipeline {i}' for i in (0, 5, 10, 15)])
+        self.assertEqual([l for l in lines if 'loud' in l], ['DEBUG loud 0', 'DEBUG loud 10'])
+        self.assertEqual(len([l for l in lines if l.startswith('INFO')]), 20)
+        self.assertEqual(sampling.rate_for('apps.testing'), 1)
+
+    def test_sampled_logger_skips_record_creation(self):
+        previous = SampledLogger.sampler
+        self.addCleanup(setattr, SampledLogger, 'sampler', previous)
+        sampling = SamplingFilter({'apps.test': 4})
+        SampledLogger.sampler = sampling
+        logger = SampledLogger('apps.test.early')
+        logger.setLevel(logging.DEBUG)
+        made = []
+        logger.makeRecord = lambda *args, **kwargs: made.append(args) or logging.Logger.makeRecord(logger, *args, **kwargs)
+        logger.addHandler(logging.NullHandler())
+        for i in range(8):
+            logger.debug('early %s', i)
+        logger.warning('siempre')
+        self.assertEqual(len(made), 3)
+
+    def test_sampled_logger_reports_caller(self):
+        logger = SampledLogger('apps.test.caller')
+        logger.setLevel(logging.DEBUG)
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger.addHandler(handler)
+        logger.info('desde el test')
+        logger.warning('con stacklevel', stacklevel=1)
+        self.assertEqual({(r.module, r.funcName) for r in records}, {('tests', 'test_sampled_logger_reports_caller')})
+
+
+class _FakeAdapter(requests.adapters.BaseAdapter):
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+@override_settings(PERF_ENABLED=True, PERF_SAMPLE_RATE=1.0, PERF_DUPLICATE_THRESHOLD=3, PERF_FORCE_TOKEN='')
+class PerformanceMiddlewareTest(SimpleTestCase):
+    """Perfilado por request: BD, N+1, HTTP saliente, buffer y Server-Timing"""
+
+    def setUp(self):
+        perf.clear()
+        self.addCleanup(perf.clear)
+        self.factory = RequestFactory()
+
+    def _view(self, request):
+        # Simula consultas pasando por los execute_wrappers instalados
+        def run(sql):
+            def execute(sql, params, many, context):
+                return None
+            for wrapper in reversed(connection.execute_wrappers):
+                execute = (lambda w, inner: lambda *a: w(inner, *a))(wrapper, execute)
+            execute(sql, (), False, {})
+
+        run('SELECT "reservation"."id" FROM "reservation" WHERE "reservation"."deleted" = %s')
+        for _ in range(4):
+            run('SELECT "clients"."id" FROM "clients" WHERE "clients"."id" = %s LIMIT 21')
+        run('SELECT "property"."id" FROM "property" WHERE "property"."id" IN (%s, %s, %s)')
+        session = requests.Session()
+        session.mount('https://', _FakeAdapter())
+        session.get('https://api.openai.com/v1/models')
+        session.get('https://exp.host/--/api/v2/push/send')
+        session.get('https://exp.host/--/api/v2/push/send')
+        return HttpResponse('ok')
+
+    def test_fingerprint_groups_values(self):
+        self.assertEqual(
+            perf.fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s) LIMIT 21"),
+            perf.fingerprint("SELECT * FROM t WHERE a = 'yy' AND b IN (%s, %s, %s) LIMIT 5"),
+        )
+
+    def test_profiles_request(self):
+        request = self.factory.get('/api/v1/reservations/')
+        request.user = mock.Mock(is_staff=True)
+        response = perf.PerformanceMiddleware(self._view)(request)
+        record = perf.recent()[0]
+        self.assertEqual(record['path'], '/api/v1/reservations/')
+        self.assertEqual(record['db']['count'], 6)
+        self.assertEqual(len(record['duplicates']), 1)
+        self.assertEqual(record['duplicates'][0]['count'], 4)
+        self.assertEqual(record['http']['api.openai.com']['count'], 1)
+        self.assertEqual(record['http']['exp.host']['count'], 2)
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('db-dup;desc="1 huellas, 4 consultas"', timing)
+        self.assertIn('http-api.openai.com;dur=', timing)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_timing_header_only_for_staff(self):
+        """Anónimos y no-staff no ven conteos de consultas ni hosts externos"""
+        middleware = perf.PerformanceMiddleware(self._view)
+        self.assertNotIn('Server-Timing', middleware(self.factory.get('/x/')))
+        request = self.factory.get('/x/')
+        request.user = mock.Mock(is_staff=False)
+        self.assertNotIn('Server-Timing', middleware(request))
+        self.assertEqual(len(perf.recent()), 2)
+
+    @override_settings(PERF_SAMPLE_RATE=0.0)
+    def test_unsampled_request_is_untouched(self):
+        response = perf.PerformanceMiddleware(self._view)(self.factory.get('/api/v1/reservations/'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(perf.recent(), [])
+
+    @override_settings(PERF_SAMPLE_RATE=0.0, PERF_FORCE_TOKEN='secreto')
+    def test_force_token(self):
+        middleware = perf.PerformanceMiddleware(self._view)
+        middleware(self.factory.get('/x/', HTTP_X_PERF_PROFILE='otro'))
+        self.assertEqual(perf.recent(), [])
+        response = middleware(self.factory.get('/x/', HTTP_X_PERF_PROFILE='secreto'))
+        self.assertEqual(len(perf.recent()), 1)
+        self.assertIn('Server-Timing', response)
+
+    def test_summary_per_view(self):
+        records = [
+            {'view': 'a', 'total_ms': ms, 'db': {'count': 2, 'ms': 1.0}, 'http': {}, 'duplicates': []}
+            for ms in (10, 20, 30, 40, 100)
+        ]
+        row = perf.summary(records)[0]
+        self.assertEqual((row['count'], row['p50_ms'], row['p95_ms'], row['max_ms']), (5, 30, 100, 100))
+        self.assertEqual(row['avg_queries'], 2)
+
+
+class SchedulerTest(SimpleTestCase):
+    """CronSchedule y ejecución de jobs en proceso"""
+
+    def test_cron_fields(self):
+        every_15 = scheduler.CronSchedule('*/15 * * * *')
+        self.assertEqual(every_15.minute, {0, 15, 30, 45})
+        followups = scheduler.CronSchedule('0 8,10,12,14,16,18,20,22 * * *')
+        self.assertTrue(followups.matches(datetime(2025, 7, 18, 14, 0)))
+        self.assertFalse(followups.matches(datetime(2025, 7, 18, 15, 0)))
+        self.assertFalse(followups.matches(datetime(2025, 7, 18, 14, 1)))
+        self.assertEqual(scheduler.CronSchedule('0 9 * * 1-5').weekday, {1, 2, 3, 4, 5})
+        self.assertEqual(scheduler.CronSchedule('0 0 * * 7').weekday, {0})
+        for bad in ('* * * *', '61 * * * *', '*/0 * * * *', '5-1 * * * *'):
+            with self.assertRaises(ValueError):
+                scheduler.CronSchedule(bad)
+
+    def test_day_of_month_or_weekday(self):
+        # Como cron: con ambos restringidos alcanza con uno (1ro del mes o lunes)
+        schedule = scheduler.CronSchedule('0 3 1 * 1')
+        self.assertTrue(schedule.matches(datetime(2025, 7, 1, 3, 0)))  # martes 1
+        self.assertTrue(schedule.matches(datetime(2025, 7, 7, 3, 0)))  # lunes 7
+        self.assertFalse(schedule.matches(datetime(2025, 7, 8, 3, 0)))
+
+    def test_next_after(self):
+        schedule = scheduler.CronSchedule('0 3 1,15 * *')
+        self.assertEqual(schedule.next_after(datetime(2025, 7, 15, 3, 0)), datetime(2025, 8, 1, 3, 0))
+        self.assertEqual(
+            scheduler.CronSchedule('*/5 * * * *').next_after(datetime(2025, 7, 18, 23, 58, 30)),
+            datetime(2025, 7, 19, 0, 0),
+        )
+
+    def test_jobs_match_crontab(self):
+        jobs = {job.command: job for job in scheduler.load_jobs()}
+        self.assertEqual(jobs['resume_ai_sessions'].schedule.minute, set(range(0, 60, 5)))
+        with override_settings(SCHEDULER_EXCLUDE=['send_quick_rescue']):
+            self.assertNotIn('send_quick_rescue', {job.command for job in scheduler.load_jobs()})
+
+    def test_tick_runs_due_jobs(self):
+        jobs = scheduler.load_jobs([('*/5 * * * *', 'cada_5', ()), ('0 9 * * *', 'diario', ())])
+        runner = scheduler.Scheduler(jobs, workers=1)
+        self.addCleanup(runner.executor.shutdown)
+        with mock.patch.object(scheduler, 'call_command') as call:
+            runner.tick(datetime(2025, 7, 18, 9, 0))
+            runner.executor.shutdown(wait=True)
+        self.assertEqual(sorted(c.args[0] for c in call.call_args_list), ['cada_5', 'diario'])
+
+    def test_run_job_skips_overlap_and_survives_errors(self):
+        job = scheduler.load_jobs([('* * * * *', 'lento', ())])[0]
+        with mock.patch.object(scheduler, 'call_command') as call:
+            job.running.acquire()
+            self.assertFalse(scheduler.run_job(job))
+            job.running.release()
+            call.assert_not_called()
+            call.side_effect = SystemExit(1)
+            with self.assertLogs('apps.core.scheduler', 'ERROR'):
+                self.assertFalse(scheduler.run_job(job))
+            self.assertFalse(job.running.locked())
+
+    def test_run_exits_after_deploy(self):
+        versions = iter([('abc', None), ('abc', None), ('def', None)])
+        runner = scheduler.Scheduler([], workers=1, version=lambda: next(versions))
+        with mock.patch.object(runner.stopping, 'wait') as wait:
+            runner.run()
+        # Una vuelta con el código del arranque; en la siguiente ve el deploy y sale
+        self.assertEqual(wait.call_count, 1)
+
+    def test_deployed_version_follows_reload_file(self):
+        with tempfile.NamedTemporaryFile() as marker, override_settings(SCHEDULER_RELOAD_FILE=marker.name):
+            before = scheduler.deployed_version()
+            os.utime(marker.name, ns=(0, 0))
+            self.assertNotEqual(scheduler.deployed_version(), before)
+            self.assertEqual(scheduler.deployed_version()[1], 0)
+
+
+class _FakeSDK:
+    """Cliente OpenAI falso: registra with_options y las llamadas."""
+
+    def __init__(self, create):
+        self.options = []
+        self.chat = mock.Mock()
+        self.chat.completions.create.side_effect = create
+
+    def with_options(self, **options):
+        self.options.append(options)
+        return self
+
+
+def _completion(prompt_tokens=10, completion_tokens=5):
+    return mock.Mock(usage=mock.Mock(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+
+
+@override_settings(
+    AI_GATEWAY_QUEUE_TIMEOUT=0.01,
+    AI_GATEWAY_USE_CASES={'blog': {'timeout': 180.0, 'max_retries': 2, 'model': 'gpt-4o'}},
+)
+class AIGatewayTest(SimpleTestCase):
+    """Cliente compartido, opciones por caso de uso, cupo y contabilidad"""
+
+    def setUp(self):
+        ai_gateway.clear_stats()
+        self.addCleanup(ai_gateway.clear_stats)
+
+    def use(self, sdk, slots=2):
+        patcher = mock.patch.multiple(
+            ai_gateway, _client=sdk, _client_pid=os.getpid(), _semaphore=threading.BoundedSemaphore(slots),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_use_case_options_and_accounting(self):
+        sdk = _FakeSDK(lambda **kwargs: _completion())
+        self.use(sdk)
+        ai_gateway.client('blog').chat.completions.create(messages=[])
+        ai_gateway.client('chatbot').chat.completions.create(model='gpt-4.1', messages=[])
+
+        calls = sdk.chat.completions.create.call_args_list
+        self.assertEqual(calls[0].kwargs['model'], 'gpt-4o')
+        self.assertEqual(calls[1].kwargs['model'], 'gpt-4.1')
+        self.assertEqual(sdk.options, [
+            {'timeout': 180.0, 'max_retries': 2},
+            ai_gateway.DEFAULT_USE_CASE,
+        ])
+        stats = ai_gateway.stats()
+        self.assertEqual((stats['blog']['calls'], stats['blog']['prompt_tokens']), (1, 10))
+        self.assertEqual(stats['chatbot']['completion_tokens'], 5)
+
+    def test_stream_holds_slot_until_consumed(self):
+        events = [mock.Mock(usage=None), mock.Mock(usage=mock.Mock(prompt_tokens=7, completion_tokens=3))]
+        sdk = _FakeSDK(lambda **kwargs: iter(events))
+        self.use(sdk, slots=1)
+        client = ai_gateway.client('chatbot')
+
+        stream = client.chat.completions.create(messages=[], stream=True)
+        with self.assertLogs('apps.core.ai_gateway', 'WARNING'):
+            with self.assertRaises(ai_gateway.AIGatewayBusy):
+                client.chat.completions.create(messages=[])
+        self.assertEqual(list(stream), events)
+        list(client.chat.completions.create(messages=[], stream=True))
+
+        stats = ai_gateway.stats()['chatbot']
+        self.assertEqual((stats['calls'], stats['busy'], stats['prompt_tokens']), (2, 1, 14))
+
+    def test_embeddings_keep_caller_model(self):
+        sdk = _FakeSDK(lambda **kwargs: _completion())
+        sdk.embeddings = mock.Mock()
+        sdk.embeddings.create.return_value = mock.Mock(usage=mock.Mock(prompt_tokens=4, completion_tokens=None))
+        self.use(sdk)
+        ai_gateway.client('blog').embeddings.create(model='text-embedding-3-small', input=['hola'])
+
+        sdk.embeddings.create.assert_called_once_with(model='text-embedding-3-small', input=['hola'])
+        self.assertEqual(sdk.options, [{'timeout': 180.0, 'max_retries': 2}])
+        stats = ai_gateway.stats()['blog']
+        self.assertEqual((stats['calls'], stats['prompt_tokens']), (1, 4))
+
+    def test_error_releases_slot(self):
+        sdk = _FakeSDK(mock.Mock(side_effect=[RuntimeError('caído'), _completion()]))
+        self.use(sdk, slots=1)
+        client = ai_gateway.client('voucher')
+        with self.assertRaises(RuntimeError):
+            client.chat.completions.create(messages=[])
+        client.chat.completions.create(messages=[])
+        self.assertEqual(ai_gateway.stats()['voucher']['errors'], 1)
+
+    def test_retries_rate_limit_on_shared_pool(self):
+        import httpx
+        import openai
+
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            if len(seen) == 1:
+                return httpx.Response(429, headers={'retry-after-ms': '1'}, json={'error': {'message': 'slow down'}})
+            return httpx.Response(200, json={
+                'id': 'c1', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': 'hola'}}],
+                'usage': {'prompt_tokens': 3, 'completion_tokens': 1, 'total_tokens': 4},
+            })
+
+        sdk = openai.OpenAI(api_key='test', http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+        self.use(sdk)
+        response = ai_gateway.client('blog').chat.completions.create(messages=[{'role': 'user', 'content': 'hola'}])
+
+        self.assertEqual(response.choices[0].message.content, 'hola')
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(json.loads(seen[1].content)['model'], 'gpt-4o')
+        self.assertEqual(ai_gateway.stats()['blog']['prompt_tokens'], 3)
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import ai_gateway, perf
+
+
+class PerfRequestsView(APIView):
+    """
+    GET: requests perfilados por PerformanceMiddleware en este proceso
+    (?view=<view_name> filtra, ?limit=N, default 50) con el agregado por
+    vista, más los contadores del gateway de OpenAI (apps.core.ai_gateway).
+    DELETE: vacía el buffer y los contadores.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = max(1, int(request.query_params.get('limit', 50)))
+        except ValueError:
+            return Response({'error': 'limit debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+        view = request.query_params.get('view') or None
+        records = perf.recent(view=view)
+        return Response({
+            'sample_rate': getattr(settings, 'PERF_SAMPLE_RATE', 0.0),
+            'buffered': len(records),
+            'summary': perf.summary(records),
+            'requests': records[:limit],
+            'ai_gateway': ai_gateway.stats(),
+        })
+
+    def delete(self, request):
+        perf.clear()
+        ai_gateway.clear_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
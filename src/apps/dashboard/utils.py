@@ -1,8 +1,9 @@
 from datetime import datetime, timedelta
 from apps.property.models import Property, ProfitPropertyAirBnb
 from apps.reservation.models import Reservation
-from django.db.models import Sum, Q
+from django.db.models import Sum
 from apps.core.functions import noches_restantes_mes
+from apps.reservation.occupancy import BOOKED, MAINTENANCE, occupancy
 
 def convertir_a_fecha(fecha):
     """
@@ -10,36 +11,6 @@ def convertir_a_fecha(fecha):
     """
     return fecha.date() if isinstance(fecha, datetime) else fecha
 
-def contar_noches_reservadas_del_mes(inicio, fin, first_day, last_day):
-    """
-    Cuenta las noches de una reserva dentro del mes en curso.
-    """
-    inicio = convertir_a_fecha(inicio)
-    fin = convertir_a_fecha(fin)
-    first_day = convertir_a_fecha(first_day)
-    last_day = convertir_a_fecha(last_day)
-
-    if inicio < first_day:
-        inicio = first_day
-    if fin > last_day:
-        fin = last_day + timedelta(days=1)
-    return (fin - inicio).days
-
-def contar_noches_entre_fechas(inicio, fin, fecha_actual, last_day):
-    """
-    Cuenta las noches de una reserva desde la fecha actual hasta el fin de la reserva o fin de mes.
-    """
-    inicio = convertir_a_fecha(inicio)
-    fin = convertir_a_fecha(fin)
-    fecha_actual = convertir_a_fecha(fecha_actual)
-    last_day = convertir_a_fecha(last_day)
-
-    if inicio < fecha_actual:
-        inicio = fecha_actual
-    if fin > last_day:
-        fin = last_day + timedelta(days=1)
-    return (fin - inicio).days
-
 def get_stadistics_period(fecha_actual, last_day):
     today = datetime.now().date()
     fecha_actual = convertir_a_fecha(fecha_actual)
@@ -47,7 +18,8 @@ def get_stadistics_period(fecha_actual, last_day):
 
     first_day = datetime(fecha_actual.year, fecha_actual.month, 1).date()
     last_day = datetime(fecha_actual.year, fecha_actual.month, last_day).date()
-    fecha_inicio_calculo = today if es_mes_actual else first_day
+    # Sin pasar del fin del período (last_day puede ser anterior a hoy)
+    fecha_inicio_calculo = min(today, last_day + timedelta(days=1)) if es_mes_actual else first_day
 
     days_without_reservations_per_property = []
     days_without_reservations_total = 0
@@ -56,19 +28,11 @@ def get_stadistics_period(fecha_actual, last_day):
     total_noches_man = 0
 
     total_days_for_all_properties = 0
-    for p in Property.objects.exclude(deleted=True):
-        # Query para contar las noches libres de acá en adelante
-        reservations_from_current_day = Reservation.objects.exclude(
-            deleted=True
-        ).filter(
-            property=p
-        ).filter(
-            Q(check_in_date__gte=fecha_inicio_calculo, check_in_date__lt=last_day + timedelta(days=1)) |
-            Q(check_out_date__gte=fecha_inicio_calculo, check_out_date__lt=last_day + timedelta(days=1))
-        )
-
-        if es_mes_actual:
-            reservations_from_current_day = reservations_from_current_day.exclude(check_out_date__lt=today)
+    properties = list(Property.objects.exclude(deleted=True))
+    # Noches ocupadas del mes por casa (una consulta para todas, con cache)
+    grids = occupancy([p.id for p in properties], first_day, last_day, statuses=None)
+    for p in properties:
+        grid = grids[p.id]
 
         # Query para contar las reservas en todo el mes
         query_reservation_check_in_month = Reservation.objects.exclude(
@@ -78,20 +42,9 @@ def get_stadistics_period(fecha_actual, last_day):
             check_in_date__range=(first_day, last_day)
         )
 
-        # Query para contar las noches de "man"
-        query_reservation_check_in_month_man = query_reservation_check_in_month.filter(origin='man')
-
-        noches_reservadas = 0
-        for r in query_reservation_check_in_month.exclude(origin='man').exclude(deleted=True).order_by('check_in_date'):
-            noches_reservadas += contar_noches_reservadas_del_mes(r.check_in_date, r.check_out_date, first_day, last_day)
-
-        noches_reservadas_hoy_a_fin_mes = 0
-        for r in reservations_from_current_day.exclude(deleted=True).order_by('check_in_date'):
-            noches_reservadas_hoy_a_fin_mes += contar_noches_entre_fechas(r.check_in_date, r.check_out_date, fecha_inicio_calculo, last_day)
-
-        noches_man = 0
-        for r in query_reservation_check_in_month_man.exclude(deleted=True).order_by('check_in_date'):
-            noches_man += contar_noches_reservadas_del_mes(r.check_in_date, r.check_out_date, first_day, last_day)
+        noches_reservadas = grid.nights(BOOKED, exclude=MAINTENANCE)
+        noches_reservadas_hoy_a_fin_mes = grid.nights(BOOKED, start=fecha_inicio_calculo)
+        noches_man = grid.nights(MAINTENANCE)
 
         # Calcula las noches restantes incluyendo la noche del día de hoy
         noches_restantes_mes_days = noches_restantes_mes(fecha_inicio_calculo, last_day)
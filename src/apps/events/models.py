@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.text import slugify
 from apps.core.models import BaseModel
+from apps.core.image_derivatives import enqueue_derivatives
 from apps.clients.models import Clients, Achievement
 from apps.property.models import Property
 import os
@@ -260,10 +261,28 @@ class Event(BaseModel):
                 imagen_cambio = True
             
             if imagen_cambio:
-                self.image = self._convert_to_webp(self.image)
-                # Regenerar thumbnail cuando la imagen cambia
-                self.thumbnail = self._create_thumbnail(self.image)
+                # La conversión a WebP y el thumbnail se hacen en el pool de
+                # derivados, fuera del request (ver apps.core.image_derivatives)
+                self.thumbnail = None
+        else:
+            imagen_cambio = False
         super().save(*args, **kwargs)
+        if imagen_cambio:
+            enqueue_derivatives(self, 'image', after='process_uploaded_image')
+
+    def process_uploaded_image(self):
+        """Hook del worker de derivados: convierte a WebP y regenera el thumbnail."""
+        updates = {}
+        if not self.image.name.lower().endswith('.webp'):
+            webp = self._convert_to_webp(self.image)
+            if isinstance(webp, ContentFile):
+                self.image.save(webp.name, webp, save=False)
+                updates['image'] = self.image.name
+        thumbnail = self._create_thumbnail(self.image)
+        if thumbnail:
+            self.thumbnail.save(thumbnail.name, thumbnail, save=False)
+            updates['thumbnail'] = self.thumbnail.name
+        return updates
     
     def _generate_unique_slug(self):
         """Genera un slug único basado en el título"""
@@ -2,6 +2,16 @@ from rest_framework import serializers
 from .models import EventCategory, Event, EventRegistration, ActivityFeed
 from apps.clients.models import Achievement
 from apps.property.models import Property
+from apps.core.image_derivatives import get_srcset
+
+
+class ImageSrcsetMixin(serializers.Serializer):
+    """Expone el srcset responsivo de la imagen del evento"""
+
+    image_srcset = serializers.SerializerMethodField()
+
+    def get_image_srcset(self, obj):
+        return get_srcset(obj.image)
 
 
 class EventCategorySerializer(serializers.ModelSerializer):
@@ -28,7 +38,7 @@ class PropertyBasicSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'titulo', 'location', 'dormitorios', 'banos', 'capacity_max', 'precio_desde']
 
 
-class EventListSerializer(serializers.ModelSerializer):
+class EventListSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Serializer para listado público de eventos"""
     
     category = EventCategorySerializer(read_only=True)
@@ -41,7 +51,7 @@ class EventListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = [
-            'id', 'slug', 'title', 'description', 'category', 'property', 'image', 'thumbnail',
+            'id', 'slug', 'title', 'description', 'category', 'property', 'image', 'thumbnail', 'image_srcset',
             'event_date', 'registration_deadline', 'location',
             'max_participants', 'registered_count', 'available_spots',
             'min_points_required', 'requires_facebook_verification', 'requires_evidence', 
@@ -68,7 +78,7 @@ class EventListSerializer(serializers.ModelSerializer):
             return 'past'      # Pasado
 
 
-class EventDetailSerializer(serializers.ModelSerializer):
+class EventDetailSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Serializer detallado para vista específica de evento"""
     
     category = EventCategorySerializer(read_only=True)
@@ -81,7 +91,7 @@ class EventDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = [
-            'id', 'slug', 'title', 'description', 'category', 'image',
+            'id', 'slug', 'title', 'description', 'category', 'image', 'image_srcset',
             'event_date', 'registration_deadline', 'location',
             'max_participants', 'registered_count', 'available_spots',
             'min_points_required', 'requires_facebook_verification', 'requires_evidence', 'required_achievements',
@@ -178,7 +188,7 @@ class WinnerSerializer(serializers.ModelSerializer):
         return first_name_only
 
 
-class EventWinnersSerializer(serializers.ModelSerializer):
+class EventWinnersSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Serializer para evento con sus ganadores"""
     
     category = EventCategorySerializer(read_only=True)
@@ -189,7 +199,7 @@ class EventWinnersSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = [
-            'id', 'slug', 'title', 'description', 'category', 'image',
+            'id', 'slug', 'title', 'description', 'category', 'image', 'image_srcset',
             'event_date', 'location', 'is_contest', 'contest_type',
             'winners', 'total_winners', 'contest_leaderboard'
         ]
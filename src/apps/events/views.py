@@ -24,6 +24,7 @@ from .serializers import (
     ActivityFeedCreateSerializer
 )
 from apps.clients.auth_views import ClientJWTAuthentication
+from apps.core.response_cache import cache_response
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,7 @@ class PublicEventCategoryListView(APIView):
     """Lista todas las categorías de eventos disponibles"""
     permission_classes = [AllowAny]
 
+    @cache_response('events.EventCategory')
     def get(self, request):
         categories = EventCategory.objects.all()
         serializer = EventCategorySerializer(categories, many=True)
@@ -53,6 +55,8 @@ class PublicEventListView(APIView):
     """Lista eventos públicos con filtros opcionales"""
     permission_classes = [AllowAny]
 
+    # TTL corto: el filtro event_date >= now cambia con el tiempo
+    @cache_response('events.Event', 'events.EventCategory', ttl=60)
     def get(self, request):
         # Filtros de query params
         category = request.GET.get('category')
@@ -2815,13 +2819,13 @@ class IngresosAnalysisView(APIView):
         from .models import MonthlyRevenueMeta
         from apps.property.models import Property
         import calendar
-        import openai
         import traceback
+        from apps.core import ai_gateway
 
         try:
             return self._generate_analysis(
                 django_settings, date, timedelta, Reservation,
-                MonthlyRevenueMeta, Property, calendar, openai
+                MonthlyRevenueMeta, Property, calendar, ai_gateway
             )
         except Exception as e:
             logger = logging.getLogger(__name__)
@@ -2832,7 +2836,7 @@ class IngresosAnalysisView(APIView):
             )
 
     def _generate_analysis(self, django_settings, date, timedelta, Reservation,
-                           MonthlyRevenueMeta, Property, calendar, openai):
+                           MonthlyRevenueMeta, Property, calendar, ai_gateway):
         today = timezone.now().date()
         start_date = date(today.year - 2, today.month, 1)
 
@@ -3297,7 +3301,7 @@ class IngresosAnalysisView(APIView):
 
         # --- Llamar a OpenAI (gpt-4.1-mini: balance entre calidad y velocidad) ---
         MODEL = "gpt-4.1-mini"
-        client = openai.OpenAI(api_key=django_settings.OPENAI_API_KEY)
+        client = ai_gateway.client('reports')
         response = client.chat.completions.create(
             model=MODEL,
             temperature=0.2,
@@ -5,3 +5,6 @@ class LogisticaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.logistica'
     verbose_name = '📊 Logística'
+
+    def ready(self):
+        import apps.logistica.signals
@@ -0,0 +1,232 @@
+"""
+Libro de quincenas: totales de gastos, limpiezas, sueldos y reembolsos.
+
+Cada tabla se agrega con UNA consulta de agregación condicional
+(`Sum(..., filter=Q(status=...))`) agrupada por quincena, así que
+calcular 1 o 24 quincenas cuesta lo mismo. El resultado se guarda en
+`PeriodSummary` (una fila por quincena) y se recalcula desde señales
+cuando cambia algo de esa quincena (ver signals.py).
+
+Uso:
+    summary = get_summary(period)                    # PeriodSummary
+    rows = compare_periods('month', date_from, date_to)
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from .models import (
+    Period, Staff, Expense, Cleaning, SalaryPayment, Reimbursement, PeriodSummary,
+)
+
+ZERO = Decimal('0')
+
+AMOUNT_FIELDS = [
+    'total_expenses', 'total_cleanings', 'total_salaries', 'total_reimbursements',
+    'expenses_pending', 'expenses_paid',
+    'cleanings_pending', 'cleanings_paid',
+    'salaries_pending', 'salaries_paid',
+]
+
+
+def _split(field):
+    """total / pendiente / pagado de `field` en una sola pasada."""
+    return {
+        'sum_total': Sum(field),
+        'sum_pending': Sum(field, filter=Q(status='pending')),
+        'sum_paid': Sum(field, filter=Q(status='paid')),
+    }
+
+
+def compute_ledgers(period_ids):
+    """
+    {period_id: {campo: monto, 'reimbursements_owed': {...}}} para varias
+    quincenas. Cinco consultas en total, sin importar cuántas quincenas.
+    """
+    period_ids = [uuid.UUID(str(pid)) for pid in period_ids]
+    ledgers = {
+        pid: {field: ZERO for field in AMOUNT_FIELDS} | {'reimbursements_owed': {}}
+        for pid in period_ids
+    }
+    if not period_ids:
+        return ledgers
+
+    tables = [
+        (Expense, 'total', 'expenses'),
+        (Cleaning, 'amount', 'cleanings'),
+        (SalaryPayment, 'amount', 'salaries'),
+    ]
+    for model, field, prefix in tables:
+        rows = (
+            model.objects.filter(period_id__in=period_ids, deleted=False)
+            .values('period_id')
+            .annotate(**_split(field))
+            .order_by()
+        )
+        for row in rows:
+            ledger = ledgers[row['period_id']]
+            ledger[f'total_{prefix}'] = row['sum_total'] or ZERO
+            ledger[f'{prefix}_pending'] = row['sum_pending'] or ZERO
+            ledger[f'{prefix}_paid'] = row['sum_paid'] or ZERO
+
+    rows = (
+        Reimbursement.objects.filter(period_id__in=period_ids, deleted=False)
+        .values('period_id')
+        .annotate(sum_total=Sum('amount'))
+        .order_by()
+    )
+    for row in rows:
+        ledgers[row['period_id']]['total_reimbursements'] = row['sum_total'] or ZERO
+
+    # Reembolsos pendientes por staff, agrupados en la BD
+    owed = (
+        Expense.objects.filter(
+            period_id__in=period_ids,
+            deleted=False,
+            payment_method=Expense.PaymentMethod.OWN_MONEY,
+            reimbursed_at__isnull=True,
+            paid_by_staff__isnull=False,
+        )
+        .values('period_id', 'paid_by_staff__name')
+        .annotate(owed=Sum('total'))
+        .order_by()
+    )
+    for row in owed:
+        by_staff = ledgers[row['period_id']]['reimbursements_owed']
+        name = row['paid_by_staff__name']
+        by_staff[name] = by_staff.get(name, 0) + float(row['owed'] or 0)
+
+    return ledgers
+
+
+def refresh_summaries(period_ids):
+    """Recalcula y guarda los PeriodSummary de las quincenas dadas."""
+    ledgers = compute_ledgers(period_ids)
+    existing = set(
+        PeriodSummary.objects.filter(period_id__in=ledgers).values_list('period_id', flat=True)
+    )
+    summaries = [PeriodSummary(period_id=pid, **ledger) for pid, ledger in ledgers.items()]
+    with transaction.atomic():
+        # Dos primeras lecturas concurrentes pueden insertar la misma quincena:
+        # la que llega segunda no falla y deja sus totales con el update
+        PeriodSummary.objects.bulk_create(
+            [s for s in summaries if s.period_id not in existing], ignore_conflicts=True,
+        )
+        now = timezone.now()
+        for summary in summaries:
+            summary.computed_at = now
+        PeriodSummary.objects.bulk_update(
+            summaries, AMOUNT_FIELDS + ['reimbursements_owed', 'computed_at'],
+        )
+    return {s.period_id: s for s in summaries}
+
+
+def refresh_summary_on_commit(*period_ids):
+    """Programa el recálculo al confirmar la transacción (desde señales)."""
+    period_ids = {pid for pid in period_ids if pid}
+    if period_ids:
+        transaction.on_commit(lambda: refresh_summaries(period_ids))
+
+
+def get_summary(period):
+    """PeriodSummary de la quincena, calculándolo si todavía no existe."""
+    summary = PeriodSummary.objects.filter(period=period).first()
+    if summary is None:
+        summary = refresh_summaries([period.id])[period.id]
+    return summary
+
+
+def summary_payload(period, summary):
+    """Dict con el formato de PeriodSummarySerializer."""
+    data = {
+        'period_id': str(period.id),
+        'label': period.label,
+        'start_date': period.start_date,
+        'end_date': period.end_date,
+        'grand_total': summary.grand_total,
+        'total_pending': summary.total_pending,
+        'total_paid': summary.total_paid,
+        'reimbursements_owed': summary.reimbursements_owed,
+    }
+    data.update({field: getattr(summary, field) for field in AMOUNT_FIELDS})
+    return data
+
+
+GROUPINGS = {
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def compare_periods(group, date_from=None, date_to=None):
+    """
+    Totales por mes o año (según start_date de la quincena), a partir de
+    los PeriodSummary. Las quincenas sin resumen se calculan antes en bloque.
+    """
+    trunc = GROUPINGS[group]
+    periods = Period.objects.filter(deleted=False)
+    if date_from:
+        periods = periods.filter(start_date__gte=date_from)
+    if date_to:
+        periods = periods.filter(start_date__lte=date_to)
+
+    missing = list(periods.filter(summary__isnull=True).values_list('id', flat=True))
+    if missing:
+        refresh_summaries(missing)
+
+    rows = (
+        PeriodSummary.objects.filter(period__in=periods)
+        .annotate(bucket=trunc('period__start_date'))
+        .values('bucket')
+        .annotate(**{f'sum_{field}': Sum(field) for field in AMOUNT_FIELDS})
+        .order_by('bucket')
+    )
+    result = []
+    for row in rows:
+        entry = {'bucket': row['bucket']}
+        entry.update({field: row[f'sum_{field}'] or ZERO for field in AMOUNT_FIELDS})
+        entry['grand_total'] = entry['total_expenses'] + entry['total_cleanings'] + entry['total_salaries']
+        entry['total_pending'] = entry['expenses_pending'] + entry['cleanings_pending'] + entry['salaries_pending']
+        entry['total_paid'] = entry['expenses_paid'] + entry['cleanings_paid'] + entry['salaries_paid']
+        result.append(entry)
+    return result
+
+
+def generate_salary_payments(period, payment_type):
+    """
+    Crea los SalaryPayments pendientes de la quincena: staff fijo activo
+    (que ya existía en esa quincena) sin registro previo, activo o borrado.
+    Un diff contra los existentes + un bulk_create (con historial).
+    """
+    existing = set(
+        SalaryPayment.objects.filter(
+            period=period, payment_type=payment_type,
+        ).values_list('staff_id', flat=True)
+    )
+    staff_qs = Staff.objects.filter(
+        staff_type=Staff.StaffType.FIXED,
+        is_active=True,
+        deleted=False,
+    ).exclude(start_date__gt=period.end_date)
+    to_create = [
+        SalaryPayment(
+            period=period,
+            staff=staff,
+            payment_type=payment_type,
+            amount=(staff.monthly_salary or ZERO) / Decimal('2'),
+            status=SalaryPayment.Status.PENDING,
+        )
+        for staff in staff_qs
+        if staff.id not in existing
+    ]
+    if not to_create:
+        return []
+    with transaction.atomic():
+        created = bulk_create_with_history(to_create, SalaryPayment)
+    refresh_summary_on_commit(period.id)
+    return created
@@ -454,3 +454,58 @@ class Reimbursement(BaseModel):
 
     def __str__(self):
         return f"{self.to_staff.name} · S/{self.amount} · {self.paid_at:%d-%m-%Y}"
+
+
+# ============================================================================
+# PeriodSummary — Resumen desnormalizado por quincena
+# ============================================================================
+
+class PeriodSummary(models.Model):
+    """Totales precalculados de una quincena (ver apps.logistica.ledger).
+
+    Se recalcula al guardar/borrar gastos, limpiezas, sueldos o reembolsos
+    de la quincena, así el dashboard y las comparativas mensuales/anuales
+    leen una fila por quincena en vez de agregar las cuatro tablas.
+    Es un dato derivado: sin historial y regenerable con
+    `ledger.refresh_summaries()`.
+    """
+    period = models.OneToOneField(
+        Period, on_delete=models.CASCADE,
+        primary_key=True, related_name='summary',
+    )
+    total_expenses = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_cleanings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_salaries = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_reimbursements = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    expenses_pending = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    expenses_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cleanings_pending = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cleanings_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    salaries_pending = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    salaries_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    reimbursements_owed = models.JSONField(
+        default=dict, blank=True,
+        help_text="Por staff: {nombre: monto} pendiente de reembolsar",
+    )
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = '🧮 Resumen de quincena'
+        verbose_name_plural = '🧮 Resúmenes de quincena'
+
+    def __str__(self):
+        return f"Resumen {self.period}"
+
+    @property
+    def grand_total(self):
+        return self.total_expenses + self.total_cleanings + self.total_salaries
+
+    @property
+    def total_pending(self):
+        return self.expenses_pending + self.cleanings_pending + self.salaries_pending
+
+    @property
+    def total_paid(self):
+        return self.expenses_paid + self.cleanings_paid + self.salaries_paid
@@ -215,3 +215,24 @@ class PeriodSummarySerializer(serializers.Serializer):
     reimbursements_owed = serializers.DictField(
         help_text="Por staff: {staff_id: amount} pendiente de reembolsar",
     )
+
+
+class PeriodCompareSerializer(serializers.Serializer):
+    """Totales de un mes/año para comparar períodos."""
+    bucket = serializers.DateField()
+
+    total_expenses = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_cleanings = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_salaries = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_reimbursements = serializers.DecimalField(max_digits=14, decimal_places=2)
+    grand_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    expenses_pending = serializers.DecimalField(max_digits=14, decimal_places=2)
+    expenses_paid = serializers.DecimalField(max_digits=14, decimal_places=2)
+    cleanings_pending = serializers.DecimalField(max_digits=14, decimal_places=2)
+    cleanings_paid = serializers.DecimalField(max_digits=14, decimal_places=2)
+    salaries_pending = serializers.DecimalField(max_digits=14, decimal_places=2)
+    salaries_paid = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    total_pending = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_paid = serializers.DecimalField(max_digits=14, decimal_places=2)
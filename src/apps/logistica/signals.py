@@ -0,0 +1,30 @@
+"""
+Mantiene PeriodSummary al día: cada alta, cambio o baja de un gasto,
+limpieza, sueldo o reembolso recalcula el resumen de su quincena (y el de
+la quincena anterior si el registro se movió de quincena).
+
+Las escrituras masivas (`update()`, `bulk_create`) no disparan señales;
+quien las use debe llamar a `ledger.refresh_summary_on_commit()`.
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .ledger import refresh_summary_on_commit
+from .models import Cleaning, Expense, Reimbursement, SalaryPayment
+
+LEDGER_MODELS = (Expense, Cleaning, SalaryPayment, Reimbursement)
+
+
+def _remember_period(sender, instance, **kwargs):
+    instance._ledger_period_id = instance.__dict__.get('period_id')
+
+
+def _refresh_period(sender, instance, **kwargs):
+    refresh_summary_on_commit(instance.period_id, getattr(instance, '_ledger_period_id', None))
+    instance._ledger_period_id = instance.period_id
+
+
+for model in LEDGER_MODELS:
+    receiver(post_init, sender=model, dispatch_uid=f'ledger_init_{model.__name__}')(_remember_period)
+    receiver(post_save, sender=model, dispatch_uid=f'ledger_save_{model.__name__}')(_refresh_period)
+    receiver(post_delete, sender=model, dispatch_uid=f'ledger_delete_{model.__name__}')(_refresh_period)
@@ -0,0 +1,188 @@
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import CustomUser
+
+from . import ledger
+from .models import Cleaning, Expense, Period, PeriodSummary, Reimbursement, SalaryPayment, Staff
+
+PAID_AT = timezone.make_aware(datetime(2026, 5, 10, 12, 0))
+
+
+class LedgerTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from apps.property.models import Property
+
+        cls.property = Property.objects.create(name='Casa Austin 1', slug='casa-austin-1')
+        cls.first = Period.objects.create(start_date=date(2026, 5, 1), end_date=date(2026, 5, 15), label='1–15 mayo 2026')
+        cls.second = Period.objects.create(start_date=date(2026, 5, 16), end_date=date(2026, 5, 31), label='16–31 mayo 2026')
+        cls.ana = Staff.objects.create(name='Ana', staff_type=Staff.StaffType.FIXED, monthly_salary=Decimal('2000'))
+        cls.beto = Staff.objects.create(name='Beto', staff_type=Staff.StaffType.EXTERNAL)
+
+    def expense(self, period, unit_price, quantity=1, **kwargs):
+        return Expense.objects.create(
+            period=period, date=period.start_date, description='Gasto',
+            quantity=Decimal(quantity), unit_price=Decimal(unit_price), **kwargs,
+        )
+
+    def summary(self, period):
+        return PeriodSummary.objects.get(period=period)
+
+
+class ComputeLedgersTest(LedgerTestCase):
+    """Totales por quincena con agregación condicional"""
+
+    def test_totals_split_by_status(self):
+        self.expense(self.first, '10.50', quantity=2)
+        self.expense(self.first, '30', status=Expense.Status.PAID)
+        self.expense(self.first, '99', deleted=True)
+        self.expense(self.first, '15', paid_by_staff=self.ana, payment_method=Expense.PaymentMethod.OWN_MONEY)
+        self.expense(self.first, '5', paid_by_staff=self.ana, payment_method=Expense.PaymentMethod.OWN_MONEY)
+        # Ya reembolsado: no se debe
+        self.expense(
+            self.first, '7', paid_by_staff=self.ana, payment_method=Expense.PaymentMethod.OWN_MONEY,
+            reimbursed_at=PAID_AT,
+        )
+        Cleaning.objects.create(period=self.first, date=date(2026, 5, 3), property=self.property, cleaner=self.beto, amount=Decimal('80'))
+        Cleaning.objects.create(
+            period=self.first, date=date(2026, 5, 4), property=self.property, cleaner=self.beto,
+            amount=Decimal('70'), status=Cleaning.Status.PAID,
+        )
+        SalaryPayment.objects.create(
+            period=self.first, staff=self.ana, payment_type=SalaryPayment.PaymentType.QUINCENA, amount=Decimal('1000'),
+        )
+        Reimbursement.objects.create(period=self.first, to_staff=self.ana, amount=Decimal('7'), paid_at=PAID_AT)
+        self.expense(self.second, '40')
+
+        with self.assertNumQueries(5):
+            ledgers = ledger.compute_ledgers([self.first.id, str(self.second.id)])
+
+        first = ledgers[self.first.id]
+        self.assertEqual(first['total_expenses'], Decimal('78'))
+        self.assertEqual(first['expenses_pending'], Decimal('48'))
+        self.assertEqual(first['expenses_paid'], Decimal('30'))
+        self.assertEqual((first['total_cleanings'], first['cleanings_pending'], first['cleanings_paid']), (150, 80, 70))
+        self.assertEqual((first['total_salaries'], first['salaries_pending'], first['salaries_paid']), (1000, 1000, 0))
+        self.assertEqual(first['total_reimbursements'], Decimal('7'))
+        self.assertEqual(first['reimbursements_owed'], {'Ana': 20.0})
+
+        second = ledgers[self.second.id]
+        self.assertEqual(second['total_expenses'], Decimal('40'))
+        self.assertEqual(second['total_salaries'], 0)
+        self.assertEqual(second['reimbursements_owed'], {})
+
+    def test_no_periods(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(ledger.compute_ledgers([]), {})
+
+
+class LedgerSignalsTest(LedgerTestCase):
+    """Las altas, cambios y bajas recalculan el resumen de su quincena"""
+
+    def test_save_move_and_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            expense = self.expense(self.first, '25')
+        self.assertEqual(self.summary(self.first).total_expenses, Decimal('25'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.status = Expense.Status.PAID
+            expense.save()
+        self.assertEqual(self.summary(self.first).expenses_paid, Decimal('25'))
+
+        # Moverlo de quincena recalcula las dos
+        expense = Expense.objects.get(pk=expense.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.period = self.second
+            expense.save()
+        self.assertEqual(self.summary(self.first).total_expenses, 0)
+        self.assertEqual(self.summary(self.second).total_expenses, Decimal('25'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expense.delete()
+        self.assertEqual(self.summary(self.second).total_expenses, 0)
+
+    def test_each_ledger_model_refreshes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Cleaning.objects.create(period=self.first, date=date(2026, 5, 3), property=self.property, amount=Decimal('80'))
+            SalaryPayment.objects.create(
+                period=self.first, staff=self.ana, payment_type=SalaryPayment.PaymentType.QUINCENA, amount=Decimal('1000'),
+            )
+            Reimbursement.objects.create(period=self.first, to_staff=self.ana, amount=Decimal('12'), paid_at=PAID_AT)
+        summary = self.summary(self.first)
+        self.assertEqual(
+            (summary.total_cleanings, summary.total_salaries, summary.total_reimbursements),
+            (Decimal('80'), Decimal('1000'), Decimal('12')),
+        )
+        self.assertEqual(summary.grand_total, Decimal('1080'))
+
+    def test_concurrent_first_refresh(self):
+        self.expense(self.first, '25')
+        # Otra lectura insertó el resumen después de que esta lo buscara
+        PeriodSummary.objects.create(period=self.first)
+        with mock.patch('apps.logistica.ledger.set', create=True, return_value=set()):
+            ledger.refresh_summaries([self.first.id])
+        self.assertEqual(self.summary(self.first).total_expenses, Decimal('25'))
+
+
+class ReimburseEndpointTest(TransactionTestCase):
+    """El reembolso recalcula el resumen con los gastos ya marcados.
+
+    TransactionTestCase: fuera de la transacción del test, on_commit corre
+    cuando confirma la vista y no al final del test.
+    """
+
+    def test_reimbursed_expenses_leave_nothing_owed(self):
+        first = Period.objects.create(start_date=date(2026, 5, 1), end_date=date(2026, 5, 15), label='1–15 mayo 2026')
+        ana = Staff.objects.create(name='Ana', staff_type=Staff.StaffType.EXTERNAL)
+        expenses = [
+            Expense.objects.create(
+                period=first, date=first.start_date, description='Gasto', quantity=1, unit_price=Decimal(amount),
+                paid_by_staff=ana, payment_method=Expense.PaymentMethod.OWN_MONEY,
+            )
+            for amount in ('15', '5')
+        ]
+        api = APIClient()
+        api.force_authenticate(CustomUser.objects.create_user(username='admin', email='admin@casaaustin.pe', password='x'))
+
+        response = api.post('/api/v1/logistica/reimbursements/pay/', {
+            'to_staff_id': str(ana.id), 'period_id': str(first.id),
+            'expense_ids': [str(e.id) for e in expenses], 'paid_at': PAID_AT.isoformat(),
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        summary = PeriodSummary.objects.get(period=first)
+        self.assertEqual((summary.total_reimbursements, summary.reimbursements_owed), (Decimal('20'), {}))
+
+
+class GenerateSalaryPaymentsTest(LedgerTestCase):
+    """Sueldos pendientes del staff fijo activo, sin duplicar"""
+
+    def test_creates_missing_payments_once(self):
+        Staff.objects.create(name='Inactiva', staff_type=Staff.StaffType.FIXED, monthly_salary=Decimal('1500'), is_active=False)
+        Staff.objects.create(
+            name='Nueva', staff_type=Staff.StaffType.FIXED, monthly_salary=Decimal('1500'), start_date=date(2026, 5, 16),
+        )
+        carla = Staff.objects.create(name='Carla', staff_type=Staff.StaffType.FIXED, monthly_salary=Decimal('1801'))
+        # Un pago borrado también cuenta como existente
+        SalaryPayment.objects.create(
+            period=self.first, staff=carla, payment_type=SalaryPayment.PaymentType.QUINCENA,
+            amount=Decimal('900'), deleted=True,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            created = ledger.generate_salary_payments(self.first, SalaryPayment.PaymentType.QUINCENA)
+        self.assertEqual([(p.staff.name, p.amount) for p in created], [('Ana', Decimal('1000'))])
+        self.assertEqual(created[0].status, SalaryPayment.Status.PENDING)
+        self.assertEqual(SalaryPayment.history.filter(staff=self.ana).count(), 1)
+        self.assertEqual(self.summary(self.first).salaries_pending, Decimal('1000'))
+
+        self.assertEqual(ledger.generate_salary_payments(self.first, SalaryPayment.PaymentType.QUINCENA), [])
+        # Otro tipo de pago de la misma quincena es otro registro
+        self.assertEqual(len(ledger.generate_salary_payments(self.first, SalaryPayment.PaymentType.FIN_DE_MES)), 2)
@@ -6,7 +6,7 @@ from .views import (
     ExpenseCategoryViewSet, ExpenseItemViewSet,
     ExpenseViewSet, CleaningViewSet,
     SalaryPaymentViewSet, ReimbursementViewSet,
-    PeriodSummaryView,
+    PeriodSummaryView, PeriodCompareView,
 )
 
 
@@ -24,4 +24,5 @@ router.register(r'reimbursements', ReimbursementViewSet, basename='logistica-rei
 urlpatterns = [
     path('', include(router.urls)),
     path('summary/', PeriodSummaryView.as_view(), name='logistica-summary'),
+    path('summary/compare/', PeriodCompareView.as_view(), name='logistica-summary-compare'),
 ]
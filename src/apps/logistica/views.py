@@ -5,11 +5,11 @@ Permisos: requiere autenticación (JWT). La visibilidad por superuser
 se hace en frontend — backend permite a cualquier usuario autenticado
 para no acoplar lógica de roles ahora.
 """
-from collections import defaultdict
 from datetime import date, datetime
 from decimal import Decimal
 
-from django.db.models import Sum, Q
+from django.db import transaction
+from django.db.models import Sum
 from django.utils import timezone
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
@@ -17,6 +17,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import ledger
 from .models import (
     Period, Staff, ExpenseCategory, ExpenseItem,
     Expense, Cleaning, SalaryPayment, Reimbursement,
@@ -26,7 +27,7 @@ from .serializers import (
     ExpenseCategorySerializer, ExpenseItemSerializer,
     ExpenseSerializer, CleaningSerializer,
     SalaryPaymentSerializer, ReimbursementSerializer,
-    PeriodSummarySerializer,
+    PeriodSummarySerializer, PeriodCompareSerializer,
 )
 
 
@@ -295,34 +296,10 @@ class SalaryPaymentViewSet(viewsets.ModelViewSet):
         except Period.DoesNotExist:
             return Response({'detail': 'Period no encontrado'}, status=404)
 
-        created = []
-        for staff in Staff.objects.filter(
-            staff_type=Staff.StaffType.FIXED,
-            is_active=True,
-            deleted=False,
-        ):
-            # No generar para staff que aún no existían en esa quincena
-            if staff.start_date and staff.start_date > period.end_date:
-                continue
-
-            # Verificar si existe (activo o borrado) — no recrear
-            existing = SalaryPayment.objects.filter(
-                period=period,
-                staff=staff,
-                payment_type=payment_type,
-            ).first()
-            if existing is not None:
-                continue
-
-            amount = (staff.monthly_salary or Decimal('0')) / Decimal('2')
-            obj = SalaryPayment.objects.create(
-                period=period,
-                staff=staff,
-                payment_type=payment_type,
-                amount=amount,
-                status=SalaryPayment.Status.PENDING,
-            )
-            created.append(SalaryPaymentSerializer(obj).data)
+        created = [
+            SalaryPaymentSerializer(obj).data
+            for obj in ledger.generate_salary_payments(period, payment_type)
+        ]
         return Response({
             'created': len(created),
             'payments': created,
@@ -431,19 +408,25 @@ class ReimbursementViewSet(viewsets.ModelViewSet):
             except ValueError:
                 pass
 
-        reimb = Reimbursement.objects.create(
-            period=period,
-            to_staff=staff,
-            amount=amount,
-            paid_at=paid_at,
-            notes=notes,
-            voucher=voucher,  # null si no se subió
-        )
-        # Marcar expenses
-        expenses.update(
-            reimbursed_at=paid_at,
-            reimbursement=reimb,
-        )
+        # Todo en una transacción: los resúmenes (señal del Reimbursement y
+        # el refresh de abajo) se recalculan al confirmar, con los gastos ya
+        # marcados como reembolsados
+        with transaction.atomic():
+            reimb = Reimbursement.objects.create(
+                period=period,
+                to_staff=staff,
+                amount=amount,
+                paid_at=paid_at,
+                notes=notes,
+                voucher=voucher,  # null si no se subió
+            )
+            period_ids = set(expenses.values_list('period_id', flat=True))
+            expenses.update(
+                reimbursed_at=paid_at,
+                reimbursement=reimb,
+            )
+            # update() no dispara señales: refrescar resúmenes
+            ledger.refresh_summary_on_commit(*period_ids)
         return Response(
             ReimbursementSerializer(reimb, context={'request': request}).data,
             status=201,
@@ -481,73 +464,33 @@ class PeriodSummaryView(APIView):
                     status=404,
                 )
 
-        # Totales
-        expenses_qs = Expense.objects.filter(period=period, deleted=False)
-        cleanings_qs = Cleaning.objects.filter(period=period, deleted=False)
-        salaries_qs = SalaryPayment.objects.filter(period=period, deleted=False)
-        reimbs_qs = Reimbursement.objects.filter(period=period, deleted=False)
-
-        total_expenses = expenses_qs.aggregate(s=Sum('total'))['s'] or Decimal('0')
-        total_cleanings = cleanings_qs.aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        total_salaries = salaries_qs.aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        total_reimbursements = reimbs_qs.aggregate(s=Sum('amount'))['s'] or Decimal('0')
+        summary = ledger.get_summary(period)
+        data = ledger.summary_payload(period, summary)
+        return Response(PeriodSummarySerializer(data).data)
 
-        expenses_pending = expenses_qs.filter(status='pending').aggregate(s=Sum('total'))['s'] or Decimal('0')
-        expenses_paid = expenses_qs.filter(status='paid').aggregate(s=Sum('total'))['s'] or Decimal('0')
 
-        cleanings_pending = cleanings_qs.filter(status='pending').aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        cleanings_paid = cleanings_qs.filter(status='paid').aggregate(s=Sum('amount'))['s'] or Decimal('0')
+class PeriodCompareView(APIView):
+    """GET /api/v1/logistica/summary/compare/?group=month&from=YYYY-MM-DD&to=YYYY-MM-DD
 
-        salaries_pending = salaries_qs.filter(status='pending').aggregate(s=Sum('amount'))['s'] or Decimal('0')
-        salaries_paid = salaries_qs.filter(status='paid').aggregate(s=Sum('amount'))['s'] or Decimal('0')
+    Totales agrupados por mes (default) o año según el inicio de cada
+    quincena, para comparar períodos.
+    """
+    permission_classes = [IsAuthenticated]
 
-        total_pending = expenses_pending + cleanings_pending + salaries_pending
-        total_paid = expenses_paid + cleanings_paid + salaries_paid
+    def get(self, request):
+        group = request.query_params.get('group', 'month')
+        if group not in ledger.GROUPINGS:
+            return Response({'detail': 'group debe ser month o year'}, status=400)
+        try:
+            date_from = request.query_params.get('from')
+            date_to = request.query_params.get('to')
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+        except ValueError:
+            return Response({'detail': 'Formato de fecha inválido (usa YYYY-MM-DD)'}, status=400)
 
-        # Reembolsos pendientes por staff
-        owed_by_staff = defaultdict(lambda: Decimal('0'))
-        owed_qs = Expense.objects.filter(
-            deleted=False,
-            period=period,
-            payment_method=Expense.PaymentMethod.OWN_MONEY,
-            reimbursed_at__isnull=True,
-            paid_by_staff__isnull=False,
-        ).values('paid_by_staff_id', 'paid_by_staff__name', 'total')
-        for row in owed_qs:
-            key = str(row['paid_by_staff_id'])
-            owed_by_staff[key] += row['total']
-        # Convertir defaultdict a dict normal con nombre
-        owed_dict = {}
-        names_qs = Staff.objects.filter(
-            id__in=owed_by_staff.keys()
-        ).values_list('id', 'name')
-        names_map = {str(i): n for i, n in names_qs}
-        for k, v in owed_by_staff.items():
-            owed_dict[names_map.get(k, k)] = float(v)
-
-        grand_total = total_expenses + total_cleanings + total_salaries
-
-        data = {
-            'period_id': str(period.id),
-            'label': period.label,
-            'start_date': period.start_date,
-            'end_date': period.end_date,
-            'total_expenses': total_expenses,
-            'total_cleanings': total_cleanings,
-            'total_salaries': total_salaries,
-            'total_reimbursements': total_reimbursements,
-            'grand_total': grand_total,
-            'expenses_pending': expenses_pending,
-            'expenses_paid': expenses_paid,
-            'cleanings_pending': cleanings_pending,
-            'cleanings_paid': cleanings_paid,
-            'salaries_pending': salaries_pending,
-            'salaries_paid': salaries_paid,
-            'total_pending': total_pending,
-            'total_paid': total_paid,
-            'reimbursements_owed': owed_dict,
-        }
-        return Response(PeriodSummarySerializer(data).data)
+        rows = ledger.compare_periods(group, date_from, date_to)
+        return Response(PeriodCompareSerializer(rows, many=True).data)
 
 
 # Helpers
@@ -0,0 +1,66 @@
+"""Genera los derivados responsivos (srcset) de las imágenes ya subidas.
+
+Recorre fotos de propiedades, imágenes de eventos y featured images del
+blog y corre el pipeline de apps.core.image_derivatives de forma síncrona.
+Como los derivados se guardan por hash de contenido, las imágenes
+repetidas o ya procesadas no se vuelven a redimensionar.
+
+Uso:
+    python manage.py backfill_image_derivatives
+    python manage.py backfill_image_derivatives --only property
+    python manage.py backfill_image_derivatives --workers 4
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.blog.models import BlogPost
+from apps.core.image_derivatives import build_derivatives, get_manifest
+from apps.events.models import Event
+from apps.property.models import PropertyPhoto
+
+
+SOURCES = {
+    'property': (PropertyPhoto, 'image_file'),
+    'events': (Event, 'image'),
+    'blog': (BlogPost, 'featured_image'),
+}
+
+
+class Command(BaseCommand):
+    help = "Genera derivados responsivos (WebP/AVIF) de las imágenes existentes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=sorted(SOURCES), help='Procesar solo un tipo de imagen')
+        parser.add_argument('--workers', type=int, default=2, help='Hilos de procesamiento (default: 2)')
+        parser.add_argument('--force', action='store_true', help='Reprocesar aunque ya tenga manifest')
+
+    def handle(self, *args, **opts):
+        names = []
+        for key, (model, field) in SOURCES.items():
+            if opts['only'] and key != opts['only']:
+                continue
+            qs = model.objects.filter(deleted=False).exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for name in qs.values_list(field, flat=True).iterator():
+                if opts['force'] or not get_manifest(name):
+                    names.append(name)
+
+        self.stdout.write(f"Imágenes pendientes: {len(names)}")
+        done = failed = 0
+
+        def _run(name):
+            try:
+                return build_derivatives(name)
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=max(1, opts['workers'])) as pool:
+            for name, manifest in zip(names, pool.map(_run, names)):
+                if manifest:
+                    done += 1
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"⚠ Sin derivados: {name}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Listo. Procesadas: {done} | Fallidas: {failed}"))
@@ -6,6 +6,7 @@ from django.core.files.base import ContentFile
 from io import BytesIO
 
 from apps.core.models import BaseModel
+from apps.core.image_derivatives import enqueue_derivatives, get_manifest
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -223,11 +224,21 @@ class PropertyPhoto(BaseModel):
         
         # Guardar primero
         super().save(*args, **kwargs)
-        
-        # Generar thumbnail si es foto principal y no tiene thumbnail
+
+        # Thumbnail y tamaños responsivos se generan en el pool de derivados,
+        # fuera del request (ver apps.core.image_derivatives)
+        if self.image_file and (
+            (self.is_main and not self.thumbnail) or not get_manifest(self.image_file.name)
+        ):
+            enqueue_derivatives(self, 'image_file', after='process_uploaded_image')
+
+    def process_uploaded_image(self):
+        """Hook del worker de derivados: genera el thumbnail de la foto principal."""
         if self.is_main and self.image_file and not self.thumbnail:
             self.generate_thumbnail()
-            super().save(update_fields=['thumbnail'])
+            if self.thumbnail:
+                return {'thumbnail': self.thumbnail.name}
+        return None
 
     def delete(self, *args, **kwargs):
         self.deleted = True
@@ -2,6 +2,8 @@ from rest_framework import serializers
 
 from drf_spectacular.utils import extend_schema_field
 
+from apps.core.image_derivatives import get_srcset
+
 from .models import Property, ProfitPropertyAirBnb, PropertyPhoto
 
 
@@ -9,10 +11,11 @@ class PropertyPhotoSerializer(serializers.ModelSerializer):
     """Serializer para las fotos de propiedades"""
     image_url_final = serializers.SerializerMethodField()
     image_thumbnail = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = PropertyPhoto
-        fields = ["id", "image_url_final", "image_thumbnail", "alt_text", "order", "is_main"]
+        fields = ["id", "image_url_final", "image_thumbnail", "srcset", "alt_text", "order", "is_main"]
 
     def get_image_url_final(self, obj):
         """Get the final image URL (file or external URL)"""
@@ -24,6 +27,24 @@ class PropertyPhotoSerializer(serializers.ModelSerializer):
             return obj.get_thumbnail_url()
         return None
 
+    def get_srcset(self, obj):
+        """Tamaños responsivos (WebP) generados por el pool de derivados"""
+        return get_srcset(obj.image_file)
+
+
+def find_main_photo(obj):
+    """
+    Foto principal (o la primera no eliminada) de la propiedad. Si las fotos
+    vienen de prefetch_related('photos') se elige en memoria, sin consultas.
+    """
+    if 'photos' in getattr(obj, '_prefetched_objects_cache', {}):
+        photos = [photo for photo in obj.photos.all() if not photo.deleted]
+        return next((photo for photo in photos if photo.is_main), photos[0] if photos else None)
+    main_photo = obj.photos.filter(is_main=True, deleted=False).first()
+    if not main_photo:
+        main_photo = obj.photos.filter(deleted=False).first()
+    return main_photo
+
 
 class PropertyListSerializer(serializers.ModelSerializer):
     """Serializer ligero para listados - solo información básica"""
@@ -50,10 +71,7 @@ class PropertyListSerializer(serializers.ModelSerializer):
 
     def get_main_photo(self, obj):
         """Obtener la foto principal o la primera foto disponible"""
-        main_photo = obj.photos.filter(is_main=True, deleted=False).first()
-        if not main_photo:
-            main_photo = obj.photos.filter(deleted=False).first()
-
+        main_photo = find_main_photo(obj)
         if main_photo:
             return PropertyPhotoSerializer(main_photo).data
         return None
@@ -70,10 +88,7 @@ class PropertyDetailSerializer(serializers.ModelSerializer):
 
     def get_main_photo(self, obj):
         """Obtener la foto principal o la primera foto disponible"""
-        main_photo = obj.photos.filter(is_main=True, deleted=False).first()
-        if not main_photo:
-            main_photo = obj.photos.filter(deleted=False).first()
-
+        main_photo = find_main_photo(obj)
         if main_photo:
             return PropertyPhotoSerializer(main_photo).data
         return None
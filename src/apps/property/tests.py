@@ -1,3 +1,146 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from PIL import Image
+
+from apps.core.image_derivatives import build_derivatives, get_manifest, get_srcset
+from apps.core.response_cache import bump_version, cache_response
+
+from .models import Property, PropertyPhoto
+from .serializers import find_main_photo
+
+
+class ImageDerivativesTest(SimpleTestCase):
+    """Tests del pipeline de derivados de imagen"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_DERIVATIVE_WIDTHS=(320, 640, 1024),
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        )
+        self.override.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _upload(self, name, size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, format='JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def test_widths_never_upscale(self):
+        """Solo se generan anchos menores al original"""
+        name = self._upload('photos/a.jpg')
+        manifest = build_derivatives(name)
+        widths = [v['width'] for v in manifest['variants']['webp']]
+        self.assertEqual(widths, [320, 640])
+
+    def test_identical_content_is_processed_once(self):
+        """Dos archivos con el mismo contenido comparten derivados"""
+        first = build_derivatives(self._upload('photos/a.jpg'))
+        second = build_derivatives(self._upload('photos/b.jpg'))
+        self.assertEqual(first['hash'], second['hash'])
+        self.assertEqual(first['variants'], second['variants'])
+
+    def test_srcset(self):
+        """El srcset lista cada ancho generado"""
+        name = self._upload('photos/a.jpg')
+        self.assertIsNone(get_manifest(name))
+        build_derivatives(name)
+        field = type('Field', (), {'name': name, '__bool__': lambda self: True})()
+        srcset = get_srcset(field)
+        self.assertIn('320w', srcset)
+        self.assertIn('640w', srcset)
+
+
+class ResponseCacheTest(SimpleTestCase):
+    """Tests del cache versionado de respuestas públicas"""
+
+    def setUp(self):
+        self.override = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            RESPONSE_CACHE_ENABLED=True,
+        )
+        self.override.enable()
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        @cache_response('property.Property', ttl=60)
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'call {self.calls}', content_type='text/plain')
+
+        self.view = view
+
+    def tearDown(self):
+        self.override.disable()
+
+    def test_hit_after_miss(self):
+        """La segunda llamada se sirve del cache"""
+        first = self.view(self.factory.get('/properties/', {'page': 1}))
+        second = self.view(self.factory.get('/properties/', {'page': 1}))
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, b'call 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_query_params_change_key(self):
+        """Otros query params generan otra entrada"""
+        self.view(self.factory.get('/properties/', {'page': 1}))
+        response = self.view(self.factory.get('/properties/', {'page': 2}))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.calls, 2)
+
+    def test_etag_not_modified(self):
+        """If-None-Match con el ETag vigente responde 304"""
+        etag = self.view(self.factory.get('/properties/'))['ETag']
+        response = self.view(self.factory.get('/properties/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_version_invalidates(self):
+        """Cambiar el modelo deja obsoleta la respuesta y su ETag"""
+        etag = self.view(self.factory.get('/properties/'))['ETag']
+        bump_version('property.Property')
+        response = self.view(self.factory.get('/properties/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_authenticated_requests_bypass(self):
+        """Requests con Authorization no usan el cache"""
+        self.view(self.factory.get('/properties/'))
+        response = self.view(self.factory.get('/properties/', HTTP_AUTHORIZATION='Bearer x'))
+        self.assertNotIn('X-Cache', response)
+        self.assertEqual(self.calls, 2)
+
+
+class MainPhotoTest(SimpleTestCase):
+    """Con fotos precargadas la foto principal se elige sin consultas"""
+
+    def _property(self, photos):
+        prop = Property(name='Casa Austin 1')
+        prop._prefetched_objects_cache = {'photos': prop.photos.none()}
+        prop._prefetched_objects_cache['photos']._result_cache = photos
+        return prop
+
+    def test_prefers_main_photo(self):
+        first = PropertyPhoto(order=0)
+        main = PropertyPhoto(order=1, is_main=True)
+        self.assertIs(find_main_photo(self._property([first, main])), main)
+
+    def test_skips_deleted_photos(self):
+        deleted = PropertyPhoto(order=0, is_main=True, deleted=True)
+        second = PropertyPhoto(order=1)
+        self.assertIs(find_main_photo(self._property([deleted, second])), second)
+        self.assertIsNone(find_main_photo(self._property([deleted])))
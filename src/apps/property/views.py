@@ -13,6 +13,7 @@ from rest_framework.permissions import AllowAny
 
 from apps.core.paginator import CustomPagination
 from apps.core.functions import update_air_bnb_api
+from apps.core.response_cache import cache_response
 
 from .models import Property, ProfitPropertyAirBnb, PropertyPhoto
 from .pricing_models import ExchangeRate, DiscountCode, DynamicDiscountConfig, SeasonPricing, AdditionalService, CancellationPolicy
@@ -69,6 +70,7 @@ class PropertyApiView(viewsets.ReadOnlyModelViewSet):
         responses={200: PropertySerializer},
         methods=["GET"],
     )
+    @cache_response('property.Property', 'property.PropertyPhoto', 'property.ExchangeRate')
     def list(self, request, *args, **kwargs):
         self.pagination_class = self.get_pagination_class()
         response = super().list(request, *args, **kwargs)
@@ -91,6 +93,10 @@ class PropertyApiView(viewsets.ReadOnlyModelViewSet):
         
         return response
 
+    @cache_response('property.Property', 'property.PropertyPhoto')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 class ProfitPropertyApiView(viewsets.ModelViewSet):
     serializer_class = ProfitPropertyAirBnbSerializer
     queryset = ProfitPropertyAirBnb.objects.exclude(deleted=True).order_by("created")
@@ -1380,6 +1386,11 @@ class BotLevelsAPIView(APIView):
         },
         description='Endpoint específico para bot que lista todos los niveles (logros) disponibles con sus requisitos. Opcionalmente puede enviar los datos a ChatBot Builder.'
     )
+    @cache_response(
+        'clients.Achievement',
+        # El envío a ChatBot Builder es un efecto secundario: nunca desde cache
+        bypass=lambda request: request.query_params.get('send_to_chatbotbuilder', '').lower() == 'true',
+    )
     def get(self, request):
         try:
             from apps.clients.models import Achievement
@@ -0,0 +1,268 @@
+"""
+Resolver compartido de "estadía activa".
+
+TV, música, Home Assistant, el portal WiFi y el chatbot necesitan saber
+quién está hospedado en una casa AHORA o si un cliente está en una
+estadía. Antes cada vista consultaba reservas y re-aplicaba sus propios
+horarios (12:00, 15:00, 11:00) en loops de Python. Este módulo concentra:
+
+- Una única política horaria (`STAY_CHECKIN_TIME` / `STAY_CHECKOUT_TIME`
+  en settings): la estadía corre desde check_in_date a la hora de check-in
+  hasta check_out_date a la hora de check-out.
+- Un índice en memoria por propiedad y por cliente con las estadías en
+  curso y próximas (`STAY_INDEX_HORIZON_DAYS`), ordenadas por inicio, que
+  responde con bisect sin ir a la BD.
+
+El índice se invalida con las señales de Reservation, que además publican
+una versión en el cache default. Con un cache compartido (`REDIS_URL`, ver
+apps.core.response_cache.is_shared) los demás workers ven esa versión y
+reconstruyen en la siguiente consulta. Con el LocMemCache por defecto la
+versión es por proceso: los otros workers siguen con su índice hasta que
+pasen `STAY_INDEX_TTL` segundos o cambie el día.
+
+Uso:
+    from apps.reservation.active_stay import stay_resolver
+
+    stay = stay_resolver.active_for_property(property_id)
+    if stay:
+        reservation = stay.load()  # Reservation completa, solo si se necesita
+"""
+import bisect
+import logging
+import threading
+import time as time_module
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('approved', 'pending', 'incomplete', 'under_review')
+
+_VERSION_CACHE_KEY = 'active_stay:version'
+
+
+def _key(value):
+    """Normaliza ids (str/UUID) para usarlos como clave del índice."""
+    if isinstance(value, uuid.UUID) or value is None:
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return value
+
+
+def _parse_time(value, default):
+    if isinstance(value, time):
+        return value
+    if not value:
+        return default
+    hour, _, minute = str(value).partition(':')
+    return time(int(hour), int(minute or 0))
+
+
+def checkin_time():
+    return _parse_time(getattr(settings, 'STAY_CHECKIN_TIME', None), time(15, 0))
+
+
+def checkout_time():
+    return _parse_time(getattr(settings, 'STAY_CHECKOUT_TIME', None), time(11, 0))
+
+
+def stay_bounds(check_in_date, check_out_date):
+    """(inicio, fin) de la estadía como datetimes locales según la política."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(check_in_date, checkin_time()), tz)
+    end = timezone.make_aware(datetime.combine(check_out_date, checkout_time()), tz)
+    return start, end
+
+
+def is_stay_active(reservation, now=None):
+    """True si la reserva está en curso en `now` según la política horaria."""
+    now = now or timezone.now()
+    start, end = stay_bounds(reservation.check_in_date, reservation.check_out_date)
+    return start <= now < end
+
+
+@dataclass(frozen=True)
+class Stay:
+    reservation_id: object
+    property_id: object
+    client_id: object
+    status: str
+    check_in_date: object
+    check_out_date: object
+    start: datetime
+    end: datetime
+    late_checkout: bool = False
+    temperature_pool: bool = False
+
+    def load(self, *related):
+        """Carga la Reservation completa (una consulta por pk)."""
+        from apps.reservation.models import Reservation
+
+        qs = Reservation.objects.all()
+        if related:
+            qs = qs.select_related(*related)
+        return qs.filter(pk=self.reservation_id, deleted=False).first()
+
+
+class _Timeline:
+    """Estadías de una propiedad/cliente ordenadas por inicio."""
+
+    __slots__ = ('stays', 'starts', 'max_end')
+
+    def __init__(self, stays):
+        self.stays = sorted(stays, key=lambda s: (s.start, s.end))
+        self.starts = [s.start for s in self.stays]
+        # max_end[i] = mayor fin entre stays[0..i]; permite cortar la búsqueda
+        # hacia atrás apenas ninguna estadía anterior pueda cubrir `now`.
+        self.max_end = []
+        current = None
+        for stay in self.stays:
+            current = stay.end if current is None or stay.end > current else current
+            self.max_end.append(current)
+
+    def covering(self, now, statuses):
+        idx = bisect.bisect_right(self.starts, now) - 1
+        best = None
+        while idx >= 0 and self.max_end[idx] > now:
+            stay = self.stays[idx]
+            if stay.end > now and stay.status in statuses:
+                # Ante solapes gana la aprobada y luego la de inicio más reciente
+                if best is None or (stay.status == 'approved' and best.status != 'approved'):
+                    best = stay
+            idx -= 1
+        return best
+
+    def all_covering(self, now, statuses):
+        """Todas las estadías en curso en `now` (solapes incluidos), por inicio."""
+        idx = bisect.bisect_right(self.starts, now) - 1
+        found = []
+        while idx >= 0 and self.max_end[idx] > now:
+            stay = self.stays[idx]
+            if stay.end > now and stay.status in statuses:
+                found.append(stay)
+            idx -= 1
+        return found[::-1]
+
+
+class ActiveStayResolver:
+    """Índice en memoria de estadías en curso y próximas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_property = {}
+        self._by_client = {}
+        self._built_at = 0.0
+        self._built_for = None
+        self._version = None
+        self._dirty = True
+
+    # -- mantenimiento ------------------------------------------------------
+
+    def invalidate(self):
+        """
+        Marca el índice para reconstruir (llamado desde señales) y publica
+        una versión nueva en el cache. Solo llega a los otros workers si el
+        cache es compartido; si no, esperan a STAY_INDEX_TTL.
+        """
+        self._dirty = True
+        try:
+            cache.set(_VERSION_CACHE_KEY, time_module.time(), None)
+        except Exception as e:
+            logger.warning(f"No se pudo publicar la versión del índice de estadías: {e}")
+
+    def _needs_refresh(self, today):
+        if self._dirty or self._built_for != today:
+            return True
+        if time_module.monotonic() - self._built_at > getattr(settings, 'STAY_INDEX_TTL', 120):
+            return True
+        return cache.get(_VERSION_CACHE_KEY) != self._version
+
+    def _ensure_fresh(self):
+        today = timezone.localdate()
+        if not self._needs_refresh(today):
+            return
+        with self._lock:
+            if self._needs_refresh(today):
+                self._rebuild(today)
+
+    def _rebuild(self, today):
+        from apps.reservation.models import Reservation
+
+        self._dirty = False
+        self._version = cache.get(_VERSION_CACHE_KEY)
+        horizon = today + timedelta(days=getattr(settings, 'STAY_INDEX_HORIZON_DAYS', 60))
+        rows = Reservation.objects.filter(
+            deleted=False,
+            status__in=ACTIVE_STATUSES,
+            check_out_date__gte=today,
+            check_in_date__lte=horizon,
+        ).values_list(
+            'id', 'property_id', 'client_id', 'status', 'check_in_date',
+            'check_out_date', 'late_checkout', 'temperature_pool',
+        )
+
+        by_property, by_client = {}, {}
+        for (res_id, property_id, client_id, status, check_in, check_out,
+             late_checkout, temperature_pool) in rows:
+            start, end = stay_bounds(check_in, check_out)
+            stay = Stay(res_id, property_id, client_id, status, check_in, check_out,
+                        start, end, late_checkout, temperature_pool)
+            by_property.setdefault(property_id, []).append(stay)
+            if client_id:
+                by_client.setdefault(client_id, []).append(stay)
+
+        self._by_property = {k: _Timeline(v) for k, v in by_property.items()}
+        self._by_client = {k: _Timeline(v) for k, v in by_client.items()}
+        self._built_for = today
+        self._built_at = time_module.monotonic()
+
+    # -- consultas ----------------------------------------------------------
+
+    def active_for_property(self, property_id, statuses=ACTIVE_STATUSES, now=None):
+        """Estadía en curso en la propiedad, o None."""
+        self._ensure_fresh()
+        timeline = self._by_property.get(_key(property_id))
+        return timeline.covering(now or timezone.now(), statuses) if timeline else None
+
+    def active_for_client(self, client_id, statuses=ACTIVE_STATUSES, now=None):
+        """Estadía en curso del cliente (como titular), o None."""
+        self._ensure_fresh()
+        timeline = self._by_client.get(_key(client_id))
+        return timeline.covering(now or timezone.now(), statuses) if timeline else None
+
+    def all_active(self, statuses=ACTIVE_STATUSES, now=None):
+        """
+        Estadías en curso en todas las propiedades. A diferencia de
+        active_for_property no elige una por casa: si dos se solapan (p.ej.
+        un late checkout con la llegada del mismo día) vienen las dos.
+        """
+        self._ensure_fresh()
+        now = now or timezone.now()
+        return [stay for t in self._by_property.values() for stay in t.all_covering(now, statuses)]
+
+    def next_for_client(self, client_id, today=None, statuses=ACTIVE_STATUSES):
+        """
+        Estadía en curso o próxima del cliente (check_out_date >= today).
+
+        Solo cubre el horizonte del índice: None no descarta reservas más
+        lejanas, el llamador decide si consultar la BD.
+        """
+        self._ensure_fresh()
+        timeline = self._by_client.get(_key(client_id))
+        if not timeline:
+            return None
+        today = today or timezone.localdate()
+        for stay in timeline.stays:
+            if stay.check_out_date >= today and stay.status in statuses:
+                return stay
+        return None
+
+
+stay_resolver = ActiveStayResolver()
@@ -0,0 +1,224 @@
+"""
+Generación de contratos PDF: pool de conversión LibreOffice + cache de PDFs.
+
+Antes cada contrato lanzaba un `libreoffice --headless` en frío (varios
+segundos por documento, y todos compartían /tmp/temp_contract.docx).
+Ahora:
+
+- `LibreOfficePool` mantiene N slots de conversión en paralelo. En
+  producción `CONTRACT_UNOSERVER_PORTS` apunta a instancias `unoserver`
+  de larga vida y cada slot convierte vía `unoconvert` sin arrancar
+  LibreOffice. Sin unoserver cada conversión sigue lanzando LibreOffice
+  en frío; el slot sólo reusa su perfil de usuario (por proceso), que se
+  ahorra la inicialización del perfil y evita el lock entre conversiones
+  simultáneas.
+- Los PDFs se cachean en disco con clave = hash(versión de plantilla +
+  contexto del contrato + firma). Regenerar el mismo contrato no vuelve
+  a convertir.
+
+Uso:
+    pdf_bytes = render_contract_pdf(template_path, context)
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_TIMEOUT = 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LibreOfficePool:
+    """Pool acotado de slots de conversión DOCX → PDF."""
+
+    def __init__(self, size=None, profile_root=None, unoserver_ports=None):
+        self.unoserver_ports = list(unoserver_ports or [])
+        if self.unoserver_ports:
+            size = len(self.unoserver_ports)
+        self.size = max(1, int(size or DEFAULT_POOL_SIZE))
+        self.profile_root = profile_root or os.path.join(tempfile.gettempdir(), 'casaaustin_lo_profiles')
+        self._slots = queue.Queue()
+        for slot in range(self.size):
+            self._slots.put(slot)
+
+    def _command(self, slot, docx_path, outdir):
+        if self.unoserver_ports:
+            pdf_path = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+            return [
+                'unoconvert', '--port', str(self.unoserver_ports[slot]),
+                '--convert-to', 'pdf', docx_path, pdf_path,
+            ]
+        # Por pid: los workers de gunicorn tienen cada uno su pool y dos
+        # LibreOffice no pueden usar el mismo perfil a la vez
+        profile = os.path.join(self.profile_root, f'{os.getpid()}_slot_{slot}')
+        os.makedirs(profile, exist_ok=True)
+        return [
+            'libreoffice', f'-env:UserInstallation=file://{profile}',
+            '--headless', '--norestore', '--convert-to', 'pdf', '--outdir', outdir, docx_path,
+        ]
+
+    def convert(self, docx_path, outdir, timeout=None):
+        """Convierte un .docx y retorna la ruta del PDF generado en `outdir`."""
+        slot = self._slots.get()
+        try:
+            subprocess.run(
+                self._command(slot, docx_path, outdir),
+                check=True, capture_output=True,
+                timeout=timeout or _setting('CONTRACT_CONVERSION_TIMEOUT', DEFAULT_TIMEOUT),
+            )
+        finally:
+            self._slots.put(slot)
+        return os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LibreOfficePool(
+                    size=_setting('CONTRACT_CONVERTER_POOL_SIZE', DEFAULT_POOL_SIZE),
+                    unoserver_ports=_setting('CONTRACT_UNOSERVER_PORTS', None),
+                )
+    return _pool
+
+
+# ---------------------------------------------------------------------------
+# Cache de PDFs
+# ---------------------------------------------------------------------------
+
+_template_versions = {}
+
+
+def template_version(template_path):
+    """Hash del contenido de la plantilla, memoizado por (ruta, mtime, tamaño)."""
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), stat.st_mtime_ns, stat.st_size)
+    version = _template_versions.get(key)
+    if version is None:
+        with open(template_path, 'rb') as fh:
+            version = hashlib.sha256(fh.read()).hexdigest()
+        _template_versions[key] = version
+    return version
+
+
+def contract_cache_key(template_path, context, firma_bytes=None):
+    payload = {
+        'template': template_version(template_path),
+        'context': context,
+        'firma': hashlib.sha256(firma_bytes).hexdigest() if firma_bytes else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _cache_path(key, namespace):
+    root = _setting('CONTRACT_PDF_CACHE_DIR', None)
+    if not root:
+        return None
+    return os.path.join(str(root), namespace, key[:2], f'{key}.pdf')
+
+
+def get_cached_pdf(key, namespace='contracts'):
+    """PDF cacheado para `key`, o None si no existe o expiró."""
+    path = _cache_path(key, namespace)
+    if not path or not os.path.exists(path):
+        return None
+    ttl = _setting('CONTRACT_PDF_CACHE_TTL', None)
+    if ttl and time.time() - os.path.getmtime(path) > ttl:
+        return None
+    with open(path, 'rb') as fh:
+        return fh.read()
+
+
+def store_cached_pdf(key, pdf_bytes, namespace='contracts'):
+    path = _cache_path(key, namespace)
+    if not path:
+        return
+    try:
+        # Contratos firmados con datos del cliente: sólo el usuario del servicio
+        os.makedirs(str(_setting('CONTRACT_PDF_CACHE_DIR', None)), mode=0o700, exist_ok=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f'No se pudo cachear PDF {namespace}/{key}: {e}')
+
+
+def render_contract_pdf(template_path, context, firma_bytes=None, post_render=None):
+    """
+    Renderiza la plantilla con `context` y retorna los bytes del PDF.
+
+    `post_render(docx_path, firma_bytes)` se llama sobre el .docx ya
+    renderizado antes de convertir (p.ej. para insertar la firma).
+    """
+    key = contract_cache_key(template_path, context, firma_bytes)
+    cached = get_cached_pdf(key)
+    if cached is not None:
+        return cached
+
+    # docxtpl (python-docx + lxml) tarda ~130ms en importarse
+    from docxtpl import DocxTemplate
+
+    work_dir = tempfile.mkdtemp(prefix='contract_')
+    try:
+        docx_path = os.path.join(work_dir, f'contrato_{key[:12]}.docx')
+        doc = DocxTemplate(template_path)
+        doc.render(context)
+        doc.save(docx_path)
+        if post_render and firma_bytes:
+            post_render(docx_path, firma_bytes)
+
+        pdf_path = get_pool().convert(docx_path, work_dir)
+        with open(pdf_path, 'rb') as fh:
+            pdf_bytes = fh.read()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    store_cached_pdf(key, pdf_bytes)
+    return pdf_bytes
+
+
+class ZipStream:
+    """Buffer write-only para que zipfile escriba a un StreamingHttpResponse."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
@@ -1,6 +1,8 @@
 
 from datetime import datetime, time
 from django.core.cache import cache
+
+from apps.reservation.active_stay import stay_resolver
 from django.db.models import Q
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -281,49 +283,8 @@ class AdminHADeviceListView(APIView):
         Obtiene la reserva activa para una propiedad, si existe.
         Retorna la reserva o None.
         """
-        from datetime import datetime, time
-
-        now = datetime.now()
-        today = now.date()
-        current_time = now.time()
-
-        check_in_time = time(15, 0)  # 3:00 PM
-        check_out_time = time(11, 0)  # 11:00 AM
-
-        # Buscar reservas potencialmente activas
-        from django.db.models import Case, When, IntegerField
-
-        potential_reservations = Reservation.objects.filter(
-            property_id=property_id,
-            deleted=False,
-            status='approved',
-            check_out_date__gte=today
-        ).filter(
-            Q(check_in_date=today, check_out_date__gt=today) |
-            Q(check_in_date__lt=today, check_out_date__gt=today) |
-            Q(check_out_date=today, check_in_date__lt=today)
-        ).annotate(
-            priority=Case(
-                When(check_in_date=today, check_out_date__gt=today, then=1),
-                When(check_in_date__lt=today, check_out_date__gt=today, then=2),
-                When(check_out_date=today, check_in_date__lt=today, then=3),
-                default=4,
-                output_field=IntegerField()
-            )
-        ).order_by('priority', 'check_in_date').first()
-
-        if not potential_reservations:
-            return None
-
-        active_reservation = potential_reservations
-
-        # Validar horarios
-        if active_reservation.check_in_date == today and current_time < check_in_time:
-            return None
-        if active_reservation.check_out_date == today and active_reservation.check_in_date < today and current_time >= check_out_time:
-            return None
-
-        return active_reservation
+        stay = stay_resolver.active_for_property(property_id, statuses=('approved',))
+        return stay.load() if stay else None
 
     @extend_schema(
         parameters=[
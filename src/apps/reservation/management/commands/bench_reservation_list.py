@@ -0,0 +1,63 @@
+"""
+Mide el costo por fila del listado de reservas: ReservationListSerializer
+(por fila) vs la proyección de apps.reservation.projections.
+
+Uso: python manage.py bench_reservation_list [--rows 1000] [--repeat 3]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.reservation.models import Reservation
+from apps.reservation.projections import ReservationListProjection
+from apps.reservation.serializers import ReservationListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara el costo por fila del listado de reservas (serializer vs proyección)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Filas a serializar (default 1000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Repeticiones; se reporta la mejor')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = max(1, options['repeat'])
+        base = Reservation.objects.exclude(deleted=True).order_by('-check_in_date')
+        ids = list(base.values_list('id', flat=True)[:rows])
+        if not ids:
+            self.stdout.write('No hay reservas para medir.')
+            return
+        queryset = base.filter(id__in=ids)
+
+        def serializer_run():
+            return ReservationListSerializer(queryset.all(), many=True).data
+
+        def projection_run():
+            projection = ReservationListProjection()
+            return projection.rows(projection.queryset(queryset.all()))
+
+        results = {}
+        for name, run in (('serializer', serializer_run), ('proyección', projection_run)):
+            best = None
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    data = run()
+                    elapsed = time.perf_counter() - started
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, len(queries), data)
+            results[name] = best
+            elapsed, query_count, _ = best
+            self.stdout.write(
+                f'{name:<11} {len(ids)} filas: {elapsed * 1000:8.1f} ms total, '
+                f'{elapsed * 1e6 / len(ids):8.1f} µs/fila, {query_count} consultas'
+            )
+
+        before, after = results['serializer'], results['proyección']
+        same = [dict(row) for row in before[2]] == after[2]
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: x{before[0] / after[0]:.1f} — filas idénticas: {"sí" if same else "NO"}'
+        ))
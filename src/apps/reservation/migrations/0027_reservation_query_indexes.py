@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservation', '0026_add_ai_fields_to_rental_receipt'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['property', 'check_in_date', 'check_out_date'], name='reservation_propert_315f9a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['client', 'status'], name='reservation_client__dd8cb0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['check_in_date'], name='reservation_check_i_93a881_idx'),
+        ),
+    ]
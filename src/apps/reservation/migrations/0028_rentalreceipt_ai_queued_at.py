@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservation', '0027_reservation_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentalreceipt',
+            name='ai_queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
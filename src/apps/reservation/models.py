@@ -28,10 +28,18 @@ class Reservation(BaseModel):
 
     @property
     def adelanto_normalizado(self):
-        res = float(self.advance_payment) if self.advance_payment else 0
+        return self.normalize_advance(
+            self.advance_payment, self.advance_payment_currency,
+            self.price_sol, self.price_usd,
+        )
 
-        if self.advance_payment_currency == 'usd' and self.advance_payment != 0:
-            res = (float(self.price_sol) / float(self.price_usd)) * float(self.advance_payment)
+    @staticmethod
+    def normalize_advance(advance_payment, advance_payment_currency, price_sol, price_usd):
+        """Adelanto en SOL (usado también por la proyección de listados)."""
+        res = float(advance_payment) if advance_payment else 0
+
+        if advance_payment_currency == 'usd' and advance_payment != 0:
+            res = (float(price_sol) / float(price_usd)) * float(advance_payment)
 
         return round(res, 2)
 
@@ -157,6 +165,19 @@ class Reservation(BaseModel):
         excluded_fields=['updated'],  # No rastrear el campo 'updated' ya que cambia siempre
     )
 
+    class Meta:
+        indexes = [
+            # `deleted=False` se compila como `NOT deleted`, que el planner no
+            # usa como prefijo de un índice: deleted queda fuera y se filtra
+            # sobre las filas del índice.
+            # Disponibilidad, calendario y ocupación por casa (con o sin status)
+            models.Index(fields=['property', 'check_in_date', 'check_out_date']),
+            # Reservas del cliente (portal, puntos, descuentos)
+            models.Index(fields=['client', 'status']),
+            # Rangos de fechas de todas las casas (dashboard, exports)
+            models.Index(fields=['check_in_date']),
+        ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Guardar el valor original de full_payment para detectar cambios
@@ -300,6 +321,8 @@ class RentalReceipt(BaseModel):
     ai_deposit_date = models.DateField(null=True, blank=True)
     ai_processed_at = models.DateTimeField(null=True, blank=True)
     ai_error = models.TextField(null=True, blank=True)
+    # Reclamo de la cola de análisis (voucher_queue): evita encolarlo dos veces
+    ai_queued_at = models.DateTimeField(null=True, blank=True)
 
 # Model to track used payment tokens
 class PaymentToken(BaseModel):
@@ -1,19 +1,48 @@
 import requests
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Any
+
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+STATUS_CACHE_KEY = 'music:status'
+STATUS_REFRESH_LOCK_KEY = 'music:status:refreshing'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
 
 class MusicAPIClient:
     """
     Cliente HTTP para la nueva API de música de Casa Austin.
     Reemplaza la conexión WebSocket de Music Assistant.
+
+    - Usa una `requests.Session` con pool de conexiones keep-alive (sin
+      handshake TCP/TLS por llamada).
+    - `get_all_status()` sirve un snapshot compartido (cache de Django) de
+      `MUSIC_STATUS_TTL` segundos. Pasada la mitad del TTL se refresca en
+      segundo plano y se sigue sirviendo el snapshot; si el upstream falla
+      se sirve el último snapshot hasta `MUSIC_STATUS_STALE_TTL`.
+    - Los comandos de control (POST/DELETE) invalidan el snapshot.
+    - Los comandos masivos (`set_power_many`) se envían en paralelo.
     """
     
     def __init__(self, base_url: str = "https://music.casaaustin.pe"):
         self.base_url = base_url
         self.timeout = 10  # Timeout de 10 segundos para requests
+        pool_size = _setting('MUSIC_API_POOL_SIZE', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._refresh_lock = threading.Lock()
     
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """
@@ -33,7 +62,7 @@ class MusicAPIClient:
         url = f"{self.base_url}{endpoint}"
         
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
                 timeout=self.timeout,
@@ -53,15 +82,69 @@ class MusicAPIClient:
         except requests.exceptions.RequestException as e:
             logger.error(f"Error en request a {url}: {str(e)}")
             raise
+        finally:
+            # Un comando de control cambia el estado de la casa
+            if method != "GET" and endpoint.startswith("/house/"):
+                self.invalidate_status()
     
     # ==================== STATUS ====================
     
-    def get_all_status(self) -> Dict[str, Any]:
+    def invalidate_status(self) -> None:
+        """Descarta el snapshot de estado (tras un comando de control)."""
+        cache.delete(STATUS_CACHE_KEY)
+    
+    def _fetch_status(self) -> Dict[str, Any]:
+        status = self._make_request("GET", "/status")
+        cache.set(
+            STATUS_CACHE_KEY,
+            {'data': status, 'fetched_at': time.time()},
+            _setting('MUSIC_STATUS_STALE_TTL', 60),
+        )
+        return status
+    
+    def _refresh_in_background(self) -> None:
+        # Un solo refresco a la vez por proceso y, vía cache.add, entre procesos
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        if not cache.add(STATUS_REFRESH_LOCK_KEY, 1, self.timeout):
+            self._refresh_lock.release()
+            return
+
+        def refresh():
+            try:
+                self._fetch_status()
+            except Exception as e:
+                logger.warning(f"No se pudo refrescar el estado de música: {e}")
+            finally:
+                cache.delete(STATUS_REFRESH_LOCK_KEY)
+                self._refresh_lock.release()
+
+        threading.Thread(target=refresh, name='music-status-refresh', daemon=True).start()
+    
+    def get_all_status(self, max_age: Optional[float] = None) -> Dict[str, Any]:
         """
         GET /status
-        Obtiene el estado de todas las casas.
+        Obtiene el estado de todas las casas (snapshot compartido).
+        
+        Args:
+            max_age: Antigüedad máxima aceptada en segundos (0 = forzar consulta).
         """
-        return self._make_request("GET", "/status")
+        ttl = _setting('MUSIC_STATUS_TTL', 5) if max_age is None else max_age
+        snapshot = cache.get(STATUS_CACHE_KEY)
+        age = time.time() - snapshot['fetched_at'] if snapshot else None
+        
+        if snapshot and age < ttl:
+            if age >= ttl / 2:
+                self._refresh_in_background()
+            return snapshot['data']
+        
+        try:
+            return self._fetch_status()
+        except requests.exceptions.RequestException:
+            if snapshot:
+                logger.warning(f"Sirviendo estado de música de hace {age:.0f}s")
+                return snapshot['data']
+            raise
     
     def get_house_status(self, house_id: int) -> Dict[str, Any]:
         """
@@ -141,6 +224,27 @@ class MusicAPIClient:
         """
         return self._make_request("POST", f"/house/{house_id}/power", json={"state": state})
     
+    def set_power_many(self, house_ids: Iterable[int], state: str) -> Dict[Any, Any]:
+        """
+        Enciende o apaga varias casas en paralelo.
+        
+        Returns:
+            {house_id: respuesta} o {house_id: excepción} si falló esa casa.
+        """
+        house_ids = list(dict.fromkeys(house_ids))
+        if not house_ids:
+            return {}
+        workers = min(len(house_ids), _setting('MUSIC_API_FANOUT_WORKERS', 8))
+        
+        def call(house_id):
+            try:
+                return self.set_power(house_id, state)
+            except Exception as e:
+                return e
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='music-fanout') as executor:
+            return dict(zip(house_ids, executor.map(call, house_ids)))
+    
     # ==================== QUEUE MANAGEMENT ====================
     
     def get_queue(self, house_id: int) -> Dict[str, Any]:
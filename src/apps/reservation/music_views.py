@@ -10,6 +10,10 @@ import logging
 from apps.reservation.music_client import get_music_client
 from apps.reservation.music_models import MusicSessionParticipant
 from apps.reservation.models import Reservation
+from apps.reservation.active_stay import (
+    stay_resolver, is_stay_active,
+    checkin_time as stay_checkin_time, checkout_time as stay_checkout_time,
+)
 from apps.property.models import Property
 from apps.clients.auth_views import ClientJWTAuthentication
 
@@ -27,85 +31,26 @@ class PlayersListView(APIView):
     
     def _get_active_reservation_for_property(self, property_obj):
         """Obtiene la reserva activa actual para una propiedad."""
-        local_now = timezone.localtime(timezone.now())
-        now_date = local_now.date()
-        now_time = local_now.time()
-        
-        checkin_time = time(15, 0)  # 3 PM
-        checkout_time = time(11, 0)  # 11 AM
-        
-        reservations = Reservation.objects.filter(
-            property=property_obj,
-            deleted=False,
-            status__in=['approved', 'pending', 'incomplete', 'under_review']
-        ).select_related('client')
-        
-        for res in reservations:
-            # Verificar rango de fechas
-            if now_date < res.check_in_date or now_date > res.check_out_date:
-                continue
-            
-            # Si es el día de check-in, debe ser después de las 3 PM
-            if now_date == res.check_in_date and now_time < checkin_time:
-                continue
-            
-            # Si es el día de check-out, debe ser antes de las 11 AM
-            if now_date == res.check_out_date and now_time >= checkout_time:
-                continue
-            
-            # Esta es la reserva activa actual
-            return res
-        
-        return None
+        stay = stay_resolver.active_for_property(property_obj.id)
+        return stay.load('client') if stay else None
     
     def get(self, request):
         try:
-            # Buscar reserva activa del usuario autenticado
-            local_now = timezone.localtime(timezone.now())
-            now_date = local_now.date()
-            now_time = local_now.time()
-            
-            checkin_time = time(15, 0)
-            checkout_time = time(11, 0)
-            
             # Opción 1: Buscar reservas donde el usuario es el owner
-            user_reservations = Reservation.objects.filter(
-                client=request.user,
-                deleted=False,
-                status__in=['approved', 'pending', 'incomplete', 'under_review']
-            ).select_related('property')
-            
-            # Encontrar la reserva activa actual
-            active_reservation = None
-            for res in user_reservations:
-                if now_date < res.check_in_date or now_date > res.check_out_date:
-                    continue
-                if now_date == res.check_in_date and now_time < checkin_time:
-                    continue
-                if now_date == res.check_out_date and now_time >= checkout_time:
-                    continue
-                active_reservation = res
-                break
+            stay = stay_resolver.active_for_client(request.user.id)
+            active_reservation = stay.load('property', 'client') if stay else None
             
             # Opción 2: Si no es owner, buscar si es participante aceptado
             if not active_reservation:
-                from apps.reservation.music_models import MusicSessionParticipant
-                
                 participant_sessions = MusicSessionParticipant.objects.filter(
                     client=request.user,
                     status='accepted'
-                ).select_related('reservation__property')
+                ).select_related('reservation__property', 'reservation__client')
                 
                 for session in participant_sessions:
-                    res = session.reservation
-                    if now_date < res.check_in_date or now_date > res.check_out_date:
-                        continue
-                    if now_date == res.check_in_date and now_time < checkin_time:
-                        continue
-                    if now_date == res.check_out_date and now_time >= checkout_time:
-                        continue
-                    active_reservation = res
-                    break
+                    if is_stay_active(session.reservation):
+                        active_reservation = session.reservation
+                        break
             
             # Si no hay reserva activa (ni como owner ni como participante), devolver lista vacía
             if not active_reservation:
@@ -209,31 +154,10 @@ class PlayerControlView(APIView):
     
     def _is_reservation_active_now(self, reservation):
         """
-        Verifica si la reserva está activa AHORA según los horarios:
-        - Check-in: 3 PM del día de llegada
-        - Check-out: 11 AM del día de salida
+        Verifica si la reserva está activa AHORA según la política horaria
+        compartida (ver apps.reservation.active_stay).
         """
-        local_now = timezone.localtime(timezone.now())
-        now_date = local_now.date()
-        now_time = local_now.time()
-        
-        # Horarios configurados
-        checkin_time = time(15, 0)  # 3 PM
-        checkout_time = time(11, 0)  # 11 AM
-        
-        # Verificar rango de fechas
-        if now_date < reservation.check_in_date or now_date > reservation.check_out_date:
-            return False
-        
-        # Si es el día de check-in, debe ser después de las 3 PM
-        if now_date == reservation.check_in_date and now_time < checkin_time:
-            return False
-        
-        # Si es el día de check-out, debe ser antes de las 11 AM
-        if now_date == reservation.check_out_date and now_time >= checkout_time:
-            return False
-        
-        return True
+        return is_stay_active(reservation)
     
     def has_player_permission(self, user, player_id):
         """
@@ -249,30 +173,19 @@ class PlayerControlView(APIView):
             return False
         
         # Buscar LA reserva que está activa AHORA MISMO en esta propiedad
-        reservations = Reservation.objects.filter(
-            property=property_obj,
-            deleted=False,
-            status__in=['approved', 'pending', 'incomplete', 'under_review']
-        )
-        
-        # Filtrar la que está activa AHORA
-        active_reservation = None
-        for res in reservations:
-            if self._is_reservation_active_now(res):
-                active_reservation = res
-                break
+        active_stay = stay_resolver.active_for_property(property_obj.id)
         
         # Si no hay ninguna reserva activa, nadie puede controlar
-        if not active_reservation:
+        if not active_stay:
             return False
         
         # Verificar si el usuario es el anfitrión (owner) de LA reserva activa
-        if active_reservation.client_id == user.id:
+        if active_stay.client_id == user.id:
             return True
         
         # Verificar si es participante aceptado de LA reserva activa
         is_participant = MusicSessionParticipant.objects.filter(
-            reservation=active_reservation,
+            reservation_id=active_stay.reservation_id,
             client=user,
             status='accepted'
         ).exists()
@@ -808,29 +721,7 @@ class AutoPowerOnView(APIView):
                 }, status=http_status.HTTP_400_BAD_REQUEST)
             
             # Verificar si hay reserva activa
-            local_now = timezone.localtime(timezone.now())
-            now_date = local_now.date()
-            now_time = local_now.time()
-            
-            checkin_time = time(15, 0)
-            checkout_time = time(11, 0)
-            
-            reservations = Reservation.objects.filter(
-                property=property_obj,
-                deleted=False,
-                status__in=['approved', 'pending', 'incomplete', 'under_review']
-            )
-            
-            active_reservation = None
-            for res in reservations:
-                if now_date < res.check_in_date or now_date > res.check_out_date:
-                    continue
-                if now_date == res.check_in_date and now_time < checkin_time:
-                    continue
-                if now_date == res.check_out_date and now_time >= checkout_time:
-                    continue
-                active_reservation = res
-                break
+            active_reservation = stay_resolver.active_for_property(property_obj.id)
             
             if not active_reservation:
                 return Response({
@@ -862,48 +753,27 @@ class AutoPowerOnAllView(APIView):
     
     def get(self, request):
         try:
-            local_now = timezone.localtime(timezone.now())
-            now_date = local_now.date()
-            now_time = local_now.time()
-            
-            checkin_time = time(15, 0)
-            checkout_time = time(11, 0)
-            
             # Obtener todas las propiedades con player_id
             properties = Property.objects.filter(
                 player_id__isnull=False,
                 deleted=False
             ).exclude(player_id='')
             
-            music_client = get_music_client()
-            powered_on = []
+            # Solo casas con reserva activa (player_id se usa directamente como house_id)
+            active = [
+                prop for prop in properties
+                if stay_resolver.active_for_property(prop.id) is not None
+            ]
             
-            for prop in properties:
-                # Buscar reserva activa
-                reservations = Reservation.objects.filter(
-                    property=prop,
-                    deleted=False,
-                    status__in=['approved', 'pending', 'incomplete', 'under_review']
-                )
-                
-                has_active = False
-                for res in reservations:
-                    if now_date < res.check_in_date or now_date > res.check_out_date:
-                        continue
-                    if now_date == res.check_in_date and now_time < checkin_time:
-                        continue
-                    if now_date == res.check_out_date and now_time >= checkout_time:
-                        continue
-                    has_active = True
-                    break
-                
-                if has_active:
-                    try:
-                        # player_id se usa directamente como house_id
-                        music_client.set_power(prop.player_id, "on")
-                        powered_on.append(prop.name)
-                    except Exception as e:
-                        logger.error(f"Error encendiendo {prop.name}: {e}")
+            # Un comando por casa, enviados en paralelo
+            results = get_music_client().set_power_many([prop.player_id for prop in active], "on")
+            powered_on = []
+            for prop in active:
+                result = results.get(prop.player_id)
+                if isinstance(result, Exception):
+                    logger.error(f"Error encendiendo {prop.name}: {result}")
+                else:
+                    powered_on.append(prop.name)
             
             return Response({
                 "success": True,
@@ -939,8 +809,8 @@ class RequestAccessView(APIView):
         now_date = local_now.date()
         now_time = local_now.time()
         
-        checkin_time = time(15, 0)
-        checkout_time = time(11, 0)
+        checkin_time = stay_checkin_time()
+        checkout_time = stay_checkout_time()
         
         if now_date < reservation.check_in_date or now_date > reservation.check_out_date:
             return Response({
@@ -951,13 +821,13 @@ class RequestAccessView(APIView):
         if now_date == reservation.check_in_date and now_time < checkin_time:
             return Response({
                 "success": False,
-                "error": "La sesión no ha comenzado (inicia a las 3 PM)"
+                "error": f"La sesión no ha comenzado (inicia a las {checkin_time.strftime('%H:%M')})"
             }, status=http_status.HTTP_400_BAD_REQUEST)
         
         if now_date == reservation.check_out_date and now_time >= checkout_time:
             return Response({
                 "success": False,
-                "error": "La sesión ya terminó (termina a las 11 AM)"
+                "error": f"La sesión ya terminó (termina a las {checkout_time.strftime('%H:%M')})"
             }, status=http_status.HTTP_400_BAD_REQUEST)
         
         # Verificar que no sea el host
@@ -1135,8 +1005,8 @@ class ParticipantsView(APIView):
         now_date = local_now.date()
         now_time = local_now.time()
         
-        checkin_time = time(15, 0)
-        checkout_time = time(11, 0)
+        checkin_time = stay_checkin_time()
+        checkout_time = stay_checkout_time()
         
         # Determinar estado de la sesión
         if now_date < reservation.check_in_date:
@@ -0,0 +1,274 @@
+"""
+Motor de ocupación por día.
+
+El calendario público de una casa (PropertyCalendarOccupancyAPIView), el
+calendario del admin (VistaCalendarioApiView), la disponibilidad del
+chatbot (ToolExecutor._check_calendar) y las estadísticas del dashboard
+(get_stadistics_period) derivaban cada uno la ocupación de las reservas,
+con su propio loop para el late checkout y el recorte del rango. Este
+módulo lo concentra:
+
+- Una noche `d` está ocupada por una reserva si check_in <= d < salida,
+  donde la salida efectiva considera el late checkout
+  (`effective_checkout`).
+- `OccupancyGrid` guarda la ocupación de una casa en una ventana como dos
+  arrays por día: id de la reserva y flags (`BOOKED`, `LATE_CHECKOUT`,
+  `MAINTENANCE`, `PENDING`).
+- `occupancy(property_ids, start, end)` arma las grillas de varias casas
+  para cualquier ventana (día, mes, año) con una sola consulta. Las
+  grillas se cachean por casa-mes (`OCCUPANCY_CACHE_TTL`) con la versión
+  de Reservation de apps.core.response_cache, así que guardar o borrar una
+  reserva las deja obsoletas... en el proceso que la guardó: con el cache
+  local (LocMem) los demás workers siguen viendo la grilla anterior hasta
+  el TTL. Por eso las consultas de disponibilidad para reservar
+  (`availability=True`: calendario público, chatbot) solo usan el cache si
+  es compartido (`is_shared()`, REDIS_URL); las estadísticas lo usan
+  siempre.
+
+Uso:
+    grids = occupancy([prop.id for prop in properties], start, end)
+    grid = grids[prop.id]
+    grid.free_nights(), grid.is_free(day), grid.reservations
+"""
+import calendar
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from apps.core.response_cache import get_versions, is_shared
+
+from .models import Reservation
+
+ACTIVE_STATUSES = ('approved', 'pending', 'incomplete', 'under_review')
+
+# Flags por día
+BOOKED = 1  # noche reservada
+LATE_CHECKOUT = 2  # día bloqueado por un late checkout
+MAINTENANCE = 4  # reserva de mantenimiento (origin=man)
+PENDING = 8  # reserva aún no aprobada
+
+FLAG_NAMES = {
+    BOOKED: 'booked',
+    LATE_CHECKOUT: 'late_checkout',
+    MAINTENANCE: 'maintenance',
+    PENDING: 'pending',
+}
+
+ROW_FIELDS = (
+    'id', 'property_id', 'check_in_date', 'check_out_date', 'late_checkout',
+    'late_check_out_date', 'origin', 'status', 'client_id',
+    'client__first_name', 'client__last_name',
+)
+
+_CACHE_PREFIX = 'occupancy:'
+
+
+def effective_checkout(check_out, late_checkout=False, late_check_out_date=None):
+    """
+    Día en que la casa queda libre para un nuevo check-in. Con late
+    checkout el mismo día de salida se bloquea también esa noche.
+    """
+    if late_checkout and late_check_out_date and check_out:
+        if late_check_out_date > check_out:
+            return late_check_out_date
+        if late_check_out_date == check_out:
+            return late_check_out_date + timedelta(days=1)
+    return check_out
+
+
+def overlap_q(start, end):
+    """Reservas cuya estadía (con late checkout) toca [start, end]."""
+    return Q(check_in_date__lte=end) & (
+        Q(check_out_date__gte=start)
+        | Q(late_checkout=True, late_check_out_date__gte=start)
+    )
+
+
+@dataclass
+class OccupancyGrid:
+    """Ocupación de una casa, un elemento por día desde `start`."""
+    start: date
+    ids: list
+    flags: bytearray
+    reservations: dict = field(default_factory=dict)
+
+    @classmethod
+    def empty(cls, start, end):
+        days = (end - start).days + 1
+        return cls(start, [None] * days, bytearray(days))
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=len(self.ids) - 1)
+
+    def _index(self, day):
+        index = (day - self.start).days
+        if not 0 <= index < len(self.ids):
+            raise IndexError(f'{day} fuera de la grilla {self.start}..{self.end}')
+        return index
+
+    def paint(self, row):
+        """Marca en la grilla las noches de una reserva (fila de ROW_FIELDS)."""
+        check_in, check_out = row['check_in_date'], row['check_out_date']
+        leaves = effective_checkout(check_out, row['late_checkout'], row['late_check_out_date'])
+        row['effective_checkout'] = leaves
+        extra = 0
+        if row['origin'] == 'man':
+            extra |= MAINTENANCE
+        if row['status'] != 'approved':
+            extra |= PENDING
+
+        last = len(self.ids) - 1
+        first_night = max((check_in - self.start).days, 0)
+        last_booked = min((check_out - self.start).days - 1, last)
+        for index in range(first_night, last_booked + 1):
+            self.ids[index] = row['id']
+            self.flags[index] = (self.flags[index] & ~PENDING & ~MAINTENANCE) | BOOKED | extra
+
+        # Días bloqueados solo por el late checkout: no pisan una noche reservada
+        for index in range(max(last_booked + 1, first_night), min((leaves - self.start).days - 1, last) + 1):
+            if self.ids[index] is None:
+                self.ids[index] = row['id']
+            self.flags[index] |= LATE_CHECKOUT
+
+        if check_in <= self.end and check_out >= self.start:
+            self.reservations[row['id']] = row
+
+    def day(self, day):
+        """(reservation_id, flags) de la noche `day`."""
+        index = self._index(day)
+        return self.ids[index], self.flags[index]
+
+    def is_free(self, day):
+        return not self.flags[self._index(day)]
+
+    def _span(self, start, end):
+        """Índices [first, last] de start..end recortados a la grilla (vacío si no la toca)."""
+        first = max((start - self.start).days, 0) if start else 0
+        last = min((end - self.start).days, len(self.ids) - 1) if end else len(self.ids) - 1
+        return first, max(last, first - 1)
+
+    def nights(self, flag=BOOKED, exclude=0, start=None, end=None):
+        """Noches con `flag` (y sin `exclude`) entre start y end inclusive, dentro de la grilla."""
+        first, last = self._span(start, end)
+        return sum(
+            1 for value in self.flags[first:last + 1]
+            if value & flag and not value & exclude
+        )
+
+    def free_nights(self, start=None, end=None):
+        first, last = self._span(start, end)
+        return self.flags[first:last + 1].count(0)
+
+    def window(self, start, end):
+        """Sub-grilla [start, end] (debe estar dentro de esta grilla)."""
+        first, last = self._index(start), self._index(end)
+        reservations = {
+            rid: row for rid, row in self.reservations.items()
+            if row['check_in_date'] <= end and row['check_out_date'] >= start
+        }
+        return OccupancyGrid(start, self.ids[first:last + 1], self.flags[first:last + 1], reservations)
+
+    def concat(self, other):
+        """Grilla con `other` (que empieza el día siguiente) a continuación."""
+        return OccupancyGrid(
+            self.start, self.ids + other.ids, self.flags + other.flags,
+            {**self.reservations, **other.reservations},
+        )
+
+    def as_dict(self):
+        """Forma compacta para la API: arrays paralelos por día."""
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'reservation_ids': [str(rid) if rid else None for rid in self.ids],
+            'flags': [
+                [name for bit, name in FLAG_NAMES.items() if value & bit]
+                for value in self.flags
+            ],
+        }
+
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _cache_key(property_id, year, month, statuses, version):
+    status_part = ','.join(statuses) if statuses else '*'
+    return f'{_CACHE_PREFIX}{property_id}:{year}-{month:02d}:{status_part}:{version}'
+
+
+def _build_months(property_ids, months, statuses):
+    """Grillas casa-mes de `months` para `property_ids` con una consulta."""
+    first, _ = _month_bounds(*months[0])
+    _, last = _month_bounds(*months[-1])
+    grids = {
+        (pid, ym): OccupancyGrid.empty(*_month_bounds(*ym))
+        for pid in property_ids for ym in months
+    }
+    queryset = Reservation.objects.filter(
+        overlap_q(first, last), deleted=False, property_id__in=property_ids,
+    )
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    for row in queryset.order_by('check_in_date').values(*ROW_FIELDS):
+        leaves = effective_checkout(row['check_out_date'], row['late_checkout'], row['late_check_out_date'])
+        for ym in months:
+            month_start, month_end = _month_bounds(*ym)
+            if row['check_in_date'] <= month_end and max(leaves, row['check_out_date']) >= month_start:
+                grids[(row['property_id'], ym)].paint(dict(row))
+    return grids
+
+
+def occupancy(property_ids, start, end, statuses=ACTIVE_STATUSES, availability=False):
+    """
+    {property_id: OccupancyGrid} de [start, end] (inclusive) para cada casa.
+    `statuses=None` considera todas las reservas no eliminadas.
+    `availability=True` (se decide una reserva con el resultado) ignora el
+    cache si no es compartido entre workers.
+    """
+    property_ids = list(dict.fromkeys(property_ids))
+    months = list(_months(start, end))
+    statuses = tuple(sorted(statuses)) if statuses else None
+    ttl = getattr(settings, 'OCCUPANCY_CACHE_TTL', 300)
+    if availability and not is_shared():
+        ttl = 0
+
+    month_grids = {}
+    if ttl:
+        version = get_versions(['reservation.Reservation'])[0]
+        keys = {
+            (pid, ym): _cache_key(pid, *ym, statuses, version)
+            for pid in property_ids for ym in months
+        }
+        found = cache.get_many(list(keys.values()))
+        month_grids = {slot: found[key] for slot, key in keys.items() if key in found}
+
+    missing = [slot for slot in ((pid, ym) for pid in property_ids for ym in months) if slot not in month_grids]
+    if missing:
+        built = _build_months(
+            list(dict.fromkeys(pid for pid, _ in missing)),
+            sorted({ym for _, ym in missing}),
+            statuses,
+        )
+        month_grids.update({slot: built[slot] for slot in missing})
+        if ttl:
+            cache.set_many({keys[slot]: built[slot] for slot in missing}, ttl)
+
+    grids = {}
+    for pid in property_ids:
+        grid = month_grids[(pid, months[0])]
+        for ym in months[1:]:
+            grid = grid.concat(month_grids[(pid, ym)])
+        grids[pid] = grid.window(start, end)
+    return grids
@@ -0,0 +1,197 @@
+"""
+Proyección de listados de reservas (ReservationsApiView, VistaCalendarioApiView).
+
+ReservationListSerializer arma cada fila con SerializerMethodFields: ordena
+`rentalreceipt_set` por cada campo voucher_N, instancia un
+ClientShortSerializer/SellerSerializer/PropertySerializer por fila (este
+último con tres consultas de fotos por casa) y recorre el modelo completo. Con páginas de
+hasta 1000 filas la mayor parte del request se va en Python.
+
+La proyección obtiene lo mismo con una sola consulta `.values()`:
+- los vouchers (cantidad y fecha del 1º, 2º y 3º por orden de subida) salen
+  como subconsultas anotadas;
+- cliente y vendedor vienen como columnas `client__*` / `seller__*`;
+- la casa se serializa una vez por propiedad distinta de la página, con
+  las fotos precargadas (una consulta para todas las casas);
+- los campos de modelo se convierten con los mismos campos DRF del
+  serializer (formato de decimales, fechas, etc.), resueltos una sola vez.
+
+El resultado es idéntico al de ReservationListSerializer, fila por fila.
+
+Uso:
+    projection = ReservationListProjection(context)
+    rows = projection.rows(projection.queryset(queryset))
+"""
+from datetime import date
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.relations import PKOnlyObject, RelatedField
+from rest_framework.serializers import SerializerMethodField
+
+from apps.accounts.serializers import SellerSerializer
+from apps.clients.serializers import ClientShortSerializer
+from apps.property.models import Property
+from apps.property.serializers import PropertySerializer
+
+from .models import RentalReceipt, Reservation
+from .serializers import (
+    CalendarReservationSerializer, ReservationListSerializer, resta_pagar, resta_pagar_usd,
+)
+
+VOUCHER_SLOTS = 3
+
+# Columnas que usan los campos calculados además de los campos de modelo
+_COMPUTED_COLUMNS = (
+    'client_id', 'seller_id', 'property_id', 'price_sol', 'price_usd',
+    'advance_payment', 'advance_payment_currency', 'points_redeemed',
+    'check_in_date', 'check_out_date', 'status',
+)
+
+
+def _converters(serializer, prefix=''):
+    """
+    (nombre, columna, to_representation) por cada campo de modelo legible
+    del serializer. Los FK (PrimaryKeyRelatedField) se leen de `<campo>_id`.
+    """
+    converters = []
+    for field in serializer._readable_fields:
+        if isinstance(field, SerializerMethodField):
+            converters.append((field.field_name, None, None))
+        elif isinstance(field, RelatedField):
+            to_repr = field.to_representation
+            converters.append((
+                field.field_name, f'{prefix}{field.source}_id',
+                lambda pk, to_repr=to_repr: to_repr(PKOnlyObject(pk=pk)),
+            ))
+        else:
+            converters.append((field.field_name, f'{prefix}{field.source}', field.to_representation))
+    return converters
+
+
+def _emit(converters, row, computed=None):
+    data = {}
+    for name, column, to_repr in converters:
+        if column is None:
+            data[name] = computed[name]
+            continue
+        value = row[column]
+        data[name] = None if value is None else to_repr(value)
+    return data
+
+
+def _receipts():
+    return RentalReceipt.objects.filter(
+        reservation=OuterRef('pk'), deleted=False,
+    ).order_by('created')
+
+
+def _voucher_date(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else None
+
+
+class ReservationListProjection:
+    """Filas de ReservationListSerializer a partir de `.values()` anotados."""
+
+    def __init__(self, context=None):
+        self.serializer = ReservationListSerializer(context=context or {})
+        self.converters = _converters(self.serializer)
+        self.client_converters = _converters(ClientShortSerializer(), prefix='client__')
+        self.seller_converters = _converters(SellerSerializer(), prefix='seller__')
+        self.status_labels = {
+            value: str(label) for value, label in Reservation._meta.get_field('status').flatchoices
+        }
+
+    def columns(self):
+        model_columns = [column for _, column, _ in self.converters if column]
+        nested = [
+            column
+            for converters in (self.client_converters, self.seller_converters)
+            for _, column, _ in converters if column
+        ]
+        return list(dict.fromkeys(model_columns + list(_COMPUTED_COLUMNS) + nested))
+
+    def queryset(self, queryset):
+        """`.values()` con los vouchers anotados (cantidad + fechas por orden)."""
+        annotations = {
+            'vouchers_count_': Coalesce(
+                Subquery(
+                    _receipts().order_by().values('reservation')
+                    .annotate(n=Count('id')).values('n'),
+                    output_field=IntegerField(),
+                ),
+                0,
+            ),
+        }
+        for idx in range(VOUCHER_SLOTS):
+            annotations[f'voucher_{idx + 1}_at'] = Subquery(
+                _receipts().values('created')[idx:idx + 1]
+            )
+        return queryset.annotate(**annotations).values(*self.columns(), *annotations)
+
+    def _properties(self, rows):
+        ids = {row['property_id'] for row in rows if row['property_id'] is not None}
+        return {
+            prop.id: PropertySerializer(prop).data
+            for prop in Property.objects.filter(id__in=ids).prefetch_related('photos')
+        }
+
+    def rows(self, rows):
+        rows = list(rows)
+        properties = self._properties(rows)
+        today = date.today()
+        data = []
+        for row in rows:
+            check_in, check_out = row['check_in_date'], row['check_out_date']
+            computed = {
+                'client': (
+                    _emit(self.client_converters, row) if row['client_id'] is not None else None
+                ),
+                'seller': (
+                    _emit(self.seller_converters, row) if row['seller_id'] is not None else None
+                ),
+                'property': properties.get(row['property_id']),
+                'resta_pagar': resta_pagar(
+                    row['price_sol'],
+                    Reservation.normalize_advance(
+                        row['advance_payment'], row['advance_payment_currency'],
+                        row['price_sol'], row['price_usd'],
+                    ),
+                    row['points_redeemed'],
+                ),
+                'resta_pagar_usd': resta_pagar_usd(
+                    row['price_usd'], row['price_sol'],
+                    row['advance_payment'], row['advance_payment_currency'],
+                    row['points_redeemed'],
+                ),
+                'number_nights': (check_out - check_in).days if check_in and check_out else 0,
+                'is_upcoming': check_out > today,
+                'status_display': self.status_labels.get(row['status'], row['status']),
+                'vouchers_count': row['vouchers_count_'],
+            }
+            for idx in range(VOUCHER_SLOTS):
+                computed[f'voucher_{idx + 1}_uploaded_at'] = _voucher_date(row[f'voucher_{idx + 1}_at'])
+            data.append(_emit(self.converters, row, computed))
+        return data
+
+
+def calendar_rows(queryset):
+    """Filas de CalendarReservationSerializer con una consulta `.values()`."""
+    converters = _converters(CalendarReservationSerializer())
+    columns = [column for _, column, _ in converters if column]
+    rows = queryset.values(
+        *columns, 'client_id', 'client__first_name', 'property__name', 'property__background_color',
+    )
+    return [
+        _emit(converters, row, {
+            'client': (
+                {'first_name': row['client__first_name']}
+                if row['client_id'] is not None else {'first_name': 'Sin cliente'}
+            ),
+            'property': {
+                'name': row['property__name'],
+                'background_color': row['property__background_color'],
+            },
+        })
+        for row in rows
+    ]
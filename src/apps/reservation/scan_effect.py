@@ -0,0 +1,200 @@
+"""
+Efecto de "documento escaneado" para contratos firmados.
+
+Cada página se renderiza y procesa de forma independiente, así que las
+páginas se reparten en un pool de procesos. El tono cálido y el grano se
+aplican en una sola pasada NumPy por bandas de filas (memoria acotada),
+y el JPEG resultante se inserta tal cual en el PDF de salida a medida que
+llegan las páginas, sin mantener todas las imágenes en memoria.
+
+El resultado es determinístico por (cliente, contrato): la semilla sale de
+un hash estable del client_id (no de `hash()`, que cambia por proceso) y
+se deriva por página. Los PDFs resultantes se cachean con esa misma clave.
+
+Este módulo no importa Django a nivel de módulo para que los procesos
+worker (spawn) arranquen livianos.
+"""
+import atexit
+import hashlib
+import io
+import logging
+import random
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+SCAN_DPI = 250
+BAND_ROWS = 256
+SINGLE_PROCESS_MAX_PAGES = 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def scan_seed(client_id):
+    """Semilla estable entre procesos para un cliente."""
+    digest = hashlib.sha256(str(client_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big')
+
+
+def _shift_and_grain(img_array, offsets, noise_level, np_rng):
+    """
+    Tono cálido + ruido de escáner en una sola pasada, por bandas.
+
+    Trabaja in-place sobre el buffer uint8 de la página; por banda solo se
+    reserva un bloque float32 de BAND_ROWS filas.
+    """
+    import numpy as np
+
+    offsets = np.asarray(offsets, dtype=np.float32)
+    height = img_array.shape[0]
+    for top in range(0, height, BAND_ROWS):
+        band = img_array[top:top + BAND_ROWS]
+        work = np_rng.standard_normal(band.shape, dtype=np.float32)
+        work *= noise_level
+        work += offsets
+        work += band
+        np.clip(work, 0, 255, out=work)
+        band[...] = work
+    return img_array
+
+
+def render_scanned_page(pdf_data, page_num, seed):
+    """
+    Renderiza y "escanea" una página. Retorna (jpeg_bytes, ancho_px, alto_px).
+
+    Función de nivel de módulo para poder ejecutarse en un ProcessPoolExecutor.
+    """
+    import fitz  # PyMuPDF
+    import numpy as np
+    from PIL import Image, ImageEnhance, ImageFilter
+
+    rng = random.Random(f'{seed}:{page_num}')
+    np_rng = np.random.default_rng([seed, page_num])
+
+    with fitz.open(stream=pdf_data, filetype='pdf') as pdf_doc:
+        page = pdf_doc[page_num]
+        # Renderizar a imagen (DPI ligeramente variable como escáner real)
+        dpi = rng.uniform(245, 255)
+        pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+        img = Image.frombytes('RGB', [pix.width, pix.height], pix.samples)
+        del pix
+
+    # 1. Rotación leve (papel no perfectamente alineado)
+    angle = rng.uniform(-0.8, 0.8)
+    fill_color = (rng.randint(250, 254), rng.randint(249, 253), rng.randint(247, 251))
+    img = img.rotate(angle, resample=Image.BICUBIC, expand=False, fillcolor=fill_color)
+
+    # 2 + 3. Tono cálido sutil + grano de escáner (pasada fusionada)
+    offsets = (rng.uniform(0, 2.5), rng.uniform(-1, 1), rng.uniform(-3, -0.5))
+    noise_level = rng.uniform(1.8, 3.5)
+    img_array = np.array(img, dtype=np.uint8)
+    img = Image.fromarray(_shift_and_grain(img_array, offsets, noise_level, np_rng))
+    del img_array
+
+    # 4. Ajuste de contraste y brillo
+    img = ImageEnhance.Contrast(img).enhance(rng.uniform(0.96, 1.03))
+    img = ImageEnhance.Brightness(img).enhance(rng.uniform(0.98, 1.02))
+
+    # 5. Desenfoque muy leve (óptica del escáner)
+    img = img.filter(ImageFilter.GaussianBlur(radius=rng.uniform(0.2, 0.45)))
+
+    # 6. Compresión JPEG (artefactos típicos de escáner). El JPEG se
+    # inserta directo en el PDF, sin decodificar de nuevo.
+    jpeg_buffer = io.BytesIO()
+    img.save(jpeg_buffer, format='JPEG', quality=rng.randint(88, 93))
+    return jpeg_buffer.getvalue(), img.width, img.height
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+    return _executor
+
+
+def _discard_executor(broken):
+    """Descarta un pool roto para que el próximo `_get_executor` cree otro."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_pages(pdf_data, page_count, seed, workers):
+    """
+    Páginas procesadas, en orden, a medida que terminan.
+
+    Si un worker muere (OOM, kill) el pool queda roto para siempre: se
+    reemplaza y se reintenta una vez desde la primera página que faltaba.
+    """
+    if workers <= 1 or page_count <= SINGLE_PROCESS_MAX_PAGES:
+        for page_num in range(page_count):
+            yield render_scanned_page(pdf_data, page_num, seed)
+        return
+    done = 0
+    for attempt in range(2):
+        executor = _get_executor(workers)
+        remaining = page_count - done
+        try:
+            for page in executor.map(
+                render_scanned_page,
+                [pdf_data] * remaining, range(done, page_count), [seed] * remaining,
+            ):
+                yield page
+                done += 1
+            return
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            if attempt:
+                raise
+            logger.warning('Pool del efecto escaneado roto; se recrea y se reintenta desde la página %d', done)
+
+
+def apply_scan_effect(pdf_data, client_id, workers=None):
+    """
+    Aplica el efecto de documento escaneado al PDF y retorna los bytes nuevos.
+
+    Cacheado por (client_id, hash del contrato) en el cache de contratos.
+    """
+    import fitz  # PyMuPDF
+    from django.conf import settings
+
+    from .contract_pdf import get_cached_pdf, store_cached_pdf
+
+    contract_hash = hashlib.sha256(pdf_data).hexdigest()
+    cache_key = hashlib.sha256(f'{client_id}:{contract_hash}'.encode('utf-8')).hexdigest()
+    cached = get_cached_pdf(cache_key, namespace='scanned')
+    if cached is not None:
+        return cached
+
+    if workers is None:
+        workers = getattr(settings, 'SCAN_EFFECT_WORKERS', 2)
+
+    with fitz.open(stream=pdf_data, filetype='pdf') as source:
+        page_count = len(source)
+
+    seed = scan_seed(client_id)
+    output = fitz.open()
+    try:
+        for jpeg_bytes, width, height in _iter_pages(pdf_data, page_count, seed, workers):
+            # Tamaño de página equivalente a guardar la imagen a SCAN_DPI
+            page = output.new_page(width=width * 72 / SCAN_DPI, height=height * 72 / SCAN_DPI)
+            page.insert_image(page.rect, stream=jpeg_bytes)
+        result = output.tobytes(deflate=True, no_new_id=True)
+    finally:
+        output.close()
+
+    store_cached_pdf(cache_key, result, namespace='scanned')
+    return result
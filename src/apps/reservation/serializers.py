@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Q
 from rest_framework import serializers
 from decimal import Decimal
@@ -5,6 +6,7 @@ from decimal import Decimal
 from drf_spectacular.utils import extend_schema_field
 
 from .models import Reservation, RentalReceipt
+from apps.clients.authentication import lock_client
 from apps.clients.models import Clients
 from apps.accounts.models import CustomUser
 
@@ -304,6 +306,43 @@ class ReservationSerializer(serializers.ModelSerializer):
 
         return reservation
 
+
+def resta_pagar(price_sol, adelanto_normalizado, points_redeemed):
+    """Saldo pendiente en SOL como texto '%.2f'."""
+    price_total = float(price_sol)
+    puntos_canjeados = float(points_redeemed or 0)  # Siempre en SOL (1 punto = 1 sol)
+
+    # Todos los valores están en SOL, se pueden restar directamente
+    resta = price_total - adelanto_normalizado - puntos_canjeados
+    return '%.2f' % round(resta, 2)
+
+
+def resta_pagar_usd(price_usd, price_sol, advance_payment, advance_payment_currency, points_redeemed):
+    """Saldo pendiente en USD como texto '%.2f'."""
+    price_total_usd = float(price_usd or 0)
+
+    # Calcular adelanto en USD
+    if advance_payment_currency == 'usd':
+        adelanto_usd = float(advance_payment or 0)
+    else:
+        # Si el adelanto está en soles, convertir a USD usando la tasa de cambio de la reserva
+        if price_usd and price_sol and float(price_usd) > 0 and float(price_sol) > 0:
+            exchange_rate = float(price_sol) / float(price_usd)
+            adelanto_usd = float(advance_payment or 0) / exchange_rate
+        else:
+            adelanto_usd = 0
+
+    # Convertir puntos canjeados a USD (1 punto = 1 sol)
+    puntos_canjeados_usd = 0
+    if points_redeemed and price_usd and price_sol and float(price_usd) > 0 and float(price_sol) > 0:
+        exchange_rate = float(price_sol) / float(price_usd)
+        puntos_canjeados_usd = float(points_redeemed) / exchange_rate
+
+    # Calcular resta en USD
+    resta_usd = price_total_usd - adelanto_usd - puntos_canjeados_usd
+    return '%.2f' % round(resta_usd, 2)
+
+
 class ReservationListSerializer(ReservationSerializer):
     client = serializers.SerializerMethodField()
     seller = serializers.SerializerMethodField()
@@ -370,38 +409,15 @@ class ReservationListSerializer(ReservationSerializer):
 
     @extend_schema_field(serializers.FloatField())
     def get_resta_pagar(self, instance):
-        price_total = float(instance.price_sol)
-        adelanto_normalizado = instance.adelanto_normalizado  # Ya está en SOL
-        puntos_canjeados = float(instance.points_redeemed or 0)  # Siempre en SOL (1 punto = 1 sol)
-
-        # Todos los valores están en SOL, se pueden restar directamente
-        resta = price_total - adelanto_normalizado - puntos_canjeados
-        return '%.2f' % round(resta, 2)
+        return resta_pagar(instance.price_sol, instance.adelanto_normalizado, instance.points_redeemed)
 
     @extend_schema_field(serializers.FloatField())
     def get_resta_pagar_usd(self, instance):
-        price_total_usd = float(instance.price_usd or 0)
-        
-        # Calcular adelanto en USD
-        if instance.advance_payment_currency == 'usd':
-            adelanto_usd = float(instance.advance_payment or 0)
-        else:
-            # Si el adelanto está en soles, convertir a USD usando la tasa de cambio de la reserva
-            if instance.price_usd and instance.price_sol and float(instance.price_usd) > 0 and float(instance.price_sol) > 0:
-                exchange_rate = float(instance.price_sol) / float(instance.price_usd)
-                adelanto_usd = float(instance.advance_payment or 0) / exchange_rate
-            else:
-                adelanto_usd = 0
-        
-        # Convertir puntos canjeados a USD (1 punto = 1 sol)
-        puntos_canjeados_usd = 0
-        if instance.points_redeemed and instance.price_usd and instance.price_sol and float(instance.price_usd) > 0 and float(instance.price_sol) > 0:
-            exchange_rate = float(instance.price_sol) / float(instance.price_usd)
-            puntos_canjeados_usd = float(instance.points_redeemed) / exchange_rate
-        
-        # Calcular resta en USD
-        resta_usd = price_total_usd - adelanto_usd - puntos_canjeados_usd
-        return '%.2f' % round(resta_usd, 2)
+        return resta_pagar_usd(
+            instance.price_usd, instance.price_sol,
+            instance.advance_payment, instance.advance_payment_currency,
+            instance.points_redeemed,
+        )
 
     @extend_schema_field(serializers.IntegerField())
     def get_number_nights(self, instance):
@@ -534,8 +550,9 @@ class ClientReservationSerializer(serializers.ModelSerializer):
         # Extraer código de descuento si se proporciona
         discount_code = validated_data.pop('discount_code', None)
 
-        # Obtener el cliente del contexto de la request
-        client = self.context['request'].user
+        # Obtener el cliente del contexto de la request. El autenticado es un
+        # principal de solo lectura: la reserva (y sus señales) usan la fila actual
+        client = Clients.objects.get(pk=self.context['request'].user.pk)
 
         # Configurar los datos de la reserva
         validated_data['client'] = client
@@ -622,15 +639,20 @@ class ClientReservationSerializer(serializers.ModelSerializer):
 
         # Si hay puntos para canjear, procesarlos INMEDIATAMENTE
         if points_to_redeem and points_to_redeem > 0:
-            # Verificar que el cliente tenga suficientes puntos
-            if client.points_balance >= Decimal(str(points_to_redeem)):
+            # Saldo y descuento sobre la fila bloqueada: dos canjes simultáneos
+            # no pueden gastar el mismo saldo
+            with transaction.atomic():
+                locked = lock_client(client)
+                has_balance = locked.points_balance >= Decimal(str(points_to_redeem))
                 # Descontar los puntos del cliente
-                success = client.redeem_points(
+                success = has_balance and locked.redeem_points(
                     points=points_to_redeem,
                     reservation=reservation,
                     description=f"Puntos canjeados en reserva #{reservation.id} - {reservation.property.name}"
                 )
 
+            # Verificar que el cliente tenga suficientes puntos
+            if has_balance:
                 if success:
                     # Guardar los puntos canjeados en la reserva
                     reservation.points_redeemed = points_to_redeem
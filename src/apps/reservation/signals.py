@@ -1,5 +1,5 @@
 import logging
-from django.db.models.signals import post_save, pre_save, pre_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from .models import Reservation, RentalReceipt
@@ -823,7 +823,7 @@ def hash_data(data):
 def reservation_post_save_handler(sender, instance, created, **kwargs):
     """Maneja las notificaciones cuando se crea o actualiza una reserva"""
     if created:
-        logger.info(f"🔥 SIGNAL EJECUTADO: Nueva reserva creada ID {instance.id} - Origen: {instance.origin} - Cliente: {instance.client}")
+        logger.info("🔥 SIGNAL EJECUTADO: Nueva reserva creada ID %s - Origen: %s - Cliente: %s", instance.id, instance.origin, instance.client)
         notify_new_reservation(instance)
 
         # 🤖 ATRIBUCIÓN CHATBOT: si el cliente cotizó con el bot en las
@@ -835,7 +835,7 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
             from apps.chatbot.attribution import attribute_to_chatbot_if_applicable
             attribute_to_chatbot_if_applicable(instance)
         except Exception as e:
-            logger.error(f"Error en atribución chatbot {instance.id}: {e}")
+            logger.error("Error en atribución chatbot %s: %s", instance.id, e)
 
         # 📊 ATRIBUCIÓN DE CANAL: infiere touch_channel de la reserva
         # (Meta ad, Google, organic WA, web direct, etc.) usando los
@@ -852,14 +852,14 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
             if instance.status == 'approved':
                 maybe_set_acquisition(instance)
         except Exception as e:
-            logger.error(f"Error en atribución de canal {instance.id}: {e}")
+            logger.error("Error en atribución de canal %s: %s", instance.id, e)
 
         # 📊 ACTIVITY FEED: Crear actividad para nueva reserva
         if instance.client and instance.origin in ['aus', 'client']:
             try:
                 from apps.events.models import ActivityFeed, ActivityFeedConfig
                 
-                logger.info(f"🎯 Intentando crear actividad de feed para reserva {instance.id}")
+                logger.info("🎯 Intentando crear actividad de feed para reserva %s", instance.id)
                 
                 # ✅ VERIFICAR CONFIGURACIÓN: ¿Está habilitado este tipo de actividad?
                 if ActivityFeedConfig.is_type_enabled(ActivityFeed.ActivityType.RESERVATION_MADE):
@@ -883,18 +883,18 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
                             'origin': instance.origin
                         }
                     )
-                    logger.info(f"✅ Actividad de nueva reserva creada exitosamente: {activity.id}")
+                    logger.info("✅ Actividad de nueva reserva creada exitosamente: %s", activity.id)
                 else:
-                    logger.info(f"⚠️ Actividades de tipo 'reservation_made' están deshabilitadas")
+                    logger.info("⚠️ Actividades de tipo 'reservation_made' están deshabilitadas")
                     
             except Exception as e:
-                logger.error(f"❌ Error creando actividad de nueva reserva para reserva {instance.id}: {str(e)}")
+                logger.error("❌ Error creando actividad de nueva reserva para reserva %s: %s", instance.id, str(e))
                 import traceback
-                logger.error(f"📊 Traceback completo: {traceback.format_exc()}")
+                logger.error("📊 Traceback completo: %s", traceback.format_exc())
 
         # NUEVO: Crear tarea de limpieza automáticamente si la nueva reserva ya está aprobada
         if instance.status == 'approved':
-            logger.info(f"New reservation created with approved status {instance.id} - Creating automatic cleaning task")
+            logger.info("New reservation created with approved status %s - Creating automatic cleaning task", instance.id)
             create_automatic_cleaning_task(instance)
             
             # REORGANIZACIÓN INTELIGENTE: Evaluar si afecta prioridades de tareas existentes
@@ -927,9 +927,9 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
                                 'status_change': 'approved_from_admin'
                             }
                         )
-                        logger.info(f"✅ Actividad de reserva confirmada creada para nueva reserva aprobada {instance.id}")
+                        logger.info("✅ Actividad de reserva confirmada creada para nueva reserva aprobada %s", instance.id)
                 except Exception as e:
-                    logger.error(f"❌ Error creando actividad de confirmación para nueva reserva aprobada {instance.id}: {str(e)}")
+                    logger.error("❌ Error creando actividad de confirmación para nueva reserva aprobada %s: %s", instance.id, str(e))
 
         # Verificar si la nueva reserva tiene pago completo
         if instance.full_payment:
@@ -1010,7 +1010,7 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
 
         # NUEVO: Crear tarea de limpieza automáticamente cuando se aprueba la reserva
         if instance.status == 'approved' and hasattr(instance, '_original_status') and instance._original_status != 'approved':
-            logger.info(f"Reservation {instance.id} status changed to approved - Creating automatic cleaning task")
+            logger.info("Reservation %s status changed to approved - Creating automatic cleaning task", instance.id)
 
             # 📊 ATRIBUCIÓN: status cambió a approved → si es la primera
             # reserva aprobada del cliente, registra acquisition_channel.
@@ -1018,7 +1018,7 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
                 from apps.chatbot.channel_attribution import maybe_set_acquisition
                 maybe_set_acquisition(instance)
             except Exception as e:
-                logger.error(f"Error seteando acquisition_channel para {instance.id}: {e}")
+                logger.error("Error seteando acquisition_channel para %s: %s", instance.id, e)
 
             create_automatic_cleaning_task(instance)
             
@@ -1052,9 +1052,9 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
                                 'status_change': 'approved_by_admin'
                             }
                         )
-                        logger.info(f"Actividad de reserva aprobada creada para reserva {instance.id}")
+                        logger.info("Actividad de reserva aprobada creada para reserva %s", instance.id)
                 except Exception as e:
-                    logger.error(f"Error creando actividad de reserva aprobada para reserva {instance.id}: {str(e)}")
+                    logger.error("Error creando actividad de reserva aprobada para reserva %s: %s", instance.id, str(e))
                 
         # 📊 ACTIVITY FEED: Crear actividad para reserva cancelada
         if instance.status == 'cancelled' and hasattr(instance, '_original_status') and instance._original_status != 'cancelled':
@@ -1084,9 +1084,9 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
                                 'status_change': 'cancelled'
                             }
                         )
-                        logger.info(f"Actividad de cancelación de reserva creada para reserva {instance.id}")
+                        logger.info("Actividad de cancelación de reserva creada para reserva %s", instance.id)
                 except Exception as e:
-                    logger.error(f"Error creando actividad de cancelación para reserva {instance.id}: {str(e)}")
+                    logger.error("Error creando actividad de cancelación para reserva %s: %s", instance.id, str(e))
 
         # NUEVO: Actualizar tareas de limpieza si cambió la fecha de checkout
         if hasattr(instance, '_original_check_out_date'):
@@ -1094,7 +1094,7 @@ def reservation_post_save_handler(sender, instance, created, **kwargs):
             current_checkout = instance.check_out_date
             
             if original_checkout != current_checkout:
-                logger.info(f"Checkout date changed for reservation {instance.id}: {original_checkout} -> {current_checkout}")
+                logger.info("Checkout date changed for reservation %s: %s -> %s", instance.id, original_checkout, current_checkout)
                 update_cleaning_tasks_for_checkout_change(instance, original_checkout, current_checkout)
 
 
@@ -1830,14 +1830,14 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
     """
     # Evitar doble procesamiento si ya se procesó en esta transacción
     if hasattr(instance, '_push_notifications_sent') and instance._push_notifications_sent:
-        logger.debug(f"🔔 PUSH SIGNAL: Saltando - ya se procesó para reserva {instance.id}")
+        logger.debug("🔔 PUSH SIGNAL: Saltando - ya se procesó para reserva %s", instance.id)
         return
 
-    logger.info(f"🔔 PUSH SIGNAL: Ejecutando send_reservation_push_notifications - Reserva {instance.id}, created={created}, status={instance.status}")
+    logger.info("🔔 PUSH SIGNAL: Ejecutando send_reservation_push_notifications - Reserva %s, created=%s, status=%s", instance.id, created, instance.status)
 
     # Verificar que la reserva tiene datos mínimos
     if not instance.property:
-        logger.debug(f"Reserva {instance.id} sin propiedad - no se envía notificación push")
+        logger.debug("Reserva %s sin propiedad - no se envía notificación push", instance.id)
         return
     
     try:
@@ -1845,7 +1845,7 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
         
         # 1. RESERVA NUEVA CREADA
         if created:
-            logger.info(f"📱 Nueva reserva {instance.id} creada - Enviando notificaciones push")
+            logger.info("📱 Nueva reserva %s creada - Enviando notificaciones push", instance.id)
             
             # A) Notificar al CLIENTE
             if instance.client:
@@ -1857,9 +1857,9 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                     data=notification['data']
                 )
                 if result and result.get('success'):
-                    logger.info(f"✅ Notificación enviada al cliente: {result.get('sent', 0)} dispositivo(s)")
+                    logger.info("✅ Notificación enviada al cliente: %s dispositivo(s)", result.get('sent', 0))
                 elif result:
-                    logger.debug(f"Cliente sin tokens: {result.get('error', 'Sin tokens')}")
+                    logger.debug("Cliente sin tokens: %s", result.get('error', 'Sin tokens'))
             
             # B) Notificar a ADMINISTRADORES
             client_name = f"{instance.client.first_name} {instance.client.last_name}" if instance.client else "Cliente no especificado"
@@ -1914,22 +1914,22 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                 }
             )
             if result_admin and result_admin.get('success'):
-                logger.info(f"✅ Notificación enviada a {result_admin.get('sent', 0)} administrador(es)")
+                logger.info("✅ Notificación enviada a %s administrador(es)", result_admin.get('sent', 0))
             return
         
         # 2. RESERVA MODIFICADA - Detectar cambios importantes
         old = getattr(instance, '_old_reservation', None)
-        logger.info(f"🔍 DEBUG PUSH: _old_reservation existe: {old is not None}, instance.pk={instance.pk}")
+        logger.debug("🔍 DEBUG PUSH: _old_reservation existe: %s, instance.pk=%s", old is not None, instance.pk)
         if not old:
-            logger.warning(f"⚠️ DEBUG PUSH: No hay _old_reservation para reserva {instance.id} - no se enviarán notificaciones de cambio")
+            logger.warning("⚠️ DEBUG PUSH: No hay _old_reservation para reserva %s - no se enviarán notificaciones de cambio", instance.id)
             return
         
         client_name = f"{instance.client.first_name} {instance.client.last_name}" if instance.client else "Cliente"
         
         # 3. CAMBIO DE ESTADO (Pago aprobado, cancelado, etc.)
-        logger.info(f"🔍 DEBUG PUSH: Verificando cambio de estado - old.status={old.status}, new.status={instance.status}")
+        logger.debug("🔍 DEBUG PUSH: Verificando cambio de estado - old.status=%s, new.status=%s", old.status, instance.status)
         if old.status != instance.status:
-            logger.info(f"📱 Cambio de estado en reserva {instance.id}: {old.status} → {instance.status}")
+            logger.info("📱 Cambio de estado en reserva %s: %s → %s", instance.id, old.status, instance.status)
             
             # A) Notificar al CLIENTE
             if instance.client:
@@ -1951,10 +1951,10 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                         data=notification['data']
                     )
                     if result and result.get('success'):
-                        logger.info(f"✅ Notificación enviada al cliente: {result.get('sent', 0)} dispositivo(s)")
+                        logger.info("✅ Notificación enviada al cliente: %s dispositivo(s)", result.get('sent', 0))
             
             # B) Notificar a ADMINISTRADORES
-            logger.info(f"🔔 DEBUG PUSH: Preparando notificación para admins - {old.status} → {instance.status}")
+            logger.debug("🔔 DEBUG PUSH: Preparando notificación para admins - %s → %s", old.status, instance.status)
             status_display = {
                 'pago_confirmado': 'Pago Confirmado',
                 'pagado': 'Pagado',
@@ -1967,7 +1967,7 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                 'under_review': 'En Revisión'
             }.get(instance.status, instance.status.title())
 
-            logger.info(f"🔔 DEBUG PUSH: Llamando send_to_admins con título 'Cambio de Estado: {status_display}'")
+            logger.debug("🔔 DEBUG PUSH: Llamando send_to_admins con título 'Cambio de Estado: %s'", status_display)
             result_admin = ExpoPushService.send_to_admins(
                 title=f"Cambio de Estado: {status_display}",
                 body=f"{client_name} - {instance.property.name}\nNuevo estado: {status_display}",
@@ -1981,11 +1981,11 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                     "screen": "AdminReservationDetail"
                 }
             )
-            logger.info(f"🔔 DEBUG PUSH: Resultado de send_to_admins: {result_admin}")
+            logger.debug("🔔 DEBUG PUSH: Resultado de send_to_admins: %s", result_admin)
             if result_admin and result_admin.get('success'):
-                logger.info(f"✅ Notificación enviada a {result_admin.get('sent', 0)} admin(s)")
+                logger.info("✅ Notificación enviada a %s admin(s)", result_admin.get('sent', 0))
             else:
-                logger.warning(f"⚠️ send_to_admins no tuvo éxito: {result_admin}")
+                logger.warning("⚠️ send_to_admins no tuvo éxito: %s", result_admin)
         
         # 4-7. DETECTAR TODOS LOS CAMBIOS Y CONSOLIDAR EN UNA NOTIFICACIÓN
         changes = []
@@ -2060,7 +2060,7 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
         
         # Si hay cambios, enviar UNA sola notificación consolidada
         if changes:
-            logger.info(f"📱 Cambios en reserva {instance.id}: {', '.join(changes)}")
+            logger.info("📱 Cambios en reserva %s: %s", instance.id, ', '.join(changes))
             
             # Construir mensaje consolidado
             changes_text = "\n".join(changes)
@@ -2123,7 +2123,7 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                     data=notification['data']
                 )
                 if result and result.get('success'):
-                    logger.info(f"✅ Notificación consolidada enviada al cliente: {result.get('sent', 0)} dispositivo(s)")
+                    logger.info("✅ Notificación consolidada enviada al cliente: %s dispositivo(s)", result.get('sent', 0))
             
             # B) Notificar a ADMINISTRADORES
             admin_type = f"admin_{notification_type}" if not notification_type.startswith("admin_") else notification_type
@@ -2150,7 +2150,7 @@ def send_reservation_push_notifications(sender, instance, created, **kwargs):
                 }
             )
             if result_admin and result_admin.get('success'):
-                logger.info(f"✅ Notificación consolidada enviada a {result_admin.get('sent', 0)} admin(s)")
+                logger.info("✅ Notificación consolidada enviada a %s admin(s)", result_admin.get('sent', 0))
 
         # Marcar como procesado para evitar doble envío
         instance._push_notifications_sent = True
@@ -2231,3 +2231,24 @@ def reservation_pre_delete_handler(sender, instance, **kwargs):
         logger.warning("ExpoPushService no disponible - notificaciones push de eliminación deshabilitadas")
     except Exception as e:
         logger.error(f"❌ Error enviando notificación de eliminación para reserva {instance.id}: {str(e)}", exc_info=True)
+
+
+@receiver(post_save, sender=RentalReceipt)
+def enqueue_voucher_analysis(sender, instance, created, **kwargs):
+    """Encola el análisis IA del voucher recién subido (export de Ingresos)."""
+    if not created or not getattr(settings, 'VOUCHER_AI_ON_UPLOAD', True):
+        return
+    if not getattr(settings, 'OPENAI_API_KEY', ''):
+        return
+    from .voucher_queue import enqueue_analysis
+
+    enqueue_analysis([instance.id])
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def invalidate_active_stay_index(sender, instance, **kwargs):
+    """Invalida el índice de estadías activas (TV, música, HA, chatbot)."""
+    from .active_stay import stay_resolver
+
+    stay_resolver.invalidate()
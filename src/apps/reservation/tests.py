@@ -1,3 +1,507 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+
+from apps.core.exports import parse_export, stream_export
+
+from .active_stay import Stay, _Timeline, stay_bounds
+from .contract_pdf import LibreOfficePool, ZipStream, contract_cache_key, store_cached_pdf
+from .models import RentalReceipt, Reservation
+from .music_client import MusicAPIClient
+from .occupancy import BOOKED, LATE_CHECKOUT, MAINTENANCE, OccupancyGrid, occupancy
+from .projections import ReservationListProjection, calendar_rows
+from .scan_effect import apply_scan_effect
+from .serializers import CalendarReservationSerializer, ReservationListSerializer
+from .voucher_ai_service import prepare_voucher_image
+from .voucher_queue import CLAIM_TTL, _process, enqueue_analysis, queue_progress
+
+
+class ContractPdfTest(SimpleTestCase):
+    """Tests de la cache de contratos y el ZIP en streaming"""
+
+    def setUp(self):
+        fd, self.template = tempfile.mkstemp(suffix='.docx')
+        os.write(fd, b'plantilla v1')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.template)
+
+    def test_cache_key_depends_on_context_and_firma(self):
+        """La clave cambia con el contexto o la firma, no con el orden de las claves"""
+        ctx = {'nombre': 'ANA', 'dni': '12345678'}
+        key = contract_cache_key(self.template, ctx)
+        self.assertEqual(key, contract_cache_key(self.template, dict(reversed(list(ctx.items())))))
+        self.assertNotEqual(key, contract_cache_key(self.template, {**ctx, 'dni': '87654321'}))
+        self.assertNotEqual(key, contract_cache_key(self.template, ctx, firma_bytes=b'png'))
+
+    def test_profile_per_process_and_slot(self):
+        """Dos workers con el mismo slot no comparten perfil de LibreOffice"""
+        pool = LibreOfficePool(size=1, profile_root=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, pool.profile_root, True)
+        with mock.patch('os.getpid', return_value=101):
+            first = pool._command(0, 'c.docx', '/tmp')[1]
+        with mock.patch('os.getpid', return_value=202):
+            second = pool._command(0, 'c.docx', '/tmp')[1]
+        self.assertNotEqual(first, second)
+
+    def test_cache_dir_is_private(self):
+        """La cache de contratos firmados solo la lee el usuario del servicio"""
+        root = os.path.join(tempfile.mkdtemp(), 'contratos')
+        self.addCleanup(shutil.rmtree, os.path.dirname(root), True)
+        with override_settings(CONTRACT_PDF_CACHE_DIR=root):
+            store_cached_pdf('ab' * 32, b'%PDF')
+        self.assertEqual(os.stat(root).st_mode & 0o777, 0o700)
+
+    def test_zip_stream_produces_valid_archive(self):
+        """Los chunks emitidos forman un ZIP válido"""
+        stream = ZipStream()
+        chunks = []
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f'contrato_{i}.pdf', b'%PDF' * 100)
+                chunks.append(stream.pop())
+        chunks.append(stream.pop())
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(archive.read('contrato_1.pdf'), b'%PDF' * 100)
+
+
+@override_settings(CONTRACT_PDF_CACHE_DIR=None)
+class ScanEffectTest(SimpleTestCase):
+    """Tests del efecto de documento escaneado"""
+
+    def _pdf(self, pages):
+        import fitz
+
+        doc = fitz.open()
+        for i in range(pages):
+            doc.new_page(width=200, height=280).insert_text((20, 40), f'Pagina {i}')
+        data = doc.tobytes()
+        doc.close()
+        return data
+
+    def _page_count(self, data):
+        import fitz
+
+        with fitz.open(stream=data, filetype='pdf') as doc:
+            return len(doc)
+
+    def test_deterministic_per_client(self):
+        """Mismo cliente y contrato = mismo resultado; otro cliente = otro escaneo"""
+        pdf = self._pdf(2)
+        first = apply_scan_effect(pdf, 'cliente-1', workers=1)
+        self.assertEqual(first, apply_scan_effect(pdf, 'cliente-1', workers=1))
+        self.assertNotEqual(first, apply_scan_effect(pdf, 'cliente-2', workers=1))
+        self.assertEqual(self._page_count(first), 2)
+
+    def test_parallel_matches_sequential(self):
+        """El pool de procesos produce el mismo PDF que el modo secuencial"""
+        pdf = self._pdf(3)
+        self.assertEqual(
+            apply_scan_effect(pdf, 'cliente-1', workers=1),
+            apply_scan_effect(pdf, 'cliente-1', workers=2),
+        )
+
+    def test_broken_pool_is_replaced(self):
+        """Un worker muerto no deja el pool roto para siempre: se recrea y se sigue"""
+        from concurrent.futures.process import BrokenProcessPool
+
+        from . import scan_effect
+
+        def broken_map(fn, *iterables):
+            yield fn(*next(zip(*iterables)))
+            raise BrokenProcessPool('worker muerto')
+
+        broken = mock.Mock(map=broken_map)
+        fresh = mock.Mock(map=map)
+        pdf = self._pdf(3)
+        with mock.patch.object(scan_effect, '_executor', broken), \
+                mock.patch('concurrent.futures.ProcessPoolExecutor', return_value=fresh), \
+                self.assertLogs('apps.reservation.scan_effect', 'WARNING'):
+            result = apply_scan_effect(pdf, 'cliente-1', workers=2)
+            self.assertIs(scan_effect._executor, fresh)
+        broken.shutdown.assert_called_once()
+        self.assertEqual(result, apply_scan_effect(pdf, 'cliente-1', workers=1))
+
+
+@override_settings(STAY_CHECKIN_TIME='15:00', STAY_CHECKOUT_TIME='11:00')
+class ActiveStayTimelineTest(SimpleTestCase):
+    """Tests del índice de estadías activas"""
+
+    def _stay(self, res_id, check_in, nights, status='approved'):
+        check_out = check_in + timedelta(days=nights)
+        start, end = stay_bounds(check_in, check_out)
+        return Stay(res_id, 'prop', 'client', status, check_in, check_out, start, end)
+
+    def _at(self, day, hour):
+        return timezone.make_aware(datetime(day.year, day.month, day.day, hour))
+
+    def test_checkin_and_checkout_hours(self):
+        """La estadía empieza a las 15:00 y termina a las 11:00"""
+        day = date(2026, 3, 10)
+        timeline = _Timeline([self._stay(1, day, 2)])
+        statuses = ('approved',)
+        self.assertIsNone(timeline.covering(self._at(day, 14), statuses))
+        self.assertEqual(timeline.covering(self._at(day, 15), statuses).reservation_id, 1)
+        self.assertEqual(timeline.covering(self._at(day + timedelta(days=2), 10), statuses).reservation_id, 1)
+        self.assertIsNone(timeline.covering(self._at(day + timedelta(days=2), 11), statuses))
+
+    def test_back_to_back_stays(self):
+        """El día de recambio, a la mañana es la salida y a la tarde la llegada"""
+        day = date(2026, 3, 10)
+        timeline = _Timeline([self._stay(1, day, 2), self._stay(2, day + timedelta(days=2), 3)])
+        turnover = day + timedelta(days=2)
+        statuses = ('approved',)
+        self.assertEqual(timeline.covering(self._at(turnover, 9), statuses).reservation_id, 1)
+        self.assertIsNone(timeline.covering(self._at(turnover, 12), statuses))
+        self.assertEqual(timeline.covering(self._at(turnover, 16), statuses).reservation_id, 2)
+
+    def test_status_filter_and_overlap_priority(self):
+        """Ante solapes gana la aprobada; el filtro de estados se respeta"""
+        day = date(2026, 3, 10)
+        timeline = _Timeline([self._stay(1, day, 5), self._stay(2, day + timedelta(days=1), 1, 'pending')])
+        now = self._at(day + timedelta(days=1), 18)
+        self.assertEqual(timeline.covering(now, ('approved', 'pending')).reservation_id, 1)
+        self.assertEqual(timeline.covering(now, ('pending',)).reservation_id, 2)
+
+    def test_all_covering_keeps_overlaps(self):
+        """Con solapes se devuelven todas las estadías en curso, no solo una"""
+        day = date(2026, 3, 10)
+        timeline = _Timeline([
+            self._stay(1, day, 5), self._stay(2, day + timedelta(days=1), 1, 'pending'),
+            self._stay(3, day + timedelta(days=2), 2),
+        ])
+        now = self._at(day + timedelta(days=1), 18)
+        self.assertEqual([s.reservation_id for s in timeline.all_covering(now, ('approved', 'pending'))], [1, 2])
+        self.assertEqual([s.reservation_id for s in timeline.all_covering(now, ('approved',))], [1])
+        self.assertEqual(timeline.all_covering(self._at(day, 9), ('approved',)), [])
+
+
+@override_settings(MUSIC_STATUS_TTL=5)
+class MusicClientSnapshotTest(SimpleTestCase):
+    """Tests del snapshot de estado y el fan-out del cliente de música"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = MusicAPIClient(base_url='http://music.test')
+        self.response = mock.Mock(status_code=200, content=b'{}')
+        self.response.json.return_value = {'1': {'playing': True}}
+        self.request = mock.patch.object(self.client.session, 'request', return_value=self.response).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_status_is_shared_until_control_command(self):
+        """Polls seguidos usan el snapshot; un comando lo invalida"""
+        self.client.get_all_status()
+        self.client.get_all_status()
+        self.assertEqual(self.request.call_count, 1)
+
+        self.client.pause(1)
+        self.client.get_all_status()
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_set_power_many_reports_failures_per_house(self):
+        """Cada casa recibe su comando; un error no corta el resto"""
+        def request(method, url, **kwargs):
+            if url.endswith('/house/2/power'):
+                raise ConnectionError('down')
+            return self.response
+        self.request.side_effect = request
+
+        results = self.client.set_power_many([1, 2, 3, 1], 'on')
+        self.assertEqual(sorted(results), [1, 2, 3])
+        self.assertIsInstance(results[2], ConnectionError)
+        self.assertEqual(self.request.call_count, 3)
+
+
+@override_settings(VOUCHER_AI_MAX_SIDE=800)
+class VoucherPipelineTest(SimpleTestCase):
+    """Tests del preprocesado y la cola de análisis de vouchers"""
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _image(self, name, size):
+        from PIL import Image
+
+        path = os.path.join(self.tmpdir, name)
+        Image.new('RGB', size, (250, 250, 250)).save(path)
+        return path
+
+    def _decoded_size(self, data_url):
+        import base64
+        from PIL import Image
+
+        raw = base64.b64decode(data_url.split(',', 1)[1])
+        return Image.open(io.BytesIO(raw)).size
+
+    def test_images_are_downscaled_and_hashed_by_content(self):
+        """Se envía como JPEG reducido; mismo contenido = mismo hash"""
+        first = prepare_voucher_image(self._image('a.png', (2400, 1200)))
+        second = prepare_voucher_image(self._image('b.png', (2400, 1200)))
+        self.assertTrue(first[0].startswith('data:image/jpeg;base64,'))
+        self.assertEqual(self._decoded_size(first[0]), (800, 400))
+        self.assertEqual(first[1], second[1])
+        self.assertIsNone(prepare_voucher_image(os.path.join(self.tmpdir, 'x.txt')))
+
+    def test_pdf_rendered_at_target_size(self):
+        """Los PDFs se renderizan directo al tamaño objetivo"""
+        import fitz
+
+        path = os.path.join(self.tmpdir, 'v.pdf')
+        doc = fitz.open()
+        doc.new_page(width=595, height=842)
+        doc.save(path)
+        doc.close()
+        width, height = self._decoded_size(prepare_voucher_image(path)[0])
+        self.assertEqual(max(width, height), 800)
+
+
+@override_settings(VOUCHER_AI_ON_UPLOAD=False)
+class VoucherQueueClaimTest(TestCase):
+    """El reclamo de la cola es un UPDATE condicional en la BD"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from apps.property.models import Property
+
+        prop = Property.objects.create(name='Casa Austin 1', slug='casa-austin-1')
+        # bulk_create: sin las señales de Reservation (notificaciones)
+        [reservation] = Reservation.objects.bulk_create([Reservation(
+            property=prop, check_in_date=date(2026, 3, 10), check_out_date=date(2026, 3, 12), origin='air',
+        )])
+        cls.receipts = RentalReceipt.objects.bulk_create([
+            RentalReceipt(reservation=reservation, file=f'recibos/{i}.jpg') for i in range(5)
+        ])
+        cls.ids = [receipt.id for receipt in cls.receipts]
+
+    def setUp(self):
+        on_commit = mock.patch('apps.reservation.voucher_queue.transaction.on_commit')
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def test_enqueue_skips_already_queued(self):
+        """Un voucher ya reclamado (por este u otro worker) no se vuelve a encolar"""
+        self.assertEqual(enqueue_analysis(self.ids[:2]), 2)
+        self.assertEqual(enqueue_analysis(self.ids[1:3]), 1)
+        self.assertEqual(enqueue_analysis([]), 0)
+
+        RentalReceipt.objects.filter(pk=self.ids[4]).update(ai_processed_at=timezone.now())
+        receipts = RentalReceipt.objects.filter(pk__in=[self.ids[0], self.ids[3], self.ids[4]])
+        self.assertEqual(
+            queue_progress(list(receipts)),
+            {'total': 3, 'processed': 1, 'queued': 1, 'pending': 1},
+        )
+
+    def test_stale_claim_is_taken_again(self):
+        """Si el worker murió con el voucher reclamado, el reclamo vence"""
+        RentalReceipt.objects.filter(pk=self.ids[0]).update(
+            ai_queued_at=timezone.now() - timedelta(seconds=CLAIM_TTL + 1),
+        )
+        self.assertEqual(enqueue_analysis(self.ids[:1]), 1)
+
+    def test_process_releases_claim(self):
+        """Terminado el análisis (o si falla) se libera el reclamo"""
+        enqueue_analysis(self.ids[:1])
+        with mock.patch('apps.reservation.voucher_ai_service.analyze_voucher', side_effect=RuntimeError('timeout')), \
+                self.assertLogs('apps.reservation.voucher_queue', 'ERROR'):
+            _process(self.ids[0])
+        self.assertIsNone(RentalReceipt.objects.get(pk=self.ids[0]).ai_queued_at)
+        self.assertEqual(enqueue_analysis(self.ids[:1]), 1)
+
+
+class ReservationListProjectionTest(SimpleTestCase):
+    """La proyección por `.values()` produce las mismas filas que los serializers (sin BD)"""
+
+    def setUp(self):
+        import uuid
+        from decimal import Decimal
+
+        from apps.accounts.models import CustomUser
+        from apps.clients.models import Clients
+        from apps.property.models import Property
+
+        self.property = Property(id=uuid.uuid4(), name='Casa Austin 2', background_color='#ff0000')
+        self.reservation = Reservation(
+            id=uuid.uuid4(),
+            client=Clients(
+                id=uuid.uuid4(), first_name='Ana', last_name='Pérez', email='ana@mail.pe',
+                tel_number='51999888777', document_type='dni', number_doc='12345678',
+            ),
+            seller=CustomUser(id=7, first_name='Luis', last_name='Ramos'),
+            property=self.property,
+            check_in_date=date(2026, 5, 8), check_out_date=date(2026, 5, 11),
+            guests=4, price_usd=Decimal('340.00'), price_sol=Decimal('1224.00'),
+            advance_payment=Decimal('100.00'), advance_payment_currency='usd',
+            points_redeemed=Decimal('20.00'), status='approved', origin='air',
+        )
+        self.vouchers = [
+            mock.Mock(created=datetime(2026, 4, 1, 10, 30)),
+            mock.Mock(created=datetime(2026, 4, 3, 18, 5)),
+        ]
+
+    def _row(self, columns):
+        row = {}
+        for column in columns:
+            value = self.reservation
+            for part in column.split('__'):
+                value = getattr(value, part)
+            row[column] = value
+        return row
+
+    def test_list_rows_match_serializer(self):
+        property_data = {'id': str(self.property.id), 'name': self.property.name}
+        with mock.patch.object(ReservationListSerializer, '_get_vouchers_sorted', return_value=self.vouchers), \
+                mock.patch.object(ReservationListSerializer, 'get_property', return_value=property_data):
+            expected = ReservationListSerializer(self.reservation).data
+
+        projection = ReservationListProjection()
+        row = self._row(projection.columns())
+        row.update({
+            'vouchers_count_': 2,
+            'voucher_1_at': self.vouchers[0].created,
+            'voucher_2_at': self.vouchers[1].created,
+            'voucher_3_at': None,
+        })
+        with mock.patch.object(projection, '_properties', return_value={self.property.id: property_data}):
+            self.assertEqual(projection.rows([row]), [dict(expected)])
+
+    def test_calendar_rows_match_serializer(self):
+        expected = CalendarReservationSerializer(self.reservation).data
+        queryset = mock.Mock()
+        queryset.values.side_effect = lambda *columns: [self._row(columns)]
+        self.assertEqual(calendar_rows(queryset), [dict(expected)])
+
+
+class StreamExportTest(SimpleTestCase):
+    """Exportación CSV/XLSX en streaming (apps.core.exports)"""
+
+    columns = ('id', 'client_info.name', 'amount')
+
+    def _request(self, **params):
+        return Request(RequestFactory().get('/', params))
+
+    def _rows(self):
+        for idx in range(3):
+            yield {'id': idx, 'client_info': {'name': f'Cliente {idx}'}, 'amount': 10.5 * idx}
+
+    def test_parse_export(self):
+        self.assertIsNone(parse_export(self._request(), self.columns))
+        self.assertEqual(
+            parse_export(self._request(export='CSV', columns='amount,id'), self.columns),
+            ('csv', ['amount', 'id']),
+        )
+        with self.assertRaises(ValueError):
+            parse_export(self._request(export='pdf'), self.columns)
+        with self.assertRaises(ValueError):
+            parse_export(self._request(export='xlsx', columns='id,secreto'), self.columns)
+
+    def test_csv_streams_selected_columns(self):
+        response = stream_export(self._rows(), 'csv', ['client_info.name', 'amount'], 'reservas-2026')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="reservas-2026.csv"')
+        body = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(body.splitlines(), [
+            'client_info.name,amount', 'Cliente 0,0.0', 'Cliente 1,10.5', 'Cliente 2,21.0',
+        ])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        from openpyxl import load_workbook
+
+        response = stream_export(self._rows(), 'xlsx', list(self.columns), 'reservas-2026')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[0], self.columns)
+        self.assertEqual(rows[2], (1, 'Cliente 1', 10.5))
+
+
+class OccupancyTest(SimpleTestCase):
+    """Grilla de ocupación por día (sin BD: la consulta es un mock)"""
+
+    def _row(self, rid, check_in, check_out, **extra):
+        return {
+            'id': rid, 'property_id': 'casa-1', 'check_in_date': check_in,
+            'check_out_date': check_out, 'late_checkout': False,
+            'late_check_out_date': None, 'origin': 'aus', 'status': 'approved',
+            'client_id': None, 'client__first_name': None, 'client__last_name': None,
+            **extra,
+        }
+
+    def test_grid_applies_late_checkout_and_clipping(self):
+        grid = OccupancyGrid.empty(date(2026, 5, 1), date(2026, 5, 31))
+        # Viene de abril: solo cuentan sus noches de mayo
+        grid.paint(self._row('r1', date(2026, 4, 28), date(2026, 5, 3)))
+        # Late checkout el mismo día de salida: bloquea esa noche sin ser reservada
+        grid.paint(self._row(
+            'r2', date(2026, 5, 10), date(2026, 5, 12),
+            late_checkout=True, late_check_out_date=date(2026, 5, 12),
+        ))
+        grid.paint(self._row('r3', date(2026, 5, 20), date(2026, 5, 22), origin='man'))
+
+        self.assertEqual(grid.day(date(2026, 5, 2)), ('r1', BOOKED))
+        self.assertTrue(grid.is_free(date(2026, 5, 3)))
+        self.assertEqual(grid.day(date(2026, 5, 12)), ('r2', LATE_CHECKOUT))
+        self.assertEqual(grid.nights(BOOKED, exclude=MAINTENANCE), 4)
+        self.assertEqual(grid.nights(MAINTENANCE), 2)
+        self.assertEqual(grid.free_nights(), 31 - 7)
+        self.assertEqual(list(grid.window(date(2026, 5, 11), date(2026, 5, 31)).reservations), ['r2', 'r3'])
+
+    @override_settings(OCCUPANCY_CACHE_TTL=60)
+    def test_windows_across_months_are_built_once_and_cached(self):
+        cache.clear()
+        rows = [
+            self._row('r1', date(2026, 1, 30), date(2026, 2, 2)),
+            self._row('r2', date(2026, 3, 5), date(2026, 3, 6)),
+        ]
+        queryset = mock.MagicMock()
+        queryset.filter.return_value = queryset
+        queryset.order_by.return_value.values.return_value = rows
+        with mock.patch('apps.reservation.occupancy.Reservation.objects.filter', return_value=queryset) as query:
+            grid = occupancy(['casa-1'], date(2026, 1, 1), date(2026, 12, 31))['casa-1']
+            again = occupancy(['casa-1'], date(2026, 2, 1), date(2026, 3, 31))['casa-1']
+
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(len(grid.ids), 365)
+        self.assertEqual(grid.nights(), 4)
+        self.assertEqual(list(grid.reservations), ['r1', 'r2'])
+        self.assertEqual(again.day(date(2026, 2, 1)), ('r1', BOOKED))
+        self.assertEqual(again.nights(), 2)
+
+    def test_counts_clip_to_the_grid(self):
+        grid = OccupancyGrid.empty(date(2026, 5, 1), date(2026, 5, 28))
+        grid.paint(self._row('r1', date(2026, 5, 26), date(2026, 5, 30)))
+        self.assertEqual(grid.nights(start=date(2026, 5, 27)), 2)
+        # Un inicio posterior al fin de la grilla (hoy > last_day) no falla
+        self.assertEqual(grid.nights(start=date(2026, 5, 30)), 0)
+        self.assertEqual(grid.free_nights(start=date(2026, 5, 30)), 0)
+        self.assertEqual(grid.free_nights(end=date(2026, 4, 30)), 0)
+
+    @override_settings(OCCUPANCY_CACHE_TTL=60)
+    def test_availability_skips_local_cache(self):
+        cache.clear()
+        queryset = mock.MagicMock()
+        queryset.filter.return_value = queryset
+        queryset.order_by.return_value.values.return_value = []
+        with mock.patch('apps.reservation.occupancy.Reservation.objects.filter', return_value=queryset) as query:
+            occupancy(['casa-1'], date(2026, 5, 1), date(2026, 5, 31), availability=True)
+            occupancy(['casa-1'], date(2026, 5, 1), date(2026, 5, 31), availability=True)
+            self.assertEqual(query.call_count, 2)
+            with mock.patch('apps.reservation.occupancy.is_shared', return_value=True):
+                occupancy(['casa-1'], date(2026, 5, 1), date(2026, 5, 31), availability=True)
+                occupancy(['casa-1'], date(2026, 5, 1), date(2026, 5, 31), availability=True)
+        self.assertEqual(query.call_count, 3)
@@ -1,5 +1,5 @@
 import os
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from pathlib import Path
 from django.conf import settings
 
@@ -29,8 +29,13 @@ from apps.accounts.models import CustomUser
 from apps.core.functions import get_month_name, generate_audit, check_user_has_rol, confeccion_ics
 from apps.dashboard.utils import get_stadistics_period
 import subprocess
-from docxtpl import DocxTemplate
 from babel.dates import format_date
+from .contract_pdf import ZipStream, get_pool, render_contract_pdf
+from .scan_effect import apply_scan_effect
+from .active_stay import stay_resolver, checkin_time as stay_checkin_time
+from .projections import ReservationListProjection, calendar_rows
+from .occupancy import occupancy, overlap_q
+from apps.core.exports import EXPORT_CHUNK_SIZE, parse_export, stream_export
 import io
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
@@ -239,7 +244,16 @@ class ReservationsApiView(viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         self.pagination_class = self.get_pagination_class()
-        return super().list(request, *args, **kwargs)
+        if not getattr(settings, 'RESERVATION_LIST_PROJECTION', True):
+            return super().list(request, *args, **kwargs)
+
+        # Mismas filas que ReservationListSerializer, desde .values() anotados
+        projection = ReservationListProjection(self.get_serializer_context())
+        queryset = projection.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.rows(page))
+        return Response(projection.rows(queryset))
 
     def perform_create(self, serializer):
         with transaction.atomic():
@@ -386,8 +400,6 @@ class ReservationsApiView(viewsets.ModelViewSet):
             else:
                 template_path = os.path.join(os.path.dirname(__file__), '../../plantilla.docx')
 
-            doc = DocxTemplate(template_path)
-
             context = {
                 'nombre': f"{client.first_name.upper()} {client.last_name.upper()}",
                 'tipodocumento': document_type.upper(),
@@ -399,23 +411,11 @@ class ReservationsApiView(viewsets.ModelViewSet):
                 'numpax': str(reservation.guests)
             }
 
-            doc.render(context)
-
-            temp_doc_path = "/tmp/temp_contract.docx"
-            temp_pdf_path = "/tmp/temp_contract.pdf"
-            doc.save(temp_doc_path)
-
-            subprocess.run(['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', '/tmp', temp_doc_path], check=True)
-
-            with open(temp_pdf_path, "rb") as pdf_file:
-                pdf_data = pdf_file.read()
+            pdf_data = render_contract_pdf(template_path, context)
 
             response = HttpResponse(pdf_data, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{property.name}_contract.pdf"'
 
-            os.remove(temp_doc_path)
-            os.remove(temp_pdf_path)
-
             return response
         except Clients.DoesNotExist:
             return Response({'error': 'Client not found'}, status=404)
@@ -511,9 +511,11 @@ class ReservationsApiView(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='contratos-zip')
     def contratos_zip(self, request):
         """Genera un ZIP con todos los contratos PDF de un mes dado."""
+        import shutil
         import zipfile
         import tempfile
         import uuid
+        from concurrent.futures import ThreadPoolExecutor, as_completed
 
         month = request.query_params.get('month')  # formato: YYYY-MM
         if not month:
@@ -552,98 +554,122 @@ class ReservationsApiView(viewsets.ModelViewSet):
         tmp_dir = os.path.join(tempfile.gettempdir(), f'contracts_{uuid.uuid4().hex[:8]}')
         os.makedirs(tmp_dir, exist_ok=True)
 
-        zip_entries = []  # (zip_path, local_path)
+        jobs = []  # (folder_name, template_path, context, voucher_paths, client_label)
         errors = []
 
-        try:
-            for res in reservations:
-                client = res.client
-                prop = res.property
-
-                doc_type = document_type_map.get(client.document_type)
-                if not doc_type:
-                    errors.append(f'{client.first_name}: tipo documento desconocido')
-                    continue
-
-                safe_name = slugify(f"{client.first_name}_{client.last_name or ''}")
-                folder_name = f"{res.check_in_date.strftime('%Y-%m-%d')}_{safe_name}_{prop.name}"
+        for res in reservations:
+            client = res.client
+            prop = res.property
 
-                checkin_date = format_date(res.check_in_date, format="d 'de' MMMM 'del' YYYY", locale='es')
-                checkout_date = format_date(res.check_out_date, format="d 'de' MMMM 'del' YYYY", locale='es')
+            doc_type = document_type_map.get(client.document_type)
+            if not doc_type:
+                errors.append(f'{client.first_name}: tipo documento desconocido')
+                continue
 
-                if client.document_type == 'ruc':
-                    template_path = os.path.join(os.path.dirname(__file__), '../../plantilla_ruc.docx')
-                else:
-                    template_path = os.path.join(os.path.dirname(__file__), '../../plantilla.docx')
+            safe_name = slugify(f"{client.first_name}_{client.last_name or ''}")
+            folder_name = f"{res.check_in_date.strftime('%Y-%m-%d')}_{safe_name}_{prop.name}"
 
-                try:
-                    doc = DocxTemplate(template_path)
-                    context = {
-                        'nombre': f"{client.first_name.upper()} {(client.last_name or '').upper()}",
-                        'tipodocumento': doc_type.upper(),
-                        'dni': client.number_doc,
-                        'propiedad': prop.name,
-                        'checkin': checkin_date,
-                        'checkout': checkout_date,
-                        'preciodolares': f"${res.price_usd:.2f}",
-                        'numpax': str(res.guests),
-                    }
-                    doc.render(context)
+            checkin_date = format_date(res.check_in_date, format="d 'de' MMMM 'del' YYYY", locale='es')
+            checkout_date = format_date(res.check_out_date, format="d 'de' MMMM 'del' YYYY", locale='es')
 
-                    docx_path = os.path.join(tmp_dir, f'{folder_name}.docx')
-                    pdf_path = os.path.join(tmp_dir, f'{folder_name}.pdf')
+            if client.document_type == 'ruc':
+                template_path = os.path.join(os.path.dirname(__file__), '../../plantilla_ruc.docx')
+            else:
+                template_path = os.path.join(os.path.dirname(__file__), '../../plantilla.docx')
 
-                    doc.save(docx_path)
-                    subprocess.run(
-                        ['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', tmp_dir, docx_path],
-                        check=True, capture_output=True, timeout=30,
-                    )
-                    if os.path.exists(docx_path):
-                        os.remove(docx_path)
+            context = {
+                'nombre': f"{client.first_name.upper()} {(client.last_name or '').upper()}",
+                'tipodocumento': doc_type.upper(),
+                'dni': client.number_doc,
+                'propiedad': prop.name,
+                'checkin': checkin_date,
+                'checkout': checkout_date,
+                'preciodolares': f"${res.price_usd:.2f}",
+                'numpax': str(res.guests),
+            }
 
-                    # Recopilar vouchers de depósito
-                    voucher_paths = []
-                    for receipt in res.rentalreceipt_set.filter(deleted=False):
-                        try:
-                            if receipt.file and receipt.file.storage.exists(receipt.file.name):
-                                voucher_paths.append(receipt.file.path)
-                        except Exception:
-                            pass
+            # Recopilar vouchers de depósito (en el hilo del request, los
+            # workers no tocan la BD)
+            voucher_paths = []
+            for receipt in res.rentalreceipt_set.all():
+                if receipt.deleted:
+                    continue
+                try:
+                    if receipt.file and receipt.file.storage.exists(receipt.file.name):
+                        voucher_paths.append(receipt.file.path)
+                except Exception:
+                    pass
 
-                    # Agregar vouchers como última página del contrato
-                    if os.path.exists(pdf_path) and voucher_paths:
-                        try:
-                            self._append_vouchers_to_pdf(pdf_path, voucher_paths, tmp_dir, folder_name)
-                        except Exception as e:
-                            errors.append(f'{client.first_name} vouchers: {str(e)}')
+            jobs.append((folder_name, template_path, context, voucher_paths,
+                         f'{client.first_name} {res.check_in_date}'))
 
-                    if os.path.exists(pdf_path):
-                        zip_entries.append((f'{folder_name}.pdf', pdf_path))
+        def build_entry(job):
+            folder_name, template_path, context, voucher_paths, _ = job
+            pdf_path = os.path.join(tmp_dir, f'{folder_name}.pdf')
+            with open(pdf_path, 'wb') as fh:
+                fh.write(render_contract_pdf(template_path, context))
 
+            # Agregar vouchers como última página del contrato
+            voucher_error = None
+            if voucher_paths:
+                try:
+                    self._append_vouchers_to_pdf(pdf_path, voucher_paths, tmp_dir, folder_name)
                 except Exception as e:
-                    errors.append(f'{client.first_name} {res.check_in_date}: {str(e)}')
-
-            if not zip_entries:
-                return Response({'error': 'No se pudo generar ningún contrato', 'details': errors}, status=500)
-
-            # Crear ZIP
-            zip_path = os.path.join(tmp_dir, 'contratos.zip')
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for zip_name, local_path in zip_entries:
-                    zf.write(local_path, zip_name)
+                    voucher_error = str(e)
+            return f'{folder_name}.pdf', pdf_path, voucher_error
+
+        # Convertir en paralelo (acotado por el pool de LibreOffice) e ir
+        # escribiendo cada contrato al ZIP a medida que termina
+        executor = ThreadPoolExecutor(max_workers=get_pool().size)
+        futures = {executor.submit(build_entry, job): job for job in jobs}
+        pending = as_completed(futures)
+
+        def next_entry():
+            for future in pending:
+                job = futures[future]
+                try:
+                    zip_name, pdf_path, voucher_error = future.result()
+                except Exception as e:
+                    errors.append(f'{job[4]}: {str(e)}')
+                    continue
+                if voucher_error:
+                    errors.append(f'{job[4]} vouchers: {voucher_error}')
+                return zip_name, pdf_path
+            return None
 
-            with open(zip_path, 'rb') as f:
-                zip_data = f.read()
+        def cleanup():
+            executor.shutdown(wait=True, cancel_futures=True)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
-            month_name = format_date(date_from, format='MMMM_YYYY', locale='es')
-            response = HttpResponse(zip_data, content_type='application/zip')
-            response['Content-Disposition'] = f'attachment; filename="contratos_{month_name}.zip"'
-            return response
+        # Esperar el primer contrato antes de responder para poder seguir
+        # devolviendo un error JSON si no se pudo generar ninguno
+        first = next_entry()
+        if first is None:
+            cleanup()
+            return Response({'error': 'No se pudo generar ningún contrato', 'details': errors}, status=500)
 
-        finally:
-            # Limpiar archivos temporales
-            import shutil
-            shutil.rmtree(tmp_dir, ignore_errors=True)
+        def stream_zip():
+            buffer = ZipStream()
+            try:
+                with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+                    entry = first
+                    while entry is not None:
+                        zip_name, pdf_path = entry
+                        zf.write(pdf_path, zip_name)
+                        os.remove(pdf_path)
+                        yield buffer.pop()
+                        entry = next_entry()
+                yield buffer.pop()
+            finally:
+                if errors:
+                    import logging
+                    logging.getLogger(__name__).warning(f'contratos_zip {month}: {errors}')
+                cleanup()
+
+        month_name = format_date(date_from, format='MMMM_YYYY', locale='es')
+        response = StreamingHttpResponse(stream_zip(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="contratos_{month_name}.zip"'
+        return response
 
     @action(detail=True, methods=['get'], url_path='contrato-firma')
     def contrato_firma(self, request, pk=None):
@@ -672,8 +698,6 @@ class ReservationsApiView(viewsets.ModelViewSet):
             else:
                 template_path = os.path.join(os.path.dirname(__file__), '../../plantilla_firma.docx')
 
-            doc = DocxTemplate(template_path)
-
             # --- Obtener firma del cliente (PNG bytes) ---
             firma_bytes = self._get_firma_bytes(client)
 
@@ -689,36 +713,19 @@ class ReservationsApiView(viewsets.ModelViewSet):
                 'firma': '',  # Se inserta como imagen flotante después
             }
 
-            doc.render(context)
-
-            import uuid as _uuid
-            uid = _uuid.uuid4().hex[:8]
-            temp_doc_path = f"/tmp/contract_firma_{uid}.docx"
-            temp_pdf_path = f"/tmp/contract_firma_{uid}.pdf"
-            doc.save(temp_doc_path)
-
             # Insertar firma como imagen flotante (anchor) encima de la línea
-            if firma_bytes:
-                self._insert_firma_anchor(temp_doc_path, firma_bytes)
-
-            subprocess.run(
-                ['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', '/tmp', temp_doc_path],
-                check=True,
+            pdf_data = render_contract_pdf(
+                template_path, context,
+                firma_bytes=firma_bytes,
+                post_render=self._insert_firma_anchor,
             )
 
-            with open(temp_pdf_path, "rb") as pdf_file:
-                pdf_data = pdf_file.read()
-
             # Aplicar efecto de documento escaneado (determinístico por cliente)
             pdf_data = self._apply_scan_effect(pdf_data, client.id)
 
             response = HttpResponse(pdf_data, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{property_obj.name}_contrato_firmado.pdf"'
 
-            os.remove(temp_doc_path)
-            if os.path.exists(temp_pdf_path):
-                os.remove(temp_pdf_path)
-
             return response
 
         except Clients.DoesNotExist:
@@ -978,77 +985,9 @@ class ReservationsApiView(viewsets.ModelViewSet):
         Aplica un efecto de documento escaneado al PDF.
         Determinístico por cliente: mismo client_id = mismo efecto siempre.
         Diferentes clientes = diferentes escaneos.
+        Ver apps.reservation.scan_effect (páginas en paralelo + cache).
         """
-        import random
-        import fitz  # PyMuPDF
-        import numpy as np
-        from PIL import Image, ImageFilter, ImageEnhance
-
-        # Seed basado en client_id para reproducibilidad por cliente
-        seed = hash(str(client_id)) % (2**32)
-        rng = random.Random(seed)
-        np_rng = np.random.RandomState(seed)
-
-        pdf_doc = fitz.open(stream=pdf_data, filetype="pdf")
-        scanned_pages = []
-
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc[page_num]
-
-            # Renderizar a imagen (DPI ligeramente variable como escáner real)
-            dpi = rng.uniform(245, 255)
-            mat = fitz.Matrix(dpi / 72, dpi / 72)
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-            # 1. Rotación leve (papel no perfectamente alineado)
-            angle = rng.uniform(-0.8, 0.8)
-            fill_color = (rng.randint(250, 254), rng.randint(249, 253), rng.randint(247, 251))
-            img = img.rotate(angle, resample=Image.BICUBIC, expand=False, fillcolor=fill_color)
-
-            # 2. Tono cálido sutil (escáneres tienden a dar tono ligeramente amarillento)
-            img_array = np.array(img, dtype=np.float32)
-            img_array[:, :, 0] = np.clip(img_array[:, :, 0] + rng.uniform(0, 2.5), 0, 255)
-            img_array[:, :, 1] = np.clip(img_array[:, :, 1] + rng.uniform(-1, 1), 0, 255)
-            img_array[:, :, 2] = np.clip(img_array[:, :, 2] + rng.uniform(-3, -0.5), 0, 255)
-
-            # 3. Ruido sutil (grano de escáner) — seed fijo por cliente
-            noise_level = rng.uniform(1.8, 3.5)
-            noise = np_rng.normal(0, noise_level, img_array.shape).astype(np.float32)
-            img_array = np.clip(img_array + noise, 0, 255)
-            img = Image.fromarray(img_array.astype(np.uint8))
-
-            # 4. Ajuste de contraste y brillo
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(rng.uniform(0.96, 1.03))
-            enhancer = ImageEnhance.Brightness(img)
-            img = enhancer.enhance(rng.uniform(0.98, 1.02))
-
-            # 5. Desenfoque muy leve (óptica del escáner)
-            img = img.filter(ImageFilter.GaussianBlur(radius=rng.uniform(0.2, 0.45)))
-
-            # 6. Compresión JPEG (artefactos típicos de escáner)
-            jpeg_quality = rng.randint(88, 93)
-            jpeg_buffer = io.BytesIO()
-            img.save(jpeg_buffer, format="JPEG", quality=jpeg_quality)
-            jpeg_buffer.seek(0)
-            img = Image.open(jpeg_buffer).convert("RGB")
-
-            scanned_pages.append(img)
-
-        pdf_doc.close()
-
-        # Guardar como PDF multi-página
-        output = io.BytesIO()
-        if len(scanned_pages) == 1:
-            scanned_pages[0].save(output, format="PDF", resolution=250)
-        else:
-            scanned_pages[0].save(
-                output, format="PDF", resolution=250,
-                save_all=True, append_images=scanned_pages[1:]
-            )
-
-        return output.getvalue()
+        return apply_scan_effect(pdf_data, client_id)
 
 class DeleteRecipeApiView(generics.DestroyAPIView):
     queryset = RentalReceipt.objects.all()
@@ -1159,20 +1098,16 @@ class VistaCalendarioApiView(viewsets.ModelViewSet):
 
                         # Filtrar por año y mes específico
                         last_day_month = calendar.monthrange(year_param, month_param)[1]
-                        range_evaluate = (datetime(year_param, month_param, 1), datetime(year_param, month_param, last_day_month))
-
-                        queryset = queryset.filter(
-                            Q(check_in_date__range=range_evaluate) |
-                            Q(check_out_date__range=range_evaluate)
-                        )
+                        # Toda estadía que toque el mes (incluye las que lo cruzan entero)
+                        queryset = queryset.filter(overlap_q(
+                            datetime(year_param, month_param, 1).date(),
+                            datetime(year_param, month_param, last_day_month).date(),
+                        ))
                     else:
                         # Solo filtrar por año completo
-                        start_of_year = datetime(year_param, 1, 1)
-                        end_of_year = datetime(year_param, 12, 31)
-                        queryset = queryset.filter(
-                            Q(check_in_date__range=(start_of_year, end_of_year)) |
-                            Q(check_out_date__range=(start_of_year, end_of_year))
-                        )
+                        start_of_year = datetime(year_param, 1, 1).date()
+                        end_of_year = datetime(year_param, 12, 31).date()
+                        queryset = queryset.filter(overlap_q(start_of_year, end_of_year))
 
                 # Aquí se debe agregar el filtro para 'pending'
                 if from_param == 'pending':
@@ -1272,6 +1207,8 @@ class VistaCalendarioApiView(viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
+        if getattr(settings, 'RESERVATION_LIST_PROJECTION', True):
+            return Response(calendar_rows(queryset))
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -1547,6 +1484,106 @@ def track_conversion(request, reservation_id):
         }, status=200)
 
 
+RESERVATION_STATUS_LABELS = {
+    'approved': 'Aprobada',
+    'pending': 'Pendiente',
+    'incomplete': 'Incompleta',
+    'rejected': 'Rechazada',
+    'cancelled': 'Cancelada'
+}
+
+RESERVATION_ORIGIN_LABELS = {
+    'air': 'Airbnb',
+    'aus': 'Austin',
+    'man': 'Mantenimiento',
+    'client': 'Cliente Web'
+}
+
+MONTHLY_EXPORT_COLUMNS = (
+    "id", "client_name", "client_email", "client_phone", "property_name",
+    "check_in_date", "check_out_date", "guests", "price_usd", "price_sol",
+    "advance_payment", "advance_payment_currency", "full_payment",
+    "temperature_pool", "origin", "status", "seller_name", "created",
+    "number_nights", "points_redeemed", "discount_code_used",
+    "tel_contact_number", "comentarios_reservas", "voucher_1_uploaded_at",
+    "voucher_2_uploaded_at", "voucher_3_uploaded_at", "vouchers_count",
+)
+
+
+def _monthly_export_row(reservation):
+    """Fila de MonthlyReservationsExportAPIView (JSON o archivo)."""
+    # Calcular número de noches
+    if reservation.check_in_date and reservation.check_out_date:
+        delta = reservation.check_out_date - reservation.check_in_date
+        number_nights = delta.days
+    else:
+        number_nights = 0
+
+    # Formatear nombre del cliente
+    client_name = ""
+    client_email = ""
+    client_phone = ""
+    if reservation.client:
+        first_name = reservation.client.first_name or ""
+        last_name = reservation.client.last_name or ""
+        client_name = f"{first_name} {last_name}".strip()
+        client_email = reservation.client.email or ""
+        client_phone = reservation.client.tel_number or ""
+
+    # Formatear nombre del vendedor
+    seller_name = ""
+    if reservation.seller:
+        seller_first = reservation.seller.first_name or ""
+        seller_last = reservation.seller.last_name or ""
+        seller_name = f"{seller_first} {seller_last}".strip()
+
+    # Fechas de subida de vouchers (orden cronológico)
+    # Hasta 3 vouchers. Si hay más, los adicionales no salen en el
+    # Excel (pero quedan en BD).
+    vouchers = sorted(
+        [r for r in reservation.rentalreceipt_set.all() if not getattr(r, 'deleted', False)],
+        key=lambda r: r.created,
+    )
+    voucher_dates = [None, None, None]
+    for i, v in enumerate(vouchers[:3]):
+        voucher_dates[i] = (
+            v.created.strftime('%Y-%m-%d %H:%M')
+            if v.created else None
+        )
+
+    return {
+        "id": reservation.id,
+        "client_name": client_name,
+        "client_email": client_email,
+        "client_phone": client_phone,
+        "property_name": reservation.property.name if reservation.property else "",
+        "check_in_date": reservation.check_in_date.strftime('%Y-%m-%d'),
+        "check_out_date": reservation.check_out_date.strftime('%Y-%m-%d'),
+        "guests": reservation.guests,
+        "price_usd": float(reservation.price_usd or 0),
+        "price_sol": float(reservation.price_sol or 0),
+        "advance_payment": float(reservation.advance_payment or 0),
+        "advance_payment_currency": reservation.advance_payment_currency,
+        "full_payment": reservation.full_payment,
+        "temperature_pool": reservation.temperature_pool,
+        "origin": RESERVATION_ORIGIN_LABELS.get(reservation.origin, reservation.origin),
+        "status": RESERVATION_STATUS_LABELS.get(reservation.status, reservation.status),
+        "seller_name": seller_name,
+        "created": reservation.created.isoformat() if reservation.created else "",
+        "number_nights": number_nights,
+        "points_redeemed": float(reservation.points_redeemed or 0),
+        "discount_code_used": reservation.discount_code_used or "",
+        "tel_contact_number": reservation.tel_contact_number or "",
+        "comentarios_reservas": reservation.comentarios_reservas or "",
+        # Fechas en las que se subieron los vouchers (1er, 2do, 3er).
+        # Útil para conciliación contable: cuándo entró cada pago.
+        "voucher_1_uploaded_at": voucher_dates[0] or "",
+        "voucher_2_uploaded_at": voucher_dates[1] or "",
+        "voucher_3_uploaded_at": voucher_dates[2] or "",
+        "vouchers_count": len(vouchers),
+    }
+
+
 class MonthlyReservationsExportAPIView(APIView):
     """
     Endpoint para exportar datos de reservas por mes
@@ -1565,8 +1602,23 @@ class MonthlyReservationsExportAPIView(APIView):
             OpenApiParameter(
                 "month",
                 OpenApiTypes.INT,
-                required=True,
-                description="Mes de las reservas a exportar (1-12)",
+                required=False,
+                description="Mes de las reservas a exportar (1-12). Si no se envía, exporta todo el año",
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                "export",
+                OpenApiTypes.STR,
+                required=False,
+                enum=["csv", "xlsx"],
+                description="Devuelve el archivo en streaming en vez de JSON",
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                "columns",
+                OpenApiTypes.STR,
+                required=False,
+                description="Columnas del archivo separadas por coma (por defecto todas)",
                 location=OpenApiParameter.QUERY
             ),
         ],
@@ -1628,10 +1680,10 @@ class MonthlyReservationsExportAPIView(APIView):
             year_param = request.query_params.get('year')
             month_param = request.query_params.get('month')
 
-            if not year_param or not month_param:
+            if not year_param:
                 return Response({
                     "success": False,
-                    "error": "Los parámetros 'year' y 'month' son requeridos"
+                    "error": "El parámetro 'year' es requerido"
                 }, status=400)
 
             # Validar año
@@ -1645,23 +1697,35 @@ class MonthlyReservationsExportAPIView(APIView):
                     "error": "El parámetro 'year' debe ser un número válido entre 2020 y 2030"
                 }, status=400)
 
-            # Validar mes
+            # Validar mes (sin mes: año completo)
+            month = None
+            if month_param:
+                try:
+                    month = int(month_param)
+                    if month < 1 or month > 12:
+                        raise ValueError()
+                except ValueError:
+                    return Response({
+                        "success": False,
+                        "error": "El parámetro 'month' debe ser un número entre 1 y 12"
+                    }, status=400)
+
             try:
-                month = int(month_param)
-                if month < 1 or month > 12:
-                    raise ValueError()
-            except ValueError:
-                return Response({
-                    "success": False,
-                    "error": "El parámetro 'month' debe ser un número entre 1 y 12"
-                }, status=400)
+                export = parse_export(request, MONTHLY_EXPORT_COLUMNS)
+            except ValueError as e:
+                return Response({"success": False, "error": str(e)}, status=400)
 
-            # Calcular rango de fechas para el mes
-            last_day_month = calendar.monthrange(year, month)[1]
-            start_date = datetime(year, month, 1).date()
-            end_date = datetime(year, month, last_day_month).date()
+            # Calcular rango de fechas (mes o año)
+            if month:
+                last_day_month = calendar.monthrange(year, month)[1]
+                start_date = datetime(year, month, 1).date()
+                end_date = datetime(year, month, last_day_month).date()
+            else:
+                start_date = datetime(year, 1, 1).date()
+                end_date = datetime(year, 12, 31).date()
 
-            # Obtener reservas del mes (con prefetch de vouchers para evitar N+1)
+            # Reservas del período (con prefetch de vouchers para evitar N+1;
+            # .iterator() los trae por bloques en vez de todo el período)
             reservations = (
                 Reservation.objects.filter(
                     check_in_date__gte=start_date,
@@ -1671,108 +1735,16 @@ class MonthlyReservationsExportAPIView(APIView):
                 .select_related('client', 'property', 'seller')
                 .prefetch_related('rentalreceipt_set')
                 .order_by('check_in_date')
+                .iterator(chunk_size=EXPORT_CHUNK_SIZE)
             )
+            rows = (_monthly_export_row(reservation) for reservation in reservations)
 
-            # Formatear datos de reservas
-            reservations_data = []
-            for reservation in reservations:
-                # Calcular número de noches
-                if reservation.check_in_date and reservation.check_out_date:
-                    delta = reservation.check_out_date - reservation.check_in_date
-                    number_nights = delta.days
-                else:
-                    number_nights = 0
-
-                # Formatear nombre del cliente
-                client_name = ""
-                client_email = ""
-                client_phone = ""
-                if reservation.client:
-                    first_name = reservation.client.first_name or ""
-                    last_name = reservation.client.last_name or ""
-                    client_name = f"{first_name} {last_name}".strip()
-                    client_email = reservation.client.email or ""
-                    client_phone = reservation.client.tel_number or ""
-
-                # Formatear nombre del vendedor
-                seller_name = ""
-                if reservation.seller:
-                    seller_first = reservation.seller.first_name or ""
-                    seller_last = reservation.seller.last_name or ""
-                    seller_name = f"{seller_first} {seller_last}".strip()
-
-                # Fechas de subida de vouchers (orden cronológico)
-                # Hasta 3 vouchers. Si hay más, los adicionales no salen en el
-                # Excel (pero quedan en BD).
-                vouchers = sorted(
-                    [r for r in reservation.rentalreceipt_set.all() if not getattr(r, 'deleted', False)],
-                    key=lambda r: r.created,
-                )
-                voucher_dates = [None, None, None]
-                for i, v in enumerate(vouchers[:3]):
-                    voucher_dates[i] = (
-                        v.created.strftime('%Y-%m-%d %H:%M')
-                        if v.created else None
-                    )
-
-                # Mapear status para mejor legibilidad
-                status_mapping = {
-                    'approved': 'Aprobada',
-                    'pending': 'Pendiente',
-                    'incomplete': 'Incompleta',
-                    'rejected': 'Rechazada',
-                    'cancelled': 'Cancelada'
-                }
-                status_display = status_mapping.get(reservation.status, reservation.status)
-
-                # Mapear origen para mejor legibilidad
-                origin_mapping = {
-                    'air': 'Airbnb',
-                    'aus': 'Austin',
-                    'man': 'Mantenimiento',
-                    'client': 'Cliente Web'
-                }
-                origin_display = origin_mapping.get(reservation.origin, reservation.origin)
-
-                reservations_data.append({
-                    "id": reservation.id,
-                    "client_name": client_name,
-                    "client_email": client_email,
-                    "client_phone": client_phone,
-                    "property_name": reservation.property.name if reservation.property else "",
-                    "check_in_date": reservation.check_in_date.strftime('%Y-%m-%d'),
-                    "check_out_date": reservation.check_out_date.strftime('%Y-%m-%d'),
-                    "guests": reservation.guests,
-                    "price_usd": float(reservation.price_usd or 0),
-                    "price_sol": float(reservation.price_sol or 0),
-                    "advance_payment": float(reservation.advance_payment or 0),
-                    "advance_payment_currency": reservation.advance_payment_currency,
-                    "full_payment": reservation.full_payment,
-                    "temperature_pool": reservation.temperature_pool,
-                    "origin": origin_display,
-                    "status": status_display,
-                    "seller_name": seller_name,
-                    "created": reservation.created.isoformat() if reservation.created else "",
-                    "number_nights": number_nights,
-                    "points_redeemed": float(reservation.points_redeemed or 0),
-                    "discount_code_used": reservation.discount_code_used or "",
-                    "tel_contact_number": reservation.tel_contact_number or "",
-                    "comentarios_reservas": reservation.comentarios_reservas or "",
-                    # Fechas en las que se subieron los vouchers (1er, 2do, 3er).
-                    # Útil para conciliación contable: cuándo entró cada pago.
-                    "voucher_1_uploaded_at": voucher_dates[0] or "",
-                    "voucher_2_uploaded_at": voucher_dates[1] or "",
-                    "voucher_3_uploaded_at": voucher_dates[2] or "",
-                    "vouchers_count": len(vouchers),
-                })
+            if export:
+                period = f"{year}-{month:02d}" if month else str(year)
+                return stream_export(rows, *export, filename=f"reservas-{period}")
 
-            # Formatear nombre del período
-            month_names = {
-                1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
-                5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
-                9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
-            }
-            period_name = f"{month_names[month]} {year}"
+            reservations_data = list(rows)
+            period_name = f"{get_month_name(month).capitalize()} {year}" if month else str(year)
 
             return Response({
                 "success": True,
@@ -1819,6 +1791,13 @@ class PropertyCalendarOccupancyAPIView(APIView):
                 description="Día para filtrar las reservas (1-31). Requiere que se especifique el mes",
                 location=OpenApiParameter.QUERY
             ),
+            OpenApiParameter(
+                "days",
+                OpenApiTypes.BOOL,
+                required=False,
+                description="Incluye la ocupación por día del rango (ids de reserva y flags)",
+                location=OpenApiParameter.QUERY
+            ),
         ],
         responses={
             200: {
@@ -1942,22 +1921,18 @@ class PropertyCalendarOccupancyAPIView(APIView):
                 start_date = datetime(year, 1, 1).date()
                 end_date = datetime(year, 12, 31).date()
 
-            # Obtener reservas de la propiedad en el rango de fechas
-            reservations = Reservation.objects.filter(
-                property=property_obj,
-                deleted=False,
-                status__in=['approved', 'pending', 'incomplete', 'under_review']
-            ).filter(
-                Q(check_in_date__lte=end_date) & Q(check_out_date__gte=start_date)
-            ).select_related('client').order_by('check_in_date')
+            # Ocupación de la propiedad en el rango (grilla por día; el cache
+            # por mes solo si es compartido entre workers)
+            grid = occupancy([property_obj.id], start_date, end_date, availability=True)[property_obj.id]
+            reservations = sorted(grid.reservations.values(), key=lambda row: row['check_in_date'])
 
             # Formatear datos de ocupación
             occupancy_data = []
             for reservation in reservations:
                 # Formatear nombre del huésped
-                if reservation.client:
-                    first_name = reservation.client.first_name or ""
-                    last_name = reservation.client.last_name or ""
+                if reservation['client_id']:
+                    first_name = reservation['client__first_name'] or ""
+                    last_name = reservation['client__last_name'] or ""
 
                     # Crear formato con primer nombre e inicial del primer apellido
                     if first_name and last_name:
@@ -1983,23 +1958,28 @@ class PropertyCalendarOccupancyAPIView(APIView):
                     'cancelled': 'cancelled'
                 }
 
-                status = status_mapping.get(reservation.status, reservation.status)
+                status = status_mapping.get(reservation['status'], reservation['status'])
 
                 occupancy_data.append({
-                    "start_date": reservation.check_in_date.strftime('%Y-%m-%d'),
-                    "end_date": reservation.check_out_date.strftime('%Y-%m-%d'),
+                    "start_date": reservation['check_in_date'].strftime('%Y-%m-%d'),
+                    "end_date": reservation['check_out_date'].strftime('%Y-%m-%d'),
                     "guest_name": guest_name,
                     "status": status,
-                    "reservation_id": str(reservation.id),
-                    "origin": reservation.origin
+                    "reservation_id": str(reservation['id']),
+                    "origin": reservation['origin']
                 })
 
+            data = {
+                "property_id": property_obj.slug or str(property_obj.id),
+                "occupancy": occupancy_data
+            }
+            # ?days=true agrega la grilla por día (arrays paralelos id/flags)
+            if request.query_params.get('days') in ('1', 'true', 'yes'):
+                data["days"] = grid.as_dict()
+
             return Response({
                 "success": True,
-                "data": {
-                    "property_id": property_obj.slug or str(property_obj.id),
-                    "occupancy": occupancy_data
-                }
+                "data": data
             })
 
         except Exception as e:
@@ -2174,7 +2154,8 @@ class ActiveReservationsView(APIView):
     """
     GET /api/v1/active/
     Devuelve todas las reservas activas en este momento.
-    Valida horarios de check-in (12 PM) y check-out (11 AM) en horario de Perú.
+    Valida horarios de check-in/check-out con la política compartida
+    (STAY_CHECKIN_TIME / STAY_CHECKOUT_TIME, ver apps.reservation.active_stay).
 
     Requiere autenticación JWT o token de portal (X-Portal-Key header).
     Variable de entorno: WIFI_PORTAL_SECRET_KEY
@@ -2201,89 +2182,65 @@ class ActiveReservationsView(APIView):
         try:
             from django.utils import timezone
             
-            # Obtener hora actual en horario de Perú
-            local_now = timezone.localtime(timezone.now())
-            now_date = local_now.date()
-            now_time = local_now.time()
-            
-            checkin_time = time(12, 0)  # 12 PM (mediodía)
-            checkout_time = time(11, 0)  # 11 AM
+            now_date = timezone.localdate()
             
-            # Obtener todas las reservas aprobadas que podrían estar activas
+            # Estadías en curso según la política horaria compartida
+            stays = stay_resolver.all_active(statuses=('approved',))
             reservations = Reservation.objects.filter(
-                deleted=False,
-                status='approved',
-                check_in_date__lte=now_date,  # Ya empezó o empieza hoy
-                check_out_date__gte=now_date   # No ha terminado o termina hoy
+                id__in=[stay.reservation_id for stay in stays]
             ).select_related('property', 'client')
             
             active_reservations = []
             
             for res in reservations:
-                # Verificar si la reserva está activa en este momento
-                is_active = True
-                
-                # Si es el día de check-in, debe ser después de las 12 PM
-                if now_date == res.check_in_date and now_time < checkin_time:
-                    is_active = False
-                
-                # Si es el día de check-out, debe ser antes de las 11 AM
-                if now_date == res.check_out_date and now_time >= checkout_time:
-                    is_active = False
+                # Manejar reservas con y sin cliente (Airbnb, Mantenimiento)
+                client = res.client
                 
-                # Si está fuera del rango de fechas
-                if now_date < res.check_in_date or now_date > res.check_out_date:
-                    is_active = False
+                if client:
+                    client_name = f"{client.first_name or ''} {client.last_name or ''}".strip() or "Sin nombre"
+                    phone = client.tel_number or ''
+                    referral_code = client.get_referral_code() if hasattr(client, 'get_referral_code') else (client.referral_code or '')
+                else:
+                    # Reservas sin cliente (Airbnb, Mantenimiento)
+                    origin_display = res.get_origin_display() if res.origin else "Reserva"
+                    client_name = f"Reserva {origin_display}"
+                    phone = res.tel_contact_number or ''
+                    referral_code = ''
                 
-                if is_active:
-                    # Manejar reservas con y sin cliente (Airbnb, Mantenimiento)
-                    client = res.client
-                    
-                    if client:
-                        client_name = f"{client.first_name or ''} {client.last_name or ''}".strip() or "Sin nombre"
-                        phone = client.tel_number or ''
-                        referral_code = client.get_referral_code() if hasattr(client, 'get_referral_code') else (client.referral_code or '')
-                    else:
-                        # Reservas sin cliente (Airbnb, Mantenimiento)
-                        origin_display = res.get_origin_display() if res.origin else "Reserva"
-                        client_name = f"Reserva {origin_display}"
-                        phone = res.tel_contact_number or ''
-                        referral_code = ''
-                    
-                    extra = _client_extra_info(client, include_photo=True)
-                    active_reservations.append({
-                        'id': str(res.id),
-                        'property': res.property.name if res.property else 'Sin propiedad',
-                        'property_id': res.property.player_id if res.property else None,
-                        'property_color': res.property.background_color if res.property else '#2196F3',
-                        'client_name': client_name,
-                        'phone': phone,
-                        'referral_code': referral_code,
-                        'client_dni': extra['number_doc'],
-                        'client_document_type': extra['document_type'],
-                        'client_birthday': extra['birthday'],
-                        'client_age': extra['age'],
-                        'client_days_to_birthday': extra['days_to_birthday'],
-                        'client_photo_b64': extra['photo_b64'],
-                        'client_photo_facebook': extra['photo_facebook'],
-                        'client_sex': extra['sex'],
-                        'price_sol': float(res.price_sol or 0),
-                        'price_usd': float(res.price_usd or 0),
-                        'advance_payment': float(res.advance_payment or 0),
-                        'advance_payment_currency': res.advance_payment_currency,
-                        'full_payment': res.full_payment,
-                        'price_latecheckout': float(res.price_latecheckout or 0),
-                        'price_temperature_pool': float(res.price_temperature_pool or 0),
-                        'points_redeemed': float(res.points_redeemed or 0),
-                        'check_in_date': res.check_in_date.isoformat(),
-                        'check_out_date': res.check_out_date.isoformat(),
-                        'guests': res.guests,
-                        'temperature_pool': res.temperature_pool,
-                        'late_checkout': res.late_checkout,
-                        'comentarios': res.comentarios_reservas or '',
-                        'is_currently_active': True,
-                        'origin': res.origin or ''
-                    })
+                extra = _client_extra_info(client, include_photo=True)
+                active_reservations.append({
+                    'id': str(res.id),
+                    'property': res.property.name if res.property else 'Sin propiedad',
+                    'property_id': res.property.player_id if res.property else None,
+                    'property_color': res.property.background_color if res.property else '#2196F3',
+                    'client_name': client_name,
+                    'phone': phone,
+                    'referral_code': referral_code,
+                    'client_dni': extra['number_doc'],
+                    'client_document_type': extra['document_type'],
+                    'client_birthday': extra['birthday'],
+                    'client_age': extra['age'],
+                    'client_days_to_birthday': extra['days_to_birthday'],
+                    'client_photo_b64': extra['photo_b64'],
+                    'client_photo_facebook': extra['photo_facebook'],
+                    'client_sex': extra['sex'],
+                    'price_sol': float(res.price_sol or 0),
+                    'price_usd': float(res.price_usd or 0),
+                    'advance_payment': float(res.advance_payment or 0),
+                    'advance_payment_currency': res.advance_payment_currency,
+                    'full_payment': res.full_payment,
+                    'price_latecheckout': float(res.price_latecheckout or 0),
+                    'price_temperature_pool': float(res.price_temperature_pool or 0),
+                    'points_redeemed': float(res.points_redeemed or 0),
+                    'check_in_date': res.check_in_date.isoformat(),
+                    'check_out_date': res.check_out_date.isoformat(),
+                    'guests': res.guests,
+                    'temperature_pool': res.temperature_pool,
+                    'late_checkout': res.late_checkout,
+                    'comentarios': res.comentarios_reservas or '',
+                    'is_currently_active': True,
+                    'origin': res.origin or ''
+                })
             
             # Obtener reservas que hacen check-in hoy
             checkin_today_reservations = Reservation.objects.filter(
@@ -2339,7 +2296,7 @@ class ActiveReservationsView(APIView):
                     'temperature_pool': res.temperature_pool,
                     'late_checkout': res.late_checkout,
                     'comentarios': res.comentarios_reservas or '',
-                    'checkin_time': '12:00 PM',
+                    'checkin_time': stay_checkin_time().strftime('%I:%M %p'),
                     'origin': res.origin or ''
                 })
             
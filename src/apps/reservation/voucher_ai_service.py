@@ -5,8 +5,17 @@ analista reconcilie depósitos bancarios contra el estado de cuenta.
 
 Idempotente: si `ai_processed_at` está seteado, no se reprocesa (salvo que
 se pase force=True).
+
+Antes de enviar, la imagen se reduce a `VOUCHER_AI_MAX_SIDE` px (los PDFs
+se renderizan directo a ese tamaño) y se recomprime como JPEG. El
+resultado del modelo se cachea por hash del contenido del archivo: el
+mismo comprobante subido dos veces se analiza una sola vez.
+
+El procesamiento en segundo plano está en voucher_queue.py.
 """
 import base64
+import hashlib
+import io
 import json
 import logging
 import os
@@ -14,6 +23,7 @@ from datetime import datetime
 from decimal import Decimal, InvalidOperation
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -58,47 +68,78 @@ USER_PROMPT = (
 )
 
 
-def _file_to_data_url(path: str) -> tuple[str, str] | None:
-    """Devuelve (data_url, mime) para una imagen local. Retorna None si
-    no se puede leer / no soportado."""
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.heic'}
+RESULT_CACHE_TTL = 60 * 60 * 24 * 30
+
+
+def _max_side() -> int:
+    return getattr(settings, 'VOUCHER_AI_MAX_SIDE', 1600)
+
+
+def _render_pdf_first_page(raw: bytes):
+    """Primera página del PDF como imagen PIL, con el lado mayor ≈ max_side."""
+    try:
+        import fitz  # type: ignore
+    except ImportError:
+        return None
+    from PIL import Image
+
+    with fitz.open(stream=raw, filetype='pdf') as doc:
+        if doc.page_count == 0:
+            return None
+        page = doc.load_page(0)
+        zoom = _max_side() / max(page.rect.width, page.rect.height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        return Image.frombytes('RGB', [pix.width, pix.height], pix.samples)
+
+
+def _downscaled_jpeg(img) -> bytes:
+    from PIL import ImageOps
+
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.thumbnail((_max_side(), _max_side()))
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_voucher_image(path: str) -> tuple[str, str] | None:
+    """Devuelve (data_url, hash_del_contenido) listo para enviar, o None
+    si el archivo no existe / no es soportado."""
     if not os.path.exists(path):
         return None
     ext = os.path.splitext(path)[1].lower()
-    if ext == '.pdf':
-        # Convertir primera página del PDF a PNG usando PyMuPDF (fitz).
-        try:
-            import fitz  # type: ignore
-        except ImportError:
-            return None
-        try:
-            doc = fitz.open(path)
-            if doc.page_count == 0:
-                doc.close()
-                return None
-            page = doc.load_page(0)
-            pix = page.get_pixmap(dpi=200)
-            png_bytes = pix.tobytes('png')
-            doc.close()
-            b64 = base64.b64encode(png_bytes).decode('ascii')
-            return f"data:image/png;base64,{b64}", 'image/png'
-        except Exception as e:
-            logger.warning(f"Error convirtiendo PDF voucher: {e}")
-            return None
-    mime_map = {
-        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-        '.png': 'image/png', '.webp': 'image/webp',
-        '.gif': 'image/gif', '.heic': 'image/heic',
-    }
-    mime = mime_map.get(ext)
-    if not mime:
+    if ext != '.pdf' and ext not in IMAGE_EXTENSIONS:
         return None
     try:
         with open(path, 'rb') as fh:
-            b64 = base64.b64encode(fh.read()).decode('ascii')
+            raw = fh.read()
     except Exception as e:
         logger.warning(f"Error leyendo voucher {path}: {e}")
         return None
-    return f"data:{mime};base64,{b64}", mime
+    content_hash = hashlib.sha256(raw).hexdigest()
+
+    try:
+        if ext == '.pdf':
+            img = _render_pdf_first_page(raw)
+            if img is None:
+                return None
+        else:
+            from PIL import Image
+
+            img = Image.open(io.BytesIO(raw))
+        jpeg = _downscaled_jpeg(img)
+    except Exception as e:
+        # HEIC sin plugin u otra imagen que PIL no abre: se envía tal cual
+        if ext == '.pdf':
+            logger.warning(f"Error convirtiendo PDF voucher: {e}")
+            return None
+        mime = 'image/heic' if ext == '.heic' else f"image/{ext.lstrip('.').replace('jpg', 'jpeg')}"
+        return f"data:{mime};base64,{base64.b64encode(raw).decode('ascii')}", content_hash
+
+    return f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('ascii')}", content_hash
 
 
 def _parse_date(value) -> 'datetime.date | None':
@@ -132,6 +173,33 @@ def _parse_currency(value) -> 'str | None':
     return None
 
 
+def _extract_fields(data_url: str, model: str) -> dict:
+    """Llama a OpenAI Vision y retorna el JSON parseado del comprobante."""
+    from apps.core import ai_gateway
+    client = ai_gateway.client('voucher')
+    response = client.chat.completions.create(
+        model=model,
+        response_format={'type': 'json_object'},
+        messages=[
+            {'role': 'system', 'content': SYSTEM_PROMPT},
+            {
+                'role': 'user',
+                'content': [
+                    {'type': 'text', 'text': USER_PROMPT},
+                    {
+                        'type': 'image_url',
+                        'image_url': {'url': data_url, 'detail': 'high'},
+                    },
+                ],
+            },
+        ],
+        temperature=0,
+        max_tokens=400,
+    )
+    raw = response.choices[0].message.content or '{}'
+    return json.loads(raw)
+
+
 def analyze_voucher(receipt, force: bool = False, model: str = 'gpt-4o'):
     """Procesa un RentalReceipt con OpenAI Vision y guarda los campos ai_*.
 
@@ -164,46 +232,29 @@ def analyze_voucher(receipt, force: bool = False, model: str = 'gpt-4o'):
         return receipt
 
     path = os.path.join(settings.MEDIA_ROOT, receipt.file.name)
-    data = _file_to_data_url(path)
-    if not data:
+    prepared = prepare_voucher_image(path)
+    if not prepared:
         receipt.ai_error = f'tipo de archivo no soportado o ilegible: {receipt.file.name}'
         receipt.ai_processed_at = timezone.now()
         receipt.save(update_fields=update_fields)
         return receipt
-    data_url, _mime = data
+    data_url, content_hash = prepared
 
-    try:
-        import openai  # type: ignore
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model=model,
-            response_format={'type': 'json_object'},
-            messages=[
-                {'role': 'system', 'content': SYSTEM_PROMPT},
-                {
-                    'role': 'user',
-                    'content': [
-                        {'type': 'text', 'text': USER_PROMPT},
-                        {
-                            'type': 'image_url',
-                            'image_url': {'url': data_url, 'detail': 'high'},
-                        },
-                    ],
-                },
-            ],
-            temperature=0,
-            max_tokens=400,
-        )
-        raw = response.choices[0].message.content or '{}'
-        parsed = json.loads(raw)
-    except Exception as e:
-        logger.error(
-            f"Error analizando voucher id={receipt.id}: {e}", exc_info=True,
-        )
-        receipt.ai_error = f'fallo OpenAI: {str(e)[:300]}'
-        receipt.ai_processed_at = timezone.now()
-        receipt.save(update_fields=update_fields)
-        return receipt
+    # Mismo archivo ya analizado (voucher subido dos veces): reusar
+    result_key = f'voucher_ai:result:{model}:{content_hash}'
+    parsed = None if force else cache.get(result_key)
+    if parsed is None:
+        try:
+            parsed = _extract_fields(data_url, model)
+        except Exception as e:
+            logger.error(
+                f"Error analizando voucher id={receipt.id}: {e}", exc_info=True,
+            )
+            receipt.ai_error = f'fallo OpenAI: {str(e)[:300]}'
+            receipt.ai_processed_at = timezone.now()
+            receipt.save(update_fields=update_fields)
+            return receipt
+        cache.set(result_key, parsed, RESULT_CACHE_TTL)
 
     receipt.ai_bank_origin = (parsed.get('bank_origin') or None)
     receipt.ai_bank_destination = (parsed.get('bank_destination') or None)
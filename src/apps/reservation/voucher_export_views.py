@@ -12,13 +12,15 @@ import calendar
 import logging
 from datetime import datetime, timedelta
 
-from django.db.models import Q
+from django.db.models import Prefetch
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.core.exports import EXPORT_CHUNK_SIZE, parse_export, stream_export
+
 from .models import RentalReceipt, Reservation
-from .voucher_ai_service import analyze_voucher
+from .voucher_queue import enqueue_analysis, queue_progress
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,17 @@ logger = logging.getLogger(__name__)
 AIR_BANK_DESTINATION = 'Interbank'
 AIR_DEPOSIT_OFFSET_DAYS = 1
 
+VOUCHER_EXPORT_COLUMNS = (
+    'reservation_id', 'property', 'origin', 'origin_label', 'client_name',
+    'client_doc', 'client_phone', 'check_in', 'check_out', 'guests',
+    'price_usd', 'price_sol', 'advance_payment', 'advance_payment_currency',
+    'full_payment', 'status', 'comentarios', 'voucher_id',
+    'voucher_uploaded_at', 'voucher_description', 'voucher_bank_origin',
+    'voucher_bank_destination', 'voucher_destination_account',
+    'voucher_currency', 'voucher_amount', 'voucher_deposit_date',
+    'voucher_ai_error', 'is_synthetic_air',
+)
+
 
 def _serialize_reservation_base(r: Reservation) -> dict:
     """Datos comunes que se repiten en cada fila (por voucher o sintética)."""
@@ -147,22 +160,38 @@ def _row_no_voucher(base: dict) -> dict:
     return row
 
 
+def _voucher_rows(reservations):
+    """Filas del export (1 por voucher, o 1 sintética AIR / sin voucher)."""
+    for r in reservations:
+        base = _serialize_reservation_base(r)
+        if r.origin == 'air':
+            yield _row_synthetic_air(base, r)
+            continue
+        receipts = r.export_receipts
+        if not receipts:
+            yield _row_no_voucher(base)
+            continue
+        for receipt in receipts:
+            yield _row_from_voucher(base, receipt)
+
+
 class VoucherExportAPIView(APIView):
     """Devuelve filas JSON listas para Excel — 1 por voucher (o 1 sintética
-    AIR / sin voucher). Procesa con IA los vouchers no analizados.
+    AIR / sin voucher) con los datos IA ya cacheados.
 
     GET /api/v1/reservation/export/vouchers/?year=2025&month=4
 
-    Filtra por check_in_date dentro del mes solicitado.
+    Filtra por check_in_date dentro del mes solicitado (sin `month`, el año
+    completo). Los vouchers del período aún no analizados se encolan
+    (voucher_queue) y `ai_progress` informa cuántos faltan; el cliente
+    vuelve a consultar hasta que `pending` y `queued` lleguen a 0.
+
+    Con `?export=csv|xlsx` (y opcionalmente `?columns=`) devuelve el
+    archivo en streaming (apps.core.exports) en vez del JSON.
     """
 
     permission_classes = [IsAuthenticated]
 
-    # Cuántos vouchers nuevos se procesan con IA por request. Limitar evita
-    # exceder el timeout de gunicorn cuando hay decenas pendientes. El
-    # cliente puede llamar de nuevo y los procesados quedan cacheados.
-    MAX_AI_CALLS_PER_REQUEST = 15
-
     def get(self, request):
         try:
             year = int(request.query_params.get('year') or 0)
@@ -172,94 +201,69 @@ class VoucherExportAPIView(APIView):
                 {'error': 'year y month requeridos como enteros'},
                 status=400,
             )
-        if year < 2000 or month < 1 or month > 12:
+        if year < 2000 or month < 0 or month > 12:
             return Response(
                 {'error': 'year/month fuera de rango'}, status=400,
             )
-        # ?limit permite override (ej: 1 para debugging, 50 para batch grande)
         try:
-            limit = int(
-                request.query_params.get('limit') or self.MAX_AI_CALLS_PER_REQUEST,
-            )
-        except (TypeError, ValueError):
-            limit = self.MAX_AI_CALLS_PER_REQUEST
-        limit = max(0, min(limit, 100))
-        # ?skip_ai=1 omite el procesamiento IA: devuelve solo lo ya cacheado.
+            export = parse_export(request, VOUCHER_EXPORT_COLUMNS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        # ?skip_ai=1 no encola nada: devuelve solo lo ya cacheado.
         skip_ai = request.query_params.get('skip_ai') in ('1', 'true', 'yes')
 
-        last_day = calendar.monthrange(year, month)[1]
-        start = datetime(year, month, 1)
-        end = datetime(year, month, last_day, 23, 59, 59)
+        if month:
+            last_day = calendar.monthrange(year, month)[1]
+            start = datetime(year, month, 1)
+            end = datetime(year, month, last_day, 23, 59, 59)
+            period = f"{year}-{month:02d}"
+        else:
+            start = datetime(year, 1, 1)
+            end = datetime(year, 12, 31, 23, 59, 59)
+            period = str(year)
 
         # Excluimos man (mantenimiento) — no entran al Excel de ingresos.
         reservations = (
             Reservation.objects
             .filter(deleted=False, check_in_date__range=(start, end))
             .exclude(origin='man')
-            .select_related('client', 'property')
-            .order_by('check_in_date', 'id')
+        )
+        receipts = RentalReceipt.objects.filter(
+            reservation__in=reservations, deleted=False,
         )
 
-        # Prefetch de receipts para evitar N+1.
-        reservation_ids = [r.id for r in reservations]
-        receipts_by_reservation: dict = {}
-        for receipt in RentalReceipt.objects.filter(
-            reservation_id__in=reservation_ids, deleted=False,
-        ).order_by('created'):
-            receipts_by_reservation.setdefault(
-                receipt.reservation_id, [],
-            ).append(receipt)
-
-        # === Procesar con IA los vouchers no analizados ===
-        # Limitamos a `limit` por request para evitar timeouts. El cliente
-        # puede llamar al endpoint de nuevo y los ya procesados quedan
-        # cacheados, así que cada llamada avanza un poco más.
-        processed_count = 0
-        pending_count = 0
+        # === Encolar los vouchers no analizados (no se procesan acá) ===
+        # Solo id + ai_processed_at: no se cargan los receipts completos.
+        all_receipts = list(receipts.only('id', 'ai_processed_at'))
+        queued_now = 0
         if not skip_ai:
-            for receipts in receipts_by_reservation.values():
-                for receipt in receipts:
-                    if receipt.ai_processed_at:
-                        continue
-                    if processed_count >= limit:
-                        pending_count += 1
-                        continue
-                    try:
-                        analyze_voucher(receipt)
-                        processed_count += 1
-                    except Exception as e:
-                        # No bloqueamos el export por un voucher.
-                        logger.error(
-                            f"Voucher {receipt.id} análisis falló: {e}",
-                            exc_info=True,
-                        )
-        else:
-            # Solo contamos pendientes para informar al frontend.
-            for receipts in receipts_by_reservation.values():
-                for receipt in receipts:
-                    if not receipt.ai_processed_at:
-                        pending_count += 1
+            queued_now = enqueue_analysis(
+                [receipt.id for receipt in all_receipts if not receipt.ai_processed_at]
+            )
+        progress = queue_progress(all_receipts)
 
-        # === Armar filas ===
-        rows = []
-        for r in reservations:
-            base = _serialize_reservation_base(r)
-            if r.origin == 'air':
-                rows.append(_row_synthetic_air(base, r))
-                continue
-            receipts = receipts_by_reservation.get(r.id, [])
-            if not receipts:
-                rows.append(_row_no_voucher(base))
-                continue
-            for receipt in receipts:
-                rows.append(_row_from_voucher(base, receipt))
+        # === Armar filas (por bloques; receipts prefetcheados por bloque) ===
+        rows = _voucher_rows(
+            reservations
+            .select_related('client', 'property')
+            .prefetch_related(Prefetch(
+                'rentalreceipt_set',
+                queryset=RentalReceipt.objects.filter(deleted=False).order_by('created'),
+                to_attr='export_receipts',
+            ))
+            .order_by('check_in_date', 'id')
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        if export:
+            return stream_export(rows, *export, filename=f"vouchers-{period}")
 
+        rows = list(rows)
         return Response({
-            'period': f"{year}-{month:02d}",
+            'period': period,
             'count_reservations': reservations.count(),
             'count_rows': len(rows),
-            'count_vouchers_processed_now': processed_count,
-            'count_vouchers_pending': pending_count,
-            'limit_used': limit,
+            'count_vouchers_queued_now': queued_now,
+            'count_vouchers_pending': progress['pending'] + progress['queued'],
+            'ai_progress': progress,
             'rows': rows,
         })
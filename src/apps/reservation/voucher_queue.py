@@ -0,0 +1,120 @@
+"""
+Cola de análisis IA de vouchers (RentalReceipt → campos ai_*).
+
+Los vouchers se encolan al subirse (señal post_save) y los procesa un pool
+acotado de `VOUCHER_AI_WORKERS` hilos, fuera del request. El export de
+Ingresos solo lee los campos ai_* ya cacheados y reporta el progreso.
+
+Cada voucher en cola se "reclama" en la BD: un UPDATE condicional de
+`RentalReceipt.ai_queued_at` (solo si está vacío o vencido) que afecta la
+fila en un solo worker de gunicorn, así otro worker o un export repetido no
+lo envía dos veces a OpenAI. El reclamo se libera al terminar; si el
+proceso muere antes, vence a los `CLAIM_TTL` segundos.
+
+Uso:
+    from apps.reservation.voucher_queue import enqueue_analysis, queue_progress
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+CLAIM_TTL = 60 * 10
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _claimable(now):
+    """Vouchers sin reclamo vigente."""
+    return Q(ai_queued_at__isnull=True) | Q(ai_queued_at__lt=now - timedelta(seconds=CLAIM_TTL))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'VOUCHER_AI_WORKERS', DEFAULT_WORKERS)
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(workers)),
+                    thread_name_prefix='voucher-ai',
+                )
+    return _executor
+
+
+def _process(receipt_id, force=False):
+    from .models import RentalReceipt
+    from .voucher_ai_service import analyze_voucher
+
+    close_old_connections()
+    try:
+        receipt = RentalReceipt.objects.filter(pk=receipt_id, deleted=False).first()
+        if receipt is not None:
+            analyze_voucher(receipt, force=force)
+    except Exception as e:
+        logger.error(f"Voucher {receipt_id} análisis falló: {e}", exc_info=True)
+    finally:
+        try:
+            RentalReceipt.objects.filter(pk=receipt_id).update(ai_queued_at=None)
+        except Exception as e:
+            logger.warning(f"Voucher {receipt_id}: no se pudo liberar el reclamo: {e}")
+        close_old_connections()
+
+
+def enqueue_analysis(receipt_ids, force=False):
+    """
+    Encola el análisis de los vouchers dados (al confirmar la transacción).
+    Los que ya están en cola se omiten. Retorna cuántos se encolaron.
+    """
+    from .models import RentalReceipt
+
+    if not receipt_ids:
+        return 0
+    now = timezone.now()
+    # Un SELECT descarta los ya reclamados; el UPDATE por fila decide la carrera
+    candidates = RentalReceipt.objects.filter(_claimable(now), pk__in=receipt_ids).values_list('pk', flat=True)
+    queued = [
+        receipt_id for receipt_id in candidates
+        if RentalReceipt.objects.filter(_claimable(now), pk=receipt_id).update(ai_queued_at=now)
+    ]
+    if not queued:
+        return 0
+
+    def _submit():
+        if getattr(settings, 'VOUCHER_AI_SYNC', False):
+            for receipt_id in queued:
+                _process(receipt_id, force)
+            return
+        executor = _get_executor()
+        for receipt_id in queued:
+            executor.submit(_process, receipt_id, force)
+
+    transaction.on_commit(_submit)
+    return len(queued)
+
+
+def queue_progress(receipts):
+    """
+    Progreso del análisis para una lista de RentalReceipt:
+    {'total', 'processed', 'queued', 'pending'} — `pending` son los que
+    aún no se analizaron y no están en cola.
+    """
+    from .models import RentalReceipt
+
+    unprocessed = [r.id for r in receipts if not r.ai_processed_at]
+    queued = RentalReceipt.objects.filter(pk__in=unprocessed).exclude(_claimable(timezone.now())).count() if unprocessed else 0
+    return {
+        'total': len(receipts),
+        'processed': len(receipts) - len(unprocessed),
+        'queued': queued,
+        'pending': len(unprocessed) - queued,
+    }
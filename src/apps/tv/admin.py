@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import TVDevice, TVSession, TVAppVersion
+from .models import TVDevice, TVSession, TVAppVersion, TVDeviceUptime
 
 
 @admin.register(TVDevice)
@@ -31,10 +31,10 @@ class TVDeviceAdmin(admin.ModelAdmin):
 
 @admin.register(TVSession)
 class TVSessionAdmin(admin.ModelAdmin):
-    list_display = ['tv_device', 'event_type', 'reservation', 'created']
+    list_display = ['tv_device', 'event_type', 'reservation', 'event_count', 'first_seen', 'last_seen']
     list_filter = ['event_type', 'tv_device__property', 'created']
     search_fields = ['tv_device__room_id', 'tv_device__property__name']
-    readonly_fields = ['created', 'updated']
+    readonly_fields = ['created', 'updated', 'first_seen', 'last_seen', 'event_count']
     date_hierarchy = 'created'
 
     def has_add_permission(self, request):
@@ -44,6 +44,20 @@ class TVSessionAdmin(admin.ModelAdmin):
         return False  # Sessions should not be edited
 
 
+@admin.register(TVDeviceUptime)
+class TVDeviceUptimeAdmin(admin.ModelAdmin):
+    list_display = ['tv_device', 'day', 'heartbeats', 'online_seconds', 'first_seen', 'last_seen']
+    list_filter = ['tv_device__property']
+    search_fields = ['tv_device__room_id', 'tv_device__property__name']
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False  # Generated by rollup_tv_sessions
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(TVAppVersion)
 class TVAppVersionAdmin(admin.ModelAdmin):
     list_display = ['version_display', 'version_code', 'is_current_display', 'force_update', 'apk_link', 'created']
@@ -0,0 +1,242 @@
+"""
+Registro compactado de eventos de TV.
+
+Cada TV envía un heartbeat cada pocos segundos y consulta su sesión en
+loop. Antes cada uno de esos requests hacía un `save()` de TVDevice y/o
+insertaba una fila en TVSession que no aportaba información nueva.
+
+- Los heartbeats y los check-in de polling se acumulan en memoria
+  (`event_buffer`) y se escriben en bloque cada `TV_EVENT_FLUSH_INTERVAL`
+  segundos: un `bulk_update` de `last_heartbeat` y las filas de sesión.
+- Los eventos idénticos consecutivos del mismo stream (TV + tipo de
+  evento) se compactan en una sola fila: `first_seen`/`last_seen` acotan
+  el tramo y `event_count` cuenta los eventos. Si la última fila del
+  stream tiene los mismos datos y terminó hace menos de
+  `TV_EVENT_COMPACT_GAP` segundos se extiende; si no, se crea otra.
+- Check-out y lanzamiento de apps se escriben al momento (`record_now`),
+  con la misma compactación.
+- Extender una fila existente suma con `F('event_count') + n` en la BD:
+  otro proceso puede estar extendiendo la misma fila a la vez.
+
+El buffer es por proceso; ante una caída se pierden como mucho los
+heartbeats de un intervalo, lo que no afecta el historial de uptime.
+El historial viejo se consolida con `manage.py rollup_tv_sessions`.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CACHE_TTL = 300
+_NOT_REGISTERED = ''
+
+
+def _flush_interval():
+    return getattr(settings, 'TV_EVENT_FLUSH_INTERVAL', 30)
+
+
+def _compact_gap():
+    return timedelta(seconds=getattr(settings, 'TV_EVENT_COMPACT_GAP', 600))
+
+
+def _fingerprint(data):
+    """Representación estable de event_data para comparar eventos."""
+    return json.dumps(data or None, sort_keys=True, default=str)
+
+
+def resolve_device_id(room_id):
+    """
+    id del TVDevice activo para `room_id` (o None), cacheado unos minutos
+    para que los heartbeats no consulten la BD en cada request.
+    """
+    from .models import TVDevice
+
+    cache_key = f'tv:device:{room_id}'
+    device_id = cache.get(cache_key)
+    if device_id is None:
+        device_id = TVDevice.objects.filter(
+            room_id=room_id, is_active=True
+        ).values_list('id', flat=True).first()
+        device_id = str(device_id) if device_id else _NOT_REGISTERED
+        cache.set(cache_key, device_id, DEVICE_CACHE_TTL)
+    return device_id or None
+
+
+class PendingEvent:
+    """Tramo de eventos idénticos aún no persistido."""
+
+    __slots__ = ('device_id', 'event_type', 'reservation_id', 'data', 'first_seen', 'last_seen', 'count')
+
+    def __init__(self, device_id, event_type, reservation_id, data, at):
+        self.device_id = str(device_id)
+        self.event_type = event_type
+        self.reservation_id = str(reservation_id) if reservation_id else None
+        self.data = data or None
+        self.first_seen = at
+        self.last_seen = at
+        self.count = 1
+
+    @property
+    def stream(self):
+        return (self.device_id, self.event_type)
+
+    def same_as(self, reservation_id, data):
+        return (self.reservation_id == (str(reservation_id) if reservation_id else None)
+                and _fingerprint(self.data) == _fingerprint(data))
+
+
+def can_extend(row, event, gap):
+    """True si `event` continúa la fila existente `row` del mismo stream."""
+    row_reservation = str(row.reservation_id) if row.reservation_id else None
+    last_seen = row.last_seen or row.created
+    return (
+        row_reservation == event.reservation_id
+        and _fingerprint(row.event_data) == _fingerprint(event.data)
+        and event.first_seen - last_seen <= gap
+    )
+
+
+def persist(events):
+    """
+    Escribe los tramos pendientes compactándolos contra la última fila de
+    cada stream. Dos escrituras en bloque + un bulk_update de last_heartbeat.
+    """
+    from .models import TVDevice, TVSession
+
+    if not events:
+        return
+    gap = _compact_gap()
+    # Último tramo por stream dentro de la ventana de compactación
+    oldest = min(e.first_seen for e in events) - gap
+    latest = {}
+    rows = TVSession.objects.filter(
+        tv_device_id__in={e.device_id for e in events},
+        event_type__in={e.event_type for e in events},
+        last_seen__gte=oldest,
+    ).order_by('-last_seen')
+    for row in rows:
+        latest.setdefault((str(row.tv_device_id), row.event_type), row)
+
+    now = timezone.now()
+    to_create, to_update, increments = [], {}, {}
+    for event in sorted(events, key=lambda e: e.first_seen):
+        row = latest.get(event.stream)
+        if row is not None and can_extend(row, event, gap):
+            row.last_seen = max(row.last_seen or event.last_seen, event.last_seen)
+            if row._state.adding:
+                row.event_count += event.count
+            else:
+                increments[row.pk] = increments.get(row.pk, 0) + event.count
+                row.updated = now
+                to_update[row.pk] = row
+            continue
+        row = TVSession(
+            tv_device_id=event.device_id,
+            reservation_id=event.reservation_id,
+            event_type=event.event_type,
+            event_data=event.data,
+            first_seen=event.first_seen,
+            last_seen=event.last_seen,
+            event_count=event.count,
+        )
+        to_create.append(row)
+        latest[event.stream] = row
+
+    heartbeats = {}
+    for event in events:
+        if event.event_type == TVSession.EventType.HEARTBEAT:
+            current = heartbeats.get(event.device_id)
+            if current is None or event.last_seen > current:
+                heartbeats[event.device_id] = event.last_seen
+
+    # Sumar y extender en la BD, no pisar con lo leído antes
+    for pk, row in to_update.items():
+        row.event_count = F('event_count') + increments[pk]
+        seen = Value(row.last_seen, output_field=models.DateTimeField())
+        row.last_seen = Greatest(Coalesce('last_seen', seen), seen)
+
+    with transaction.atomic():
+        if to_update:
+            TVSession.objects.bulk_update(to_update.values(), ['last_seen', 'event_count', 'updated'])
+        if to_create:
+            TVSession.objects.bulk_create(to_create)
+        if heartbeats:
+            TVDevice.objects.bulk_update(
+                [TVDevice(pk=pk, last_heartbeat=at) for pk, at in heartbeats.items()],
+                ['last_heartbeat'],
+            )
+
+
+def record_now(device_id, event_type, reservation_id=None, data=None):
+    """Persiste un evento al momento (check-out, apps), compactado."""
+    persist([PendingEvent(device_id, event_type, reservation_id, data, timezone.now())])
+
+
+class EventBuffer:
+    """Acumula eventos por stream en memoria y los persiste periódicamente."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+
+    def record(self, device_id, event_type, reservation_id=None, data=None, at=None):
+        at = at or timezone.now()
+        stream = (str(device_id), event_type)
+        with self._lock:
+            runs = self._pending.setdefault(stream, [])
+            if runs and runs[-1].same_as(reservation_id, data):
+                runs[-1].last_seen = at
+                runs[-1].count += 1
+            else:
+                runs.append(PendingEvent(device_id, event_type, reservation_id, data, at))
+        self._ensure_flusher()
+
+    def drain(self):
+        """Retira y retorna los tramos pendientes."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return [event for runs in pending.values() for event in runs]
+
+    def flush(self):
+        events = self.drain()
+        if not events:
+            return 0
+        try:
+            persist(events)
+        except Exception as e:
+            logger.error(f"No se pudieron guardar {len(events)} eventos de TV: {e}")
+            return 0
+        return len(events)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='tv-event-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(_flush_interval())
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+event_buffer = EventBuffer()
+atexit.register(event_buffer.flush)
@@ -0,0 +1,119 @@
+"""
+Cron diario: consolida heartbeats viejos de TV en TVDeviceUptime (uno por
+TV y día) y borra las filas de TVSession ya consolidadas.
+
+Los demás eventos (check-in, check-out, apps) se conservan: ya están
+compactados y son pocos.
+
+Un tramo compactado puede cruzar la medianoche: se reparte entre los días
+locales que cubre (segundos exactos; heartbeats en proporción al tiempo).
+
+Uso: python manage.py rollup_tv_sessions
+     python manage.py rollup_tv_sessions --days 7 --dry-run
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.tv.events import event_buffer
+from apps.tv.models import TVDeviceUptime, TVSession
+
+
+def day_slices(first_seen, last_seen, count):
+    """
+    Parte un tramo [first_seen, last_seen] en días locales. Retorna
+    [(día, desde, hasta, segundos, heartbeats)]; los heartbeats se reparten
+    según el tiempo de cada día y suman `count`.
+    """
+    total = (last_seen - first_seen).total_seconds()
+    slices = []
+    start = first_seen
+    while True:
+        day = timezone.localdate(start)
+        midnight = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+        end = min(midnight, last_seen)
+        slices.append([day, start, end, int((end - start).total_seconds())])
+        if end >= last_seen:
+            break
+        start = end
+
+    assigned = 0
+    for piece in slices[:-1]:
+        share = int(count * (piece[3] / total)) if total else 0
+        piece.append(share)
+        assigned += share
+    slices[-1].append(count - assigned)
+    return [tuple(piece) for piece in slices]
+
+
+class Command(BaseCommand):
+    help = 'Consolida heartbeats viejos de TV en uptime diario y los purga'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'TV_HEARTBEAT_RETENTION_DAYS', 30),
+            help='Conservar el detalle de heartbeats de los últimos N días.'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar qué se consolidaría.')
+
+    def handle(self, *args, **options):
+        event_buffer.flush()
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        heartbeats = TVSession.objects.filter(
+            event_type=TVSession.EventType.HEARTBEAT,
+            last_seen__lt=cutoff,
+        )
+
+        totals = {}
+        ids = []
+        rows = heartbeats.values_list('id', 'tv_device_id', 'first_seen', 'last_seen', 'event_count')
+        for pk, device_id, first_seen, last_seen, count in rows.iterator(chunk_size=2000):
+            ids.append(pk)
+            for day, start, end, seconds, heartbeats in day_slices(first_seen, last_seen, count):
+                entry = totals.setdefault((device_id, day), {
+                    'heartbeats': 0, 'online_seconds': 0, 'first_seen': start, 'last_seen': end,
+                })
+                entry['heartbeats'] += heartbeats
+                entry['online_seconds'] += seconds
+                entry['first_seen'] = min(entry['first_seen'], start)
+                entry['last_seen'] = max(entry['last_seen'], end)
+
+        self.stdout.write(f'{len(ids)} filas de heartbeat en {len(totals)} días-TV anteriores a {cutoff:%Y-%m-%d}')
+        if options['dry_run'] or not ids:
+            return
+
+        with transaction.atomic():
+            existing = {
+                (u.tv_device_id, u.day): u
+                for u in TVDeviceUptime.objects.select_for_update().filter(
+                    tv_device_id__in={device_id for device_id, _ in totals},
+                    day__in={day for _, day in totals},
+                )
+            }
+            to_create, to_update = [], []
+            for key, entry in totals.items():
+                uptime = existing.get(key)
+                if uptime is None:
+                    to_create.append(TVDeviceUptime(tv_device_id=key[0], day=key[1], **entry))
+                    continue
+                # Re-ejecuciones suman lo nuevo a lo ya consolidado
+                uptime.heartbeats += entry['heartbeats']
+                uptime.online_seconds += entry['online_seconds']
+                uptime.first_seen = min(filter(None, (uptime.first_seen, entry['first_seen'])))
+                uptime.last_seen = max(filter(None, (uptime.last_seen, entry['last_seen'])))
+                to_update.append(uptime)
+
+            TVDeviceUptime.objects.bulk_create(to_create)
+            TVDeviceUptime.objects.bulk_update(
+                to_update, ['heartbeats', 'online_seconds', 'first_seen', 'last_seen']
+            )
+            for start in range(0, len(ids), 2000):
+                TVSession.objects.filter(id__in=ids[start:start + 2000]).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Consolidado: {len(to_create)} días nuevos, {len(to_update)} actualizados, {len(ids)} filas purgadas'
+        ))
@@ -0,0 +1,62 @@
+import uuid
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_seen(apps, schema_editor):
+    TVSession = apps.get_model('tv', 'TVSession')
+    TVSession.objects.filter(first_seen__isnull=True).update(
+        first_seen=models.F('created'),
+        last_seen=models.F('created'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tv', '0003_add_tv_app_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tvsession',
+            name='first_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tvsession',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tvsession',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1, help_text='Number of identical consecutive events compacted into this row'),
+        ),
+        migrations.RunPython(backfill_seen, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tvsession',
+            index=models.Index(fields=['tv_device', 'event_type', 'last_seen'], name='tv_session_stream_idx'),
+        ),
+        migrations.CreateModel(
+            name='TVDeviceUptime',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When the instance was created.', verbose_name='created at')),
+                ('updated', models.DateTimeField(auto_now=True, help_text='The last time at the instance was modified.', verbose_name='updated at')),
+                ('deleted', models.BooleanField(default=False, help_text='It can be set to false, usefull to simulate deletion')),
+                ('day', models.DateField()),
+                ('heartbeats', models.PositiveIntegerField(default=0)),
+                ('online_seconds', models.PositiveIntegerField(default=0, help_text='Sum of the compacted heartbeat runs (first to last heartbeat)')),
+                ('first_seen', models.DateTimeField(blank=True, null=True)),
+                ('last_seen', models.DateTimeField(blank=True, null=True)),
+                ('tv_device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uptime', to='tv.tvdevice')),
+            ],
+            options={
+                'verbose_name': 'TV Device Uptime',
+                'verbose_name_plural': 'TV Device Uptime',
+                'ordering': ['-day'],
+                'unique_together': {('tv_device', 'day')},
+            },
+        ),
+    ]
@@ -44,6 +44,10 @@ class TVDevice(BaseModel):
 class TVSession(BaseModel):
     """
     Tracks TV session events (check-in, check-out, heartbeats).
+
+    Consecutive identical events of a device are compacted into one row:
+    first_seen/last_seen bound the run and event_count counts the events
+    (see apps.tv.events).
     """
     class EventType(models.TextChoices):
         CHECK_IN = 'check_in', 'Check In'
@@ -73,16 +77,53 @@ class TVSession(BaseModel):
         blank=True,
         help_text="Additional event data (e.g., app name for app_launch)"
     )
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    event_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of identical consecutive events compacted into this row"
+    )
 
     class Meta:
         verbose_name = "TV Session"
         verbose_name_plural = "TV Sessions"
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['tv_device', 'event_type', 'last_seen'], name='tv_session_stream_idx'),
+        ]
 
     def __str__(self):
         return f"{self.tv_device} - {self.event_type} - {self.created}"
 
 
+class TVDeviceUptime(BaseModel):
+    """
+    Daily heartbeat rollup per device, kept after old heartbeat rows are purged.
+    """
+    tv_device = models.ForeignKey(
+        TVDevice,
+        on_delete=models.CASCADE,
+        related_name='uptime'
+    )
+    day = models.DateField()
+    heartbeats = models.PositiveIntegerField(default=0)
+    online_seconds = models.PositiveIntegerField(
+        default=0,
+        help_text="Sum of the compacted heartbeat runs (first to last heartbeat)"
+    )
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "TV Device Uptime"
+        verbose_name_plural = "TV Device Uptime"
+        ordering = ['-day']
+        unique_together = [('tv_device', 'day')]
+
+    def __str__(self):
+        return f"{self.tv_device} - {self.day} ({self.heartbeats} heartbeats)"
+
+
 class TVAppVersion(BaseModel):
     """
     Tracks TV app versions for OTA updates.
@@ -0,0 +1,94 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .events import EventBuffer, PendingEvent, can_extend, persist
+from .management.commands.rollup_tv_sessions import day_slices
+from .models import TVDevice, TVSession
+
+
+class TVEventCompactionTest(SimpleTestCase):
+    """Tests del buffer y la compactación de eventos de TV"""
+
+    def setUp(self):
+        self.buffer = EventBuffer()
+        self.buffer._ensure_flusher = lambda: None  # sin hilo de flush en tests
+        self.now = timezone.now()
+
+    def test_identical_events_are_coalesced(self):
+        """Heartbeats iguales forman un tramo; un cambio de datos abre otro"""
+        for i in range(5):
+            self.buffer.record('tv-1', 'heartbeat', data={'app_in_use': 'netflix'},
+                               at=self.now + timedelta(seconds=30 * i))
+        self.buffer.record('tv-1', 'heartbeat', data={'app_in_use': 'youtube'},
+                           at=self.now + timedelta(seconds=150))
+        self.buffer.record('tv-2', 'heartbeat', at=self.now)
+
+        events = sorted(self.buffer.drain(), key=lambda e: (e.device_id, e.first_seen))
+        self.assertEqual([(e.device_id, e.count) for e in events], [('tv-1', 5), ('tv-1', 1), ('tv-2', 1)])
+        self.assertEqual(events[0].last_seen - events[0].first_seen, timedelta(seconds=120))
+        self.assertEqual(self.buffer.drain(), [])
+
+    def test_can_extend_existing_row(self):
+        """Se extiende la última fila solo si los datos coinciden y el hueco es corto"""
+        self.buffer.record('tv-1', 'check_in', reservation_id='r1', at=self.now)
+        event = self.buffer.drain()[0]
+        gap = timedelta(minutes=10)
+        row = SimpleNamespace(reservation_id='r1', event_data=None, created=None,
+                              last_seen=self.now - timedelta(minutes=5))
+        self.assertTrue(can_extend(row, event, gap))
+        self.assertFalse(can_extend(SimpleNamespace(**{**vars(row), 'reservation_id': 'r2'}), event, gap))
+        self.assertFalse(can_extend(
+            SimpleNamespace(**{**vars(row), 'last_seen': self.now - timedelta(hours=1)}), event, gap
+        ))
+
+
+class TVRollupTest(SimpleTestCase):
+    """Tests del reparto de tramos de heartbeat por día"""
+
+    def test_run_across_midnight_is_split(self):
+        """Un tramo 23:50 → 00:20 aporta 10 y 20 minutos a cada día"""
+        start = timezone.make_aware(datetime(2026, 3, 10, 23, 50))
+        slices = day_slices(start, start + timedelta(minutes=30), 61)
+        self.assertEqual([(day, seconds, heartbeats) for day, _, _, seconds, heartbeats in slices], [
+            (date(2026, 3, 10), 600, 20),
+            (date(2026, 3, 11), 1200, 41),
+        ])
+        self.assertEqual(slices[0][2], slices[1][1])
+
+    def test_single_heartbeat(self):
+        at = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+        self.assertEqual(day_slices(at, at, 1), [(date(2026, 3, 10), at, at, 0, 1)])
+
+
+class TVPersistTest(TestCase):
+    """Extender una fila suma en la BD aunque otro flush la haya tocado"""
+
+    def test_concurrent_flush_keeps_both_counts(self):
+        from apps.property.models import Property
+
+        device = TVDevice.objects.create(
+            property=Property.objects.create(name='Casa Austin 1', slug='casa-austin-1'), room_id='sala',
+        )
+        now = timezone.now()
+        row = TVSession.objects.create(
+            tv_device=device, event_type='heartbeat', first_seen=now - timedelta(minutes=2),
+            last_seen=now - timedelta(minutes=1), event_count=5,
+        )
+        event = PendingEvent(device.id, 'heartbeat', None, None, now)
+        event.count = 2
+
+        def other_flush_first(row, event, gap):
+            TVSession.objects.filter(pk=row.pk).update(event_count=F('event_count') + 3, last_seen=now + timedelta(seconds=5))
+            return can_extend(row, event, gap)
+
+        with mock.patch('apps.tv.events.can_extend', side_effect=other_flush_first):
+            persist([event])
+
+        row.refresh_from_db()
+        self.assertEqual(row.event_count, 10)
+        self.assertEqual(row.last_seen, now + timedelta(seconds=5))
@@ -1,13 +1,12 @@
-from datetime import date
-from django.utils import timezone
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from apps.reservation.models import Reservation
+from apps.reservation.active_stay import stay_resolver
 from apps.property.models import Property
+from .events import event_buffer, record_now, resolve_device_id
 from .models import TVDevice, TVSession, TVAppVersion
 from .serializers import (
     TVSessionResponseSerializer,
@@ -65,18 +64,11 @@ class TVSessionView(APIView):
         else:
             property_for_search = tv_device.property
 
-        # Find active reservation for this property
-        today = date.today()
-
-        active_reservation = Reservation.objects.select_related(
-            'client', 'property'
-        ).filter(
-            property=property_for_search,
-            check_in_date__lte=today,
-            check_out_date__gte=today,
-            status__in=['approved', 'pending'],
-            deleted=False
-        ).order_by('-check_in_date').first()
+        # Find active reservation for this property (shared stay index)
+        stay = stay_resolver.active_for_property(
+            property_for_search.id, statuses=('approved', 'pending')
+        )
+        active_reservation = stay.load('client', 'property') if stay else None
 
         if active_reservation and active_reservation.client:
             # Active session with guest
@@ -99,12 +91,12 @@ class TVSessionView(APIView):
                 'message': None
             }
 
-            # Log check-in event if TV device exists
+            # Log check-in event if TV device exists (compacted per stay)
             if tv_device:
-                TVSession.objects.create(
-                    tv_device=tv_device,
-                    reservation=active_reservation,
-                    event_type=TVSession.EventType.CHECK_IN
+                event_buffer.record(
+                    tv_device.id,
+                    TVSession.EventType.CHECK_IN,
+                    reservation_id=active_reservation.id,
                 )
         else:
             # No active session - standby mode
@@ -147,26 +139,23 @@ class TVHeartbeatView(APIView):
     def post(self, request, room_id):
         """Record a heartbeat from TV device."""
 
-        try:
-            tv_device = TVDevice.objects.get(room_id=room_id, is_active=True)
-        except TVDevice.DoesNotExist:
+        device_id = resolve_device_id(room_id)
+        if not device_id:
             return Response(
                 {'status': 'ok', 'message': 'Device not registered'},
                 status=status.HTTP_200_OK
             )
 
-        # Update last heartbeat
-        tv_device.last_heartbeat = timezone.now()
-        tv_device.save(update_fields=['last_heartbeat'])
-
-        # Log heartbeat event
+        # Coalesced in memory; last_heartbeat and the session row are
+        # written in bulk by the flusher. The client timestamp is dropped
+        # so identical heartbeats compact (first/last_seen keep the timing).
         serializer = TVHeartbeatSerializer(data=request.data)
+        event_data = None
         if serializer.is_valid():
-            TVSession.objects.create(
-                tv_device=tv_device,
-                event_type=TVSession.EventType.HEARTBEAT,
-                event_data=serializer.validated_data
-            )
+            event_data = {
+                k: v for k, v in serializer.validated_data.items() if k != 'timestamp'
+            } or None
+        event_buffer.record(device_id, TVSession.EventType.HEARTBEAT, data=event_data)
 
         return Response({'status': 'ok'}, status=status.HTTP_200_OK)
 
@@ -207,11 +196,7 @@ class TVCheckoutView(APIView):
         if serializer.is_valid():
             event_data = serializer.validated_data
 
-        TVSession.objects.create(
-            tv_device=tv_device,
-            event_type=TVSession.EventType.CHECK_OUT,
-            event_data=event_data
-        )
+        record_now(tv_device.id, TVSession.EventType.CHECK_OUT, data=event_data)
 
         return Response({'status': 'ok'}, status=status.HTTP_200_OK)
 
@@ -235,11 +220,7 @@ class TVAppLaunchView(APIView):
                 status=status.HTTP_200_OK
             )
 
-        TVSession.objects.create(
-            tv_device=tv_device,
-            event_type=TVSession.EventType.APP_LAUNCH,
-            event_data={'app_name': app_name}
-        )
+        record_now(tv_device.id, TVSession.EventType.APP_LAUNCH, data={'app_name': app_name})
 
         return Response({'status': 'ok'}, status=status.HTTP_200_OK)
 
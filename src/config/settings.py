@@ -1,5 +1,7 @@
 import environ
 import os
+import sys
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -130,6 +132,7 @@ DJANGO_APPS = [
 ]
 
 LOCAL_APPS = [
+    'apps.core',
     'apps.accounts',
     'apps.clients.apps.ClientsConfig',  # Aquí la forma correcta
     'apps.property',
@@ -155,6 +158,7 @@ THIRD_APPS = [
 INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_APPS
 
 MIDDLEWARE = [
+    "apps.core.perf.PerformanceMiddleware",  # Perfilado por muestreo (Server-Timing, /api/v1/perf/requests/)
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -212,6 +216,26 @@ else:
         }
     }
 
+# Cache: con REDIS_URL (redis://host:6379/1) lo comparten los workers de
+# gunicorn y el scheduler, y las invalidaciones por versión
+# (apps.core.response_cache) llegan a todos. Sin él cada proceso tiene su
+# LocMemCache: lo que requiere consistencia entre workers (disponibilidad,
+# principals de clientes) no se cachea; ver response_cache.is_shared()
+REDIS_URL = env('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -257,6 +281,151 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Política horaria de estadías (apps.reservation.active_stay): TV, música,
+# Home Assistant, portal WiFi y chatbot usan estos mismos horarios. Sin
+# cache compartido, STAY_INDEX_TTL es lo que tarda otro worker en ver un
+# cambio de reserva.
+STAY_CHECKIN_TIME = env('STAY_CHECKIN_TIME', default='15:00')
+STAY_CHECKOUT_TIME = env('STAY_CHECKOUT_TIME', default='11:00')
+STAY_INDEX_HORIZON_DAYS = env.int('STAY_INDEX_HORIZON_DAYS', default=60)
+STAY_INDEX_TTL = env.int('STAY_INDEX_TTL', default=120)
+
+# Derivados de imagen (srcset responsivo) - ver apps.core.image_derivatives
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_WORKERS = env.int('IMAGE_DERIVATIVE_WORKERS', default=2)
+# True = procesa en el mismo hilo al confirmar la transacción (tests/debug)
+IMAGE_DERIVATIVES_SYNC = env.bool('IMAGE_DERIVATIVES_SYNC', default=False)
+
+# Contratos PDF (apps.reservation.contract_pdf)
+CONTRACT_CONVERTER_POOL_SIZE = env.int('CONTRACT_CONVERTER_POOL_SIZE', default=2)
+# Puertos de instancias unoserver de larga vida; es el modo de producción
+# (vacío = un libreoffice en frío por conversión)
+CONTRACT_UNOSERVER_PORTS = env.list('CONTRACT_UNOSERVER_PORTS', cast=int, default=[])
+CONTRACT_CONVERSION_TIMEOUT = env.int('CONTRACT_CONVERSION_TIMEOUT', default=60)
+# Directorio privado para PDFs ya generados: contratos firmados con datos
+# personales, fuera del árbol del código y de MEDIA_ROOT (se crea con 0700)
+CONTRACT_PDF_CACHE_DIR = env(
+    'CONTRACT_PDF_CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'casaaustin_contract_cache'),
+)
+CONTRACT_PDF_CACHE_TTL = env.int('CONTRACT_PDF_CACHE_TTL', default=60 * 60 * 24 * 30)
+# Procesos para el efecto "escaneado" de contrato_firma (1 = sin pool)
+SCAN_EFFECT_WORKERS = env.int('SCAN_EFFECT_WORKERS', default=2)
+
+# Eventos de TV (apps.tv.events): heartbeats coalescidos en memoria
+TV_EVENT_FLUSH_INTERVAL = env.int('TV_EVENT_FLUSH_INTERVAL', default=30)
+# Eventos idénticos separados por menos de esto se compactan en una fila
+TV_EVENT_COMPACT_GAP = env.int('TV_EVENT_COMPACT_GAP', default=600)
+TV_HEARTBEAT_RETENTION_DAYS = env.int('TV_HEARTBEAT_RETENTION_DAYS', default=30)
+
+# API de música (apps.reservation.music_client)
+MUSIC_API_POOL_SIZE = env.int('MUSIC_API_POOL_SIZE', default=10)
+MUSIC_API_FANOUT_WORKERS = env.int('MUSIC_API_FANOUT_WORKERS', default=8)
+# Snapshot de /status compartido entre requests; se sirve vencido hasta
+# MUSIC_STATUS_STALE_TTL si el upstream no responde
+MUSIC_STATUS_TTL = env.int('MUSIC_STATUS_TTL', default=5)
+MUSIC_STATUS_STALE_TTL = env.int('MUSIC_STATUS_STALE_TTL', default=60)
+
+# Análisis IA de vouchers (apps.reservation.voucher_queue)
+VOUCHER_AI_WORKERS = env.int('VOUCHER_AI_WORKERS', default=4)
+VOUCHER_AI_ON_UPLOAD = env.bool('VOUCHER_AI_ON_UPLOAD', default=True)
+# True = procesa en el mismo hilo al confirmar la transacción (tests/debug)
+VOUCHER_AI_SYNC = env.bool('VOUCHER_AI_SYNC', default=False)
+# Lado mayor (px) de la imagen enviada a OpenAI Vision
+VOUCHER_AI_MAX_SIDE = env.int('VOUCHER_AI_MAX_SIDE', default=1600)
+
+# Cache de respuestas de endpoints públicos (apps.core.response_cache)
+RESPONSE_CACHE_ENABLED = env.bool('RESPONSE_CACHE_ENABLED', default=True)
+RESPONSE_CACHE_TTL = env.int('RESPONSE_CACHE_TTL', default=300)
+RESPONSE_CACHE_STALE_TTL = env.int('RESPONSE_CACHE_STALE_TTL', default=600)
+
+# Análisis incremental de preguntas frecuentes (apps.chatbot.faq_index)
+FAQ_INDEX_DIR = env('FAQ_INDEX_DIR', default=str(BASE_DIR / 'var' / 'faq_index'))
+FAQ_EMBEDDING_MODEL = env('FAQ_EMBEDDING_MODEL', default='text-embedding-3-small')
+# Similitud coseno mínima para asignar un mensaje a una pregunta existente
+FAQ_MATCH_THRESHOLD = env.float('FAQ_MATCH_THRESHOLD', default=0.82)
+
+# Respuesta del chatbot en streaming (apps.chatbot.streaming)
+CHATBOT_STREAMING = env.bool('CHATBOT_STREAMING', default=False)
+# Mínimo de caracteres por mensaje enviado (se juntan párrafos cortos)
+CHATBOT_STREAM_MIN_CHARS = env.int('CHATBOT_STREAM_MIN_CHARS', default=160)
+
+# Envío de campañas por WhatsApp (apps.chatbot.campaigns)
+CAMPAIGN_WORKERS = env.int('CAMPAIGN_WORKERS', default=4)
+# Ritmo máximo de envío (mensajes/segundo) y ráfaga permitida
+CAMPAIGN_RATE_PER_SEC = env.float('CAMPAIGN_RATE_PER_SEC', default=10.0)
+CAMPAIGN_BURST = env.int('CAMPAIGN_BURST', default=10)
+# Journal de progreso para reanudar una campaña cortada
+CAMPAIGN_PROGRESS_DIR = env('CAMPAIGN_PROGRESS_DIR', default=str(BASE_DIR / 'var' / 'campaigns'))
+
+# Principal cacheado de ClientJWTAuthentication (apps.clients.authentication);
+# solo se cachea con un cache compartido (REDIS_URL)
+CLIENT_PRINCIPAL_TTL = env.int('CLIENT_PRINCIPAL_TTL', default=60)
+
+# Listados de reservas desde .values() anotados (apps.reservation.projections);
+# False = ReservationListSerializer / CalendarReservationSerializer por fila
+RESERVATION_LIST_PROJECTION = env.bool('RESERVATION_LIST_PROJECTION', default=True)
+
+# Grillas de ocupación por casa-mes (apps.reservation.occupancy); 0 = sin cache
+OCCUPANCY_CACHE_TTL = env.int('OCCUPANCY_CACHE_TTL', default=300)
+
+# Reporte JSON (consultas + EXPLAIN) del suite de presupuesto de consultas
+# (apps.core.query_budget); vacío = no se escribe
+QUERY_BUDGET_REPORT = env('QUERY_BUDGET_REPORT', default='')
+
+# Logs del logger `apps` (apps.core.logging_pipeline): archivo escrito desde
+# una cola (lo rota logrotate, ver el módulo) y muestreo 1 de N de DEBUG por
+# módulo. Ruta absoluta para no depender del cwd; `manage.py test` escribe en
+# el directorio temporal en vez del log del proyecto.
+LOG_FILE = env('LOG_FILE', default=str(
+    Path(tempfile.gettempdir()) / 'casaaustin_test.log' if sys.argv[1:2] == ['test']
+    else BASE_DIR / 'casaaustin_debug.log'
+))
+LOG_QUEUE_SIZE = env.int('LOG_QUEUE_SIZE', default=10000)
+LOG_SAMPLING = env.dict('LOG_SAMPLING', cast={'value': int}, default={
+    'apps.reservation.signals': 10,
+    'apps.clients': 10,
+})
+
+# Perfilado por request (apps.core.perf): fracción de requests perfilados,
+# tamaño del ring buffer por proceso, repeticiones de una misma consulta
+# que cuentan como N+1 y token del header X-Perf-Profile (vacío = sin forzar)
+PERF_ENABLED = env.bool('PERF_ENABLED', default=True)
+PERF_SAMPLE_RATE = env.float('PERF_SAMPLE_RATE', default=0.05)
+PERF_BUFFER_SIZE = env.int('PERF_BUFFER_SIZE', default=500)
+PERF_DUPLICATE_THRESHOLD = env.int('PERF_DUPLICATE_THRESHOLD', default=3)
+# Server-Timing solo llega a usuarios staff o a requests con X-Perf-Profile
+PERF_SERVER_TIMING = env.bool('PERF_SERVER_TIMING', default=True)
+PERF_FORCE_TOKEN = env('PERF_FORCE_TOKEN', default='')
+
+# Scheduler en proceso (apps.core.scheduler / manage.py run_scheduler): zona
+# horaria de las expresiones cron (UTC como el crontab del servidor: las
+# horas de SCHEDULER_JOBS son UTC, Lima = UTC-5), hilos para jobs, comandos
+# desactivados y archivo cuyo mtime (además de git HEAD) marca un deploy: el
+# proceso sale al cambiar y cron lo relanza con el código nuevo
+SCHEDULER_TIMEZONE = env('SCHEDULER_TIMEZONE', default='UTC')
+SCHEDULER_WORKERS = env.int('SCHEDULER_WORKERS', default=4)
+SCHEDULER_EXCLUDE = env.list('SCHEDULER_EXCLUDE', default=[])
+SCHEDULER_RELOAD_FILE = env('SCHEDULER_RELOAD_FILE', default='')
+
+# Asistente financiero (apps.admin_ai.analytics): segundos que se cachean las
+# reservas en columnas por ventana; se invalida al guardar reservas (0 = sin caché)
+ADMIN_ANALYTICS_CACHE_TTL = env.int('ADMIN_ANALYTICS_CACHE_TTL', default=300)
+
+# Gateway de OpenAI (apps.core.ai_gateway): conexiones del pool por proceso,
+# llamadas simultáneas por proceso, espera máxima por un cupo y, por caso de
+# uso, timeout (s), reintentos del SDK y modelo de chat por defecto
+AI_GATEWAY_POOL_SIZE = env.int('AI_GATEWAY_POOL_SIZE', default=20)
+AI_GATEWAY_MAX_CONCURRENCY = env.int('AI_GATEWAY_MAX_CONCURRENCY', default=8)
+AI_GATEWAY_QUEUE_TIMEOUT = env.float('AI_GATEWAY_QUEUE_TIMEOUT', default=20.0)
+AI_GATEWAY_USE_CASES = {
+    'chatbot': {'timeout': 30.0, 'max_retries': 2},
+    'admin_ai': {'timeout': 60.0, 'max_retries': 2},
+    'reports': {'timeout': 180.0, 'max_retries': 1},
+    'blog': {'timeout': 180.0, 'max_retries': 2, 'model': 'gpt-4o'},
+    'voucher': {'timeout': 60.0, 'max_retries': 2},
+    'faq_analysis': {'timeout': 120.0, 'max_retries': 3, 'model': 'gpt-4.1-mini'},
+}
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
@@ -333,12 +502,21 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'apps.core.logging_pipeline.SamplingFilter',
+            'rates': LOG_SAMPLING,
+            'early': True,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'casaaustin_debug.log',
+            '()': 'apps.core.logging_pipeline.queued_file_handler',
+            'filename': LOG_FILE,
+            'queue_size': LOG_QUEUE_SIZE,
             'formatter': 'verbose',
+            'filters': ['sampling'],
         },
         'console': {
             'level': LOG_LEVEL,
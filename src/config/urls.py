@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from django.views.static import serve
 
 from . import apiviews
+from apps.core.views import PerfRequestsView
 
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
@@ -46,6 +47,9 @@ urlpatterns = [
     path('api/v1/stats/client-profile/', ClientProfileStatsView.as_view(), name='stats-client-profile'),
     path('api/v1/metas/', MetasIngresosView.as_view(), name='stats-ingresos-metas'),
     path('api/v1/upcoming-checkins/', UpcomingCheckinsView.as_view(), name='upcoming-checkins'),
+
+    # === PERFILADO DE REQUESTS (apps.core.perf) ===
+    path('api/v1/perf/requests/', PerfRequestsView.as_view(), name='perf-requests'),
 ]
 
 # Serve media files in production (using re_path + serve instead of static())